@@ -0,0 +1,204 @@
+"""日本語コーパスでの BM25 スパース検索（hybrid 検索の sparse 側）のベンチマーク
+
+リポジトリ内の日本語ドキュメント（README.ja.md・docs/ 以下の記事）を rag._chunk_text で
+チャンクに分け、
+
+- 旧方式: \\w+ で区切り hash() % 2M にした語の TF（rag._tokenize_for_bm25 の再現）
+- 新方式: services/bm25.py（NFKC + 日本語 bigram、blake2b、文書側 BM25 TF・クエリ側 IDF）
+
+でスパースベクトルを作り、Qdrant と同じくスパースベクトルの内積で全チャンクを順位付けする。
+
+クエリは各チャンクの同じ文から取った2つの断片（--fragment 文字ずつ）を空白でつないだもので、
+元のチャンク（と両方の断片を含むチャンク）を正解とする。MRR@10・Recall@10 と、
+クエリのスパースベクトル作成（新方式は SQLite の DF 参照を含む）・順位付けの時間を比べる。
+
+--ollama-url を指定すると埋め込みも取り、dense のみ・dense + 旧 sparse・dense + 新 sparse を
+RRF で融合した hybrid の精度も出す（Qdrant の prefetch + fusion: rrf と同じ計算）。
+
+使い方:
+    python -m benchmarks.bench_bm25_ja [--queries 300] [--fragment 5] [--chunk-size 400]
+    python -m benchmarks.bench_bm25_ja --ollama-url http://localhost:11434
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import random
+import re
+import statistics
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from unittest.mock import patch
+
+from helix_studio import db as db_module
+from helix_studio.db import db_pool, init_db
+from helix_studio.services import bm25, rag
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_FILES = [
+    "README.ja.md",
+    "docs/blog/note_v2.md",
+    "docs/blog/qiita_v2.md",
+    "docs/blog/zenn_v2.md",
+    "docs/blog_moe_models.md",
+    "docs/qwen35-397b-setup.md",
+]
+TOP_K = 10
+RRF_K = 60
+
+
+def _old_encode(text: str) -> dict[int, float]:
+    """以前の rag._tokenize_for_bm25（同じプロセス内なので hash() は一定）。"""
+    freq = Counter(hash(t) % 2_000_000 for t in re.findall(r"\w+", text.lower()))
+    return {i: 1.0 + math.log(n) for i, n in freq.items()}
+
+
+def _queries(chunks: list[str], count: int, fragment: int, rng: random.Random) -> list[tuple[str, set[int]]]:
+    queries = []
+    order = list(range(len(chunks)))
+    rng.shuffle(order)
+    for i in order:
+        sentences = [s for s in re.split(r"[。\n！？]", chunks[i]) if len(s.strip()) >= fragment * 3]
+        if not sentences:
+            continue
+        sentence = rng.choice(sentences).strip()
+        a = rng.randrange(0, len(sentence) - fragment * 2)
+        b = rng.randrange(a + fragment, len(sentence) - fragment + 1)
+        parts = [sentence[a:a + fragment], sentence[b:b + fragment]]
+        relevant = {j for j, c in enumerate(chunks) if all(p in c for p in parts)} | {i}
+        queries.append((" ".join(parts), relevant))
+        if len(queries) >= count:
+            break
+    return queries
+
+
+def _rank(query: dict[int, float], docs: list[dict[int, float]]) -> list[int]:
+    scores = []
+    for j, doc in enumerate(docs):
+        score = sum(w * doc[t] for t, w in query.items() if t in doc)
+        if score > 0:
+            scores.append((score, j))
+    scores.sort(reverse=True)
+    return [j for _, j in scores[:TOP_K * 3]]
+
+
+def _dense_rank(query: list[float], docs: list[list[float]]) -> list[int]:
+    scores = sorted(((sum(a * b for a, b in zip(query, d)), j) for j, d in enumerate(docs)), reverse=True)
+    return [j for _, j in scores[:TOP_K * 3]]
+
+
+def _rrf(*rankings: list[int]) -> list[int]:
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for r, j in enumerate(ranking):
+            scores[j] = scores.get(j, 0.0) + 1 / (RRF_K + r + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _metrics(rankings: list[list[int]], queries: list[tuple[str, set[int]]]) -> tuple[float, float]:
+    mrr = hits = 0.0
+    for ranking, (_, relevant) in zip(rankings, queries):
+        for r, j in enumerate(ranking[:TOP_K]):
+            if j in relevant:
+                mrr += 1 / (r + 1)
+                hits += 1
+                break
+    return mrr / len(queries), hits / len(queries)
+
+
+def _ms(values: list[float]) -> str:
+    return f"p50 {statistics.median(values) * 1000:6.2f} ms  p95 {sorted(values)[int(len(values) * 0.95)] * 1000:6.2f} ms"
+
+
+def _normalize(vector: list[float] | None) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vector or [])) or 1.0
+    return [x / norm for x in vector or []]
+
+
+async def main(files: list[str], queries_n: int, fragment: int, chunk_size: int, ollama_url: str | None) -> None:
+    text = "\n\n".join((ROOT / f).read_text(encoding="utf-8") for f in files if (ROOT / f).exists())
+    chunks = rag._chunk_text(text, chunk_size=chunk_size, overlap=0)
+    queries = _queries(chunks, queries_n, fragment, random.Random(0))
+    print(f"corpus: {len(text):,} chars, {len(chunks)} chunks   queries: {len(queries)}   "
+          f"e.g. {queries[0][0]!r}")
+
+    with tempfile.TemporaryDirectory() as tmp, patch.object(db_module, "DB_PATH", Path(tmp) / "bench.db"):
+        await init_db()
+        await db_pool.open()
+        try:
+            start = time.perf_counter()
+            old_docs = [_old_encode(c) for c in chunks]
+            old_ingest = time.perf_counter() - start
+
+            start = time.perf_counter()
+            avgdl = await bm25.bm25_index.average_length(chunks)
+            new_docs = []
+            for c in chunks:
+                v = bm25.encode_document(c, avgdl)
+                new_docs.append(dict(zip(v["indices"], v["values"])))
+            await bm25.bm25_index.add(chunks)
+            new_ingest = time.perf_counter() - start
+
+            results: dict[str, list[list[int]]] = {}
+            timings: dict[str, tuple[list[float], list[float]]] = {}
+            for label in ("before", "after"):
+                rankings, encode_t, rank_t = [], [], []
+                for q, _ in queries:
+                    start = time.perf_counter()
+                    if label == "before":
+                        vector = _old_encode(q)
+                        docs = old_docs
+                    else:
+                        sparse = await bm25.bm25_index.encode_query(q)
+                        vector = dict(zip(sparse["indices"], sparse["values"]))
+                        docs = new_docs
+                    encode_t.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    rankings.append(_rank(vector, docs))
+                    rank_t.append(time.perf_counter() - start)
+                results[label] = rankings
+                timings[label] = (encode_t, rank_t)
+        finally:
+            await db_pool.close()
+
+    print(f"  ingest encode: before {old_ingest * 1000:7.1f} ms   after {new_ingest * 1000:7.1f} ms "
+          f"(DF 更新を含む)")
+    for label in ("before", "after"):
+        mrr, recall = _metrics(results[label], queries)
+        encode_t, rank_t = timings[label]
+        print(f"  sparse {label:<6}: MRR@{TOP_K} {mrr:.3f}  Recall@{TOP_K} {recall:.3f}   "
+              f"query encode {_ms(encode_t)}   rank {_ms(rank_t)}")
+
+    if not ollama_url:
+        return
+    from helix_studio.services.embeddings import Embedder
+
+    embedder = Embedder()
+    dense_docs = [_normalize(v) for v in await embedder.embed_many(chunks, ollama_url, rag.EMBEDDING_MODEL)]
+    dense_queries = [
+        _normalize(v)
+        for v in await embedder.embed_many([q for q, _ in queries], ollama_url, rag.EMBEDDING_MODEL)
+    ]
+    dense = [_dense_rank(q, dense_docs) for q in dense_queries]
+    for label, rankings in (
+        ("dense only", dense),
+        ("hybrid before", [_rrf(d, s) for d, s in zip(dense, results["before"])]),
+        ("hybrid after", [_rrf(d, s) for d, s in zip(dense, results["after"])]),
+    ):
+        mrr, recall = _metrics(rankings, queries)
+        print(f"  {label:<14}: MRR@{TOP_K} {mrr:.3f}  Recall@{TOP_K} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", nargs="+", default=DEFAULT_FILES, help="リポジトリからの相対パス")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--fragment", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=400)
+    parser.add_argument("--ollama-url", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.files, args.queries, args.fragment, args.chunk_size, args.ollama_url))
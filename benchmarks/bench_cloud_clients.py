@@ -0,0 +1,154 @@
+"""クラウド SDK クライアントキャッシュのベンチマーク
+
+Anthropic / OpenAI のストリーミング API を模したローカル HTTP サーバーに対して、
+毎ターン SDK クライアントを作る場合（旧方式）と ClientCache で使い回す場合（新方式）の
+1ターンあたりの所要時間と、サーバーが受け付けた TCP 接続数を比較する。
+
+使い方:
+    python -m benchmarks.bench_cloud_clients [--turns 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import anthropic
+import openai
+
+from helix_studio.services import cloud_ai
+from helix_studio.services.cloud_ai import ClientCache
+
+_TOKENS = ["Hello", ", ", "world", "!"]
+
+
+def _anthropic_body() -> bytes:
+    events = [
+        ("message_start", {"type": "message_start", "message": {
+            "id": "msg_bench", "type": "message", "role": "assistant", "model": "bench",
+            "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": 5, "output_tokens": 1}}}),
+        ("content_block_start", {"type": "content_block_start", "index": 0,
+                                 "content_block": {"type": "text", "text": ""}}),
+        *[("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                   "delta": {"type": "text_delta", "text": t}}) for t in _TOKENS],
+        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        ("message_delta", {"type": "message_delta",
+                           "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                           "usage": {"output_tokens": len(_TOKENS)}}),
+        ("message_stop", {"type": "message_stop"}),
+    ]
+    return "".join(f"event: {e}\ndata: {json.dumps(d)}\n\n" for e, d in events).encode()
+
+
+def _openai_body() -> bytes:
+    chunks = [
+        {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "bench",
+         "choices": [{"index": 0, "delta": {"content": t}, "finish_reason": None}]}
+        for t in _TOKENS
+    ]
+    chunks.append({"id": "c", "object": "chat.completion.chunk", "created": 0, "model": "bench",
+                   "choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": len(_TOKENS),
+                                            "total_tokens": 5 + len(_TOKENS)}})
+    lines = [f"data: {json.dumps(c)}\n\n" for c in chunks] + ["data: [DONE]\n\n"]
+    return "".join(lines).encode()
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """1接続につき1インスタンス。setup() で受け付けた接続数を数える。"""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    bodies = {"/v1/messages": _anthropic_body(), "/v1/chat/completions": _openai_body()}
+
+    def setup(self):
+        type(self).connections += 1
+        super().setup()
+        # ヘッダと本文を別々に書くので、Nagle と遅延 ACK で 40ms 待たないようにする
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = self.bodies.get(self.path.split("?")[0])
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+async def _per_call_claude(base_url: str) -> None:
+    # 旧方式: 毎回クライアントを作る
+    client = anthropic.AsyncAnthropic(api_key="bench", base_url=base_url)
+    async with client.messages.stream(
+        model="bench", max_tokens=16, messages=[{"role": "user", "content": "hi"}],
+    ) as stream:
+        async for _ in stream.text_stream:
+            pass
+
+
+async def _per_call_openai(base_url: str) -> None:
+    client = openai.AsyncOpenAI(api_key="bench", base_url=base_url)
+    stream = await client.chat.completions.create(
+        model="bench", messages=[{"role": "user", "content": "hi"}], stream=True,
+    )
+    async for _ in stream:
+        pass
+
+
+async def _cached(provider: str, base_url: str) -> None:
+    messages = [{"role": "user", "content": "hi"}]
+    if provider == "claude":
+        gen = cloud_ai.stream_chat_claude("bench", "bench", messages, base_url=base_url)
+    else:
+        gen = cloud_ai.stream_chat_openai("bench", "bench", messages, base_url=base_url)
+    async for _ in gen:
+        pass
+
+
+async def _measure(turn, turns: int) -> tuple[float, int]:
+    _StandIn.connections = 0
+    await turn()  # ウォームアップ（import・初回接続）
+    _StandIn.connections = 0
+    start = time.perf_counter()
+    for _ in range(turns):
+        await turn()
+    return (time.perf_counter() - start) / turns, _StandIn.connections
+
+
+async def main(turns: int) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = f"http://127.0.0.1:{server.server_port}"
+    cloud_ai.client_cache = ClientCache()
+    try:
+        print(f"turns: {turns}")
+        for provider, base_url, per_call in (
+            ("claude", root, _per_call_claude),
+            ("openai", f"{root}/v1", _per_call_openai),
+        ):
+            before, conns_before = await _measure(lambda: per_call(base_url), turns)
+            after, conns_after = await _measure(lambda: _cached(provider, base_url), turns)
+            print(f"{provider:<7} per-call client : {before * 1000:7.2f} ms/turn  {conns_before:4d} connections")
+            print(f"{provider:<7} cached client   : {after * 1000:7.2f} ms/turn  {conns_after:4d} connections")
+            print(f"{provider:<7} speedup         : {before / after:7.1f}x")
+    finally:
+        await cloud_ai.client_cache.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    asyncio.run(main(parser.parse_args().turns))
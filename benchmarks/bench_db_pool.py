@@ -0,0 +1,65 @@
+"""DB接続プールのマイクロベンチマーク
+
+1クエリあたりのオーバーヘッドを「毎回 get_connection() して close」
+（旧方式）と「ConnectionPool から借りる」（新方式）で比較する。
+
+使い方:
+    python -m benchmarks.bench_db_pool [--queries 500]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from helix_studio import db as db_module
+from helix_studio.db import ConnectionPool, get_connection, init_db
+
+
+async def _per_call(queries: int) -> float:
+    start = time.perf_counter()
+    for _ in range(queries):
+        db = await get_connection()
+        try:
+            cursor = await db.execute("SELECT value FROM settings WHERE key = ?", ("ollama_url",))
+            await cursor.fetchone()
+        finally:
+            await db.close()
+    return time.perf_counter() - start
+
+
+async def _pooled(queries: int) -> float:
+    pool = ConnectionPool()
+    await pool.open()
+    try:
+        start = time.perf_counter()
+        for _ in range(queries):
+            async with pool.read() as db:
+                cursor = await db.execute("SELECT value FROM settings WHERE key = ?", ("ollama_url",))
+                await cursor.fetchone()
+        return time.perf_counter() - start
+    finally:
+        await pool.close()
+
+
+async def main(queries: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        with patch.object(db_module, "DB_PATH", Path(tmp) / "bench.db"):
+            await init_db()
+            before = await _per_call(queries)
+            after = await _pooled(queries)
+
+    print(f"queries: {queries}")
+    print(f"per-call connection : {before * 1e6 / queries:8.1f} us/query")
+    print(f"pooled connection   : {after * 1e6 / queries:8.1f} us/query")
+    print(f"speedup             : {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=500)
+    asyncio.run(main(parser.parse_args().queries))
@@ -0,0 +1,140 @@
+"""検索クエリ埋め込みのまとめ送信のベンチマーク
+
+多数のユーザーが同時にチャットしたときの rag.search・mem0 の検索クエリ埋め込みを模し、
+
+- 旧方式: 呼び出しごとに /api/embed を1回呼ぶ
+- 新方式: Embedder.embed（window 内の呼び出しをまとめ、同じテキストは1件にする）
+
+の所要時間・1呼び出しあたりのレイテンシ (p50/p95)・埋め込みリクエスト数を比較する。
+各ユーザーは --users 人が --spread-ms の範囲でばらばらに送り、--duplicates の割合で
+他のユーザーと同じクエリを送る。
+
+代役の埋め込みサーバーは、1リクエストあたり --latency-ms + 1件あたり --per-text-ms の
+処理時間を模し、同時に --parallel 件まで処理する（Ollama の OLLAMA_NUM_PARALLEL 相当）。
+
+使い方:
+    python -m benchmarks.bench_embed_coalesce [--users 64] [--spread-ms 20] [--duplicates 0.25]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, patch
+
+MODEL = "qwen3-embedding:8b"
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.015
+    per_text = 0.001
+    slots = threading.Semaphore(2)
+    vector_json = b"[]"
+    requests = 0
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        texts = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["input"]
+        cls = type(self)
+        cls.requests += 1
+        with cls.slots:
+            time.sleep(cls.latency + cls.per_text * len(texts))
+        body = b'{"embeddings":[' + b",".join([cls.vector_json] * len(texts)) + b"]}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def _run(embed, queries: list[tuple[float, str]]) -> tuple[float, list[float]]:
+    async def user(delay: float, text: str) -> float:
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        assert await embed(text)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(user(delay, text) for delay, text in queries))
+    return time.perf_counter() - start, list(latencies)
+
+
+async def main(users: int, spread_ms: float, duplicates: float, dim: int,
+               latency_ms: float, per_text_ms: float, parallel: int) -> None:
+    from helix_studio.services.embeddings import Embedder
+
+    _StandIn.latency = latency_ms / 1000
+    _StandIn.per_text = per_text_ms / 1000
+    _StandIn.slots = threading.Semaphore(parallel)
+    _StandIn.vector_json = json.dumps([0.0123456789] * dim).encode()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    rng = random.Random(0)
+    texts: list[str] = []
+    for i in range(users):
+        texts.append(rng.choice(texts) if texts and rng.random() < duplicates else f"ユーザー{i}の質問です")
+    queries = [(rng.uniform(0, spread_ms / 1000), text) for text in texts]
+
+    old_embedder = Embedder()
+    new_embedder = Embedder()
+
+    async def old(text: str):
+        return (await old_embedder.embed_batch(url, MODEL, [text]))[0]
+
+    async def new(text: str):
+        return await new_embedder.embed(url, MODEL, text)
+
+    print(f"users: {users}   unique queries: {len(set(texts))}   spread: {spread_ms:g} ms   dim: {dim}   "
+          f"embed: {latency_ms:g} ms + {per_text_ms:g} ms/text, parallel {parallel}")
+    try:
+        with patch("helix_studio.services.residency.get_setting", new_callable=AsyncMock, return_value=None):
+            results = {}
+            for label, embed in (("before", old), ("after", new)):
+                _StandIn.requests = 0
+                elapsed, latencies = await _run(embed, queries)
+                results[label] = elapsed
+                print(f"  {label:<6}: {elapsed * 1000:8.1f} ms total   "
+                      f"p50 {_percentile(latencies, 50) * 1000:7.1f} ms   "
+                      f"p95 {_percentile(latencies, 95) * 1000:7.1f} ms   "
+                      f"{_StandIn.requests:4d} embed requests")
+            stats = new_embedder.stats()
+            print(f"  speedup: {results['before'] / results['after']:7.1f}x   "
+                  f"batch sizes {stats['batch_sizes']}")
+    finally:
+        from helix_studio.services.http_pool import http_pool
+        await http_pool.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--spread-ms", type=float, default=20.0)
+    parser.add_argument("--duplicates", type=float, default=0.25)
+    parser.add_argument("--dim", type=int, default=4096)
+    parser.add_argument("--latency-ms", type=float, default=15.0)
+    parser.add_argument("--per-text-ms", type=float, default=1.0)
+    parser.add_argument("--parallel", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.spread_ms, args.duplicates, args.dim,
+                     args.latency_ms, args.per_text_ms, args.parallel))
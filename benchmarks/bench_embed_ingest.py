@@ -0,0 +1,185 @@
+"""RAG 取り込み（埋め込み + Qdrant 保存）のスループットのベンチマーク
+
+Ollama /api/embed と Qdrant を模したローカル HTTP サーバーに対して、
+
+- 旧方式: チャンクを1つずつ rag._embed で埋め込み、最後に全件を1回で upsert
+- 新方式: rag.ingest_text（バッチ・並行の埋め込み + ストリーミング upsert）
+
+で同じ文書を取り込み、所要時間・チャンク/秒・埋め込みリクエスト数・最大 upsert サイズを比較する。
+続けて1段落だけ書き換えた文書を再登録し（edit）、差分だけが埋め込まれることを確かめる。
+
+代役の埋め込みサーバーは、1リクエストあたり --latency-ms + 1件あたり --per-text-ms の
+処理時間を模し、同時に --parallel 件まで処理する（Ollama の OLLAMA_NUM_PARALLEL 相当）。
+
+使い方:
+    python -m benchmarks.bench_embed_ingest [--chunks 600] [--dim 4096] [--latency-ms 15]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import socket
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.015
+    per_text = 0.001
+    slots = threading.Semaphore(2)
+    vector_json = b"[]"
+    embed_requests = 0
+    upsert_bytes: list[int] = []
+    points: dict[str, dict] = {}
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, body: bytes) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if "/points/" in self.path:
+            self._points(payload)
+            return
+        texts = payload["input"] if isinstance(payload["input"], list) else [payload["input"]]
+        cls = type(self)
+        cls.embed_requests += 1
+        with cls.slots:
+            time.sleep(cls.latency + cls.per_text * len(texts))
+        self._send(b'{"embeddings":[' + b",".join([cls.vector_json] * len(texts)) + b"]}")
+
+    def do_PUT(self):
+        size = int(self.headers["Content-Length"])
+        points = json.loads(self.rfile.read(size))["points"]
+        type(self).upsert_bytes.append(size)
+        type(self).points.update({p["id"]: p["payload"] for p in points})
+        self._send(b'{"result":{"status":"acknowledged"}}')
+
+    def _points(self, payload: dict) -> None:
+        points = type(self).points
+        if self.path.endswith("/scroll"):
+            doc_id = payload["filter"]["must"][0]["match"]["value"]
+            found = [{"id": k, "payload": v} for k, v in points.items() if v["doc_id"] == doc_id]
+            self._send(json.dumps({"result": {"points": found, "next_page_offset": None}}).encode())
+            return
+        if self.path.endswith("/batch"):
+            for op in payload["operations"]:
+                for point_id in op["set_payload"]["points"]:
+                    points[point_id].update(op["set_payload"]["payload"])
+        elif self.path.endswith("/delete"):
+            for point_id in payload["points"]:
+                points.pop(point_id, None)
+        self._send(b'{"result":{"status":"acknowledged"}}')
+
+    def do_GET(self):
+        self._send(b'{"result":{}}')
+
+    def log_message(self, *args):
+        pass
+
+
+def _document(chunks: int, edited: int | None = None) -> str:
+    # 1段落 ≒ 1チャンク（CHUNK_SIZE 1000 文字に収まる長さ）
+    return "\n\n".join(
+        f"第{i}節 " + "取り込み対象の本文です。" * 60 + ("（改訂）" if i == edited else "")
+        for i in range(chunks)
+    )
+
+
+async def _old_ingest(rag, text: str, url: str) -> int:
+    chunks = rag._chunk_text(text)
+    points = []
+    for i, chunk in enumerate(chunks):
+        vector = await rag._embed(chunk, url)
+        if vector:
+            points.append(rag._make_point("bench", "bench.md", i, chunks, vector, None))
+    r = await rag.http_pool.client("qdrant").put(
+        f"{rag.QDRANT_URL}/collections/{rag.COLLECTION}/points",
+        json={"points": points}, timeout=rag._TIMEOUT,
+    )
+    r.raise_for_status()
+    return len(points)
+
+
+async def main(chunks: int, dim: int, latency_ms: float, per_text_ms: float, parallel: int) -> None:
+    from helix_studio import db as db_module
+    from helix_studio.db import init_db
+    from helix_studio.services import rag
+    from helix_studio.services.embeddings import embedder
+
+    _StandIn.latency = latency_ms / 1000
+    _StandIn.per_text = per_text_ms / 1000
+    _StandIn.slots = threading.Semaphore(parallel)
+    _StandIn.vector_json = json.dumps([0.0123456789] * dim).encode()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    text = _document(chunks)
+
+    async def old() -> int:
+        return await _old_ingest(rag, text, url)
+
+    async def new() -> int:
+        result = await rag.ingest_text(text, "bench.md", ollama_url=url, doc_id="bench-new")
+        return result["chunks"]
+
+    async def edit() -> int:
+        result = await rag.ingest_text(
+            _document(chunks, edited=chunks // 2), "bench.md", ollama_url=url, doc_id="bench-new",
+        )
+        return result["chunks"]
+
+    print(f"chunks: {len(rag._chunk_text(text))}   dim: {dim}   "
+          f"embed: {latency_ms:g} ms + {per_text_ms:g} ms/text, parallel {parallel}")
+    try:
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            # BM25 の統計はベンチ用の DB に書く
+            patch.object(db_module, "DB_PATH", Path(tmp) / "bench.db"),
+            patch.object(rag, "QDRANT_URL", url),
+            patch("helix_studio.services.residency.get_setting", new_callable=AsyncMock, return_value=None),
+            # 2回目の取り込みがキャッシュに当たらないようにする
+            patch.object(embedder, "cache", None),
+        ):
+            await init_db()
+            results = {}
+            for label, ingest in (("before", old), ("after", new), ("edit", edit)):
+                _StandIn.embed_requests = 0
+                _StandIn.upsert_bytes = []
+                start = time.perf_counter()
+                stored = await ingest()
+                elapsed = time.perf_counter() - start
+                results[label] = elapsed
+                print(f"  {label:<6}: {elapsed:7.2f} s  {stored / elapsed:8.1f} chunks/s  "
+                      f"{_StandIn.embed_requests:5d} embed requests  "
+                      f"{len(_StandIn.upsert_bytes):3d} upserts (max {max(_StandIn.upsert_bytes, default=0) / 1024**2:6.1f} MiB)")
+            print(f"  speedup: {results['before'] / results['after']:7.1f}x   "
+                  f"(avg batch {embedder.stats()['avg_batch']})")
+    finally:
+        await rag.http_pool.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=600)
+    parser.add_argument("--dim", type=int, default=4096)
+    parser.add_argument("--latency-ms", type=float, default=15.0)
+    parser.add_argument("--per-text-ms", type=float, default=1.0)
+    parser.add_argument("--parallel", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(main(args.chunks, args.dim, args.latency_ms, args.per_text_ms, args.parallel))
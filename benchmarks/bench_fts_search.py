@@ -0,0 +1,137 @@
+"""全文検索 (FTS5 trigram) ベンチマーク
+
+合成コーパス（日英混在、デフォルト100万メッセージ）を生成し、
+トリガー経由のインデックス構築時間と GET /api/search 相当の検索レイテンシを、
+インデックスを使わない LIKE 全走査と比較する。
+
+使い方:
+    python -m benchmarks.bench_fts_search [--messages 1000000] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from helix_studio import db as db_module
+from helix_studio.db import db_pool, init_db
+from helix_studio.services import search
+
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+KANJI = "東京量子化埋込検索推論速度設定要約応答高速記憶文脈再順位計画実行検証模型言語処理"
+LATIN = "abcdefghijklmnopqrstuvwxyz"
+VOCAB_SIZE = 20_000
+# ごく稀にしか出現しない語（実際の「昔の回答を探す」検索を想定）
+NEEDLES = ["東京タワー", "ベクトル検索", "reranker", "websocket"]
+NEEDLE_RATE = 0.001
+QUERIES = ["東京タワー", "ベクトル検索 reranker", "websocket", "東京", "モデル"]
+MESSAGES_PER_CONV = 200
+
+
+def _vocab(rng: random.Random) -> list[str]:
+    words = ["モデル", "設定", "検索", "応答"]  # 頻出語
+    while len(words) < VOCAB_SIZE:
+        r = rng.random()
+        if r < 0.4:
+            w = "".join(rng.choice(KATAKANA) for _ in range(rng.randint(3, 6)))
+        elif r < 0.7:
+            w = "".join(rng.choice(KANJI) for _ in range(rng.randint(2, 4)))
+        else:
+            w = "".join(rng.choice(LATIN) for _ in range(rng.randint(3, 9)))
+        words.append(w)
+    return words
+
+
+def _sentences(rng: random.Random, count: int):
+    vocab = _vocab(rng)
+    cum = list(itertools.accumulate(1.0 / (i + 1) for i in range(len(vocab))))  # Zipf
+    for _ in range(count):
+        words = rng.choices(vocab, cum_weights=cum, k=rng.randint(10, 60))
+        if rng.random() < NEEDLE_RATE:
+            words.insert(rng.randrange(len(words)), rng.choice(NEEDLES))
+        yield "".join(w if rng.random() < 0.5 else w + " " for w in words) + "。"
+
+
+def _build(path: Path, messages: int, seed: int) -> float:
+    rng = random.Random(seed)
+    sentences = _sentences(rng, messages)
+    conn = sqlite3.connect(str(path))
+    start = time.perf_counter()
+    with conn:
+        convs = (messages + MESSAGES_PER_CONV - 1) // MESSAGES_PER_CONV
+        conn.executemany(
+            "INSERT INTO conversations (id, title, provider, model) VALUES (?, ?, 'ollama', 'm')",
+            ((f"c{i}", f"Conversation {i}") for i in range(convs)),
+        )
+        conn.executemany(
+            "INSERT INTO messages (id, conversation_id, role, content) VALUES (?, ?, ?, ?)",
+            (
+                (f"m{i}", f"c{i // MESSAGES_PER_CONV}", "user" if i % 2 == 0 else "assistant", text)
+                for i, text in enumerate(sentences)
+            ),
+        )
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def _like_scan(path: Path, query: str) -> float:
+    conn = sqlite3.connect(str(path))
+    terms = query.split()
+    where = " AND ".join("content LIKE ?" for _ in terms)
+    start = time.perf_counter()
+    conn.execute(
+        f"SELECT id FROM messages WHERE {where} ORDER BY rowid DESC LIMIT 20",
+        [f"%{t}%" for t in terms],
+    ).fetchall()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+async def _fts(query: str) -> float:
+    start = time.perf_counter()
+    await search.search(query, limit=20)
+    return time.perf_counter() - start
+
+
+def _pct(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+async def main(messages: int, repeat: int, seed: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        with patch.object(db_module, "DB_PATH", path):
+            await init_db()
+            build = _build(path, messages, seed)
+            size_mb = path.stat().st_size / 1e6
+            print(f"messages: {messages:,}  build (insert + FTS triggers): {build:.1f}s  db size: {size_mb:.0f}MB")
+            print(f"{'query':<24} {'FTS p50':>9} {'FTS p95':>9} {'LIKE p50':>9}")
+
+            await db_pool.open()
+            try:
+                for q in QUERIES:
+                    fts = [await _fts(q) for _ in range(repeat)]
+                    like = [_like_scan(path, q) for _ in range(max(1, repeat // 5))]
+                    print(f"{q:<24} {_pct(fts, 0.5):8.1f}ms {_pct(fts, 0.95):8.1f}ms {statistics.median(like) * 1000:8.1f}ms")
+            finally:
+                await db_pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.repeat, args.seed))
@@ -0,0 +1,178 @@
+"""上流ストリームのパースと WebSocket フレームのエンコードのベンチマーク
+
+1万トークンの Ollama NDJSON / OpenAI 互換 SSE の応答を記録したバイト列を、
+ネットワークから届く大きさ（--chunk-bytes）に区切って httpx のレスポンスとして再生し、
+
+- 旧方式: aiter_lines() で str に分割 → 1行ずつ json.loads → 1トークンずつ json.dumps
+- 新方式: aiter_bytes() をバイト列のまま分割 → 不要な行はデコードせず fastjson.loads
+          → fastjson.dumps
+
+の1ストリームあたりの CPU 時間を比較する。--file で実際に記録した応答
+（1行1イベントの NDJSON または SSE）を再生できる。--stdlib で orjson を使わない
+フォールバック経路を測る。
+
+使い方:
+    python -m benchmarks.bench_stream_parse [--tokens 10000] [--chunk-bytes 1024] [--runs 5]
+    python -m benchmarks.bench_stream_parse --file recorded.ndjson --stdlib
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+# 日本語と英語が混ざった、1トークン数バイトの典型的な応答
+_TOKENS = ["了解", "しました", "。", " The", " function", " returns", " a", " list", "\n", "```"]
+
+
+def record_ollama(tokens: int) -> bytes:
+    """Ollama /api/chat のストリーム応答（Go の encoding/json と同じく空白なし）。"""
+    lines = []
+    for i in range(tokens):
+        lines.append(json.dumps({
+            "model": "gemma3:27b", "created_at": "2026-10-17T09:00:00.000000Z",
+            "message": {"role": "assistant", "content": _TOKENS[i % len(_TOKENS)]},
+            "done": False,
+        }, ensure_ascii=False, separators=(",", ":")))
+    lines.append(json.dumps({
+        "model": "gemma3:27b", "created_at": "2026-10-17T09:00:10.000000Z",
+        "message": {"role": "assistant", "content": ""}, "done_reason": "stop", "done": True,
+        "total_duration": 10_000_000_000, "prompt_eval_count": 512, "eval_count": tokens,
+    }, separators=(",", ":")))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def record_openai(tokens: int) -> bytes:
+    """OpenAI 互換 /v1/chat/completions の SSE 応答（include_usage あり）。"""
+    def event(choices: list, usage: dict | None = None) -> str:
+        chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 1760691600,
+                 "model": "qwen3-32b", "choices": choices, "usage": usage}
+        return "data: " + json.dumps(chunk, ensure_ascii=False, separators=(",", ":")) + "\n\n"
+
+    events = [event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])]
+    for i in range(tokens):
+        events.append(event([{"index": 0, "delta": {"content": _TOKENS[i % len(_TOKENS)]},
+                              "finish_reason": None}]))
+    events.append(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+    events.append(event([], {"prompt_tokens": 512, "completion_tokens": tokens, "total_tokens": 512 + tokens}))
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode()
+
+
+def _response(recorded: bytes, chunk_bytes: int) -> httpx.Response:
+    async def stream():
+        for i in range(0, len(recorded), chunk_bytes):
+            yield recorded[i:i + chunk_bytes]
+
+    return httpx.Response(200, content=stream())
+
+
+# ── 旧方式（変更前の local_ai と ws_chat と同じ処理） ──
+
+
+async def _old_ollama(resp: httpx.Response, usage: dict):
+    async for line in resp.aiter_lines():
+        if not line:
+            continue
+        try:
+            chunk = json.loads(line)
+            content = chunk.get("message", {}).get("content", "")
+            if content:
+                yield content
+            if chunk.get("done") and usage is not None:
+                usage["tokens_in"] = chunk.get("prompt_eval_count")
+                usage["tokens_out"] = chunk.get("eval_count")
+        except json.JSONDecodeError:
+            continue
+
+
+async def _old_openai(resp: httpx.Response, usage: dict):
+    async for line in resp.aiter_lines():
+        if not line or not line.startswith("data: "):
+            continue
+        data_str = line[6:]
+        if data_str.strip() == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data_str)
+            if chunk.get("usage") and usage is not None:
+                usage["tokens_in"] = chunk["usage"].get("prompt_tokens")
+                usage["tokens_out"] = chunk["usage"].get("completion_tokens")
+            delta = chunk.get("choices", [{}])[0].get("delta", {})
+            content = delta.get("content", "")
+            if content:
+                yield content
+        except (json.JSONDecodeError, IndexError):
+            continue
+
+
+async def _replay(parse, encode, recorded: bytes, chunk_bytes: int) -> tuple[float, int, dict]:
+    usage: dict = {}
+    frames = 0
+    cpu = time.process_time()
+    async for text in parse(_response(recorded, chunk_bytes), usage):
+        encode({"type": "chunk", "content": text, "conversation_id": "bench"})
+        frames += 1
+    return time.process_time() - cpu, frames, usage
+
+
+async def main(tokens: int, chunk_bytes: int, runs: int, file: str | None) -> None:
+    from helix_studio.services import fastjson, local_ai
+
+    if file:
+        recorded = Path(file).read_bytes()
+        kind = "openai" if recorded.lstrip().startswith(b"data:") else "ollama"
+        streams = {f"{kind} ({Path(file).name})": (kind, recorded)}
+    else:
+        streams = {
+            "ollama": ("ollama", record_ollama(tokens)),
+            "openai": ("openai", record_openai(tokens)),
+        }
+
+    def new_path(kind: str):
+        parse = local_ai._parse_ollama_ndjson if kind == "ollama" else local_ai._parse_openai_sse
+
+        async def run(resp: httpx.Response, usage: dict):
+            async for text in parse(resp.aiter_bytes(), usage):
+                yield text
+
+        return run
+
+    print(f"json backend: {fastjson.BACKEND}   chunk: {chunk_bytes} B   runs: {runs} (best)")
+    for name, (kind, recorded) in streams.items():
+        old_parse = _old_ollama if kind == "ollama" else _old_openai
+        results = {}
+        for label, parse, encode in (
+            ("before", old_parse, json.dumps),
+            ("after", new_path(kind), fastjson.dumps),
+        ):
+            best = None
+            for _ in range(runs):
+                cpu, frames, usage = await _replay(parse, encode, recorded, chunk_bytes)
+                best = cpu if best is None else min(best, cpu)
+            results[label] = (best, frames, usage)
+        (before, frames_b, usage_b), (after, frames_a, usage_a) = results["before"], results["after"]
+        assert frames_a == frames_b and usage_a == usage_b, "paths disagree"
+        print(f"{name:<8} {len(recorded) / 1024:8.0f} KiB  {frames_b:6d} tokens")
+        print(f"  before : {before * 1000:8.1f} ms  {frames_b / before:10.0f} tokens/s")
+        print(f"  after  : {after * 1000:8.1f} ms  {frames_a / after:10.0f} tokens/s")
+        print(f"  speedup: {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=10_000)
+    parser.add_argument("--chunk-bytes", type=int, default=1024)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--file", help="記録した NDJSON / SSE 応答を再生する")
+    parser.add_argument("--stdlib", action="store_true", help="orjson を使わない経路を測る")
+    args = parser.parse_args()
+    if args.stdlib:
+        sys.modules["orjson"] = None  # import orjson を ImportError にする
+    asyncio.run(main(args.tokens, args.chunk_bytes, args.runs, args.file))
@@ -0,0 +1,88 @@
+"""WebSocket チャンク結合のベンチマーク
+
+高速なモデルのトークンストリームを模擬し、1チャンク1フレームで送る場合（旧方式）と
+ChunkCoalescer でまとめて送る場合（新方式）のフレーム数・サーバーCPU時間・
+最初のフレームまでの時間を比較する。送信は実際の ws_chat と同じく
+json.dumps + UTF-8 エンコードを行い、フレームごとにイベントループへ制御を返す。
+
+使い方:
+    python -m benchmarks.bench_ws_coalesce [--tokens 4000] [--interval-ms 1] [--flush-ms 33]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+
+from helix_studio.services.stream_coalescer import ChunkCoalescer
+
+TOKEN = "トークン "
+
+
+async def _tokens(count: int, interval: float):
+    """interval 秒ごとに1トークン返す（interval=0 なら8トークンごとにまとめて到着）。"""
+    for i in range(count):
+        if interval:
+            await asyncio.sleep(interval)
+        elif i % 8 == 0:
+            await asyncio.sleep(0)
+        yield TOKEN
+
+
+async def _run(count: int, interval: float, flush_ms: float, max_bytes: int) -> dict:
+    sent: list[bytes] = []
+    first_frame: list[float] = []
+
+    async def send(text: str) -> None:
+        frame = json.dumps({"type": "chunk", "content": text, "conversation_id": "bench"})
+        sent.append(frame.encode())
+        if not first_frame:
+            first_frame.append(time.perf_counter())
+        # 実際の send_text はフレームごとにトランスポートへ書き込み、制御を返す
+        await asyncio.sleep(0)
+
+    coalescer = ChunkCoalescer(send, flush_ms, max_bytes)
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    async for token in _tokens(count, interval):
+        await coalescer.push(token)
+    await coalescer.close()
+    return {
+        "frames": coalescer.frames,
+        "bytes": sum(len(f) for f in sent),
+        "cpu": time.process_time() - cpu,
+        "wall": time.perf_counter() - wall,
+        "first_ms": (first_frame[0] - wall) * 1000,
+    }
+
+
+def _print(label: str, r: dict) -> None:
+    print(
+        f"{label:<12}: {r['frames']:6d} frames  {r['bytes'] / 1024:8.1f} KiB  "
+        f"cpu {r['cpu'] * 1000:7.1f} ms  wall {r['wall'] * 1000:7.1f} ms  "
+        f"first frame {r['first_ms']:5.2f} ms"
+    )
+
+
+async def main(tokens: int, interval_ms: float, flush_ms: float, max_bytes: int) -> None:
+    interval = interval_ms / 1000
+    before = await _run(tokens, interval, 0, 0)
+    after = await _run(tokens, interval, flush_ms, max_bytes)
+
+    print(f"tokens: {tokens}  interval: {interval_ms} ms  flush: {flush_ms} ms / {max_bytes} B")
+    _print("per-chunk", before)
+    _print("coalesced", after)
+    print(f"frame reduction : {before['frames'] / max(after['frames'], 1):8.1f}x")
+    print(f"cpu reduction   : {before['cpu'] / max(after['cpu'], 1e-9):8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=4000)
+    parser.add_argument("--interval-ms", type=float, default=1.0)
+    parser.add_argument("--flush-ms", type=float, default=33.0)
+    parser.add_argument("--bytes", type=int, default=2048)
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens, args.interval_ms, args.flush_ms, args.bytes))
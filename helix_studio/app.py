@@ -11,16 +11,32 @@ from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
-from helix_studio.db import init_db
+from helix_studio.config import load_settings, settings_cache
+from helix_studio.db import db_pool, init_db
+from helix_studio.services.backend_pool import backend_pool
+from helix_studio.services.cli_ai import reset_cli_detection
+from helix_studio.services.circuit import health_poller
+from helix_studio.services.cli_sessions import cli_sessions
+from helix_studio.services.cloud_ai import client_cache
+from helix_studio.services.context_window import context_manager
+from helix_studio.services.embedding_cache import embedding_cache
+from helix_studio.services.embeddings import embedder
+from helix_studio.services.history_cache import history_cache
+from helix_studio.services.http_pool import http_pool
+from helix_studio.services.journal import message_journal
+from helix_studio.services.model_catalog import model_catalog
+from helix_studio.services.residency import residency
 from helix_studio.routes import (
     chat,
     crew_api,
     mcp_api,
     memory,
+    metrics_api,
     models_api,
     pages,
     pipeline_api,
     rag_api,
+    search_api,
     settings_api,
     tools_api,
 )
@@ -35,12 +51,37 @@ TEMPLATES_DIR = BASE_DIR / "templates"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """アプリ起動時にDBを初期化。"""
+    """アプリ起動時にDBを初期化し、接続プールを開く。"""
     logger.info("Helix AI Studio を起動中...")
+    await db_pool.open()
+    await http_pool.open()
     await init_db()
+    await load_settings()
+    await message_journal.start()
+    await cli_sessions.start()
+    health_poller.start(http_pool)
+    residency.start()
+    backend_pool.start()
     logger.info("データベース初期化完了")
-    yield
-    logger.info("Helix AI Studio をシャットダウン")
+    try:
+        yield
+    finally:
+        logger.info("Helix AI Studio をシャットダウン")
+        await health_poller.stop()
+        await residency.stop()
+        await backend_pool.stop()
+        await cli_sessions.stop()
+        await context_manager.stop()
+        await message_journal.stop()
+        await model_catalog.stop()
+        await embedder.stop()
+        reset_cli_detection()
+        settings_cache.invalidate()
+        history_cache.clear()
+        await http_pool.close()
+        await client_cache.close()
+        await embedding_cache.close()
+        await db_pool.close()
 
 
 def create_app() -> FastAPI:
@@ -71,6 +112,8 @@ def create_app() -> FastAPI:
     app.include_router(tools_api.router)
     app.include_router(rag_api.router)
     app.include_router(mcp_api.router)
+    app.include_router(metrics_api.router)
+    app.include_router(search_api.router)
 
     # ヘルスチェック（外部依存なし）
     @app.get("/healthz")
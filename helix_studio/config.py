@@ -1,45 +1,121 @@
-"""設定ヘルパー — DBから設定を読み書きする。"""
+"""設定ヘルパー — DBから設定を読み書きする。
+
+設定は起動時にメモリへスナップショットとして読み込み、読み取りは dict 参照のみで
+完結させる。書き込みは DB に反映した後、新しいスナップショットに差し替える
+（write-through）。差し替えは参照の代入1回なので、読み取り側が中途半端な状態を
+見ることはない。
+"""
 
 from __future__ import annotations
 
-from helix_studio.db import get_connection
+import asyncio
+
+from helix_studio.db import db_pool
+
+_UPSERT_SQL = """INSERT INTO settings (key, value, updated_at)
+               VALUES (?, ?, datetime('now'))
+               ON CONFLICT(key) DO UPDATE SET value = excluded.value,
+                                              updated_at = excluded.updated_at"""
+
+
+class SettingsCache:
+    """settings テーブルのインメモリスナップショット。"""
+
+    def __init__(self):
+        self._snapshot: dict[str, str] | None = None
+        self._write_lock = asyncio.Lock()
+        self._lock_loop: asyncio.AbstractEventLoop | None = None
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    async def load(self) -> dict[str, str]:
+        """DBから全設定を読み直してスナップショットを差し替える。
+
+        読み取りから差し替えまで書き込みと同じロックを持つ。持たないと、読み取りの後に
+        終わった write() の値を古いスナップショットで上書きしてしまう。
+        """
+        async with self._lock():
+            async with db_pool.read() as db:
+                cursor = await db.execute("SELECT key, value FROM settings")
+                rows = await cursor.fetchall()
+            snapshot = {row["key"]: row["value"] for row in rows}
+            self._snapshot = snapshot
+            self.loads += 1
+        return snapshot
+
+    async def snapshot(self) -> dict[str, str]:
+        """現在のスナップショットを返す。未ロードならDBから読み込む。"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        return await self.load()
+
+    async def write(self, values: dict[str, str]) -> None:
+        """複数の設定を1トランザクションで書き込み、スナップショットを更新。"""
+        if not values:
+            return
+        async with self._lock():
+            try:
+                async with db_pool.write() as db:
+                    await db.executemany(_UPSERT_SQL, list(values.items()))
+            except BaseException:
+                self.invalidate()
+                raise
+            if self._snapshot is not None:
+                self._snapshot = {**self._snapshot, **values}
+
+    def _lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            # 別のイベントループで待たれたロックは使えないので作り直す（スクリプト・テスト）
+            self._write_lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._write_lock
+
+    def invalidate(self) -> None:
+        """スナップショットを破棄（次回読み取り時にDBから再読込）。"""
+        self._snapshot = None
+
+    def stats(self) -> dict[str, int | bool | float]:
+        total = self.hits + self.misses
+        return {
+            "loaded": self._snapshot is not None,
+            "keys": len(self._snapshot or {}),
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# グローバルインスタンス（app.py の lifespan で load）
+settings_cache = SettingsCache()
+
+
+async def load_settings() -> None:
+    """起動時に設定スナップショットを読み込む。"""
+    await settings_cache.load()
 
 
 async def get_setting(key: str) -> str | None:
     """指定キーの設定値を取得。存在しなければ None。"""
-    db = await get_connection()
-    try:
-        cursor = await db.execute(
-            "SELECT value FROM settings WHERE key = ?", (key,)
-        )
-        row = await cursor.fetchone()
-        return row["value"] if row else None
-    finally:
-        await db.close()
+    snapshot = await settings_cache.snapshot()
+    return snapshot.get(key)
 
 
 async def set_setting(key: str, value: str) -> None:
     """設定値を更新（なければ挿入）。"""
-    db = await get_connection()
-    try:
-        await db.execute(
-            """INSERT INTO settings (key, value, updated_at)
-               VALUES (?, ?, datetime('now'))
-               ON CONFLICT(key) DO UPDATE SET value = excluded.value,
-                                              updated_at = excluded.updated_at""",
-            (key, value),
-        )
-        await db.commit()
-    finally:
-        await db.close()
+    await settings_cache.write({key: value})
+
+
+async def set_settings(values: dict[str, str]) -> None:
+    """複数の設定値をまとめて更新（1トランザクション）。"""
+    await settings_cache.write(values)
 
 
 async def get_all_settings() -> dict[str, str]:
     """全設定をdict形式で返す。"""
-    db = await get_connection()
-    try:
-        cursor = await db.execute("SELECT key, value FROM settings")
-        rows = await cursor.fetchall()
-        return {row["key"]: row["value"] for row in rows}
-    finally:
-        await db.close()
+    return dict(await settings_cache.snapshot())
@@ -2,12 +2,24 @@
 
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
-import aiosqlite
+import re
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
 
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
 DB_PATH = Path(__file__).parent.parent / "data" / "helix_studio.db"
 
+# conversations・messages・pipeline_runs の seq は rowid の別名（INTEGER PRIMARY KEY）。
+# TEXT 主キーだけのテーブルの暗黙の rowid は VACUUM で振り直されることがあり、rowid を
+# 参照する FTS の索引・conversation_summaries.covered_seq・journal の RETURNING rowid・
+# 履歴のページングと食い違う。別名にした rowid は VACUUM でも変わらない。
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS settings (
     key TEXT PRIMARY KEY,
@@ -15,7 +27,8 @@ CREATE TABLE IF NOT EXISTS settings (
     updated_at TEXT DEFAULT (datetime('now'))
 );
 CREATE TABLE IF NOT EXISTS conversations (
-    id TEXT PRIMARY KEY,
+    seq INTEGER PRIMARY KEY,  -- rowid の別名（VACUUM で変わらない）
+    id TEXT NOT NULL UNIQUE,
     title TEXT NOT NULL DEFAULT 'New Chat',
     provider TEXT NOT NULL,
     model TEXT NOT NULL,
@@ -24,7 +37,8 @@ CREATE TABLE IF NOT EXISTS conversations (
     updated_at TEXT DEFAULT (datetime('now'))
 );
 CREATE TABLE IF NOT EXISTS messages (
-    id TEXT PRIMARY KEY,
+    seq INTEGER PRIMARY KEY,  -- rowid の別名（VACUUM で変わらない）
+    id TEXT NOT NULL UNIQUE,
     conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
     role TEXT NOT NULL,
     content TEXT NOT NULL,
@@ -36,8 +50,39 @@ CREATE TABLE IF NOT EXISTS messages (
     created_at TEXT DEFAULT (datetime('now'))
 );
 CREATE INDEX IF NOT EXISTS idx_messages_conv ON messages(conversation_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at, id);
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    conversation_id TEXT PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    covered_seq INTEGER NOT NULL,  -- 要約に含めた最後の messages.seq
+    updated_at TEXT DEFAULT (datetime('now'))
+);
+CREATE TABLE IF NOT EXISTS turn_metrics (
+    id INTEGER PRIMARY KEY,
+    message_id TEXT,
+    conversation_id TEXT,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    db_ms INTEGER,
+    history_ms INTEGER,
+    context_ms INTEGER,
+    stages TEXT,  -- 取得元ごとの所要時間 (JSON)
+    skipped TEXT,  -- 締め切り超過・エラーで捨てた取得元 (JSON)
+    connect_ms INTEGER,
+    ttft_ms INTEGER,
+    stream_ms INTEGER,
+    total_ms INTEGER,
+    chunks INTEGER,
+    gap_mean_ms REAL,
+    gap_max_ms INTEGER,
+    tokens_in INTEGER,
+    tokens_out INTEGER,
+    tokens_per_sec REAL,
+    created_at TEXT DEFAULT (datetime('now'))
+);
 CREATE TABLE IF NOT EXISTS pipeline_runs (
-    id TEXT PRIMARY KEY,
+    seq INTEGER PRIMARY KEY,  -- rowid の別名（VACUUM で変わらない）
+    id TEXT NOT NULL UNIQUE,
     title TEXT NOT NULL,
     status TEXT NOT NULL DEFAULT 'pending',
     input_text TEXT NOT NULL,
@@ -53,13 +98,89 @@ CREATE TABLE IF NOT EXISTS pipeline_runs (
     created_at TEXT DEFAULT (datetime('now')),
     completed_at TEXT
 );
+-- RAG の BM25 統計（services/bm25.py）。term_id は語の blake2b 32 ビット値
+CREATE TABLE IF NOT EXISTS bm25_terms (
+    term_id INTEGER PRIMARY KEY,
+    df INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bm25_corpus (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    docs INTEGER NOT NULL,  -- 登録済みチャンク数
+    tokens INTEGER NOT NULL
+);
+"""
+
+# 全文検索インデックス（FTS5 external content）。FTS の rowid は元テーブルの seq。
+# trigram トークナイザは空白で区切られない日本語でも部分一致検索ができる。
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='seq', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content) VALUES (new.seq, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content)
+    VALUES ('delete', old.seq, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content)
+    VALUES ('delete', old.seq, old.content);
+    INSERT INTO messages_fts(rowid, content) VALUES (new.seq, new.content);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+    title, content='conversations', content_rowid='seq', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS conversations_fts_ai AFTER INSERT ON conversations BEGIN
+    INSERT INTO conversations_fts(rowid, title) VALUES (new.seq, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS conversations_fts_ad AFTER DELETE ON conversations BEGIN
+    INSERT INTO conversations_fts(conversations_fts, rowid, title)
+    VALUES ('delete', old.seq, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS conversations_fts_au AFTER UPDATE OF title ON conversations BEGIN
+    INSERT INTO conversations_fts(conversations_fts, rowid, title)
+    VALUES ('delete', old.seq, old.title);
+    INSERT INTO conversations_fts(rowid, title) VALUES (new.seq, new.title);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS pipeline_runs_fts USING fts5(
+    title, input_text, step2_result, step3_result,
+    content='pipeline_runs', content_rowid='seq', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS pipeline_runs_fts_ai AFTER INSERT ON pipeline_runs BEGIN
+    INSERT INTO pipeline_runs_fts(rowid, title, input_text, step2_result, step3_result)
+    VALUES (new.seq, new.title, new.input_text, new.step2_result, new.step3_result);
+END;
+CREATE TRIGGER IF NOT EXISTS pipeline_runs_fts_ad AFTER DELETE ON pipeline_runs BEGIN
+    INSERT INTO pipeline_runs_fts(pipeline_runs_fts, rowid, title, input_text, step2_result, step3_result)
+    VALUES ('delete', old.seq, old.title, old.input_text, old.step2_result, old.step3_result);
+END;
+CREATE TRIGGER IF NOT EXISTS pipeline_runs_fts_au
+AFTER UPDATE OF title, input_text, step2_result, step3_result ON pipeline_runs BEGIN
+    INSERT INTO pipeline_runs_fts(pipeline_runs_fts, rowid, title, input_text, step2_result, step3_result)
+    VALUES ('delete', old.seq, old.title, old.input_text, old.step2_result, old.step3_result);
+    INSERT INTO pipeline_runs_fts(rowid, title, input_text, step2_result, step3_result)
+    VALUES (new.seq, new.title, new.input_text, new.step2_result, new.step3_result);
+END;
 """
 
+FTS_TABLES = ("messages_fts", "conversations_fts", "pipeline_runs_fts")
+# seq 列を持つテーブル → その FTS テーブル
+SEQ_TABLES = {
+    "conversations": "conversations_fts",
+    "messages": "messages_fts",
+    "pipeline_runs": "pipeline_runs_fts",
+}
+
 DEFAULT_SETTINGS: dict[str, str] = {
     "claude_api_key": "",
     "openai_api_key": "",
     "ollama_url": "http://localhost:11434",
+    "ollama_urls": "",
     "openai_compat_url": "",
+    "openai_compat_urls": "",
     "openai_compat_api_key": "",
     "mem0_url": "http://localhost:8080",
     "mem0_user_id": "tsunamayo7",
@@ -69,6 +190,7 @@ DEFAULT_SETTINGS: dict[str, str] = {
     "default_cloud_provider": "claude",
     "default_cloud_model": "claude-sonnet-4-20250514",
     "default_local_model": "gemma4:31b",
+    "ollama_keep_alive": "1h",
     "pipeline_step1_model": "claude-sonnet-4-20250514",
     "pipeline_step2_model": "gemma3:27b",
     "pipeline_step3_model": "claude-sonnet-4-20250514",
@@ -79,6 +201,8 @@ DEFAULT_SETTINGS: dict[str, str] = {
     "language": "ja",
     "gpu_vram_total": "0",
     "gpu_config": "auto",
+    "context_budget_tokens": "0",
+    "context_summary": "true",
 }
 
 
@@ -89,7 +213,7 @@ def _get_db_path() -> Path:
 
 
 async def get_connection() -> aiosqlite.Connection:
-    """DB接続を取得する。"""
+    """単発のDB接続を取得する（プール未起動時・スクリプト用）。"""
     db = await aiosqlite.connect(str(_get_db_path()))
     db.row_factory = aiosqlite.Row
     await db.execute("PRAGMA journal_mode=WAL")
@@ -97,22 +221,190 @@ async def get_connection() -> aiosqlite.Connection:
     return db
 
 
+# ── 接続プール ────────────────────────────────────────
+
+# 接続オープン時に一度だけ適用するチューニング
+CONNECTION_PRAGMAS: tuple[str, ...] = (
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",  # 16MB (負値はKiB単位)
+    "PRAGMA mmap_size=268435456",  # 256MB
+    "PRAGMA temp_store=MEMORY",
+)
+
+DEFAULT_READERS = 4
+
+
+class ConnectionPool:
+    """書き込み専用1本 + 読み取りN本の長寿命 aiosqlite 接続プール。
+
+    SQLite は同時に1つの書き込みしか許さないため、書き込みは専用接続と
+    ロックで直列化し、読み取りは WAL のスナップショット読み取りで並行させる。
+    プール未起動時（テストやスクリプト）は単発接続にフォールバックする。
+    """
+
+    def __init__(self, readers: int = DEFAULT_READERS):
+        self._size = readers
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue[aiosqlite.Connection] | None = None
+        self._all_readers: list[aiosqlite.Connection] = []
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, path: Path, *, readonly: bool) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(str(path))
+        db.row_factory = aiosqlite.Row
+        if not readonly:
+            await db.execute("PRAGMA journal_mode=WAL")
+        for pragma in CONNECTION_PRAGMAS:
+            await db.execute(pragma)
+        if readonly:
+            await db.execute("PRAGMA query_only=ON")
+        return db
+
+    async def open(self) -> None:
+        """接続を開いてPRAGMAを適用する。起動時に1回だけ呼ぶ。"""
+        if self.is_open:
+            return
+        path = _get_db_path()
+        # 待たれたロックは作ったイベントループに縛られるので、開くたびに作り直す（テスト・スクリプト）
+        self._write_lock = asyncio.Lock()
+        self._writer = await self._connect(path, readonly=False)
+        self._readers = asyncio.Queue()
+        for _ in range(self._size):
+            conn = await self._connect(path, readonly=True)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+        logger.info("DB pool opened: 1 writer + %d readers (%s)", self._size, path)
+
+    async def close(self) -> None:
+        """全接続を閉じる。実行中の書き込みが終わるまで待つ。"""
+        if self._writer is None:
+            return
+        async with self._write_lock:
+            writer, self._writer = self._writer, None
+            await writer.close()
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers = []
+        self._readers = None
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """読み取り用接続を借りる。全て使用中なら空くまで待つ。"""
+        if self._readers is None:
+            db = await get_connection()
+            try:
+                yield db
+            finally:
+                await db.close()
+            return
+        readers = self._readers
+        conn = await readers.get()
+        try:
+            yield conn
+        finally:
+            readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """書き込み用接続を排他的に借りる。正常終了でcommit、例外でrollback。"""
+        if self._writer is None:
+            db = await get_connection()
+            try:
+                yield db
+                await db.commit()
+            finally:
+                await db.close()
+            return
+        async with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+
+
+# グローバルインスタンス（app.py の lifespan で open/close）
+db_pool = ConnectionPool()
+
+
 ENV_OVERRIDE_MAP: dict[str, str] = {
     "ANTHROPIC_API_KEY": "claude_api_key",
     "OPENAI_API_KEY": "openai_api_key",
     "OLLAMA_URL": "ollama_url",
+    "OLLAMA_URLS": "ollama_urls",
     "OPENAI_COMPAT_URL": "openai_compat_url",
+    "OPENAI_COMPAT_URLS": "openai_compat_urls",
     "OPENAI_COMPAT_API_KEY": "openai_compat_api_key",
     "MEM0_URL": "mem0_url",
     "MEM0_USER_ID": "mem0_user_id",
 }
 
 
+async def _migrate_seq_columns(db: aiosqlite.Connection) -> None:
+    """seq 列のない旧スキーマ（TEXT 主キーだけ）のテーブルを作り直す。
+
+    既存の rowid をそのまま seq に写すので、covered_seq などの参照は変わらない。
+    FTS テーブルは削除し、init_db が作り直して再構築する。
+    """
+    legacy: list[tuple[str, list[str]]] = []
+    for table in SEQ_TABLES:
+        cursor = await db.execute(f"PRAGMA table_info({table})")
+        columns = [row["name"] for row in await cursor.fetchall()]
+        if "seq" not in columns:
+            legacy.append((table, columns))
+    if not legacy:
+        return
+
+    script = ["BEGIN;"]
+    for table, columns in legacy:
+        create = re.search(rf"CREATE TABLE IF NOT EXISTS {table} \(.*?\n\);", SCHEMA, re.S).group(0)
+        copied = ", ".join(columns)
+        script += [
+            f"DROP TABLE IF EXISTS {SEQ_TABLES[table]};",
+            create.replace(f" {table} (", f" {table}_new (", 1),
+            f"INSERT INTO {table}_new (seq, {copied}) SELECT rowid, {copied} FROM {table};",
+            f"DROP TABLE {table};",
+            f"ALTER TABLE {table}_new RENAME TO {table};",
+        ]
+    script.append("COMMIT;")
+    # 親テーブルを消すときに ON DELETE CASCADE で子の行まで消えないよう、外部キーを切る
+    # （PRAGMA foreign_keys はトランザクションの外でしか効かない）
+    await db.commit()
+    await db.execute("PRAGMA foreign_keys=OFF")
+    try:
+        await db.executescript("\n".join(script))
+    finally:
+        await db.execute("PRAGMA foreign_keys=ON")
+    # 作り直したテーブルのインデックス
+    await db.executescript(SCHEMA)
+    logger.info("Added seq columns to %s", ", ".join(table for table, _ in legacy))
+
+
 async def init_db() -> None:
     """テーブル作成とデフォルト設定の投入。環境変数があれば上書き。"""
-    db = await get_connection()
-    try:
+    async with db_pool.write() as db:
         await db.executescript(SCHEMA)
+        await _migrate_seq_columns(db)
+
+        # 既存DBに後から FTS を追加した場合は既存行からインデックスを再構築
+        cursor = await db.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name IN (%s)"
+            % ",".join("?" * len(FTS_TABLES)),
+            FTS_TABLES,
+        )
+        existing = {row["name"] for row in await cursor.fetchall()}
+        await db.executescript(SEARCH_SCHEMA)
+        for table in FTS_TABLES:
+            if table not in existing:
+                await db.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
 
         # デフォルト設定（環境変数があれば上書き）
         effective = dict(DEFAULT_SETTINGS)
@@ -126,6 +418,3 @@ async def init_db() -> None:
                 "INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
                 (key, value),
             )
-        await db.commit()
-    finally:
-        await db.close()
@@ -2,16 +2,19 @@
 
 from __future__ import annotations
 
+import asyncio
+import base64
 import json
 import logging
+import re
 import time
 import uuid
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Query
 from fastapi.responses import JSONResponse
 
 from helix_studio.config import get_setting
-from helix_studio.db import get_connection
+from helix_studio.db import db_pool
 from helix_studio.models import (
     ChatRequest,
     ChatResponse,
@@ -19,11 +22,29 @@ from helix_studio.models import (
     ConversationDetail,
     ConversationSummary,
 )
-from helix_studio.services import cloud_ai, local_ai, cli_ai, mem0, rag, tools
+from helix_studio.services import cloud_ai, local_ai, cli_ai, fastjson, mem0, rag, tools
+from helix_studio.services.context_assembly import (
+    ContextAssembler,
+    SourceResult,
+    skipped,
+    timings,
+)
+from helix_studio.services.cli_sessions import cli_sessions
+from helix_studio.services.context_window import context_manager
+from helix_studio.services.history_cache import history_cache
+from helix_studio.services.http_pool import http_pool
+from helix_studio.services.journal import message_journal
+from helix_studio.services.stream_coalescer import ChunkCoalescer, negotiate
+from helix_studio.services.turn_metrics import TurnTrace, record_turn
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["chat"])
 
+# キーセットページングの既定ページサイズ
+CONVERSATION_PAGE_SIZE = 50
+MESSAGE_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
 
 # ── WebSocket チャット ────────────────────────────────
 
@@ -35,7 +56,7 @@ async def ws_chat(ws: WebSocket):
     try:
         while True:
             raw = await ws.receive_text()
-            data = json.loads(raw)
+            data = fastjson.loads(raw)
 
             provider = data.get("provider", "ollama")
             model = data.get("model", "")
@@ -44,12 +65,14 @@ async def ws_chat(ws: WebSocket):
             conversation_id = data.get("conversation_id", "")
 
             if not content:
-                await ws.send_text(json.dumps({
+                await ws.send_text(fastjson.dumps({
                     "type": "error",
                     "content": "Message is empty",
                 }))
                 continue
 
+            trace = TurnTrace(provider, model)
+
             # 会話IDがなければ新規作成（タイトルはメッセージ冒頭から自動生成）
             if not conversation_id:
                 conversation_id = str(uuid.uuid4())
@@ -59,66 +82,92 @@ async def ws_chat(ws: WebSocket):
                 auto_title = _re.sub(r'@\w+\s*', '', auto_title).strip() or "New Chat"
                 await _create_conversation(conversation_id, provider, model, system_prompt, title=auto_title)
 
-            # ユーザーメッセージをDB保存
+            # ユーザーメッセージをDB保存（直後に履歴を読むので永続化を待つ）
             user_msg_id = str(uuid.uuid4())
-            await _save_message(
+            user_saved = await _save_message(
                 user_msg_id, conversation_id, "user", content,
                 provider, model,
             )
 
-            # ツールコマンド処理（@search, @file）
-            tool_context = await _process_tool_commands(content)
-
-            # 過去のメッセージを取得して会話履歴を構築
-            messages = await _load_conversation_messages(conversation_id)
-
-            # ツール結果をコンテキストに注入
-            if tool_context:
-                messages.insert(0, {"role": "system", "content": tool_context})
+            # コンテキスト取得元を並行起動（締め切りを過ぎたものは捨てる）
+            assembler = ContextAssembler()
+            has_tool_commands = bool(_TOOL_COMMAND_RE.search(content))
+            if has_tool_commands:
+                assembler.start("tools", _process_tool_commands(content))
+            if await get_setting("mem0_auto_inject") == "true":
+                assembler.start("mem0", _fetch_mem0_context(content))
+            if data.get("rag_enabled", True):
+                assembler.start("rag", _fetch_rag_context(content))
 
-            # Mem0自動注入
-            mem0_inject = await get_setting("mem0_auto_inject")
-            if mem0_inject == "true" and content:
-                await _inject_mem0_context(messages, content)
-
-            # RAG自動注入
-            rag_enabled = data.get("rag_enabled", True)
-            if rag_enabled and content:
-                await _inject_rag_context(messages, content)
+            try:
+                with trace.measure("db"):
+                    await user_saved
+                # 過去のメッセージを取得して会話履歴を構築（トークン予算内に収める）
+                with trace.measure("history"):
+                    messages = await context_manager.build(
+                        conversation_id, provider, model, system_prompt,
+                        summarize=_summarizer(provider, model),
+                    )
 
-            # LLM自律Web検索（tool use対応モデルのみ）
-            if not tool_context:  # 手動@searchがなければ自動検索を試みる
-                auto_search = await _auto_web_search(provider, model, content, messages)
-                if auto_search:
-                    messages.insert(0, {"role": "system", "content": auto_search})
+                # LLM自律Web検索（手動 @コマンドがなければ tool use 対応モデルで試みる）
+                if not has_tool_commands and _supports_tool_use(provider, model):
+                    assembler.start(
+                        "web_search", _auto_web_search(provider, model, content, messages),
+                    )
+                # 履歴構築後、取得元の完了を追加で待った時間
+                with trace.measure("context"):
+                    sources = await assembler.collect()
+            except BaseException:
+                assembler.cancel()
+                raise
+            _assemble_context(messages, sources)
+            trace.stages.update(timings(sources))
+            trace.skipped = skipped(sources)
 
             # ストリーミング応答
             start_ms = time.monotonic_ns() // 1_000_000
             full_response = ""
+
+            async def send_chunk(text: str) -> None:
+                await ws.send_text(fastjson.dumps({
+                    "type": "chunk",
+                    "content": text,
+                    "conversation_id": conversation_id,
+                }))
+
+            # クライアントが coalesce_ms / coalesce_bytes を指定したらチャンクをまとめて送る
+            coalescer = ChunkCoalescer(send_chunk, *negotiate(data))
+            trace.stream_started()
             try:
-                async for chunk in _route_stream(provider, model, messages, system_prompt):
+                async for chunk in _route_stream(
+                    provider, model, messages, system_prompt, usage=trace.usage,
+                    conversation_id=conversation_id,
+                ):
+                    trace.chunk()
                     full_response += chunk
-                    await ws.send_text(json.dumps({
-                        "type": "chunk",
-                        "content": chunk,
-                        "conversation_id": conversation_id,
-                    }))
+                    await coalescer.push(chunk)
+                await coalescer.close()
             except Exception as e:
                 logger.exception("Streaming error")
-                await ws.send_text(json.dumps({
+                coalescer.discard()
+                await ws.send_text(fastjson.dumps({
                     "type": "error",
                     "content": f"An error occurred: {e}",
                     "conversation_id": conversation_id,
                 }))
                 continue
 
+            trace.stream_ended()
             duration_ms = (time.monotonic_ns() // 1_000_000) - start_ms
 
             # アシスタントメッセージをDB保存
             asst_msg_id = str(uuid.uuid4())
-            await _save_message(
+            asst_saved = await _save_message(
                 asst_msg_id, conversation_id, "assistant", full_response,
-                provider, model, duration_ms=duration_ms,
+                provider, model,
+                tokens_in=trace.usage.get("tokens_in"),
+                tokens_out=trace.usage.get("tokens_out"),
+                duration_ms=duration_ms,
             )
 
             # プロバイダ表示名の生成
@@ -133,8 +182,9 @@ async def ws_chat(ws: WebSocket):
             }
             provider_label = provider_labels.get(provider, provider)
 
-            # 完了通知（モデル情報付き）
-            await ws.send_text(json.dumps({
+            # 完了通知（モデル情報付き）— クライアントが直後に履歴を再取得するため永続化を待つ
+            await asst_saved
+            await ws.send_text(fastjson.dumps({
                 "type": "done",
                 "conversation_id": conversation_id,
                 "message_id": asst_msg_id,
@@ -142,7 +192,12 @@ async def ws_chat(ws: WebSocket):
                 "provider": provider,
                 "provider_label": provider_label,
                 "model": model,
+                "timings": {**trace.stages, "ttft": trace.ttft_ms},
+                "skipped": trace.skipped,
+                "tokens_in": trace.usage.get("tokens_in"),
+                "tokens_out": trace.usage.get("tokens_out"),
             }))
+            await _record_turn(trace, asst_msg_id, conversation_id)
 
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
@@ -161,17 +216,34 @@ async def post_chat(req: ChatRequest) -> ChatResponse:
     if not req.conversation_id:
         await _create_conversation(conversation_id, req.provider, req.model, req.system_prompt)
 
-    messages = [{"role": m.role, "content": m.content} for m in req.messages]
+    messages = await context_manager.fit(
+        [{"role": m.role, "content": m.content} for m in req.messages],
+        req.provider, req.model, req.system_prompt,
+    )
 
+    trace = TurnTrace(req.provider, req.model)
     start_ms = time.monotonic_ns() // 1_000_000
     chunks: list[str] = []
-    async for chunk in _route_stream(req.provider, req.model, messages, req.system_prompt):
+    trace.stream_started()
+    async for chunk in _route_stream(
+        req.provider, req.model, messages, req.system_prompt, usage=trace.usage,
+        conversation_id=conversation_id,
+    ):
+        trace.chunk()
         chunks.append(chunk)
+    trace.stream_ended()
     content = "".join(chunks)
     duration_ms = (time.monotonic_ns() // 1_000_000) - start_ms
+    tokens_in = trace.usage.get("tokens_in")
+    tokens_out = trace.usage.get("tokens_out")
 
+    # REST の呼び出し元が直後に会話を読めるよう永続化を待つ
     msg_id = str(uuid.uuid4())
-    await _save_message(msg_id, conversation_id, "assistant", content, req.provider, req.model, duration_ms=duration_ms)
+    await (await _save_message(
+        msg_id, conversation_id, "assistant", content, req.provider, req.model,
+        tokens_in=tokens_in, tokens_out=tokens_out, duration_ms=duration_ms,
+    ))
+    await _record_turn(trace, msg_id, conversation_id)
 
     return ChatResponse(
         conversation_id=conversation_id,
@@ -179,6 +251,8 @@ async def post_chat(req: ChatRequest) -> ChatResponse:
         content=content,
         provider=req.provider,
         model=req.model,
+        tokens_in=tokens_in,
+        tokens_out=tokens_out,
         duration_ms=duration_ms,
     )
 
@@ -192,95 +266,188 @@ async def create_conversation(req: ConversationCreate) -> dict:
 
 
 @router.get("/api/conversations")
-async def list_conversations() -> list[dict]:
-    """会話一覧を取得。"""
-    db = await get_connection()
-    try:
-        cursor = await db.execute(
-            "SELECT id, title, provider, model, created_at, updated_at "
-            "FROM conversations ORDER BY updated_at DESC"
-        )
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
-    finally:
-        await db.close()
+async def list_conversations(
+    limit: int = Query(CONVERSATION_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+) -> dict:
+    """会話一覧を updated_at 降順で1ページ取得 (キーセットページング)。"""
+    sql = (
+        "SELECT id, title, provider, model, created_at, updated_at "
+        "FROM conversations"
+    )
+    params: list = []
+    if cursor:
+        updated_at, conv_id = _decode_cursor(cursor, 2)
+        sql += " WHERE (updated_at, id) < (?, ?)"
+        params += [updated_at, conv_id]
+    sql += " ORDER BY updated_at DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    async with db_pool.read() as db:
+        rows = await (await db.execute(sql, params)).fetchall()
+
+    page = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = _encode_cursor(last["updated_at"], last["id"])
+    return {"conversations": page, "next_cursor": next_cursor}
 
 
 @router.get("/api/conversations/{conv_id}")
-async def get_conversation(conv_id: str) -> dict:
-    """会話詳細（メッセージ含む）を取得。"""
-    db = await get_connection()
-    try:
+async def get_conversation(
+    conv_id: str,
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+) -> dict:
+    """会話詳細と直近のメッセージ1ページを取得。"""
+    async with db_pool.read() as db:
         cursor = await db.execute(
             "SELECT * FROM conversations WHERE id = ?", (conv_id,)
         )
         conv = await cursor.fetchone()
         if not conv:
             raise HTTPException(status_code=404, detail="Conversation not found")
+        page = await _fetch_message_page(db, conv_id, limit, None)
+    return {**dict(conv), **page}
+
 
+@router.get("/api/conversations/{conv_id}/messages")
+async def list_messages(
+    conv_id: str,
+    before: str | None = None,
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+) -> dict:
+    """before カーソルより古いメッセージを1ページ取得 (時系列順)。"""
+    async with db_pool.read() as db:
         cursor = await db.execute(
-            "SELECT id, role, content, provider, model, tokens_in, tokens_out, "
-            "duration_ms, created_at FROM messages "
-            "WHERE conversation_id = ? ORDER BY created_at",
-            (conv_id,),
+            "SELECT 1 FROM conversations WHERE id = ?", (conv_id,)
         )
-        messages = await cursor.fetchall()
-        return {
-            **dict(conv),
-            "messages": [dict(m) for m in messages],
-        }
-    finally:
-        await db.close()
+        if not await cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        return await _fetch_message_page(db, conv_id, limit, before)
 
 
 @router.delete("/api/conversations/{conv_id}")
 async def delete_conversation(conv_id: str) -> dict:
     """会話を削除。"""
-    db = await get_connection()
-    try:
+    async with db_pool.write() as db:
         await db.execute("DELETE FROM conversations WHERE id = ?", (conv_id,))
-        await db.commit()
-        return {"deleted": conv_id}
-    finally:
-        await db.close()
+    history_cache.evict(conv_id)
+    return {"deleted": conv_id}
 
 
 # ── ヘルパー ──────────────────────────────────────────
 
 
+def _encode_cursor(*values) -> str:
+    """キーセットの値を不透明なカーソル文字列にする。"""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, size: int) -> list:
+    """カーソル文字列をキーセットの値に戻す。不正なら 400。"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+async def _fetch_message_page(
+    db, conv_id: str, limit: int, before: str | None,
+) -> dict:
+    """(created_at, rowid) 降順で1ページ読み、時系列順に並べ直して返す。
+
+    created_at は秒精度で id は UUID のため、同一秒内の順序は挿入順の rowid で決める。
+    """
+    sql = (
+        "SELECT rowid AS seq, id, role, content, provider, model, tokens_in, "
+        "tokens_out, duration_ms, created_at FROM messages "
+        "WHERE conversation_id = ?"
+    )
+    params: list = [conv_id]
+    if before:
+        created_at, seq = _decode_cursor(before, 2)
+        sql += " AND (created_at, rowid) < (?, ?)"
+        params += [created_at, seq]
+    sql += " ORDER BY created_at DESC, rowid DESC LIMIT ?"
+    params.append(limit + 1)
+
+    rows = await (await db.execute(sql, params)).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        oldest = rows[-1]
+        next_cursor = _encode_cursor(oldest["created_at"], oldest["seq"])
+
+    messages = []
+    for row in reversed(rows):
+        msg = dict(row)
+        del msg["seq"]
+        messages.append(msg)
+    return {"messages": messages, "next_cursor": next_cursor, "has_more": has_more}
+
+
 async def _route_stream(
     provider: str,
     model: str,
     messages: list[dict[str, str]],
     system_prompt: str = "",
+    usage: dict | None = None,
+    conversation_id: str = "",
 ):
-    """プロバイダに応じたストリーミングを返す。"""
+    """プロバイダに応じたストリーミングを返す。
+
+    usage を渡すと、対応プロバイダは接続時刻とトークン数を書き込む。
+    conversation_id を渡すと、CLI プロバイダは会話ごとのセッションを使い回す。
+    """
     if provider in ("claude", "openai"):
         api_key_map = {"claude": "claude_api_key", "openai": "openai_api_key"}
         api_key = await get_setting(api_key_map[provider]) or ""
         if not api_key:
             raise ValueError(f"API key for {provider} is not configured. Please set it in the settings page.")
-        async for chunk in cloud_ai.stream_chat(provider, api_key, model, messages, system_prompt):
+        async for chunk in cloud_ai.stream_chat(
+            provider, api_key, model, messages, system_prompt, usage=usage,
+        ):
             yield chunk
     elif provider == "openai_compat":
         url = await get_setting("openai_compat_url") or ""
         api_key = await get_setting("openai_compat_api_key") or ""
         if not url:
             raise ValueError("OpenAI-compatible API URL is not configured.")
-        async for chunk in local_ai.stream_chat("openai_compat", url, model, messages, api_key):
+        async for chunk in local_ai.stream_chat(
+            "openai_compat", url, model, messages, api_key, usage=usage,
+        ):
             yield chunk
     elif provider in ("claude_code", "codex", "gemini_cli"):
-        # CLI経由
-        user_content = messages[-1]["content"] if messages else ""
-        async for chunk in cli_ai.stream_chat_cli(provider, model, user_content, system_prompt):
-            yield chunk
+        # CLI経由 — 会話があればセッションプールでプロセスと文脈を使い回す
+        if conversation_id:
+            async for chunk in cli_sessions.stream(
+                provider, model, conversation_id, messages, system_prompt, usage=usage,
+            ):
+                yield chunk
+        else:
+            user_content = messages[-1]["content"] if messages else ""
+            async for chunk in cli_ai.stream_chat_cli(
+                provider, model, user_content, system_prompt, usage=usage,
+            ):
+                yield chunk
     else:
         # デフォルト: Ollama
         url = await get_setting("ollama_url") or "http://localhost:11434"
-        async for chunk in local_ai.stream_chat("ollama", url, model, messages):
+        async for chunk in local_ai.stream_chat("ollama", url, model, messages, usage=usage):
             yield chunk
 
 
+# @search / @file / @ls コマンドの有無
+_TOOL_COMMAND_RE = re.compile(r"@(?:search|file|ls)\s")
+
+
 async def _process_tool_commands(content: str) -> str:
     """メッセージ中の @search/@file コマンドを処理し、結果テキストを返す。
 
@@ -333,74 +500,73 @@ async def _process_tool_commands(content: str) -> str:
     return "\n\n".join(parts) if parts else ""
 
 
-async def _inject_mem0_context(
+async def _fetch_mem0_context(query: str) -> str:
+    """Mem0から関連記憶を検索し、参考情報テキストを返す。"""
+    mem0_url = await get_setting("mem0_url") or "http://localhost:8080"
+    user_id = await get_setting("mem0_user_id") or "tsunamayo7"
+    memories = await mem0.search(mem0_url, user_id, query, limit=5)
+    if not memories:
+        return ""
+    mem_texts = []
+    for m in memories:
+        text = m.get("memory", m.get("text", str(m)))
+        mem_texts.append(f"- {text}")
+    return "[Reference: Past Memories]\n" + "\n".join(mem_texts)
+
+
+async def _fetch_rag_context(query: str) -> str:
+    """RAGナレッジベースから関連チャンクを検索し、参考情報テキストを返す。"""
+    ollama_url = await get_setting("ollama_url") or "http://localhost:11434"
+    results = await rag.search(query, limit=3, ollama_url=ollama_url)
+    if not results:
+        return ""
+    return rag.format_rag_context(results) or ""
+
+
+def _assemble_context(
     messages: list[dict[str, str]],
-    query: str,
+    sources: dict[str, SourceResult],
 ) -> None:
-    """Mem0から関連記憶を検索し、最後のユーザーメッセージに参考情報として注入。
+    """取得したコンテキストを完了順によらず固定の順序でメッセージに組み込む。
 
-    Ollamaの一部モデル（gemma3系など）はsystemロールのメッセージを無視する
-    ことがあるため、systemではなくユーザーメッセージの先頭に埋め込む。
+    @コマンド・自動Web検索の結果は先頭の system メッセージに、
+    RAG → Mem0 の参考情報は最後のユーザーメッセージの先頭に埋め込む
+    （Ollamaの一部モデル（gemma3系など）はsystemロールを無視することがあるため）。
     """
+    for name in ("tools", "web_search"):
+        result = sources.get(name)
+        if result and result.text:
+            messages.insert(0, {"role": "system", "content": result.text})
+
+    prefix = [sources[n].text for n in ("rag", "mem0") if n in sources and sources[n].text]
+    if not prefix:
+        return
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i]["role"] == "user":
+            messages[i]["content"] = "\n\n---\n\n".join([*prefix, messages[i]["content"]])
+            break
+
+
+async def _record_turn(trace: TurnTrace, message_id: str, conversation_id: str) -> None:
+    """ターンの計測値を保存する。失敗してもチャットは止めない。"""
     try:
-        mem0_url = await get_setting("mem0_url") or "http://localhost:8080"
-        user_id = await get_setting("mem0_user_id") or "tsunamayo7"
-        memories = await mem0.search(mem0_url, user_id, query, limit=5)
-        if memories:
-            mem_texts = []
-            for m in memories:
-                text = m.get("memory", m.get("text", str(m)))
-                mem_texts.append(f"- {text}")
-            context = "[Reference: Past Memories]\n" + "\n".join(mem_texts)
-            # 最後のuserメッセージのcontentの前に参考情報として追加
-            if messages:
-                last_user = None
-                for i in range(len(messages) - 1, -1, -1):
-                    if messages[i]["role"] == "user":
-                        last_user = i
-                        break
-                if last_user is not None:
-                    messages[last_user]["content"] = (
-                        context + "\n\n---\n\n" + messages[last_user]["content"]
-                    )
+        await record_turn(trace, message_id, conversation_id)
     except Exception as e:
-        logger.debug("Skipping Mem0 injection: %s", e)
+        logger.warning("Failed to record turn metrics: %s", e)
 
 
-async def _inject_rag_context(
-    messages: list[dict[str, str]],
-    query: str,
-) -> None:
-    """RAGナレッジベースから関連チャンクを検索し、ユーザーメッセージに注入。"""
-    try:
-        ollama_url = await get_setting("ollama_url") or "http://localhost:11434"
-        results = await rag.search(query, limit=3, ollama_url=ollama_url)
-        if results:
-            context = rag.format_rag_context(results)
-            if context and messages:
-                for i in range(len(messages) - 1, -1, -1):
-                    if messages[i]["role"] == "user":
-                        messages[i]["content"] = (
-                            context + "\n\n---\n\n" + messages[i]["content"]
-                        )
-                        break
-    except Exception as e:
-        logger.debug("Skipping RAG injection: %s", e)
+def _summarizer(provider: str, model: str):
+    """履歴要約に使う関数を返す。CLI は最後のメッセージしか送らないので要約しない。"""
+    if provider in ("claude_code", "codex", "gemini_cli"):
+        return None
 
+    async def summarize(prompt: str) -> str:
+        chunks: list[str] = []
+        async for chunk in _route_stream(provider, model, [{"role": "user", "content": prompt}]):
+            chunks.append(chunk)
+        return "".join(chunks)
 
-async def _load_conversation_messages(conversation_id: str) -> list[dict[str, str]]:
-    """会話の全メッセージをDBから取得してLLM用の形式で返す。"""
-    db = await get_connection()
-    try:
-        cursor = await db.execute(
-            "SELECT role, content FROM messages "
-            "WHERE conversation_id = ? ORDER BY created_at ASC",
-            (conversation_id,),
-        )
-        rows = await cursor.fetchall()
-        return [{"role": r["role"], "content": r["content"]} for r in rows]
-    finally:
-        await db.close()
+    return summarize
 
 
 async def _create_conversation(
@@ -411,16 +577,12 @@ async def _create_conversation(
     title: str = "New Chat",
 ) -> None:
     """会話レコードをDBに作成。"""
-    db = await get_connection()
-    try:
+    async with db_pool.write() as db:
         await db.execute(
             "INSERT INTO conversations (id, title, provider, model, system_prompt) "
             "VALUES (?, ?, ?, ?, ?)",
             (conv_id, title, provider, model, system_prompt),
         )
-        await db.commit()
-    finally:
-        await db.close()
 
 
 async def _save_message(
@@ -433,22 +595,29 @@ async def _save_message(
     tokens_in: int | None = None,
     tokens_out: int | None = None,
     duration_ms: int | None = None,
-) -> None:
-    """メッセージをDBに保存し、会話のupdated_atを更新。"""
-    db = await get_connection()
-    try:
-        await db.execute(
-            "INSERT INTO messages (id, conversation_id, role, content, provider, model, "
-            "tokens_in, tokens_out, duration_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (msg_id, conversation_id, role, content, provider, model, tokens_in, tokens_out, duration_ms),
-        )
-        await db.execute(
-            "UPDATE conversations SET updated_at = datetime('now') WHERE id = ?",
-            (conversation_id,),
+) -> asyncio.Future:
+    """メッセージを書き込みキューに積む（会話のupdated_atも更新）。
+
+    返り値の Future を await すると、DBへのコミット完了まで待てる。
+    コミットされたメッセージは履歴キャッシュにも追記する。
+    """
+    saved = await message_journal.append(
+        msg_id, conversation_id, role, content, provider, model,
+        tokens_in=tokens_in, tokens_out=tokens_out, duration_ms=duration_ms,
+    )
+
+    def _cache(fut: asyncio.Future) -> None:
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        history_cache.append(
+            conversation_id, {"seq": fut.result(), "role": role, "content": content},
         )
-        await db.commit()
-    finally:
-        await db.close()
+
+    if saved.done():
+        _cache(saved)
+    else:
+        saved.add_done_callback(_cache)
+    return saved
 
 
 # ── LLM自律Web検索（tool use） ──────────────────────────
@@ -503,7 +672,6 @@ async def _auto_web_search(
 
     try:
         ollama_url = await get_setting("ollama_url") or "http://localhost:11434"
-        import httpx
 
         # tool use付きの非ストリーミング呼び出し
         if provider == "ollama" or provider not in ("claude", "openai"):
@@ -513,11 +681,11 @@ async def _auto_web_search(
                 "tools": [_WEB_SEARCH_TOOL],
                 "stream": False,
             }
-            async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as c:
-                r = await c.post(f"{ollama_url}/api/chat", json=payload)
-                if r.status_code != 200:
-                    return ""
-                data = r.json()
+            c = http_pool.client("ollama")
+            r = await c.post(f"{ollama_url}/api/chat", json=payload, timeout=30.0)
+            if r.status_code != 200:
+                return ""
+            data = r.json()
 
             # ツール呼び出しがあるか確認
             tool_calls = data.get("message", {}).get("tool_calls", [])
@@ -9,7 +9,7 @@ import uuid
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 from helix_studio.config import get_setting
-from helix_studio.db import get_connection
+from helix_studio.db import db_pool
 from helix_studio.services import crew_ai
 
 logger = logging.getLogger(__name__)
@@ -55,8 +55,7 @@ async def run_crew_task(req: dict) -> dict:
 
     # DB保存
     run_id = str(uuid.uuid4())
-    db = await get_connection()
-    try:
+    async with db_pool.write() as db:
         await db.execute(
             "INSERT INTO pipeline_runs (id, title, status, input_text, "
             "step1_result, step2_result, step3_result, "
@@ -74,9 +73,6 @@ async def run_crew_task(req: dict) -> dict:
                 result["agents_used"],
             ),
         )
-        await db.commit()
-    finally:
-        await db.close()
 
     result["run_id"] = run_id
     return result
@@ -0,0 +1,108 @@
+"""内部メトリクス API ルーター（キャッシュ・プール等の統計）"""
+
+from __future__ import annotations
+
+from fastapi import APIRouter, Query
+
+from helix_studio.config import settings_cache
+from helix_studio.services.backend_pool import backend_pool
+from helix_studio.services.bm25 import bm25_index
+from helix_studio.services.cli_sessions import cli_sessions
+from helix_studio.services.cloud_ai import client_cache
+from helix_studio.services.context_window import context_manager
+from helix_studio.services.embeddings import embedder
+from helix_studio.services.history_cache import history_cache
+from helix_studio.services.http_pool import http_pool
+from helix_studio.services.journal import message_journal
+from helix_studio.services.model_catalog import model_catalog
+from helix_studio.services.residency import residency
+from helix_studio.services.turn_metrics import DEFAULT_WINDOW, latency_stats
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("/settings")
+async def settings_cache_stats() -> dict:
+    """設定キャッシュのヒット/ミス統計。"""
+    return settings_cache.stats()
+
+
+@router.get("/journal")
+async def journal_stats() -> dict:
+    """メッセージジャーナル（write-behind）の統計。"""
+    return message_journal.stats()
+
+
+@router.get("/history")
+async def history_cache_stats() -> dict:
+    """会話履歴キャッシュのサイズ・ヒット率・追い出し統計。"""
+    return history_cache.stats()
+
+
+@router.get("/context")
+async def context_stats() -> dict:
+    """コンテキストウィンドウ管理（履歴の切り詰め・要約）の統計。"""
+    return context_manager.stats()
+
+
+@router.get("/cli")
+async def cli_session_stats() -> dict:
+    """CLI セッションプールのワーカー数・再利用・回収統計。"""
+    return cli_sessions.stats()
+
+
+@router.get("/http")
+async def http_pool_stats() -> dict:
+    """上流ごとの共有 HTTP クライアントの接続再利用・同時実行数・飽和の統計。"""
+    return http_pool.stats()
+
+
+@router.get("/circuits")
+async def circuit_stats() -> dict:
+    """任意バックエンド（Qdrant・リランカー等）のサーキットブレーカーの状態。"""
+    return http_pool.circuit_stats()
+
+
+@router.get("/cloud")
+async def cloud_client_stats() -> dict:
+    """Claude / OpenAI SDK クライアントキャッシュの統計。"""
+    return client_cache.stats()
+
+
+@router.get("/models")
+async def model_catalog_stats() -> dict:
+    """モデル一覧キャッシュの統計。"""
+    return model_catalog.stats()
+
+
+@router.get("/residency")
+async def residency_stats() -> dict:
+    """Ollama モデルの常駐状態（/api/ps）とウォームアップの統計。"""
+    return residency.stats()
+
+
+@router.get("/backends")
+async def backend_pool_stats() -> dict:
+    """ローカル LLM ノード（Ollama / OpenAI 互換）ごとの状態・実行中のリクエスト数・フェイルオーバー回数。"""
+    return backend_pool.stats()
+
+
+@router.get("/embeddings")
+async def embedding_stats() -> dict:
+    """埋め込み API の呼び出し回数・平均バッチサイズ・再試行の統計。"""
+    return embedder.stats()
+
+
+@router.get("/bm25")
+async def bm25_stats() -> dict:
+    """RAG の BM25 統計（登録チャンク数・平均長）とクエリのスパースベクトル作成の統計。"""
+    docs, tokens = await bm25_index.corpus()
+    return {**bm25_index.stats(), "docs": docs, "avg_length": round(tokens / docs, 1) if docs else 0.0}
+
+
+@router.get("/chat")
+async def chat_latency_stats(
+    window: int = Query(DEFAULT_WINDOW, ge=1, le=100_000),
+) -> dict:
+    """直近のチャットターンの TTFT・所要時間・トークン速度 (p50/p95/p99)。"""
+    return await latency_stats(window)
@@ -9,45 +9,77 @@ from fastapi import APIRouter
 from helix_studio.config import get_setting
 from helix_studio.models import ModelTestRequest
 from helix_studio.services import cloud_ai, local_ai, cli_ai
+from helix_studio.services.model_catalog import model_catalog, signature
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/models", tags=["models"])
 
 
+# プロバイダごとの取得タイムアウト（秒）。1つが止まっても画面全体を待たせない
+_LIST_TIMEOUTS = {
+    "ollama": 3.0,
+    "openai_compat": 3.0,
+    "claude": 8.0,
+    "openai": 8.0,
+}
+
+
 @router.get("")
 async def list_all_models() -> dict:
-    """全プロバイダのモデル一覧を統合して返す。"""
-    results: dict[str, list] = {
-        "ollama": [],
-        "openai_compat": [],
-        "claude": [],
-        "openai": [],
-    }
+    """全プロバイダのモデル一覧を統合して返す。
 
-    # Ollama
+    各プロバイダは並行に問い合わせ、結果は model_catalog にキャッシュする。
+    失敗したプロバイダは空の一覧を返し、理由を errors に入れる。
+    """
     ollama_url = await get_setting("ollama_url") or "http://localhost:11434"
-    results["ollama"] = await local_ai.list_ollama_models(ollama_url)
-
-    # OpenAI互換
     compat_url = await get_setting("openai_compat_url") or ""
     compat_key = await get_setting("openai_compat_api_key") or ""
-    if compat_url:
-        results["openai_compat"] = await local_ai.list_openai_compat_models(compat_url, compat_key)
-
-    # Claude
     claude_key = await get_setting("claude_api_key") or ""
-    results["claude"] = await cloud_ai.list_claude_models(claude_key)
-
-    # OpenAI
     openai_key = await get_setting("openai_api_key") or ""
-    results["openai"] = await cloud_ai.list_openai_models(openai_key)
+
+    fetchers = {
+        "ollama": (
+            signature(ollama_url),
+            lambda: local_ai.list_ollama_models(ollama_url, strict=True),
+        ),
+        "openai_compat": (
+            signature(compat_url, compat_key),
+            lambda: local_ai.list_openai_compat_models(compat_url, compat_key, strict=True),
+        ),
+        "claude": (
+            signature(claude_key),
+            lambda: cloud_ai.list_claude_models(claude_key, strict=True),
+        ),
+        "openai": (
+            signature(openai_key),
+            lambda: cloud_ai.list_openai_models(openai_key, strict=True),
+        ),
+    }
+    # 未設定のプロバイダは問い合わせない
+    if not compat_url:
+        del fetchers["openai_compat"]
+    if not claude_key:
+        del fetchers["claude"]
+    if not openai_key:
+        del fetchers["openai"]
+
+    models, errors = await model_catalog.get_all({
+        name: (sig, fetch, _LIST_TIMEOUTS[name]) for name, (sig, fetch) in fetchers.items()
+    })
+    results: dict[str, list] = {
+        "ollama": [],
+        "openai_compat": [],
+        "claude": [],
+        "openai": [],
+    }
+    results.update(models)
 
     # CLI（自動検出）
     cli_models = cli_ai.list_cli_models()
-    for provider, models in cli_models.items():
-        results[provider] = models
+    for provider, provider_models in cli_models.items():
+        results[provider] = provider_models
 
-    return results
+    return {**results, "errors": errors}
 
 
 @router.post("/test")
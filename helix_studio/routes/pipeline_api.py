@@ -7,7 +7,7 @@ import logging
 
 from fastapi import APIRouter, HTTPException
 
-from helix_studio.db import get_connection
+from helix_studio.db import db_pool
 from helix_studio.models import PipelineRequest, PipelineStatus
 from helix_studio.services.pipeline import create_pipeline_run, run_pipeline
 
@@ -37,29 +37,23 @@ async def start_pipeline(req: PipelineRequest) -> dict:
 @router.get("/{run_id}")
 async def get_pipeline_status(run_id: str) -> PipelineStatus:
     """パイプラインの実行状況を取得。"""
-    db = await get_connection()
-    try:
+    async with db_pool.read() as db:
         cursor = await db.execute(
             "SELECT * FROM pipeline_runs WHERE id = ?", (run_id,)
         )
         row = await cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Pipeline not found")
-        return PipelineStatus(**dict(row))
-    finally:
-        await db.close()
+    if not row:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    return PipelineStatus(**dict(row))
 
 
 @router.get("/history/list")
 async def pipeline_history() -> list[dict]:
     """パイプライン実行履歴を取得。"""
-    db = await get_connection()
-    try:
+    async with db_pool.read() as db:
         cursor = await db.execute(
             "SELECT id, title, status, current_step, created_at, completed_at "
             "FROM pipeline_runs ORDER BY created_at DESC LIMIT 50"
         )
         rows = await cursor.fetchall()
         return [dict(row) for row in rows]
-    finally:
-        await db.close()
@@ -5,7 +5,7 @@ from __future__ import annotations
 import logging
 from typing import Any
 
-from fastapi import APIRouter, File, UploadFile, HTTPException
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException
 from pydantic import BaseModel
 
 from helix_studio.config import get_setting
@@ -38,8 +38,14 @@ async def list_documents() -> list[dict[str, Any]]:
 
 
 @router.post("/upload")
-async def upload_document(file: UploadFile = File(...)) -> dict[str, Any]:
-    """ドキュメントをアップロードして RAG に登録。"""
+async def upload_document(
+    file: UploadFile = File(...),
+    doc_id: str | None = Form(None),
+) -> dict[str, Any]:
+    """ドキュメントをアップロードして RAG に登録。
+
+    doc_id を指定すると、その登録済みドキュメントを置き換える（変わったチャンクだけ埋め込み直す）。
+    """
     if not file.filename:
         raise HTTPException(status_code=400, detail="Filename is required")
 
@@ -66,7 +72,7 @@ async def upload_document(file: UploadFile = File(...)) -> dict[str, Any]:
                 raise HTTPException(status_code=400, detail="Unsupported file encoding")
 
     ollama_url = await get_setting("ollama_url") or "http://localhost:11434"
-    result = await rag.ingest_text(text, file.filename, ollama_url=ollama_url)
+    result = await rag.ingest_text(text, file.filename, ollama_url=ollama_url, doc_id=doc_id or None)
 
     if not result.get("ok"):
         raise HTTPException(status_code=500, detail=result.get("error", "Registration failed"))
@@ -0,0 +1,24 @@
+"""履歴全文検索 API ルーター"""
+
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException, Query
+
+from helix_studio.services import search
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+
+@router.get("")
+async def search_history(
+    q: str = Query(..., min_length=1, description="検索語（空白区切りでAND）"),
+    limit: int = Query(20, ge=1, le=100),
+    kind: str = Query("", description="message / conversation / pipeline（カンマ区切り、空なら全て）"),
+) -> dict:
+    """会話タイトル・メッセージ・パイプライン実行を全文検索し、スニペット付きで返す。"""
+    kinds = [k.strip() for k in kind.split(",") if k.strip()] or list(search.KINDS)
+    unknown = [k for k in kinds if k not in search.KINDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown kind: {', '.join(unknown)}")
+    results = await search.search(q, limit=limit, kinds=kinds)
+    return {"query": q, "results": results, "count": len(results)}
@@ -4,8 +4,9 @@ from __future__ import annotations
 
 from fastapi import APIRouter
 
-from helix_studio.config import get_all_settings, set_setting
+from helix_studio.config import get_all_settings, set_settings
 from helix_studio.models import SettingResponse, SettingUpdate
+from helix_studio.services.cloud_ai import client_cache
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
 
@@ -16,6 +17,12 @@ _MASK_KEYS = {
     "openai_compat_api_key",
 }
 
+# キーが変わったら SDK クライアントを作り直すプロバイダ
+_CLIENT_KEYS = {
+    "claude_api_key": "claude",
+    "openai_api_key": "openai",
+}
+
 
 def _mask_value(key: str, value: str) -> str:
     """APIキーは末尾4文字のみ表示し、残りをマスクする。"""
@@ -45,12 +52,16 @@ async def get_settings() -> SettingResponse:
 @router.put("")
 async def update_settings(req: SettingUpdate) -> dict:
     """設定を一括更新。マスクされた値（****含む）は更新しない。"""
-    updated_keys: list[str] = []
+    updates: dict[str, str] = {}
     for key, value in req.settings.items():
         str_value = str(value) if not isinstance(value, str) else value
         # マスクされたままの値は無視（ユーザーが変更していない）
         if "****" in str_value and key in _MASK_KEYS:
             continue
-        await set_setting(key, str_value)
-        updated_keys.append(key)
+        updates[key] = str_value
+    await set_settings(updates)
+    for key, provider in _CLIENT_KEYS.items():
+        if key in updates:
+            await client_cache.invalidate(provider)
+    updated_keys = list(updates)
     return {"updated": updated_keys, "count": len(updated_keys)}
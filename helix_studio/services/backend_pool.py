@@ -0,0 +1,313 @@
+"""ローカル LLM バックエンドプール — 複数の Ollama / OpenAI 互換ノードへ振り分ける
+
+ollama_url・openai_compat_url には1台しか指定できず、GPU マシンが複数あっても
+全リクエストが1台に集中していた。
+
+ノードは主 URL（ollama_url / openai_compat_url）に ollama_urls / openai_compat_urls
+（カンマ・空白・改行区切り）で追加する。リクエストごとに次の順でノードを選ぶ。
+
+1. 停止中と判定されていないノード
+2. その中で「実行中のリクエスト数 + モデル未ロードのペナルティ」が最小のノード
+   （Ollama は /api/ps、OpenAI 互換は /v1/models でモデルの有無を判定する）
+
+モデルのロードは数十秒かかるので、ロード済みのノードが少し混んでいても優先する。
+LOAD_PENALTY 件以上の差がついたら、未ロードのノードに振り分けてロードさせる。
+
+ノードの状態は poll_interval ごとのポーリングで更新し、実行中のリクエスト数は
+リクエストの開始・終了で数える。応答を受け取る前の接続エラーは次の候補ノードへ
+フェイルオーバーし、失敗したノードは down_cooldown 秒の間候補の最後に回す
+（次のポーリングで応答すれば戻す）。全ノードが停止中でも順に試す。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import TypeVar
+
+import httpx
+
+from helix_studio.config import get_setting
+from helix_studio.services.http_pool import http_pool
+from helix_studio.services.residency import normalize, residency
+
+logger = logging.getLogger(__name__)
+
+OLLAMA = "ollama"
+OPENAI_COMPAT = "openai_compat"
+
+DEFAULT_URLS = {OLLAMA: "http://localhost:11434", OPENAI_COMPAT: ""}
+POLL_INTERVAL = 15.0
+DOWN_COOLDOWN = 30.0
+# モデル未ロードのノードは、実行中のリクエストがこの件数多いのと同じ扱いにする
+LOAD_PENALTY = 4
+# 振り分けた直後のモデルは、次のポーリングで見えるまでロード済みとみなす
+ROUTED_TTL = 2 * POLL_INTERVAL
+_POLL_TIMEOUT = httpx.Timeout(5.0)
+
+# 応答を受け取る前に起きたら別ノードで再試行する例外
+_FAILOVER_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+T = TypeVar("T")
+
+_URL_SEP = re.compile(r"[\s,]+")
+
+
+def parse_urls(primary: str, extra: str) -> list[str]:
+    """主 URL と追加 URL（カンマ・空白区切り）を重複なしのリストにする。"""
+    urls = [primary, *_URL_SEP.split(extra or "")]
+    return list(dict.fromkeys(u.rstrip("/") for u in urls if u and u.strip()))
+
+
+@dataclass
+class Node:
+    kind: str
+    url: str
+    in_flight: int = 0
+    requests: int = 0
+    failures: int = 0
+    down_until: float = 0.0
+    last_error: str = ""
+    # OpenAI 互換: /v1/models で提供中のモデル（空なら未取得）
+    models: set[str] = field(default_factory=set)
+    # モデル → 最後に振り分けた時刻
+    routed_at: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def down(self) -> bool:
+        return time.monotonic() < self.down_until
+
+    def has_model(self, model: str) -> bool:
+        if time.monotonic() - self.routed_at.get(model, float("-inf")) < ROUTED_TTL:
+            return True
+        if self.kind == OLLAMA:
+            return residency.has_model(self.url, model)
+        # 一覧を取れていないノードは提供していると仮定する
+        return not self.models or model in self.models
+
+    def mark_up(self) -> None:
+        self.down_until = 0.0
+
+    def mark_down(self, error: str, cooldown: float) -> None:
+        self.failures += 1
+        self.last_error = error
+        if not self.down:
+            logger.warning("Backend %s marked down: %s", self.url, error)
+        self.down_until = time.monotonic() + cooldown
+
+
+class BackendPool:
+    """種別（ollama / openai_compat）ごとのノード群と、その負荷・常駐状態。"""
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL, down_cooldown: float = DOWN_COOLDOWN):
+        self.poll_interval = poll_interval
+        self.down_cooldown = down_cooldown
+        self._nodes: dict[tuple[str, str], Node] = {}
+        self._task: asyncio.Task | None = None
+        self.failovers = 0
+
+    # ── ノード ──
+
+    async def nodes(self, kind: str, primary: str | None = None) -> list[Node]:
+        """設定から種別のノード一覧を返す。primary を渡すと主 URL の代わりに使う。"""
+        if primary is None:
+            primary = await get_setting(f"{kind}_url") or DEFAULT_URLS[kind]
+        extra = await get_setting(f"{kind}_urls") or ""
+        nodes = []
+        for url in parse_urls(primary, extra):
+            node = self._nodes.get((kind, url))
+            if node is None:
+                node = self._nodes[(kind, url)] = Node(kind, url)
+            nodes.append(node)
+        return nodes
+
+    async def candidates(self, kind: str, model: str, primary: str | None = None) -> list[Node]:
+        """試す順に並べたノード。1つも設定されていなければ ValueError。"""
+        nodes = await self.nodes(kind, primary)
+        if not nodes:
+            raise ValueError(f"no {kind} backend configured")
+        model = normalize(model) if kind == OLLAMA else model
+
+        def cost(item: tuple[int, Node]) -> tuple:
+            index, node = item
+            load = node.in_flight + (0 if node.has_model(model) else LOAD_PENALTY)
+            return (node.down, load, index)
+
+        return [node for _, node in sorted(enumerate(nodes), key=cost)]
+
+    async def choose(self, kind: str, model: str, primary: str | None = None) -> str:
+        """次のリクエストを送るノードの URL。"""
+        return (await self.candidates(kind, model, primary))[0].url
+
+    # ── リクエスト ──
+
+    async def stream(
+        self,
+        kind: str,
+        model: str,
+        open_stream: Callable[[str], AsyncIterator[T]],
+        primary: str | None = None,
+    ) -> AsyncIterator[T]:
+        """ノードを選んで open_stream(url) の出力を中継する。
+
+        最初のチャンクを受け取る前の接続エラーは次のノードで再試行する。
+        """
+        last_error: Exception | None = None
+        for node in await self.candidates(kind, model, primary):
+            started = False
+            self._begin(node, model)
+            try:
+                async for chunk in open_stream(node.url):
+                    started = True
+                    yield chunk
+            except _FAILOVER_ERRORS as e:
+                if started:
+                    raise
+                last_error = self._failed(node, e)
+                continue
+            except httpx.HTTPStatusError as e:
+                # 混雑（Ollama の OLLAMA_MAX_QUEUE 超過等）は別ノードに回す。ノードは停止扱いにしない
+                if started or e.response.status_code != 503:
+                    raise
+                last_error = e
+                self.failovers += 1
+                continue
+            finally:
+                node.in_flight -= 1
+            node.mark_up()
+            return
+        assert last_error is not None
+        raise last_error
+
+    async def call(
+        self,
+        kind: str,
+        model: str,
+        request: Callable[[str], Awaitable[T]],
+        primary: str | None = None,
+    ) -> T:
+        """ノードを選んで request(url) を実行する（ストリーミングなし版）。"""
+        last_error: Exception | None = None
+        for node in await self.candidates(kind, model, primary):
+            self._begin(node, model)
+            try:
+                result = await request(node.url)
+            except _FAILOVER_ERRORS as e:
+                last_error = self._failed(node, e)
+                continue
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 503:
+                    raise
+                last_error = e
+                self.failovers += 1
+                continue
+            finally:
+                node.in_flight -= 1
+            node.mark_up()
+            return result
+        assert last_error is not None
+        raise last_error
+
+    async def prefetch(self, model: str, primary: str | None = None) -> None:
+        """Ollama のモデルを、次のリクエストが振り分けられるノードで先読みする。"""
+        node = (await self.candidates(OLLAMA, model, primary))[0]
+        node.routed_at[normalize(model)] = time.monotonic()
+        residency.prefetch(node.url, model)
+
+    # ── ポーリング ──
+
+    def start(self) -> None:
+        """ノード状態の定期ポーリングを始める（lifespan 開始時）。"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name="backend-pool-poller")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def poll(self) -> dict[tuple[str, str], bool]:
+        """設定済みの全ノードを並行に問い合わせ、(種別, URL) → 応答したかを返す。"""
+        nodes = [*await self.nodes(OLLAMA)]
+        if await get_setting("openai_compat_url") or await get_setting("openai_compat_urls"):
+            nodes += await self.nodes(OPENAI_COMPAT)
+        api_key = await get_setting("openai_compat_api_key") or ""
+        results = await asyncio.gather(*(self._poll_node(node, api_key) for node in nodes))
+        return {(node.kind, node.url): ok for node, ok in zip(nodes, results)}
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        resident = residency.stats()["resident"]
+        return {
+            "failovers": self.failovers,
+            "nodes": [
+                {
+                    "kind": node.kind,
+                    "url": node.url,
+                    "state": "down" if node.down else "up",
+                    "retry_in": round(max(node.down_until - now, 0.0), 1),
+                    "in_flight": node.in_flight,
+                    "requests": node.requests,
+                    "failures": node.failures,
+                    "last_error": node.last_error,
+                    "models": sorted(resident.get(node.url, {}) if node.kind == OLLAMA else node.models),
+                }
+                for node in self._nodes.values()
+            ],
+        }
+
+    # ── 内部 ──
+
+    def _begin(self, node: Node, model: str) -> None:
+        node.in_flight += 1
+        node.requests += 1
+        node.routed_at[normalize(model) if node.kind == OLLAMA else model] = time.monotonic()
+
+    def _failed(self, node: Node, error: Exception) -> Exception:
+        self.failovers += 1
+        node.mark_down(str(error) or type(error).__name__, self.down_cooldown)
+        return error
+
+    async def _poll_node(self, node: Node, api_key: str) -> bool:
+        if node.kind == OLLAMA:
+            await residency.refresh(node.url)
+            ok = residency.reachable(node.url)
+            error = "/api/ps failed"
+        else:
+            headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+            try:
+                resp = await http_pool.client(OPENAI_COMPAT).get(
+                    f"{node.url}/v1/models", headers=headers, timeout=_POLL_TIMEOUT,
+                )
+                resp.raise_for_status()
+                node.models = {m.get("id", "") for m in resp.json().get("data", [])}
+                ok, error = True, ""
+            except Exception as e:
+                ok, error = False, str(e) or type(e).__name__
+        if ok:
+            node.mark_up()
+        else:
+            node.mark_down(error, self.down_cooldown)
+        return ok
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug("Backend poll failed: %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+
+# グローバルインスタンス
+backend_pool = BackendPool()
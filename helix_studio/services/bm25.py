@@ -0,0 +1,198 @@
+"""BM25 スパースベクトル — RAG の hybrid 検索で Qdrant の text_bm25 に入れるベクトルを作る
+
+以前の rag._tokenize_for_bm25 には次の問題があった。
+- 語のインデックスに組み込みの hash() を使っていたので、PYTHONHASHSEED によってプロセスごとに
+  値が変わり、再起動前に登録したチャンクと再起動後のクエリが一致しなかった
+- \\w+ で区切るので、日本語は句読点までの文字列全体が1語になり、部分一致しなかった
+- 語の重みが TF だけで、「です」「ます」のようなどこにでも出る語も同じ重みだった
+
+ここでは
+- 語は NFKC 正規化・小文字化してから、英数字は単語ごと、日本語（かな・漢字）は文字 bigram に分ける
+- インデックスは blake2b の 32 ビット値（Qdrant のスパースインデックスは u32）
+- 文書側の値は BM25 の TF 部分（k1・b と平均チャンク長による正規化）、
+  クエリ側の値は IDF にする。Qdrant のスパースベクトルの内積がそのまま BM25 スコアになる
+- IDF に使う文書頻度（DF）と総チャンク数・総トークン数は SQLite（bm25_terms・bm25_corpus）に
+  持ち、rag の取り込み・削除のたびに更新する
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import Counter
+from collections.abc import Sequence
+
+from helix_studio.db import db_pool
+
+logger = logging.getLogger(__name__)
+
+K1 = 1.2
+B = 0.75
+# 文書側のベクトルの作り方を変えたら上げる（rag のポイント ID に含まれる）
+VERSION = 1
+
+# 々・ひらがな・カタカナ・CJK 統合漢字（拡張 A・互換漢字を含む）
+_CJK = "\u3005\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+# 日本語の並び、または日本語以外の単語文字の並び
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[^\W{_CJK}]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+# SQLite の変数の上限より十分小さく
+_QUERY_CHUNK = 500
+
+SparseVector = dict[str, list]
+
+
+def tokenize(text: str) -> list[str]:
+    """英数字は単語ごと、日本語は2文字ずつずらした bigram（1文字だけの並びはそのまま）に分ける。"""
+    tokens: list[str] = []
+    for run in _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower()):
+        if len(run) > 1 and _CJK_RE.match(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def term_id(term: str) -> int:
+    """プロセスをまたいで変わらない語のインデックス（32 ビット）。"""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def term_frequencies(text: str) -> tuple[Counter[int], int]:
+    """(語のインデックス → 出現回数, トークン数)。"""
+    tokens = tokenize(text)
+    return Counter(term_id(t) for t in tokens), len(tokens)
+
+
+def encode_document(text: str, avgdl: float | None = None) -> SparseVector:
+    """チャンクのスパースベクトル（BM25 の TF 部分）。avgdl がなければ長さで正規化しない。"""
+    tf, length = term_frequencies(text)
+    if not tf:
+        return {"indices": [], "values": []}
+    norm = K1 * (1 - B + B * length / avgdl) if avgdl else K1
+    indices = sorted(tf)
+    return {"indices": indices, "values": [tf[i] * (K1 + 1) / (tf[i] + norm) for i in indices]}
+
+
+def idf(df: int, docs: int) -> float:
+    return math.log(1 + (docs - df + 0.5) / (df + 0.5))
+
+
+class BM25Index:
+    """DF・コーパス統計の保持と、クエリのスパースベクトル作成。
+
+    統計の読み書きに失敗しても取り込み・検索は止めない（IDF が少しずれるだけ）。
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.query_ms = 0.0
+        self.added = 0
+        self.removed = 0
+        self.errors = 0
+
+    async def corpus(self) -> tuple[int, int]:
+        """(登録済みチャンク数, 総トークン数)。"""
+        try:
+            async with db_pool.read() as db:
+                cursor = await db.execute("SELECT docs, tokens FROM bm25_corpus WHERE id = 0")
+                row = await cursor.fetchone()
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            return 0, 0
+        return (row["docs"], row["tokens"]) if row else (0, 0)
+
+    async def average_length(self, texts: Sequence[str] = ()) -> float | None:
+        """登録済みチャンクの平均トークン数。コーパスが空なら texts の平均。"""
+        docs, tokens = await self.corpus()
+        if docs:
+            return tokens / docs
+        lengths = [len(tokenize(t)) for t in texts]
+        return sum(lengths) / len(lengths) if lengths and any(lengths) else None
+
+    async def encode_query(self, text: str) -> SparseVector:
+        """クエリのスパースベクトル（語ごとの IDF × クエリ内の出現回数）。
+
+        コーパスにない語は落とす。統計が空ならベクトルも空（dense だけで検索する）。
+        """
+        start = time.perf_counter()
+        tf, _ = term_frequencies(text)
+        docs, _ = await self.corpus()
+        if not tf or not docs:
+            return {"indices": [], "values": []}
+        frequencies: dict[int, int] = {}
+        ids = list(tf)
+        try:
+            async with db_pool.read() as db:
+                for i in range(0, len(ids), _QUERY_CHUNK):
+                    chunk = ids[i:i + _QUERY_CHUNK]
+                    cursor = await db.execute(
+                        f"SELECT term_id, df FROM bm25_terms WHERE term_id IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                    frequencies.update((row["term_id"], row["df"]) for row in await cursor.fetchall())
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            return {"indices": [], "values": []}
+        indices = sorted(frequencies)
+        self.queries += 1
+        self.query_ms += (time.perf_counter() - start) * 1000
+        return {"indices": indices, "values": [idf(frequencies[i], docs) * tf[i] for i in indices]}
+
+    async def add(self, texts: Sequence[str]) -> None:
+        """登録したチャンクを DF・コーパス統計に加える。"""
+        await self._update(texts, 1)
+        self.added += len(texts)
+
+    async def remove(self, texts: Sequence[str]) -> None:
+        """削除したチャンクを DF・コーパス統計から除く。"""
+        await self._update(texts, -1)
+        self.removed += len(texts)
+
+    def stats(self) -> dict:
+        return {
+            "queries": self.queries,
+            "avg_query_ms": round(self.query_ms / self.queries, 3) if self.queries else 0.0,
+            "added": self.added,
+            "removed": self.removed,
+            "errors": self.errors,
+        }
+
+    async def _update(self, texts: Sequence[str], sign: int) -> None:
+        if not texts:
+            return
+        df: Counter[int] = Counter()
+        tokens = 0
+        for text in texts:
+            tf, length = term_frequencies(text)
+            df.update(tf.keys())
+            tokens += length
+        try:
+            async with db_pool.write() as db:
+                await db.executemany(
+                    "INSERT INTO bm25_terms (term_id, df) VALUES (?, ?) "
+                    "ON CONFLICT(term_id) DO UPDATE SET df = df + excluded.df",
+                    [(term, sign * n) for term, n in df.items()],
+                )
+                await db.execute("INSERT OR IGNORE INTO bm25_corpus (id, docs, tokens) VALUES (0, 0, 0)")
+                await db.execute(
+                    "UPDATE bm25_corpus SET docs = MAX(docs + ?, 0), tokens = MAX(tokens + ?, 0) WHERE id = 0",
+                    (sign * len(texts), sign * tokens),
+                )
+                if sign < 0:
+                    await db.execute("DELETE FROM bm25_terms WHERE df <= 0")
+        except sqlite3.Error as e:
+            self._failed("write", e)
+
+    def _failed(self, op: str, error: Exception) -> None:
+        self.errors += 1
+        logger.warning("BM25 statistics %s failed: %s", op, error)
+
+
+# グローバルインスタンス
+bm25_index = BM25Index()
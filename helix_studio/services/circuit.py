@@ -0,0 +1,194 @@
+"""サーキットブレーカー — 停止中の任意バックエンドを即座にスキップする
+
+Qdrant・TEI リランカー・Docling・SearXNG・Mem0 は任意のバックエンドで、失敗時は
+空の結果を返して処理を続ける。ただし停止中でも毎ターン接続タイムアウトまで待っていた。
+
+上流ごとのブレーカーを http_pool のトランスポートに組み込み、連続して failure_threshold 回
+失敗（接続エラー・タイムアウト・5xx）したら open にする。open の間はリクエストを送らずに
+CircuitOpenError を送出する。reset_timeout 経過後は half_open になり、1リクエストだけ
+試しに通して成否で closed / open を決める。
+
+HealthPoller は一定間隔で各バックエンドのヘルスチェック URL を叩き、結果をブレーカーに
+反映する。復旧したバックエンドは次のポーリングで closed に戻る。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 30.0
+POLL_INTERVAL = 15.0
+PROBE_TIMEOUT = httpx.Timeout(2.0)
+
+# リクエストの extensions にこのキーがあればブレーカーを素通りする（ヘルスチェック用）
+PROBE_EXTENSION = "circuit_probe"
+
+
+class CircuitOpenError(httpx.TransportError):
+    """ブレーカーが open のため、リクエストを送らずに失敗した。"""
+
+
+class CircuitBreaker:
+    """1上流ぶんのブレーカー。状態遷移は closed → open → half_open → closed/open。"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        # half_open で試しに通したリクエストが実行中か
+        self._probing = False
+        self.last_error = ""
+        self.trips = 0
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """リクエストを送ってよいか。open の間と、half_open の試行中は False。"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._state = HALF_OPEN
+            self._probing = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self) -> None:
+        if self._state != CLOSED:
+            logger.info("Circuit %s closed (backend recovered)", self.name)
+        self._state = CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self, error: str = "") -> None:
+        self.last_error = error
+        self._failures += 1
+        self._probing = False
+        if self._state != CLOSED or self._failures >= self.failure_threshold:
+            if self._state == CLOSED:
+                self.trips += 1
+                logger.warning(
+                    "Circuit %s opened after %d failures: %s", self.name, self._failures, error,
+                )
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """成否が判定できないまま終わった（キャンセル等）試行を取り消す。"""
+        self._probing = False
+
+    def stats(self) -> dict:
+        state = self.state
+        retry_in = 0.0
+        if state == OPEN:
+            retry_in = max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+        return {
+            "state": state,
+            "failures": self._failures,
+            "failure_threshold": self.failure_threshold,
+            "trips": self.trips,
+            "short_circuited": self.short_circuited,
+            "retry_in": round(retry_in, 1),
+            "last_error": self.last_error,
+        }
+
+
+async def health_urls() -> dict[str, str]:
+    """上流名 → ヘルスチェック URL。"""
+    # rag・tools は http_pool を経由してこのモジュールを読み込むので、ここで import する
+    from helix_studio.config import get_setting
+    from helix_studio.services import rag, tools
+
+    mem0_url = await get_setting("mem0_url") or "http://localhost:8080"
+    return {
+        "qdrant": f"{rag.QDRANT_URL}/readyz",
+        "reranker": f"{rag.RERANKER_URL}/health",
+        "docling": f"{rag.DOCLING_URL}/health",
+        "searxng": f"{tools.SEARXNG_URL}/healthz",
+        "mem0": f"{mem0_url.rstrip('/')}/health",
+    }
+
+
+class HealthPoller:
+    """ブレーカー付きの上流を定期的にヘルスチェックする。"""
+
+    def __init__(self, interval: float = POLL_INTERVAL):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+        self.polls = 0
+
+    def start(self, pool) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(pool), name="circuit-health-poller")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def poll(self, pool, urls: dict[str, str] | None = None) -> dict[str, bool]:
+        """全バックエンドを並行にヘルスチェックし、上流名 → 成否を返す。"""
+        if urls is None:
+            urls = await health_urls()
+        names = [name for name in urls if name in pool.breakers]
+        results = await asyncio.gather(*(self._probe(pool, name, urls[name]) for name in names))
+        self.polls += 1
+        return dict(zip(names, results))
+
+    async def _probe(self, pool, name: str, url: str) -> bool:
+        breaker = pool.breakers[name]
+        try:
+            resp = await pool.client(name).get(
+                url, timeout=PROBE_TIMEOUT, extensions={PROBE_EXTENSION: True},
+            )
+        except httpx.HTTPError as e:
+            breaker.record_failure(str(e) or type(e).__name__)
+            return False
+        if resp.status_code >= 500:
+            breaker.record_failure(f"HTTP {resp.status_code}")
+            return False
+        breaker.record_success()
+        return True
+
+    async def _loop(self, pool) -> None:
+        while True:
+            try:
+                await self.poll(pool)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug("Health poll failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+
+# グローバルインスタンス
+health_poller = HealthPoller()
@@ -5,9 +5,15 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import os
+import re
 import shutil
-import subprocess
-from collections.abc import AsyncIterator
+import signal
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import aclosing
+
+from helix_studio.services.turn_metrics import mark_connected
 
 logger = logging.getLogger(__name__)
 
@@ -33,13 +39,30 @@ GEMINI_CLI_MODELS = [
 ]
 
 
+# PATH 探索は /api/models のたびに走るので、結果をしばらく保持する
+CLI_DETECT_TTL = 300.0
+_detected: tuple[float, dict[str, bool]] | None = None
+
+
 def detect_installed_clis() -> dict[str, bool]:
-    """インストール済みCLIを自動検出。"""
-    return {
+    """インストール済みCLIを自動検出。結果は CLI_DETECT_TTL 秒キャッシュする。"""
+    global _detected
+    now = time.monotonic()
+    if _detected is not None and now - _detected[0] < CLI_DETECT_TTL:
+        return dict(_detected[1])
+    installed = {
         "claude_code": shutil.which("claude") is not None,
         "codex": shutil.which("codex") is not None,
         "gemini_cli": shutil.which("gemini") is not None,
     }
+    _detected = (now, installed)
+    return dict(installed)
+
+
+def reset_cli_detection() -> None:
+    """CLI 検出結果のキャッシュを捨てる。"""
+    global _detected
+    _detected = None
 
 
 def list_cli_models() -> dict[str, list[dict]]:
@@ -65,55 +88,245 @@ def _resolve_command(cmd_name: str) -> str:
     return cmd_name
 
 
-def _run_subprocess(cmd: list[str], timeout: int = 300, stdin_text: str | None = None) -> subprocess.CompletedProcess:
-    """サブプロセスを同期的に実行する（asyncio.to_thread用）。"""
+# CLI 1回の実行の上限（秒）
+CLI_TIMEOUT = 300
+# stream-json の1行（最終 result イベントは応答全文を含む）の上限
+_LINE_LIMIT = 16 * 1024 * 1024
+# オプション非対応（古いCLI）と判断する stderr のパターン
+_OPTION_ERROR_RE = re.compile(r"unknown (option|argument)|unexpected argument|unrecognized|invalid option", re.I)
+
+
+class CLITimeout(Exception):
+    """CLI が CLI_TIMEOUT 秒以内に終了しなかった。"""
+
+
+class CLIError(Exception):
+    """CLI が 0 以外の終了コードで終了した。"""
+
+    def __init__(self, returncode: int, stderr: str):
+        super().__init__(stderr or f"exit code {returncode}")
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+def _kill_process_tree(proc: asyncio.subprocess.Process) -> None:
+    """プロセスグループごと強制終了する（CLI が起動した子プロセスも残さない）。"""
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == "nt":
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def _stream_lines(
+    cmd: list[str],
+    stdin_text: str | None = None,
+    timeout: float = CLI_TIMEOUT,
+) -> AsyncIterator[str]:
+    """CLI を起動し、stdout を1行ずつ届いた時点で返す（shell は使わない）。
+
+    timeout を過ぎるか呼び出し側が途中で止めたら、プロセスグループごと終了する。
+    締め切りは CLI からの読み書きごとにかけ、yield は timeout のスコープに入れない
+    （スコープ内で yield すると、呼び出し側が止まっている間に期限が来たとき
+    呼び出し側のタスクに素の CancelledError が届いてしまう）。
+    """
     resolved_cmd = [_resolve_command(cmd[0])] + cmd[1:]
-    return subprocess.run(
-        resolved_cmd,
-        capture_output=True,
-        timeout=timeout,
-        shell=True,
-        input=stdin_text.encode("utf-8") if stdin_text else None,
+    proc = await asyncio.create_subprocess_exec(
+        *resolved_cmd,
+        stdin=asyncio.subprocess.PIPE if stdin_text else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        limit=_LINE_LIMIT,
+        start_new_session=os.name != "nt",
     )
+    # stderr を並行して読み切る（パイプが詰まって CLI が止まらないように）
+    stderr_task = asyncio.create_task(proc.stderr.read())
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        if stdin_text:
+            async with asyncio.timeout_at(deadline):
+                proc.stdin.write(stdin_text.encode("utf-8"))
+                await proc.stdin.drain()
+                proc.stdin.close()
+        while True:
+            # バッファ済みの行は待たずに返るので、期限切れは自分で確かめる
+            if loop.time() >= deadline:
+                raise TimeoutError
+            async with asyncio.timeout_at(deadline):
+                line = await proc.stdout.readline()
+            if not line:
+                break
+            yield line.decode("utf-8", errors="replace")
+        async with asyncio.timeout_at(deadline):
+            returncode = await proc.wait()
+            stderr = (await stderr_task).decode("utf-8", errors="replace").strip()
+    except TimeoutError:
+        raise CLITimeout() from None
+    finally:
+        _kill_process_tree(proc)
+        stderr_task.cancel()
+        if proc.returncode is None:
+            await proc.wait()
+    if returncode != 0:
+        raise CLIError(returncode, stderr)
+
+
+def _claude_event(event: dict, state: dict) -> str:
+    """Claude Code の stream-json イベントからテキスト差分を取り出す。"""
+    kind = event.get("type")
+    if kind == "system" and event.get("session_id"):
+        state["session_id"] = event["session_id"]
+    elif kind == "stream_event":
+        inner = event.get("event") or {}
+        delta = inner.get("delta") or {}
+        if inner.get("type") == "content_block_delta" and delta.get("type") == "text_delta":
+            state["streamed"] = True
+            return delta.get("text", "")
+    elif kind == "assistant" and not state.get("streamed"):
+        # --include-partial-messages 非対応の版: 完成したメッセージ単位で届く
+        state["assistant"] = True
+        content = (event.get("message") or {}).get("content") or []
+        return "".join(b.get("text", "") for b in content if b.get("type") == "text")
+    elif kind == "result":
+        state["done"] = True
+        usage = event.get("usage") or {}
+        state["tokens_in"] = usage.get("input_tokens")
+        state["tokens_out"] = usage.get("output_tokens")
+        if event.get("is_error"):
+            raise CLIError(1, str(event.get("result", "")))
+        if not state.get("streamed") and not state.get("assistant"):
+            return str(event.get("result", ""))
+    return ""
+
+
+def _codex_event(event: dict, state: dict) -> str:
+    """Codex の exec --json イベントからテキストを取り出す。"""
+    kind = event.get("type")
+    if kind == "thread.started":
+        state["session_id"] = event.get("thread_id")
+    elif kind == "item.completed":
+        item = event.get("item") or {}
+        if item.get("type") == "agent_message":
+            return item.get("text", "")
+    elif kind == "turn.completed":
+        usage = event.get("usage") or {}
+        state["tokens_in"] = usage.get("input_tokens")
+        state["tokens_out"] = usage.get("output_tokens")
+    elif kind == "error" or kind == "turn.failed":
+        error = event.get("error") or {}
+        raise CLIError(1, error.get("message") or event.get("message", ""))
+    # 旧形式: {"msg": {"type": "agent_message_delta", "delta": ...}}
+    msg = event.get("msg") or {}
+    if msg.get("type") == "session_configured":
+        state["session_id"] = msg.get("session_id")
+    if msg.get("type") == "agent_message_delta":
+        state["streamed"] = True
+        return msg.get("delta", "")
+    if msg.get("type") == "agent_message" and not state.get("streamed"):
+        return msg.get("message", "")
+    return ""
+
+
+def _gemini_event(event: dict, state: dict) -> str:
+    """Gemini CLI の stream-json イベントからテキスト差分を取り出す。"""
+    kind = event.get("type")
+    if kind == "init":
+        state["session_id"] = event.get("session_id")
+    elif kind == "message" and event.get("role") == "assistant":
+        return event.get("content", "")
+    elif kind == "result":
+        stats = event.get("stats") or {}
+        state["tokens_in"] = stats.get("input_tokens")
+        state["tokens_out"] = stats.get("output_tokens")
+        if event.get("status") == "error":
+            error = event.get("error") or {}
+            raise CLIError(1, error.get("message", ""))
+    elif kind == "error":
+        raise CLIError(1, event.get("message", ""))
+    return ""
+
+
+async def _stream_cli(
+    label: str,
+    cmd: list[str],
+    fallback_cmd: list[str],
+    parse_event: Callable[[dict, dict], str],
+    stdin_text: str | None = None,
+    usage: dict | None = None,
+    state: dict | None = None,
+) -> AsyncIterator[str]:
+    """CLI の JSON イベントストリームを解析してテキストを逐次返す。
+
+    JSON でない行はそのまま返す。JSON 出力オプションに対応しない古い CLI なら
+    fallback_cmd（プレーンテキスト出力）で実行し直し、stdout をそのまま流す。
+    state を渡すと解析結果（session_id など）と失敗 (failed) が書き込まれる。
+    """
+    state = {} if state is None else state
+    connected = yielded = False
+    try:
+        try:
+            # 途中で止められたらその場でプロセスを終了させる
+            async with aclosing(_stream_lines(cmd, stdin_text)) as lines:
+                async for line in lines:
+                    if not connected:
+                        connected = True
+                        mark_connected(usage)
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        event = None
+                    if not isinstance(event, dict):
+                        text = line
+                    else:
+                        text = parse_event(event, state)
+                    if text:
+                        yielded = True
+                        yield text
+        except CLIError as e:
+            if yielded or not _OPTION_ERROR_RE.search(e.stderr):
+                raise
+            logger.info("%s does not support JSON streaming, falling back to text output", label)
+            async with aclosing(_stream_lines(fallback_cmd, stdin_text)) as lines:
+                async for line in lines:
+                    yield line
+            return
+        if usage is not None:
+            usage["tokens_in"] = state.get("tokens_in")
+            usage["tokens_out"] = state.get("tokens_out")
+    except CLITimeout:
+        state["failed"] = True
+        yield f"[{label} タイムアウト] {CLI_TIMEOUT}秒以内に応答がありませんでした"
+    except CLIError as e:
+        state["failed"] = True
+        yield f"[{label} エラー] {e}"
 
 
 async def stream_chat_claude_code(
     model: str,
     message: str,
     system: str = "",
+    usage: dict | None = None,
 ) -> AsyncIterator[str]:
-    """Claude Code CLI で非対話チャット（ストリーミング風）。"""
+    """Claude Code CLI で非対話チャット（stream-json を逐次解析）。"""
     # 長文プロンプトはstdin経由で渡す（コマンドライン引数長制限回避）
     if len(message) > 500:
-        cmd = ["claude", "-p", "-", "--model", model, "--output-format", "json"]
+        base = ["claude", "-p", "-", "--model", model]
         stdin_text = message
     else:
-        cmd = ["claude", "-p", message, "--model", model, "--output-format", "json"]
+        base = ["claude", "-p", message, "--model", model]
         stdin_text = None
+    cmd = base + ["--output-format", "stream-json", "--verbose", "--include-partial-messages"]
 
     try:
-        result = await asyncio.to_thread(_run_subprocess, cmd, 300, stdin_text)
-
-        if result.returncode != 0:
-            error_text = result.stderr.decode("utf-8", errors="replace").strip()
-            yield f"[Claude Code エラー] {error_text}"
-            return
-
-        output = result.stdout.decode("utf-8", errors="replace").strip()
-        try:
-            data = json.loads(output)
-            result_text = data.get("result", output)
-        except json.JSONDecodeError:
-            result_text = output
-
-        # チャンク分割してストリーミング風に返す
-        chunk_size = 50
-        for i in range(0, len(result_text), chunk_size):
-            yield result_text[i:i + chunk_size]
-            await asyncio.sleep(0.02)
-
-    except subprocess.TimeoutExpired:
-        yield "[Claude Code タイムアウト] 300秒以内に応答がありませんでした"
+        async for chunk in _stream_cli(
+            "Claude Code", cmd, base, _claude_event, stdin_text, usage,
+        ):
+            yield chunk
     except FileNotFoundError:
         yield "[エラー] claude コマンドが見つかりません。Claude Code CLIをインストールしてください。"
     except Exception as e:
@@ -124,28 +337,15 @@ async def stream_chat_claude_code(
 async def stream_chat_codex(
     model: str,
     message: str,
+    usage: dict | None = None,
 ) -> AsyncIterator[str]:
-    """Codex CLI で非対話チャット（ストリーミング風）。"""
-    cmd = ["codex", "exec", "-m", model, "--", message]
+    """Codex CLI で非対話チャット（--json のイベントを逐次解析）。"""
+    cmd = ["codex", "exec", "--json", "-m", model, "--", message]
+    fallback_cmd = ["codex", "exec", "-m", model, "--", message]
 
     try:
-        result = await asyncio.to_thread(_run_subprocess, cmd, 300)
-
-        if result.returncode != 0:
-            error_text = result.stderr.decode("utf-8", errors="replace").strip()
-            yield f"[Codex エラー] {error_text}"
-            return
-
-        output = result.stdout.decode("utf-8", errors="replace").strip()
-
-        # チャンク分割
-        chunk_size = 50
-        for i in range(0, len(output), chunk_size):
-            yield output[i:i + chunk_size]
-            await asyncio.sleep(0.02)
-
-    except subprocess.TimeoutExpired:
-        yield "[Codex タイムアウト] 300秒以内に応答がありませんでした"
+        async for chunk in _stream_cli("Codex", cmd, fallback_cmd, _codex_event, usage=usage):
+            yield chunk
     except FileNotFoundError:
         yield "[エラー] codex コマンドが見つかりません。Codex CLIをインストールしてください。"
     except Exception as e:
@@ -156,27 +356,15 @@ async def stream_chat_codex(
 async def stream_chat_gemini_cli(
     model: str,
     message: str,
+    usage: dict | None = None,
 ) -> AsyncIterator[str]:
-    """Gemini CLI で非対話チャット（ストリーミング風）。"""
-    cmd = ["gemini", "-p", message, "-m", model]
+    """Gemini CLI で非対話チャット（stream-json を逐次解析）。"""
+    fallback_cmd = ["gemini", "-p", message, "-m", model]
+    cmd = fallback_cmd + ["--output-format", "stream-json"]
 
     try:
-        result = await asyncio.to_thread(_run_subprocess, cmd, 300)
-
-        if result.returncode != 0:
-            error_text = result.stderr.decode("utf-8", errors="replace").strip()
-            yield f"[Gemini CLI エラー] {error_text}"
-            return
-
-        output = result.stdout.decode("utf-8", errors="replace").strip()
-
-        chunk_size = 50
-        for i in range(0, len(output), chunk_size):
-            yield output[i:i + chunk_size]
-            await asyncio.sleep(0.02)
-
-    except subprocess.TimeoutExpired:
-        yield "[Gemini CLI タイムアウト] 300秒以内に応答がありませんでした"
+        async for chunk in _stream_cli("Gemini CLI", cmd, fallback_cmd, _gemini_event, usage=usage):
+            yield chunk
     except FileNotFoundError:
         yield "[エラー] gemini コマンドが見つかりません。Gemini CLIをインストールしてください。"
     except Exception as e:
@@ -189,16 +377,17 @@ async def stream_chat_cli(
     model: str,
     message: str,
     system: str = "",
+    usage: dict | None = None,
 ) -> AsyncIterator[str]:
     """CLI統合インターフェース。"""
     if provider == "claude_code":
-        async for chunk in stream_chat_claude_code(model, message, system):
+        async for chunk in stream_chat_claude_code(model, message, system, usage=usage):
             yield chunk
     elif provider == "codex":
-        async for chunk in stream_chat_codex(model, message):
+        async for chunk in stream_chat_codex(model, message, usage=usage):
             yield chunk
     elif provider == "gemini_cli":
-        async for chunk in stream_chat_gemini_cli(model, message):
+        async for chunk in stream_chat_gemini_cli(model, message, usage=usage):
             yield chunk
     else:
         yield f"[エラー] 未対応のCLIプロバイダ: {provider}"
@@ -0,0 +1,459 @@
+"""CLI セッションプール — 会話ごとに CLI のプロセスと文脈を使い回す
+
+CLI プロバイダは1ターンごとに新しいプロセスを起動し、最後のユーザーメッセージしか
+受け取らないため、起動コストを毎回払ううえに会話の文脈が失われていた。
+ここでは (provider, model, conversation_id) ごとにワーカーを保持する。
+
+- Claude Code: --input-format stream-json で常駐させ、stdin にターンを書き込む
+  （常駐モード非対応の版では --resume でセッションを引き継ぐ）
+- Codex / Gemini CLI: 1ターン1プロセスのまま、前回のセッションIDで resume する
+
+新しいワーカーの最初のターンだけ、それまでの会話履歴を含めたプロンプトを渡す。
+アイドルワーカーの回収・同時プロセス数の上限・使う前の死活確認を行う。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+
+from helix_studio.services import cli_ai
+from helix_studio.services.cli_ai import (
+    _LINE_LIMIT,
+    _OPTION_ERROR_RE,
+    CLI_TIMEOUT,
+    CLIError,
+    CLITimeout,
+    _claude_event,
+    _codex_event,
+    _gemini_event,
+    _kill_process_tree,
+    _resolve_command,
+    _stream_cli,
+)
+from helix_studio.services.turn_metrics import mark_connected
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+# これ以上使われなかったワーカーは回収する（秒）
+DEFAULT_IDLE_TIMEOUT = 600.0
+REAP_INTERVAL = 30.0
+# 長いプロンプトは引数ではなく stdin で渡す
+_STDIN_THRESHOLD = 500
+_STDERR_TAIL = 4096
+
+PROVIDER_LABELS = {
+    "claude_code": "Claude Code",
+    "codex": "Codex",
+    "gemini_cli": "Gemini CLI",
+}
+
+SessionKey = tuple[str, str, str]
+
+
+def build_prompt(messages: list[dict[str, str]], system: str = "", fresh: bool = True) -> str:
+    """CLI に渡すプロンプトを組み立てる。
+
+    fresh（CLI 側に文脈がない）なら system と過去の会話を含める。
+    そうでなければ今回のターンの分（先頭の system メッセージと最後のユーザーメッセージ）だけ。
+    """
+    if not messages:
+        return ""
+    last = messages[-1]["content"]
+    history = messages[:-1]
+    extra = [m["content"] for m in history if m["role"] == "system"]
+    if not fresh:
+        return "\n\n".join(extra + [last])
+
+    parts = [system] if system else []
+    transcript = [
+        f"{m['role'].capitalize()}: {m['content']}" for m in history if m["role"] != "system"
+    ]
+    if transcript:
+        parts.append("Conversation so far:\n\n" + "\n\n".join(transcript))
+        parts.extend(extra)
+        parts.append(f"User: {last}")
+    else:
+        parts.extend(extra + [last])
+    return "\n\n".join(parts)
+
+
+class _ClaudeWorker:
+    """claude を stream-json 入出力で常駐させ、1プロセスで複数ターンを処理する。"""
+
+    persistent = True
+
+    def __init__(self, model: str, cmd: list[str] | None = None):
+        self.model = model
+        self.cmd = cmd or [
+            "claude", "-p",
+            "--input-format", "stream-json",
+            "--output-format", "stream-json",
+            "--verbose", "--include-partial-messages",
+            "--model", model,
+        ]
+        self.proc: asyncio.subprocess.Process | None = None
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.turns = 0
+        self.broken = False
+        self._stderr = bytearray()
+        self._stderr_task: asyncio.Task | None = None
+
+    @property
+    def fresh(self) -> bool:
+        return self.turns == 0
+
+    def healthy(self) -> bool:
+        """プロセスが生きていて、前のターンが途中で終わっていないか。"""
+        return not self.broken and (self.proc is None or self.proc.returncode is None)
+
+    async def turn(self, prompt: str, usage: dict | None = None) -> AsyncIterator[str]:
+        if self.proc is None:
+            await self._spawn()
+        assert self.proc is not None and self.proc.stdin is not None
+        message = {"type": "user", "message": {"role": "user", "content": [{"type": "text", "text": prompt}]}}
+        state: dict = {}
+        finished = False
+        # 締め切りは読み書きごとにかけ、yield は timeout のスコープに入れない（cli_ai._stream_lines と同じ）
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + CLI_TIMEOUT
+        try:
+            async with asyncio.timeout_at(deadline):
+                self.proc.stdin.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+                await self.proc.stdin.drain()
+            while not state.get("done"):
+                if loop.time() >= deadline:
+                    raise TimeoutError
+                async with asyncio.timeout_at(deadline):
+                    line = await self.proc.stdout.readline()
+                    if not line:
+                        returncode = await self.proc.wait()
+                        raise CLIError(returncode, self.stderr_tail())
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(event, dict):
+                    continue
+                if not state:
+                    mark_connected(usage)
+                    state["connected"] = True
+                text = _claude_event(event, state)
+                if text:
+                    yield text
+            finished = True
+        except TimeoutError:
+            raise CLITimeout() from None
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise CLIError(-1, self.stderr_tail() or str(e)) from None
+        finally:
+            # 途中で終わったターンの残りのイベントが次のターンに混ざらないよう、このプロセスは捨てる
+            self.turns += 1
+            self.last_used = time.monotonic()
+            if not finished:
+                self.broken = True
+        if usage is not None:
+            usage["tokens_in"] = state.get("tokens_in")
+            usage["tokens_out"] = state.get("tokens_out")
+
+    def stderr_tail(self) -> str:
+        return self._stderr.decode("utf-8", errors="replace").strip()
+
+    async def close(self) -> None:
+        # 渡された直後（プロセス起動前）に追い出されたワーカーでも、ロックを取った側が
+        # プールの管理外でプロセスを起動しないようにする
+        self.broken = True
+        if self.proc is None:
+            return
+        if self.proc.stdin is not None and not self.proc.stdin.is_closing():
+            self.proc.stdin.close()
+        _kill_process_tree(self.proc)
+        await self.proc.wait()
+        if self._stderr_task is not None:
+            self._stderr_task.cancel()
+
+    async def _spawn(self) -> None:
+        self.proc = await asyncio.create_subprocess_exec(
+            _resolve_command(self.cmd[0]), *self.cmd[1:],
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=_LINE_LIMIT,
+            start_new_session=os.name != "nt",
+        )
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+
+    async def _drain_stderr(self) -> None:
+        assert self.proc is not None and self.proc.stderr is not None
+        while chunk := await self.proc.stderr.read(4096):
+            self._stderr += chunk
+            del self._stderr[:-_STDERR_TAIL]
+
+
+class _ResumeWorker:
+    """1ターン1プロセスで実行し、CLI のセッションIDで前回の文脈を引き継ぐ。"""
+
+    persistent = False
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.session_id: str | None = None
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.turns = 0
+
+    @property
+    def fresh(self) -> bool:
+        return self.session_id is None
+
+    def healthy(self) -> bool:
+        return True
+
+    async def turn(self, prompt: str, usage: dict | None = None) -> AsyncIterator[str]:
+        cmd, fallback_cmd, stdin_text = self._commands(prompt)
+        parser = {"claude_code": _claude_event, "codex": _codex_event}.get(self.provider, _gemini_event)
+        state: dict = {}
+        try:
+            async with aclosing(_stream_cli(
+                PROVIDER_LABELS[self.provider], cmd, fallback_cmd, parser,
+                stdin_text, usage, state=state,
+            )) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            self.turns += 1
+            self.last_used = time.monotonic()
+        # 失敗したら次のターンは履歴込みのプロンプトで新しいセッションを始める
+        self.session_id = None if state.get("failed") else state.get("session_id") or self.session_id
+
+    def _commands(self, prompt: str) -> tuple[list[str], list[str], str | None]:
+        """(JSON 出力のコマンド, テキスト出力のコマンド, stdin) を返す。"""
+        long_prompt = len(prompt) > _STDIN_THRESHOLD
+        stdin_text = prompt if long_prompt else None
+        sid = self.session_id
+        if self.provider == "claude_code":
+            base = ["claude", "-p", "-" if long_prompt else prompt, "--model", self.model]
+            resume = ["--resume", sid] if sid else []
+            stream = ["--output-format", "stream-json", "--verbose", "--include-partial-messages"]
+            return base + resume + stream, base + resume, stdin_text
+        if self.provider == "codex":
+            arg = "-" if long_prompt else prompt
+            resume = ["resume", sid] if sid else []
+            return (
+                ["codex", "exec", "--json", "-m", self.model, *resume, "--", arg],
+                ["codex", "exec", "-m", self.model, *resume, "--", arg],
+                stdin_text,
+            )
+        resume = ["--resume", sid] if sid else []
+        base = ["gemini", "-p", prompt, "-m", self.model] + resume
+        return base + ["--output-format", "stream-json"], base, None
+
+    async def close(self) -> None:
+        pass
+
+
+Worker = _ClaudeWorker | _ResumeWorker
+
+
+class CLISessionPool:
+    """(provider, model, conversation_id) → CLI ワーカーのプール。"""
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        reap_interval: float = REAP_INTERVAL,
+    ):
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self._workers: OrderedDict[SessionKey, Worker] = OrderedDict()
+        self._reaper: asyncio.Task | None = None
+        # 常駐モードに対応しない claude なら以後は resume で扱う
+        self._persistent_unsupported = False
+        self.spawned = 0
+        self.reused = 0
+        self.reaped = 0
+        self.evicted = 0
+        self.unhealthy = 0
+        self.overflow = 0
+
+    async def start(self) -> None:
+        """アイドルワーカーの回収を開始する。"""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop(), name="cli-session-reaper")
+
+    async def stop(self) -> None:
+        """回収を止め、全ワーカーのプロセスを終了する。"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        workers = list(self._workers.values())
+        self._workers.clear()
+        for worker in workers:
+            await worker.close()
+
+    async def stream(
+        self,
+        provider: str,
+        model: str,
+        conversation_id: str,
+        messages: list[dict[str, str]],
+        system: str = "",
+        usage: dict | None = None,
+    ) -> AsyncIterator[str]:
+        """会話のワーカーで1ターン実行し、応答テキストを逐次返す。"""
+        label = PROVIDER_LABELS.get(provider, provider)
+        key = (provider, model, conversation_id)
+        worker = await self._acquire(key)
+        if worker is None:
+            # 全ワーカーが使用中で上限に達している: 単発実行（履歴込み）
+            self.overflow += 1
+            async for chunk in self._one_shot(provider, model, messages, system, usage):
+                yield chunk
+            return
+
+        async with worker.lock:
+            if not worker.healthy():
+                # ロック待ちの間に前のターンが壊した
+                await self._discard(key, worker)
+                async for chunk in self._one_shot(provider, model, messages, system, usage):
+                    yield chunk
+                return
+            prompt = build_prompt(messages, system, worker.fresh)
+            yielded = False
+            try:
+                # 途中で止められたら turn() の後始末（ワーカーを壊れた扱いにする）を先に済ませる
+                async with aclosing(worker.turn(prompt, usage)) as chunks:
+                    async for chunk in chunks:
+                        yielded = True
+                        yield chunk
+            except FileNotFoundError:
+                await self._discard(key, worker)
+                async for chunk in cli_ai.stream_chat_cli(provider, model, prompt, usage=usage):
+                    yield chunk
+            except CLITimeout:
+                yield f"[{label} タイムアウト] {CLI_TIMEOUT}秒以内に応答がありませんでした"
+            except CLIError as e:
+                if worker.persistent and not yielded and _OPTION_ERROR_RE.search(e.stderr):
+                    logger.info("claude does not support stream-json input, using --resume sessions")
+                    self._persistent_unsupported = True
+                    await self._discard(key, worker)
+                    async for chunk in self.stream(provider, model, conversation_id, messages, system, usage):
+                        yield chunk
+                else:
+                    yield f"[{label} エラー] {e}"
+            finally:
+                if not worker.healthy():
+                    await self._discard(key, worker)
+
+    def stats(self) -> dict[str, int | float | bool]:
+        return {
+            "workers": len(self._workers),
+            "busy": sum(1 for w in self._workers.values() if w.lock.locked()),
+            "processes": sum(
+                1 for w in self._workers.values()
+                if isinstance(w, _ClaudeWorker) and w.proc is not None and w.proc.returncode is None
+            ),
+            "max_workers": self.max_workers,
+            "idle_timeout": self.idle_timeout,
+            "persistent_claude": not self._persistent_unsupported,
+            "spawned": self.spawned,
+            "reused": self.reused,
+            "reaped": self.reaped,
+            "evicted": self.evicted,
+            "unhealthy": self.unhealthy,
+            "overflow": self.overflow,
+        }
+
+    def _new_worker(self, key: SessionKey) -> Worker:
+        provider, model, _ = key
+        if provider == "claude_code" and not self._persistent_unsupported:
+            return _ClaudeWorker(model)
+        return _ResumeWorker(provider, model)
+
+    async def _acquire(self, key: SessionKey) -> Worker | None:
+        """会話のワーカーを返す（なければ作る）。上限に達して空きがなければ None。"""
+        while True:
+            # await の間に同じ会話の別のターンがワーカーを作ることがあるので、毎回見直す
+            worker = self._workers.get(key)
+            if worker is not None:
+                if worker.healthy():
+                    self._workers.move_to_end(key)
+                    self.reused += 1
+                    return worker
+                self.unhealthy += 1
+                await self._discard(key, worker)
+                continue
+            if len(self._workers) < self.max_workers:
+                break
+            if not await self._evict_idle():
+                return None
+        worker = self._new_worker(key)
+        self._workers[key] = worker
+        self.spawned += 1
+        return worker
+
+    async def _evict_idle(self) -> bool:
+        """最も長く使われていない空きワーカーを1つ閉じる。"""
+        for key, worker in self._workers.items():
+            if not worker.lock.locked():
+                self.evicted += 1
+                await self._discard(key, worker)
+                return True
+        return False
+
+    async def _discard(self, key: SessionKey, worker: Worker) -> None:
+        if self._workers.get(key) is worker:
+            del self._workers[key]
+        await worker.close()
+
+    async def _one_shot(
+        self,
+        provider: str,
+        model: str,
+        messages: list[dict[str, str]],
+        system: str,
+        usage: dict | None,
+    ) -> AsyncIterator[str]:
+        prompt = build_prompt(messages, system, fresh=True)
+        async for chunk in cli_ai.stream_chat_cli(provider, model, prompt, usage=usage):
+            yield chunk
+
+    async def reap(self) -> int:
+        """アイドル時間を超えた・死んでいるワーカーを閉じ、閉じた数を返す。"""
+        now = time.monotonic()
+        stale = [
+            (key, worker) for key, worker in self._workers.items()
+            if not worker.lock.locked()
+            and (now - worker.last_used > self.idle_timeout or not worker.healthy())
+        ]
+        for key, worker in stale:
+            await self._discard(key, worker)
+        self.reaped += len(stale)
+        return len(stale)
+
+    async def _reap_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception:
+                logger.exception("CLI session reaping failed")
+
+
+# グローバルインスタンス
+cli_sessions = CLISessionPool()
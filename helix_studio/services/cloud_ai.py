@@ -2,24 +2,133 @@
 
 from __future__ import annotations
 
+import hashlib
 import logging
+import os
 from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any
 
 import anthropic
 import openai
 
+from helix_studio.services.turn_metrics import mark_connected
+
 logger = logging.getLogger(__name__)
 
+# base_url 未指定時に SDK が参照する環境変数
+_BASE_URL_ENV = {"claude": "ANTHROPIC_BASE_URL", "openai": "OPENAI_BASE_URL"}
+
+
+# ── SDK クライアントキャッシュ ────────────────────────
+
+
+@dataclass
+class _CachedClient:
+    client: Any
+    in_use: int = 0
+    retired: bool = False
+
+
+class ClientCache:
+    """(provider, APIキーのハッシュ, base_url) → SDK クライアント。
+
+    SDK クライアントはそれぞれ接続プールを持つので、使い回してターン間で接続を再利用する。
+    同じプロバイダで別のキーが使われたら古いクライアントを退役させ、
+    使用中のストリームが終わった時点で閉じる。
+    """
+
+    def __init__(self):
+        self._clients: dict[tuple[str, str, str], _CachedClient] = {}
+        self.hits = 0
+        self.misses = 0
+        self.retired = 0
+
+    @asynccontextmanager
+    async def lease(self, provider: str, api_key: str, base_url: str | None = None):
+        """クライアントを借りる。退役済みなら返却時に閉じる。"""
+        entry = await self._get(provider, api_key, base_url)
+        entry.in_use += 1
+        try:
+            yield entry.client
+        finally:
+            entry.in_use -= 1
+            if entry.retired and entry.in_use == 0:
+                await self._close(entry)
+
+    async def invalidate(self, provider: str | None = None) -> None:
+        """プロバイダ（省略時は全て）のクライアントを退役させる（キー変更時）。"""
+        for key in [k for k in self._clients if provider is None or k[0] == provider]:
+            await self._retire(key)
+
+    async def close(self) -> None:
+        """全クライアントを閉じる（シャットダウン時）。"""
+        for key in list(self._clients):
+            entry = self._clients.pop(key)
+            await self._close(entry)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "clients": len(self._clients),
+            "in_use": sum(e.in_use for e in self._clients.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "retired": self.retired,
+        }
+
+    async def _get(self, provider: str, api_key: str, base_url: str | None) -> _CachedClient:
+        base_url = base_url or os.environ.get(_BASE_URL_ENV[provider], "")
+        key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        cache_key = (provider, key_hash, base_url)
+        entry = self._clients.get(cache_key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        if provider == "claude":
+            client = anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url or None)
+        else:
+            client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url or None)
+        entry = _CachedClient(client)
+        stale = [k for k in self._clients if k[0] == provider and k[2] == base_url]
+        self._clients[cache_key] = entry
+        # 同じプロバイダ・上流の古いキーのクライアントは退役させる
+        for key in stale:
+            await self._retire(key)
+        return entry
+
+    async def _retire(self, key: tuple[str, str, str]) -> None:
+        entry = self._clients.pop(key)
+        entry.retired = True
+        self.retired += 1
+        if entry.in_use == 0:
+            await self._close(entry)
+
+    @staticmethod
+    async def _close(entry: _CachedClient) -> None:
+        try:
+            await entry.client.close()
+        except Exception as e:
+            logger.debug("SDK client close failed: %s", e)
+
+
+# グローバルインスタンス
+client_cache = ClientCache()
+
+
+# ── ストリーミングチャット ────────────────────────────
+
 
 async def stream_chat_claude(
     api_key: str,
     model: str,
     messages: list[dict[str, str]],
     system: str = "",
+    usage: dict[str, Any] | None = None,
+    base_url: str | None = None,
 ) -> AsyncIterator[str]:
     """Anthropic Claude API でストリーミングチャット。"""
-    client = anthropic.AsyncAnthropic(api_key=api_key)
-
     # systemメッセージをmessagesから分離
     filtered = [m for m in messages if m["role"] != "system"]
     system_text = system
@@ -36,28 +145,41 @@ async def stream_chat_claude(
     if system_text:
         kwargs["system"] = system_text
 
-    async with client.messages.stream(**kwargs) as stream:
-        async for text in stream.text_stream:
-            yield text
+    async with client_cache.lease("claude", api_key, base_url) as client:
+        async with client.messages.stream(**kwargs) as stream:
+            mark_connected(usage)
+            async for text in stream.text_stream:
+                yield text
+            if usage is not None:
+                final = await stream.get_final_message()
+                usage["tokens_in"] = final.usage.input_tokens
+                usage["tokens_out"] = final.usage.output_tokens
 
 
 async def stream_chat_openai(
     api_key: str,
     model: str,
     messages: list[dict[str, str]],
+    usage: dict[str, Any] | None = None,
+    base_url: str | None = None,
 ) -> AsyncIterator[str]:
     """OpenAI API でストリーミングチャット。"""
-    client = openai.AsyncOpenAI(api_key=api_key)
-
-    stream = await client.chat.completions.create(
-        model=model,
-        messages=messages,  # type: ignore[arg-type]
-        stream=True,
-    )
-    async for chunk in stream:
-        delta = chunk.choices[0].delta if chunk.choices else None
-        if delta and delta.content:
-            yield delta.content
+    async with client_cache.lease("openai", api_key, base_url) as client:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,  # type: ignore[arg-type]
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        mark_connected(usage)
+        async with stream:
+            async for chunk in stream:
+                if chunk.usage is not None and usage is not None:
+                    usage["tokens_in"] = chunk.usage.prompt_tokens
+                    usage["tokens_out"] = chunk.usage.completion_tokens
+                delta = chunk.choices[0].delta if chunk.choices else None
+                if delta and delta.content:
+                    yield delta.content
 
 
 async def stream_chat(
@@ -66,13 +188,14 @@ async def stream_chat(
     model: str,
     messages: list[dict[str, str]],
     system: str = "",
+    usage: dict[str, Any] | None = None,
 ) -> AsyncIterator[str]:
     """プロバイダに応じたストリーミングチャット統合インターフェース。"""
     if provider == "claude":
-        async for chunk in stream_chat_claude(api_key, model, messages, system):
+        async for chunk in stream_chat_claude(api_key, model, messages, system, usage=usage):
             yield chunk
     elif provider == "openai":
-        async for chunk in stream_chat_openai(api_key, model, messages):
+        async for chunk in stream_chat_openai(api_key, model, messages, usage=usage):
             yield chunk
     else:
         raise ValueError(f"未対応のクラウドプロバイダ: {provider}")
@@ -92,11 +215,12 @@ async def chat_once(
     return "".join(chunks)
 
 
-async def list_claude_models(api_key: str) -> list[dict]:
+async def list_claude_models(api_key: str, strict: bool = False) -> list[dict]:
     """Claude の利用可能モデル一覧を取得。
 
     Anthropic APIにモデル一覧エンドポイントがあればそれを使い、
     なければ既知モデルのリストを返す。APIキーの有効性確認も兼ねる。
+    strict ならキーが無効なとき例外を送出する。
     """
     if not api_key:
         return []
@@ -113,14 +237,16 @@ async def list_claude_models(api_key: str) -> list[dict]:
 
     # APIキーの有効性確認（軽量なリクエスト）
     try:
-        client = anthropic.AsyncAnthropic(api_key=api_key)
-        # 最小限のリクエストでAPIキー確認
-        await client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=1,
-            messages=[{"role": "user", "content": "hi"}],
-        )
+        async with client_cache.lease("claude", api_key) as client:
+            # 最小限のリクエストでAPIキー確認
+            await client.messages.create(
+                model="claude-haiku-4-5-20251001",
+                max_tokens=1,
+                messages=[{"role": "user", "content": "hi"}],
+            )
     except anthropic.AuthenticationError:
+        if strict:
+            raise
         logger.warning("Claude APIキーが無効です")
         return []
     except Exception:
@@ -133,13 +259,13 @@ async def list_claude_models(api_key: str) -> list[dict]:
     ]
 
 
-async def list_openai_models(api_key: str) -> list[dict]:
-    """OpenAI のモデル一覧を取得。"""
+async def list_openai_models(api_key: str, strict: bool = False) -> list[dict]:
+    """OpenAI のモデル一覧を取得。strict なら失敗時に例外を送出する。"""
     if not api_key:
         return []
     try:
-        client = openai.AsyncOpenAI(api_key=api_key)
-        resp = await client.models.list()
+        async with client_cache.lease("openai", api_key) as client:
+            resp = await client.models.list()
         return [
             {
                 "provider": "openai",
@@ -151,5 +277,7 @@ async def list_openai_models(api_key: str) -> list[dict]:
             if m.id.startswith(("gpt-", "o1", "o3", "o4", "chatgpt-"))
         ]
     except Exception as e:
+        if strict:
+            raise
         logger.warning("OpenAIモデル一覧の取得に失敗: %s", e)
         return []
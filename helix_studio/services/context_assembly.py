@@ -0,0 +1,89 @@
+"""コンテキスト組み立て — ツール・Mem0・RAG・自動Web検索を並行取得する
+
+各取得元は数秒かかることがあり、順番に待つと最初のトークンが出るまでの時間が
+合計分だけ延びる。ここでは全取得元を同時に走らせ、取得元ごとの締め切りを
+過ぎたものはキャンセルして捨てる。結果の並べ方は呼び出し側が固定順で行うので、
+完了順によってプロンプトが変わることはない。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# 取得元ごとの締め切り（秒）。明示的な @コマンドは長め、自動注入は短め。
+SOURCE_DEADLINES: dict[str, float] = {
+    "tools": 15.0,
+    "mem0": 1.5,
+    "rag": 3.0,
+    "web_search": 8.0,
+}
+DEFAULT_DEADLINE = 3.0
+
+
+@dataclass
+class SourceResult:
+    """1つの取得元の結果。status は ok / empty / timeout / error。"""
+    name: str
+    text: str
+    elapsed_ms: int
+    status: str
+
+    @property
+    def skipped(self) -> bool:
+        return self.status in ("timeout", "error")
+
+
+class ContextAssembler:
+    """取得元を並行に走らせ、締め切り付きで結果を集める。"""
+
+    def __init__(self, deadlines: dict[str, float] | None = None):
+        self.deadlines = SOURCE_DEADLINES if deadlines is None else deadlines
+        self._tasks: dict[str, asyncio.Task[SourceResult]] = {}
+
+    def start(self, name: str, coro: Awaitable[str]) -> None:
+        """取得元を起動する。結果は collect() で受け取る。"""
+        deadline = self.deadlines.get(name, DEFAULT_DEADLINE)
+        self._tasks[name] = asyncio.create_task(self._run(name, coro, deadline))
+
+    async def collect(self) -> dict[str, SourceResult]:
+        """起動済みの全取得元の完了（または締め切り）を待つ。"""
+        results = await asyncio.gather(*self._tasks.values())
+        self._tasks.clear()
+        return {r.name: r for r in results}
+
+    def cancel(self) -> None:
+        """未完了の取得元を全てキャンセルする（切断時など）。"""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+    @staticmethod
+    async def _run(name: str, coro: Awaitable[str], deadline: float) -> SourceResult:
+        start = time.perf_counter()
+        try:
+            text = await asyncio.wait_for(coro, deadline)
+            status = "ok" if text else "empty"
+        except asyncio.TimeoutError:
+            text, status = "", "timeout"
+            logger.info("Context source '%s' exceeded %.1fs deadline", name, deadline)
+        except Exception as e:
+            text, status = "", "error"
+            logger.debug("Context source '%s' failed: %s", name, e)
+        elapsed_ms = int((time.perf_counter() - start) * 1000)
+        return SourceResult(name=name, text=text or "", elapsed_ms=elapsed_ms, status=status)
+
+
+def timings(results: dict[str, SourceResult]) -> dict[str, int]:
+    """取得元ごとの所要時間 (ms)。"""
+    return {name: r.elapsed_ms for name, r in results.items()}
+
+
+def skipped(results: dict[str, SourceResult]) -> list[str]:
+    """締め切り超過・エラーで捨てた取得元。"""
+    return [name for name, r in results.items() if r.skipped]
@@ -0,0 +1,446 @@
+"""コンテキストウィンドウ管理 — 会話履歴をモデルごとのトークン予算に収める
+
+毎ターン全履歴を送ると、長い会話ほどプロンプト処理が遅くなり、いずれ
+コンテキスト長を超える。ここでは:
+
+- 日本語を考慮した高速なトークン数推定（ASCII は約4文字/トークン、
+  かな・漢字などは1文字/トークンとして多めに見積もる）
+- モデルごとの予算内で新しいターンから順に履歴を詰める
+- 予算から溢れた古いターンはバックグラウンドで要約し、
+  conversation_summaries テーブルにローリング要約として保存する
+
+要約は次のターン以降、最初のユーザーメッセージの先頭に埋め込む
+（system ロールを無視するローカルモデルがあるため Mem0 注入と同じ方式）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from collections.abc import Awaitable, Callable
+
+from helix_studio.config import get_setting
+from helix_studio.db import db_pool
+from helix_studio.services.history_cache import history_cache
+
+logger = logging.getLogger(__name__)
+
+# プレフィックス一致でのコンテキスト長（上から順に判定）
+MODEL_CONTEXT_LIMITS: tuple[tuple[str, int], ...] = (
+    ("claude", 200_000),
+    ("gpt-4.1", 1_000_000),
+    ("gpt-4o", 128_000),
+    ("gpt-5", 400_000),
+    ("o1", 200_000),
+    ("o3", 200_000),
+    ("o4", 200_000),
+    ("gemini", 1_000_000),
+)
+
+# モデル名で判定できない場合のプロバイダ既定値。
+# Ollama は num_ctx 未指定だと 4096 で動き、超えた分は先頭から黙って切り捨てる。
+PROVIDER_CONTEXT_LIMITS: dict[str, int] = {
+    "claude": 200_000,
+    "openai": 128_000,
+    "claude_code": 200_000,
+    "codex": 200_000,
+    "gemini_cli": 1_000_000,
+    "openai_compat": 8_192,
+    "ollama": 4_096,
+}
+
+# 応答用に空けておく割合と上限
+OUTPUT_RESERVE_RATIO = 4
+OUTPUT_RESERVE_MAX = 4_096
+
+# 履歴に使う既定の上限（大きなコンテキストのモデルでも毎ターンの処理量を抑える）
+DEFAULT_HISTORY_BUDGET = 32_000
+
+# 1メッセージあたりのロール・区切り分のオーバーヘッド
+MESSAGE_OVERHEAD = 4
+
+# 要約を作るのに必要な最小トークン数と要約自体の上限
+SUMMARY_MIN_TOKENS = 512
+SUMMARY_MAX_TOKENS = 1_024
+
+TRUNCATION_MARKER = "\n\n...(truncated)...\n\n"
+
+SUMMARY_PROMPT = """You maintain a running summary of a long conversation between a user and an AI assistant.
+You MUST write the summary in the same language as the conversation.
+Merge the previous summary and the new turns into one updated summary.
+Keep facts, decisions, names, numbers, file paths, code identifiers and open questions.
+Drop greetings and small talk. Use concise bullet points, at most about 300 words.
+
+## Previous Summary
+{summary}
+
+## New Turns
+{turns}
+"""
+
+SUMMARY_HEADER = "[Summary of earlier conversation]"
+
+Summarizer = Callable[[str], Awaitable[str]]
+
+
+# ── トークン推定 ──────────────────────────────────────
+
+
+def estimate_tokens(text: str) -> int:
+    """テキストのトークン数を推定する（実トークナイザより多めに出る）。"""
+    if not text:
+        return 0
+    if text.isascii():
+        return (len(text) + 3) // 4
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def message_tokens(message: dict[str, str]) -> int:
+    """1メッセージ分のトークン数を推定する。"""
+    return estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD
+
+
+def context_limit(provider: str, model: str) -> int:
+    """モデルのコンテキスト長を返す。"""
+    name = model.lower().rsplit("/", 1)[-1]
+    for prefix, limit in MODEL_CONTEXT_LIMITS:
+        if name.startswith(prefix):
+            return limit
+    return PROVIDER_CONTEXT_LIMITS.get(provider, PROVIDER_CONTEXT_LIMITS["ollama"])
+
+
+def prompt_budget(provider: str, model: str) -> int:
+    """応答分を差し引いた、プロンプトに使えるトークン数。"""
+    limit = context_limit(provider, model)
+    return limit - min(limit // OUTPUT_RESERVE_RATIO, OUTPUT_RESERVE_MAX)
+
+
+async def history_budget(provider: str, model: str) -> int:
+    """履歴に使うトークン予算。context_budget_tokens 設定 (>0) で上書きできる。"""
+    try:
+        configured = int(await get_setting("context_budget_tokens") or 0)
+    except ValueError:
+        configured = 0
+    cap = configured if configured > 0 else DEFAULT_HISTORY_BUDGET
+    return min(prompt_budget(provider, model), cap)
+
+
+# ── テキストの切り詰め ────────────────────────────────
+
+
+def fit_text(text: str, max_tokens: int) -> str:
+    """予算を超えるテキストを先頭と末尾を残して切り詰める。"""
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    if max_tokens <= estimate_tokens(TRUNCATION_MARKER):
+        return ""
+    keep = int(len(text) * (max_tokens - estimate_tokens(TRUNCATION_MARKER)) / total)
+    while keep > 0:
+        head = keep // 2
+        fitted = text[:head] + TRUNCATION_MARKER + text[len(text) - (keep - head):]
+        if estimate_tokens(fitted) <= max_tokens:
+            return fitted
+        keep = keep * 9 // 10
+    return ""
+
+
+def fit_texts(texts: list[str], budget: int) -> list[str]:
+    """複数のテキストで予算を分け合う。短いものは丸ごと残し、余りを長いものに配る。"""
+    sizes = [estimate_tokens(t) for t in texts]
+    if sum(sizes) <= budget:
+        return list(texts)
+    alloc = [0] * len(texts)
+    remaining = max(budget, 0)
+    order = sorted(range(len(texts)), key=sizes.__getitem__)
+    for rank, i in enumerate(order):
+        alloc[i] = min(sizes[i], remaining // (len(texts) - rank))
+        remaining -= alloc[i]
+    return [
+        t if alloc[i] >= sizes[i] else fit_text(t, alloc[i])
+        for i, t in enumerate(texts)
+    ]
+
+
+def _cached_tokens(message: dict) -> int:
+    """キャッシュ上のメッセージはトークン数を覚えておき、毎ターン数え直さない。"""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = message["tokens"] = message_tokens(message)
+    return tokens
+
+
+def _budget_start(
+    messages: list[dict],
+    budget: int,
+    cost: Callable[[dict], int] = message_tokens,
+) -> int:
+    """新しい順に予算内へ詰めたときの先頭インデックス。最後の1件は必ず含める。"""
+    used = 0
+    start = len(messages)
+    while start > 0:
+        c = cost(messages[start - 1])
+        if start < len(messages) and used + c > budget:
+            break
+        used += c
+        start -= 1
+    return start
+
+
+def _align_to_user(messages: list[dict], start: int) -> int:
+    """先頭が user になるまで start を進める（最後の1件は残す）。"""
+    while start < len(messages) - 1 and messages[start]["role"] != "user":
+        start += 1
+    return start
+
+
+def trim_messages(messages: list[dict[str, str]], budget: int) -> list[dict[str, str]]:
+    """新しい順に予算内へ詰め、先頭が user になるよう揃える。最後の1件は必ず残す。"""
+    return messages[_align_to_user(messages, _budget_start(messages, budget)):]
+
+
+def _prepend_summary(messages: list[dict[str, str]], summary: str) -> None:
+    """要約を最初のユーザーメッセージの先頭に埋め込む。"""
+    for msg in messages:
+        if msg["role"] == "user":
+            msg["content"] = f"{SUMMARY_HEADER}\n{summary}\n\n---\n\n{msg['content']}"
+            return
+
+
+# ── 会話履歴の組み立て ────────────────────────────────
+
+
+class ContextManager:
+    """会話履歴をトークン予算内に収め、溢れた分をローリング要約する。"""
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.builds = 0
+        self.trimmed = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    async def build(
+        self,
+        conversation_id: str,
+        provider: str,
+        model: str,
+        system_prompt: str = "",
+        summarize: Summarizer | None = None,
+    ) -> list[dict[str, str]]:
+        """DBの会話履歴から、予算内に収まる LLM 用メッセージ列を組み立てる。
+
+        summarize を渡すと、予算から溢れた未要約のターンをバックグラウンドで要約する。
+        """
+        self.builds += 1
+        budget = await history_budget(provider, model) - estimate_tokens(system_prompt)
+
+        summary, covered_seq = await self._load_summary(conversation_id)
+        if summary:
+            budget -= estimate_tokens(summary) + MESSAGE_OVERHEAD
+
+        kept, truncated = await self._load_recent(conversation_id, covered_seq, budget)
+        if truncated:
+            self.trimmed += 1
+            if summarize is not None and await get_setting("context_summary") != "false":
+                self._schedule_summary(
+                    conversation_id, provider, model, summary, covered_seq,
+                    kept[0]["seq"], summarize,
+                )
+
+        messages = [{"role": m["role"], "content": m["content"]} for m in kept]
+        if summary:
+            _prepend_summary(messages, summary)
+        return messages
+
+    async def fit(
+        self,
+        messages: list[dict[str, str]],
+        provider: str,
+        model: str,
+        system_prompt: str = "",
+    ) -> list[dict[str, str]]:
+        """クライアントから渡された履歴を予算内に切り詰める（要約はしない）。"""
+        budget = await history_budget(provider, model) - estimate_tokens(system_prompt)
+        fitted = trim_messages(messages, budget)
+        if len(fitted) < len(messages):
+            self.trimmed += 1
+        return fitted
+
+    async def _load_summary(self, conversation_id: str) -> tuple[str, int]:
+        async with db_pool.read() as db:
+            cursor = await db.execute(
+                "SELECT summary, covered_seq FROM conversation_summaries "
+                "WHERE conversation_id = ?",
+                (conversation_id,),
+            )
+            row = await cursor.fetchone()
+        if row is None:
+            return "", 0
+        return row["summary"], row["covered_seq"]
+
+    async def _load_recent(
+        self, conversation_id: str, after_seq: int, budget: int,
+    ) -> tuple[list[dict], bool]:
+        """要約済み以降のメッセージを予算まで集める。キャッシュで足りなければ DB を読む。"""
+        cached = history_cache.get(conversation_id, after_seq)
+        if cached is not None:
+            messages, complete = cached
+            start = _budget_start(messages, budget, _cached_tokens)
+            if start > 0 or complete:
+                return self._align(messages, start)
+
+        rows, exhausted = await self._read_recent(conversation_id, after_seq, budget)
+        floor_seq = after_seq if exhausted or not rows else rows[0]["seq"] - 1
+        history_cache.put(conversation_id, floor_seq, rows)
+        return self._align(rows, _budget_start(rows, budget, _cached_tokens))
+
+    @staticmethod
+    def _align(messages: list[dict], start: int) -> tuple[list[dict], bool]:
+        aligned = _align_to_user(messages, start)
+        return messages[aligned:], aligned > 0
+
+    async def _read_recent(
+        self, conversation_id: str, after_seq: int, budget: int,
+    ) -> tuple[list[dict], bool]:
+        """DB から新しい順に、予算を1件超えるところまで読む。全件は読まない。
+
+        返り値は時系列順のメッセージと、after_seq まで読み切ったかどうか。
+        """
+        rows: list[dict] = []
+        used = 0
+        exhausted = True
+        history_cache.begin_load(conversation_id)
+        async with db_pool.read() as db:
+            cursor = await db.execute(
+                "SELECT rowid AS seq, role, content FROM messages "
+                "WHERE conversation_id = ? AND rowid > ? "
+                "ORDER BY created_at DESC, rowid DESC",
+                (conversation_id, after_seq),
+            )
+            try:
+                while exhausted:
+                    batch = await cursor.fetchmany(64)
+                    if not batch:
+                        break
+                    for row in batch:
+                        msg = dict(row)
+                        rows.append(msg)
+                        used += _cached_tokens(msg)
+                        if used > budget and len(rows) > 1:
+                            exhausted = False
+                            break
+            finally:
+                await cursor.close()
+        rows.reverse()
+        return rows, exhausted
+
+    def _schedule_summary(
+        self,
+        conversation_id: str,
+        provider: str,
+        model: str,
+        summary: str,
+        covered_seq: int,
+        boundary_seq: int,
+        summarize: Summarizer,
+    ) -> None:
+        """要約タスクを起動する。同じ会話で実行中なら何もしない。"""
+        task = self._tasks.get(conversation_id)
+        if task is not None and not task.done():
+            return
+        task = asyncio.create_task(self._summarize(
+            conversation_id, provider, model, summary, covered_seq,
+            boundary_seq, summarize,
+        ))
+        self._tasks[conversation_id] = task
+        task.add_done_callback(functools.partial(self._forget, conversation_id))
+
+    def _forget(self, conversation_id: str, task: asyncio.Task) -> None:
+        if self._tasks.get(conversation_id) is task:
+            del self._tasks[conversation_id]
+
+    async def _summarize(
+        self,
+        conversation_id: str,
+        provider: str,
+        model: str,
+        summary: str,
+        covered_seq: int,
+        boundary_seq: int,
+        summarize: Summarizer,
+    ) -> None:
+        """covered_seq < seq < boundary_seq のターンを既存の要約に畳み込む。"""
+        try:
+            async with db_pool.read() as db:
+                cursor = await db.execute(
+                    "SELECT rowid AS seq, role, content FROM messages "
+                    "WHERE conversation_id = ? AND rowid > ? AND rowid < ? "
+                    "ORDER BY created_at, rowid",
+                    (conversation_id, covered_seq, boundary_seq),
+                )
+                rows = await cursor.fetchall()
+            if not rows:
+                return
+            turns = "\n\n".join(f"{r['role']}: {r['content']}" for r in rows)
+            if estimate_tokens(turns) < SUMMARY_MIN_TOKENS:
+                return
+
+            room = (
+                prompt_budget(provider, model) - SUMMARY_MAX_TOKENS
+                - estimate_tokens(SUMMARY_PROMPT) - estimate_tokens(summary)
+            )
+            prompt = SUMMARY_PROMPT.format(
+                summary=summary or "(none)",
+                turns=fit_text(turns, max(room, SUMMARY_MIN_TOKENS)),
+            )
+            new_summary = fit_text((await summarize(prompt)).strip(), SUMMARY_MAX_TOKENS)
+            if not new_summary:
+                return
+
+            async with db_pool.write() as db:
+                await db.execute(
+                    """INSERT INTO conversation_summaries
+                           (conversation_id, summary, covered_seq, updated_at)
+                       VALUES (?, ?, ?, datetime('now'))
+                       ON CONFLICT(conversation_id) DO UPDATE SET
+                           summary = excluded.summary,
+                           covered_seq = excluded.covered_seq,
+                           updated_at = excluded.updated_at
+                       WHERE excluded.covered_seq > conversation_summaries.covered_seq""",
+                    (conversation_id, new_summary, rows[-1]["seq"]),
+                )
+            self.summaries += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.summary_failures += 1
+            logger.warning("Conversation summary failed (%s): %s", conversation_id, e)
+
+    async def wait_idle(self) -> None:
+        """実行中の要約タスクが全て終わるまで待つ。"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    async def stop(self) -> None:
+        """実行中の要約タスクをキャンセルする（シャットダウン用）。"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "builds": self.builds,
+            "trimmed": self.trimmed,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+            "pending_summaries": len(self._tasks),
+        }
+
+
+# グローバルインスタンス
+context_manager = ContextManager()
@@ -20,7 +20,8 @@ import time
 from dataclasses import dataclass, field
 from typing import Any, Callable, Optional
 
-import httpx
+from helix_studio.services.backend_pool import backend_pool
+from helix_studio.services.http_pool import http_pool
 
 logger = logging.getLogger(__name__)
 
@@ -143,19 +144,19 @@ def estimate_model_size(model_name: str) -> float:
 async def get_vram_status(ollama_url: str) -> dict:
     """現在のOllama VRAM使用状況を取得"""
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(f"{ollama_url}/api/ps")
-            resp.raise_for_status()
-            data = resp.json()
-            loaded = {}
-            for m in data.get("models", []):
-                name = m.get("name", "unknown")
-                size_gb = m.get("size_vram", m.get("size", 0)) / (1024**3)
-                loaded[name] = round(size_gb, 1)
-            return {
-                "loaded_models": loaded,
-                "total_vram_used_gb": round(sum(loaded.values()), 1),
-            }
+        client = http_pool.client("ollama")
+        resp = await client.get(f"{ollama_url}/api/ps", timeout=5.0)
+        resp.raise_for_status()
+        data = resp.json()
+        loaded = {}
+        for m in data.get("models", []):
+            name = m.get("name", "unknown")
+            size_gb = m.get("size_vram", m.get("size", 0)) / (1024**3)
+            loaded[name] = round(size_gb, 1)
+        return {
+            "loaded_models": loaded,
+            "total_vram_used_gb": round(sum(loaded.values()), 1),
+        }
     except Exception as e:
         logger.debug("VRAM状況取得失敗: %s", e)
         return {"loaded_models": {}, "total_vram_used_gb": 0}
@@ -242,15 +243,22 @@ async def _ollama_chat(
     model: str,
     messages: list[dict[str, str]],
 ) -> str:
-    """Ollama API で同期的にチャット（ストリーミングなし）"""
-    async with httpx.AsyncClient(timeout=300.0) as client:
+    """Ollama API で同期的にチャット（ストリーミングなし）
+
+    ollama_url は主ノードで、追加ノードがあれば backend_pool が振り分ける。
+    """
+    async def request(node_url: str) -> str:
+        client = http_pool.client("ollama")
         resp = await client.post(
-            f"{ollama_url}/api/chat",
+            f"{node_url}/api/chat",
             json={"model": model, "messages": messages, "stream": False},
+            timeout=300.0,
         )
         resp.raise_for_status()
         return resp.json().get("message", {}).get("content", "")
 
+    return await backend_pool.call("ollama", model, request, primary=ollama_url)
+
 
 async def run_crew(
     ollama_url: str,
@@ -313,10 +321,20 @@ async def run_crew(
 
     steps: list[dict] = []
     accumulated_context = f"## タスク\n{task_description}\n\n"
+    group_models = list(model_groups)
+    vram_total = await get_effective_vram_total() if len(group_models) > 1 else 0.0
 
-    for model_name, group_agents in model_groups.items():
+    for index, (model_name, group_agents) in enumerate(model_groups.items()):
         model_size = estimate_model_size(model_name)
 
+        # 次のグループのモデルが今のモデルと同時に VRAM に載るなら、このグループの実行中に先読みする
+        if index + 1 < len(group_models):
+            next_model = group_models[index + 1]
+            budget = VRAMBudget(total_gb=vram_total)
+            budget.register(model_name, model_size)
+            if budget.can_load(next_model, estimate_model_size(next_model)):
+                await backend_pool.prefetch(next_model, primary=ollama_url)
+
         if progress_callback:
             await _safe_callback(progress_callback, {
                 "step": "model_load",
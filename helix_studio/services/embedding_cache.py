@@ -0,0 +1,395 @@
+"""埋め込みキャッシュ — (モデル, sha256(テキスト)) → ベクトルをローカルディスクに保持する
+
+rag._embed・mem0._embed は同じ文書の再アップロード、繰り返しの検索クエリ、
+1ターンで Mem0 と RAG が同じユーザーメッセージを埋め込む場合も毎回 Ollama を呼んでいた。
+
+保存形式（data/embedding_cache/ 以下）:
+- index.sqlite3 … (model, digest) → (次元数, スロット番号, 最終利用時刻) の索引
+- vectors-{次元数}.f16 … 次元数ごとの固定長スロットを並べたファイル。mmap して
+  struct の 'e'（float16）で読み書きする。4096 次元で1件 8KB
+
+float16 に丸めてもコサイン類似度の誤差は 1e-3 程度で、検索順位にはほぼ影響しない。
+
+ベクトルの合計サイズが max_bytes を超えたら、最終利用時刻の古いものから追い出し、
+空いたスロットを再利用する（ファイルは最大使用量までしか伸びない）。
+直近に使った hot_entries 件はデコード済みのリストをメモリに置き、SQLite も引かない。
+
+SQLite と mmap の読み書きは asyncio.to_thread でワーカースレッドに回し、イベントループを
+止めない（スレッド間は _lock で直列にする）。hot tier はイベントループ側だけで触る。
+最終利用時刻はディスクから読んだときに更新するが、読むたびに commit しないよう
+メモリに溜めておき、TOUCH_FLUSH_ENTRIES 件または TOUCH_FLUSH_SEC 秒ごと・
+追い出しの前・close のときにまとめて書く。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import mmap
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+
+from helix_studio import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024**2
+DEFAULT_HOT_ENTRIES = 256
+# ファイルを伸ばすときの単位（スロット数）
+GROW_SLOTS = 256
+# 溜めた最終利用時刻を書き出す件数・間隔
+TOUCH_FLUSH_ENTRIES = 256
+TOUCH_FLUSH_SEC = 30.0
+_HALF = 2  # float16 のバイト数
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    model     TEXT    NOT NULL,
+    digest    BLOB    NOT NULL,
+    dim       INTEGER NOT NULL,
+    slot      INTEGER NOT NULL,
+    last_used REAL    NOT NULL,
+    PRIMARY KEY (model, digest)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+-- 次元数ごとに、まだ使ったことのない最初のスロット
+CREATE TABLE IF NOT EXISTS slot_heads (
+    dim       INTEGER PRIMARY KEY,
+    next_slot INTEGER NOT NULL
+);
+-- 追い出しで空いたスロット
+CREATE TABLE IF NOT EXISTS free_slots (
+    dim  INTEGER NOT NULL,
+    slot INTEGER NOT NULL,
+    PRIMARY KEY (dim, slot)
+) WITHOUT ROWID;
+"""
+
+Vector = list[float]
+
+
+def digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class _VectorFile:
+    """1つの次元数ぶんのスロットファイル。"""
+
+    def __init__(self, path: Path, dim: int):
+        self.dim = dim
+        self.slot_bytes = dim * _HALF
+        self._format = struct.Struct(f"<{dim}e")
+        self._file = open(path, "a+b")
+        self._map: mmap.mmap | None = None
+        self._remap()
+
+    @property
+    def capacity(self) -> int:
+        return len(self._map) // self.slot_bytes if self._map is not None else 0
+
+    def read(self, slot: int) -> Vector:
+        return list(self._format.unpack_from(self._map, slot * self.slot_bytes))
+
+    def write(self, slot: int, vector: Sequence[float]) -> None:
+        if slot >= self.capacity:
+            self._file.truncate((slot + GROW_SLOTS) * self.slot_bytes)
+            self._remap()
+        self._format.pack_into(self._map, slot * self.slot_bytes, *vector)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _remap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.seek(0, 2)
+        if self._file.tell():
+            self._map = mmap.mmap(self._file.fileno(), 0)
+
+
+class EmbeddingCache:
+    """ディスク上の埋め込みキャッシュ。最初の利用時に開く。"""
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        hot_entries: int = DEFAULT_HOT_ENTRIES,
+    ):
+        self._path = path
+        self.max_bytes = max_bytes
+        self.hot_entries = hot_entries
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._files: dict[int, _VectorFile] = {}
+        self._hot: OrderedDict[tuple[str, bytes], Vector] = OrderedDict()
+        # まだ書いていない最終利用時刻
+        self._touched: dict[tuple[str, bytes], float] = {}
+        self._touched_at = time.monotonic()
+        self._entries = 0
+        self._used_bytes = 0
+        self.hot_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.skipped = 0
+
+    @property
+    def path(self) -> Path:
+        return self._path or db.DB_PATH.parent / "embedding_cache"
+
+    # ── 読み書き ──
+
+    async def get(self, model: str, text: str) -> Vector | None:
+        return (await self.get_many(model, [text]))[0]
+
+    async def get_many(self, model: str, texts: Sequence[str]) -> list[Vector | None]:
+        """テキストごとのキャッシュ済みベクトル（なければ None）。"""
+        results: list[Vector | None] = [None] * len(texts)
+        cold: dict[bytes, list[int]] = {}
+        for i, text in enumerate(texts):
+            key = (model, digest(text))
+            vector = self._hot.get(key)
+            if vector is not None:
+                self._hot.move_to_end(key)
+                self.hot_hits += 1
+                results[i] = vector
+            else:
+                cold.setdefault(key[1], []).append(i)
+        if not cold:
+            return results
+
+        found = await asyncio.to_thread(self._read, model, list(cold))
+        for key_digest, vector in found.items():
+            self._remember((model, key_digest), vector)
+            for i in cold.pop(key_digest):
+                results[i] = vector
+                self.disk_hits += 1
+        self.misses += sum(len(indices) for indices in cold.values())
+        return results
+
+    async def put(self, model: str, text: str, vector: Sequence[float]) -> None:
+        await self.put_many(model, [text], [vector])
+
+    async def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """ベクトルを保存する。float16 に収まらない値を含むものは保存しない。"""
+        items = [(digest(text), list(vector)) for text, vector in zip(texts, vectors) if vector]
+        for key_digest, vector in await asyncio.to_thread(self._write, model, items):
+            self._remember((model, key_digest), vector)
+
+    # ── 管理 ──
+
+    async def clear(self) -> None:
+        """全エントリを削除し、ファイルも消す。"""
+        await self.close()
+        await asyncio.to_thread(self._unlink_all)
+
+    async def close(self) -> None:
+        """溜めた最終利用時刻を書き出して閉じる（ワーカースレッドで、実行中の読み書きを待つ）。"""
+        await asyncio.to_thread(self._close)
+        self._hot.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hot_hits + self.disk_hits + self.misses
+        return {
+            "path": str(self.path),
+            "entries": self._entries,
+            "bytes": self._used_bytes,
+            "max_bytes": self.max_bytes,
+            "hot_entries": len(self._hot),
+            "hot_hits": self.hot_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hot_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "skipped": self.skipped,
+            "pending_touches": len(self._touched),
+        }
+
+    # ── 内部（ワーカースレッドで _lock を取って動く） ──
+
+    def _read(self, model: str, digests: list[bytes]) -> dict[bytes, Vector]:
+        with self._lock:
+            conn = self._open()
+            found = []
+            for chunk in _chunks(digests, 500):
+                found.extend(conn.execute(
+                    f"SELECT digest, dim, slot FROM entries WHERE model = ? AND digest IN ({','.join('?' * len(chunk))})",
+                    (model, *chunk),
+                ).fetchall())
+            vectors: dict[bytes, Vector] = {}
+            released = False
+            now = time.time()
+            for key_digest, dim, slot in found:
+                try:
+                    vectors[key_digest] = self._file(dim).read(slot)
+                except (TypeError, ValueError, struct.error):
+                    # ベクトルファイルが消えた・切り詰められた場合は索引から外す
+                    self._release(conn, model, key_digest, dim, slot)
+                    released = True
+                    continue
+                self._touched[(model, key_digest)] = now
+            if (
+                released
+                or len(self._touched) >= TOUCH_FLUSH_ENTRIES
+                or time.monotonic() - self._touched_at >= TOUCH_FLUSH_SEC
+            ):
+                self._flush_touched(conn)
+                conn.commit()
+            return vectors
+
+    def _write(self, model: str, items: list[tuple[bytes, Vector]]) -> list[tuple[bytes, Vector]]:
+        """保存できた (digest, ベクトル) を返す。"""
+        stored = []
+        with self._lock:
+            conn = self._open()
+            # 追い出しの順番に直近の読み出しを反映する
+            self._flush_touched(conn)
+            now = time.time()
+            for key_digest, vector in items:
+                key = (model, key_digest)
+                dim = len(vector)
+                row = conn.execute(
+                    "SELECT dim, slot FROM entries WHERE model = ? AND digest = ?", key,
+                ).fetchone()
+                reused = row is not None and row[0] == dim
+                if reused:
+                    slot = row[1]
+                else:
+                    if row is not None:
+                        self._release(conn, *key, *row)
+                    self._evict(conn, dim * _HALF)
+                    slot = self._allocate(conn, dim)
+                try:
+                    self._file(dim).write(slot, vector)
+                except (OverflowError, struct.error):
+                    self.skipped += 1
+                    if reused:
+                        self._release(conn, *key, dim, slot)
+                    else:
+                        conn.execute("INSERT OR IGNORE INTO free_slots (dim, slot) VALUES (?, ?)", (dim, slot))
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (model, digest, dim, slot, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (*key, dim, slot, now),
+                )
+                if not reused:
+                    self._entries += 1
+                    self._used_bytes += dim * _HALF
+                self.writes += 1
+                stored.append((key_digest, vector))
+            conn.commit()
+        return stored
+
+    def _close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._flush_touched(self._conn)
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning("Embedding cache last_used flush failed: %s", e)
+                self._conn.close()
+                self._conn = None
+            for file in self._files.values():
+                file.close()
+            self._files.clear()
+            self._touched.clear()
+
+    def _unlink_all(self) -> None:
+        with self._lock:
+            for file in self.path.glob("*"):
+                file.unlink()
+
+    def _open(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            # ワーカースレッドは呼び出しごとに変わる（_lock で直列にしている）
+            conn = sqlite3.connect(self.path / "index.sqlite3", check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._entries, dims = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(dim), 0) FROM entries",
+            ).fetchone()
+            self._used_bytes = dims * _HALF
+            self._conn = conn
+        return self._conn
+
+    def _flush_touched(self, conn: sqlite3.Connection) -> None:
+        if self._touched:
+            conn.executemany(
+                "UPDATE entries SET last_used = ? WHERE model = ? AND digest = ?",
+                [(t, model, key_digest) for (model, key_digest), t in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def _file(self, dim: int) -> _VectorFile:
+        file = self._files.get(dim)
+        if file is None:
+            file = self._files[dim] = _VectorFile(self.path / f"vectors-{dim}.f16", dim)
+        return file
+
+    def _remember(self, key: tuple[str, bytes], vector: Vector) -> None:
+        if self.hot_entries <= 0:
+            return
+        self._hot[key] = vector
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_entries:
+            self._hot.popitem(last=False)
+
+    def _allocate(self, conn: sqlite3.Connection, dim: int) -> int:
+        row = conn.execute("SELECT slot FROM free_slots WHERE dim = ? LIMIT 1", (dim,)).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM free_slots WHERE dim = ? AND slot = ?", (dim, row[0]))
+            return row[0]
+        row = conn.execute("SELECT next_slot FROM slot_heads WHERE dim = ?", (dim,)).fetchone()
+        slot = row[0] if row is not None else 0
+        conn.execute(
+            "INSERT OR REPLACE INTO slot_heads (dim, next_slot) VALUES (?, ?)", (dim, slot + 1),
+        )
+        return slot
+
+    def _release(self, conn: sqlite3.Connection, model: str, key_digest: bytes, dim: int, slot: int) -> None:
+        # hot tier はイベントループ側で持つので、ここでは外さない（中身は同じテキストのベクトルのまま）
+        conn.execute("DELETE FROM entries WHERE model = ? AND digest = ?", (model, key_digest))
+        conn.execute("INSERT OR IGNORE INTO free_slots (dim, slot) VALUES (?, ?)", (dim, slot))
+        self._touched.pop((model, key_digest), None)
+        self._entries -= 1
+        self._used_bytes -= dim * _HALF
+
+    def _evict(self, conn: sqlite3.Connection, incoming: int) -> None:
+        """incoming バイトを追加しても max_bytes に収まるまで、古いエントリを追い出す。"""
+        while self._used_bytes + incoming > self.max_bytes:
+            rows = conn.execute(
+                "SELECT model, digest, dim, slot FROM entries ORDER BY last_used LIMIT 64",
+            ).fetchall()
+            if not rows:
+                return
+            for model, key_digest, dim, slot in rows:
+                self._release(conn, model, key_digest, dim, slot)
+                self.evictions += 1
+                if self._used_bytes + incoming <= self.max_bytes:
+                    break
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# グローバルインスタンス（lifespan 終了時に close）
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,342 @@
+"""埋め込み生成 — Ollama /api/embed をまとめて・並行に呼ぶ
+
+rag.ingest_text はチャンクを1つずつ埋め込み、チャンク数ぶん Ollama との往復を
+順番に待っていた。/api/embed は input にリストを受け付けるので、チャンクをまとめて送る。
+
+- バッチは件数（batch_size）と本文のバイト数（max_bytes）の両方で区切る。
+  長いチャンクが続くと1リクエストあたりの件数が自動的に減る
+- バッチは concurrency 件まで並行に送る
+- 特定の入力のせいで失敗したバッチ（4xx・件数の不一致）は半分に分けて送り直し、失敗した側だけを
+  さらに分ける。1件だけでも失敗したテキストは None になり、他のテキストの結果は捨てない
+- 接続できない・タイムアウト・5xx は分けても同じく失敗するので、送り直さずにバッチ全体を None にする
+  （以前は Ollama が止まっていると 600 チャンクに 1,181 リクエストを送っていた）
+- iter_embeddings は完了したバッチから順に返すので、呼び出し側は全件を待たずに保存を始められる
+
+cache（services/embedding_cache.py）を渡すと、キャッシュ済みのテキストは送らず、
+埋め込んだ結果を保存する。
+
+embed は1件用（rag.search・mem0 の検索クエリ）。同時に多くのユーザーがチャットすると
+1ターンごとに /api/embed を呼んでいたので、window 秒のあいだに届いた
+テキストを (URL, モデル) ごとにまとめて1回のバッチで送り、Future で各呼び出し側に返す。
+同じテキストは1件にまとめ、送信中のテキストを後から頼んだ呼び出しも同じ Future を待つ。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import logging
+import sqlite3
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+import httpx
+
+from helix_studio.services.embedding_cache import EmbeddingCache, embedding_cache
+from helix_studio.services.http_pool import http_pool
+from helix_studio.services.residency import residency
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_BYTES = 64 * 1024
+DEFAULT_CONCURRENCY = 4
+# embed の呼び出しをまとめる待ち時間
+DEFAULT_WINDOW_SEC = 0.005
+
+# まとめて送ると1リクエストの処理時間が長くなる
+_TIMEOUT = httpx.Timeout(connect=5.0, read=120.0, write=30.0, pool=30.0)
+
+Vector = list[float]
+
+
+def plan_batches(
+    texts: Sequence[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> list[list[int]]:
+    """テキストのインデックスを、件数とバイト数の上限内のバッチに分ける。
+
+    max_bytes を超える1件だけのテキストは単独のバッチにする。
+    """
+    batches: list[list[int]] = []
+    current: list[int] = []
+    size = 0
+    for i, text in enumerate(texts):
+        n = len(text.encode("utf-8"))
+        if current and (len(current) >= batch_size or size + n > max_bytes):
+            batches.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _is_input_error(error: Exception) -> bool:
+    """特定の入力のせいで失敗したか（分けて送り直せば他の入力は通る見込みがあるか）。"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        # 408・429 は混雑など入力と関係のない失敗
+        return 400 <= status < 500 and status not in (408, 429)
+    return isinstance(error, ValueError)
+
+
+class _Histogram:
+    """上限値ごとの件数（最後の上限を超えたものは "{上限}+" に数える）。"""
+
+    def __init__(self, bounds: Sequence[int] = (1, 2, 4, 8, 16, 32)):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+
+    def observe(self, value: int) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+
+    def stats(self) -> dict[str, int]:
+        labels = [f"<={b}" for b in self.bounds] + [f"{self.bounds[-1]}+"]
+        return dict(zip(labels, self.counts))
+
+
+class Embedder:
+    """Ollama の埋め込み API をバッチで呼び、統計を取る。"""
+
+    def __init__(
+        self,
+        cache: EmbeddingCache | None = None,
+        window: float = DEFAULT_WINDOW_SEC,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        self.cache = cache
+        self.window = window
+        self.batch_size = batch_size
+        # (モデル, テキスト) → 送信待ち・送信中の1件の埋め込み
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        # (URL, モデル) → まだ送っていないテキストと、その結果を待つ Future
+        self._queues: dict[tuple[str, str], dict[str, asyncio.Future]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.queue_depth = _Histogram()
+        self.batch_sizes = _Histogram()
+        self.coalesced_batches = 0
+        self.shared = 0
+        self.requests = 0
+        self.texts = 0
+        self.bytes_sent = 0
+        self.retries = 0
+        self.failures = 0
+
+    async def embed_batch(self, url: str, model: str, texts: list[str]) -> list[Vector]:
+        """1リクエストでテキストのリストを埋め込む。件数が合わなければ ValueError。"""
+        payload: dict[str, Any] = {"model": model, "input": texts}
+        keep_alive = await residency.keep_alive_for(model)
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        self.requests += 1
+        self.texts += len(texts)
+        self.bytes_sent += sum(len(t.encode("utf-8")) for t in texts)
+        resp = await http_pool.client("ollama").post(
+            f"{url.rstrip('/')}/api/embed", json=payload, timeout=_TIMEOUT,
+        )
+        resp.raise_for_status()
+        embeddings = resp.json().get("embeddings") or []
+        if len(embeddings) != len(texts) or not all(embeddings):
+            raise ValueError(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+        return embeddings
+
+    async def embed(self, url: str, model: str, text: str) -> Vector | None:
+        """1件を埋め込む。失敗は None。
+
+        キャッシュ → 同じテキストの送信待ち・送信中の Future → 次のまとめ送信 の順に探す。
+        """
+        vector = (await self._lookup(model, [text]))[0]
+        if vector is not None:
+            return vector
+        future = self._inflight.get((model, text))
+        if future is None:
+            future = self._enqueue(url, model, text)
+        else:
+            self.shared += 1
+        # 一方の呼び出し側がキャンセルされても、他の呼び出し側のための埋め込みは続ける
+        return await asyncio.shield(future)
+
+    async def iter_embeddings(
+        self,
+        texts: Sequence[str],
+        url: str,
+        model: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ) -> AsyncIterator[tuple[list[int], list[Vector | None]]]:
+        """完了したバッチから順に (インデックス, ベクトル) を返す。失敗したテキストは None。
+
+        キャッシュ済みのテキストは最初にまとめて返す。
+        """
+        cached = await self._lookup(model, texts)
+        hits = [i for i, vector in enumerate(cached) if vector is not None]
+        if hits:
+            yield hits, [cached[i] for i in hits]
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [
+            asyncio.create_task(self._embed_with_retry(
+                url, model, texts, [missing[j] for j in batch], semaphore,
+            ))
+            for batch in plan_batches([texts[i] for i in missing], batch_size, max_bytes)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 呼び出し側が途中でやめたら、残りのバッチは送らない
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def embed_many(
+        self,
+        texts: Sequence[str],
+        url: str,
+        model: str,
+        **options: int,
+    ) -> list[Vector | None]:
+        """全テキストを埋め込み、入力と同じ順で返す。"""
+        vectors: list[Vector | None] = [None] * len(texts)
+        async for indices, batch in self.iter_embeddings(texts, url, model, **options):
+            for i, vector in zip(indices, batch):
+                vectors[i] = vector
+        return vectors
+
+    async def stop(self) -> None:
+        """まとめ送信を止め、結果を待っている呼び出し側には None を返す（lifespan 終了時）。
+
+        window 待ちの間に止めたキューは送られないので、その Future もここで解決する。
+        """
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        futures = [f for queue in self._queues.values() for f in queue.values()]
+        futures.extend(self._inflight.values())
+        for future in futures:
+            if not future.done():
+                future.set_result(None)
+        self._queues.clear()
+        self._inflight.clear()
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "queue_depth": self.queue_depth.stats(),
+            "coalesced_batches": self.coalesced_batches,
+            "batch_sizes": self.batch_sizes.stats(),
+            "shared": self.shared,
+            "requests": self.requests,
+            "texts": self.texts,
+            "bytes_sent": self.bytes_sent,
+            "avg_batch": round(self.texts / self.requests, 1) if self.requests else 0.0,
+            "retries": self.retries,
+            "failures": self.failures,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    def _enqueue(self, url: str, model: str, text: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[(model, text)] = future
+        key = (url, model)
+        queue = self._queues.setdefault(key, {})
+        queue[text] = future
+        self.queue_depth.observe(len(queue))
+        if len(queue) >= self.batch_size:
+            # 1バッチぶん溜まったら待たずに送る
+            del self._queues[key]
+            self._spawn(self._send_queued(url, model, queue))
+        elif len(queue) == 1:
+            self._spawn(self._send_after_window(url, model, queue))
+        return future
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send_after_window(self, url: str, model: str, queue: dict[str, asyncio.Future]) -> None:
+        await asyncio.sleep(self.window)
+        # 上限に達して先に送られていれば何もしない
+        if self._queues.get((url, model)) is queue:
+            del self._queues[(url, model)]
+            await self._send_queued(url, model, queue)
+
+    async def _send_queued(self, url: str, model: str, queue: dict[str, asyncio.Future]) -> None:
+        texts = list(queue)
+        self.coalesced_batches += 1
+        self.batch_sizes.observe(len(texts))
+        vectors: list[Vector | None] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(DEFAULT_CONCURRENCY)
+        try:
+            for indices, batch in await asyncio.gather(*(
+                self._embed_with_retry(url, model, texts, batch, semaphore)
+                for batch in plan_batches(texts, self.batch_size)
+            )):
+                for i, vector in zip(indices, batch):
+                    vectors[i] = vector
+        finally:
+            # 失敗・キャンセルでも待っている呼び出し側を必ず起こす
+            for text, vector in zip(texts, vectors):
+                self._inflight.pop((model, text), None)
+                if not queue[text].done():
+                    queue[text].set_result(vector)
+
+    async def _lookup(self, model: str, texts: Sequence[str]) -> list[Vector | None]:
+        if self.cache is not None:
+            try:
+                return await self.cache.get_many(model, texts)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning("Embedding cache read failed: %s", e)
+        return [None] * len(texts)
+
+    async def _store(self, model: str, texts: Sequence[str], vectors: Sequence[Vector]) -> None:
+        # キャッシュに書けなくても埋め込み自体は成功として扱う
+        if self.cache is not None:
+            try:
+                await self.cache.put_many(model, texts, vectors)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning("Embedding cache write failed: %s", e)
+
+    async def _embed_with_retry(
+        self,
+        url: str,
+        model: str,
+        texts: Sequence[str],
+        indices: list[int],
+        semaphore: asyncio.Semaphore,
+    ) -> tuple[list[int], list[Vector | None]]:
+        batch = [texts[i] for i in indices]
+        async with semaphore:
+            try:
+                vectors = await self.embed_batch(url, model, batch)
+            except Exception as e:
+                error = e
+            else:
+                await self._store(model, batch, vectors)
+                return indices, vectors
+        if len(indices) == 1:
+            self.failures += 1
+            logger.debug("Embedding failed (chunk %d): %s", indices[0], error)
+            return indices, [None]
+        if not _is_input_error(error):
+            self.failures += len(indices)
+            logger.warning("Embedding batch of %d failed: %s", len(indices), error)
+            return indices, [None] * len(indices)
+        # 半分ずつ送り直す（並行枠は分割後のバッチで取り直す）
+        self.retries += 1
+        mid = len(indices) // 2
+        (left, left_vectors), (right, right_vectors) = await asyncio.gather(
+            self._embed_with_retry(url, model, texts, indices[:mid], semaphore),
+            self._embed_with_retry(url, model, texts, indices[mid:], semaphore),
+        )
+        return left + right, left_vectors + right_vectors
+
+
+# グローバルインスタンス
+embedder = Embedder(cache=embedding_cache)
@@ -0,0 +1,67 @@
+"""JSON シリアライズ層 — orjson があれば使い、なければ標準ライブラリで同じ結果を返す
+
+ストリーミングの内側のループ（上流の NDJSON / SSE 行のデコード、WebSocket フレームの
+エンコード）はトークンごとに回るので、ここだけ orjson（任意依存: pip install .[fast]）を使う。
+
+出力は orjson に合わせて区切りの空白なし・非 ASCII はそのまま（ensure_ascii=False）。
+デコード失敗は orjson・標準ライブラリとも json.JSONDecodeError（ValueError のサブクラス）。
+
+iter_line_batches は httpx の aiter_bytes() をバイト列のまま改行で分割する。
+aiter_lines() のように全体を str にデコードしてから分割せず、ネットワークから届いた
+まとまりごとに行のリストを返すので、行ごとの非同期イテレーションも発生しない。
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import AsyncIterable, AsyncIterator
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson は任意依存
+    orjson = None
+
+ORJSON_AVAILABLE = orjson is not None
+BACKEND = "orjson" if ORJSON_AVAILABLE else "json"
+
+JSONDecodeError = json.JSONDecodeError
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj: Any) -> str:
+        """WebSocket のテキストフレーム用に str で返す。"""
+        return orjson.dumps(obj).decode("utf-8")
+
+    dumps_bytes = orjson.dumps
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    _decoder = json.JSONDecoder()
+
+    def loads(data: bytes | bytearray | str) -> Any:
+        if not isinstance(data, str):
+            data = data.decode("utf-8")
+        return _decoder.decode(data)
+
+    def dumps(obj: Any) -> str:
+        """WebSocket のテキストフレーム用に str で返す。"""
+        return _encoder.encode(obj)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return _encoder.encode(obj).encode("utf-8")
+
+
+async def iter_line_batches(chunks: AsyncIterable[bytes]) -> AsyncIterator[list[bytes]]:
+    """バイト列のストリームを改行で分割し、届いたまとまりごとに空でない行のリストを返す。"""
+    pending = b""
+    async for data in chunks:
+        if pending:
+            data = pending + data
+        lines = data.split(b"\n")
+        pending = lines.pop()
+        batch = [line.rstrip(b"\r") for line in lines if line and line != b"\r"]
+        if batch:
+            yield batch
+    if pending.strip():
+        yield [pending.rstrip(b"\r")]
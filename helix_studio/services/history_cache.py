@@ -0,0 +1,165 @@
+"""会話履歴キャッシュ — アクティブな会話のメッセージをメモリに保持する
+
+WebSocket チャットは毎ターン、ユーザーメッセージ保存の直後に同じ会話の履歴を
+読み直す。会話ごとのメッセージ列をバイト数上限付きの LRU に保持し、
+保存時に追記・削除時に破棄することで、DB を読むのはキャッシュミス時だけにする。
+
+各エントリは「floor_seq より大きい rowid のメッセージを全て持つ」ことを保証する。
+長い会話は末尾（新しい側）だけを保持し、足りないときは呼び出し側が DB を読む。
+"""
+
+from __future__ import annotations
+
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# 1会話が全体を占有しないよう、これを超えたら古いメッセージから捨てる
+DEFAULT_MAX_ENTRY_BYTES = 8 * 1024 * 1024
+
+# dict・キー・ロール文字列など content 以外のおおよそのオーバーヘッド
+_MESSAGE_OVERHEAD = 200
+
+
+def message_size(message: dict) -> int:
+    """キャッシュ上の1メッセージのおおよそのメモリ使用量。"""
+    return sys.getsizeof(message["content"]) + _MESSAGE_OVERHEAD
+
+
+@dataclass
+class _Entry:
+    floor_seq: int
+    messages: list[dict] = field(default_factory=list)
+    nbytes: int = 0
+
+
+class HistoryCache:
+    """会話ID → メッセージ列 (seq, role, content) のバイト数上限付き LRU。"""
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_entry_bytes: int = DEFAULT_MAX_ENTRY_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        # DB 読み込み中の会話 → 読み込み中に追記・破棄があったか
+        self._loading: dict[str, bool] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.appends = 0
+
+    def get(self, conversation_id: str, after_seq: int = 0) -> tuple[list[dict], bool] | None:
+        """after_seq より新しいメッセージと、それが欠けなく揃っているかを返す。
+
+        エントリがなければ None。after_seq 以前のメッセージはこの時点で捨てる
+        （要約済みの範囲は二度と読まないため）。
+        """
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(conversation_id)
+        if after_seq > entry.floor_seq:
+            self._drop_until(entry, after_seq)
+        self.hits += 1
+        return entry.messages, entry.floor_seq <= after_seq
+
+    def begin_load(self, conversation_id: str) -> None:
+        """DB 読み込みの開始を記録する。完了後に put() で登録する。"""
+        self._loading[conversation_id] = False
+
+    def put(self, conversation_id: str, floor_seq: int, messages: list[dict]) -> None:
+        """DB から読んだメッセージ列を登録する。読み込み中に追記があれば登録しない。"""
+        if self._loading.pop(conversation_id, True):
+            return
+        self._remove(conversation_id)
+        entry = _Entry(floor_seq=floor_seq, messages=list(messages))
+        entry.nbytes = sum(message_size(m) for m in entry.messages)
+        self._entries[conversation_id] = entry
+        self._bytes += entry.nbytes
+        self._trim_entry(entry)
+        self._enforce_limit()
+
+    def append(self, conversation_id: str, message: dict) -> None:
+        """保存したメッセージを末尾に追記する。キャッシュにない会話は何もしない。"""
+        if conversation_id in self._loading:
+            self._loading[conversation_id] = True
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return
+        if entry.messages and message["seq"] <= entry.messages[-1]["seq"]:
+            # 順序が崩れたら整合性を優先して捨てる（次回 DB から読み直す）
+            self.evict(conversation_id)
+            return
+        size = message_size(message)
+        entry.messages.append(message)
+        entry.nbytes += size
+        self._bytes += size
+        self.appends += 1
+        self._trim_entry(entry)
+        self._enforce_limit()
+
+    def evict(self, conversation_id: str) -> None:
+        """会話のエントリを破棄する（会話削除時など）。"""
+        if conversation_id in self._loading:
+            self._loading[conversation_id] = True
+        self._remove(conversation_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+        self._loading.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "messages": sum(len(e.messages) for e in self._entries.values()),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "appends": self.appends,
+        }
+
+    def _remove(self, conversation_id: str) -> None:
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def _drop_until(self, entry: _Entry, seq: int) -> None:
+        """seq 以下のメッセージを先頭から捨て、floor_seq を進める。"""
+        drop = 0
+        freed = 0
+        for m in entry.messages:
+            if m["seq"] > seq:
+                break
+            freed += message_size(m)
+            drop += 1
+        if drop:
+            del entry.messages[:drop]
+            entry.nbytes -= freed
+            self._bytes -= freed
+        entry.floor_seq = max(entry.floor_seq, seq)
+
+    def _trim_entry(self, entry: _Entry) -> None:
+        """1エントリの上限を超えたら古いメッセージから捨てる（最新の1件は残す）。"""
+        while entry.nbytes > self.max_entry_bytes and len(entry.messages) > 1:
+            self._drop_until(entry, entry.messages[0]["seq"])
+
+    def _enforce_limit(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.nbytes
+            self.evictions += 1
+
+
+# グローバルインスタンス
+history_cache = HistoryCache()
@@ -0,0 +1,255 @@
+"""共有 HTTP クライアントプール — 上流サービスごとに httpx.AsyncClient を使い回す
+
+各サービスが呼び出しのたびに httpx.AsyncClient を作っていたため、チャット1ターンごとに
+Ollama・Qdrant・リランカー・SearXNG への TCP（と TLS）ハンドシェイクを繰り返していた。
+上流ごとに keep-alive・接続数上限付きのクライアントを1つずつ持ち、アプリの lifespan で
+開閉する。lifespan 外（スクリプト・テスト）では最初の利用時に作る。
+
+接続の再利用とプールの飽和は、トランスポートのラッパーが httpcore の trace 拡張で
+新規接続を数え、同時実行数を追跡して stats() で返す。
+circuit=True の上流は同じラッパーでサーキットブレーカーを通す（services/circuit.py）。
+HTTP/2 は h2 パッケージがあれば有効にする（https の上流のみ効果がある）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import ssl
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+
+import httpx
+
+from helix_studio.services.circuit import PROBE_EXTENSION, CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+@dataclass(frozen=True)
+class Upstream:
+    """上流サービスごとのクライアント設定。timeout は呼び出し側で上書きできる。"""
+    timeout: httpx.Timeout
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry: float = 30.0
+    follow_redirects: bool = False
+    # 任意のバックエンド: 停止中はサーキットブレーカーで即座に失敗させる
+    circuit: bool = False
+
+
+UPSTREAMS: dict[str, Upstream] = {
+    "ollama": Upstream(httpx.Timeout(connect=10.0, read=120.0, write=10.0, pool=10.0), 32, 16),
+    "openai_compat": Upstream(httpx.Timeout(connect=10.0, read=120.0, write=10.0, pool=10.0), 32, 16),
+    "qdrant": Upstream(
+        httpx.Timeout(connect=5.0, read=60.0, write=10.0, pool=5.0), 32, 16, circuit=True,
+    ),
+    "reranker": Upstream(httpx.Timeout(connect=5.0, read=60.0, write=10.0, pool=5.0), circuit=True),
+    "docling": Upstream(
+        httpx.Timeout(connect=5.0, read=120.0, write=30.0, pool=5.0), 4, 2, circuit=True,
+    ),
+    "searxng": Upstream(httpx.Timeout(10.0), circuit=True),
+    "mem0": Upstream(httpx.Timeout(connect=5.0, read=30.0, write=10.0, pool=5.0), circuit=True),
+    # DuckDuckGo などの外部サイト
+    "web": Upstream(httpx.Timeout(10.0), follow_redirects=True),
+}
+
+
+@dataclass
+class UpstreamStats:
+    requests: int = 0
+    errors: int = 0
+    new_connections: int = 0
+    tls_handshakes: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    # 同時実行数が接続数上限に達していた（プール待ちが起きうる）リクエスト数
+    saturated: int = 0
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """レスポンス本文を閉じた時点で同時実行数を減らす。"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, done):
+        self._stream = stream
+        self._done = done
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._done()
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """接続の新規作成・同時実行数を数え、ブレーカーを通すトランスポートのラッパー。"""
+
+    def __init__(
+        self,
+        inner: httpx.AsyncBaseTransport,
+        stats: UpstreamStats,
+        max_connections: int,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self._inner = inner
+        self._stats = stats
+        self._max_connections = max_connections
+        self._breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # ヘルスチェックはブレーカーを素通りし、結果はポーラーが反映する
+        breaker = None if request.extensions.pop(PROBE_EXTENSION, False) else self._breaker
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f"{breaker.name} circuit is open", request=request)
+        stats = self._stats
+        stats.requests += 1
+        if stats.in_flight >= self._max_connections:
+            stats.saturated += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        request.extensions["trace"] = self._tracer(request.extensions.get("trace"))
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                stats.in_flight -= 1
+
+        try:
+            response = await self._inner.handle_async_request(request)
+        except BaseException as e:
+            stats.errors += 1
+            release()
+            if breaker is not None:
+                if isinstance(e, httpx.TransportError):
+                    breaker.record_failure(str(e) or type(e).__name__)
+                else:
+                    breaker.release()
+            raise
+        if breaker is not None:
+            if response.status_code >= 500:
+                breaker.record_failure(f"HTTP {response.status_code}")
+            else:
+                breaker.record_success()
+        response.stream = _TrackedStream(response.stream, release)
+        return response
+
+    def _tracer(self, inner_trace):
+        stats = self._stats
+
+        async def trace(event_name: str, info: dict) -> None:
+            # 新しい接続を張ったときだけ connect_tcp が発生する（再利用時は発生しない）
+            if event_name == "connection.connect_tcp.complete":
+                stats.new_connections += 1
+            elif event_name == "connection.start_tls.complete":
+                stats.tls_handshakes += 1
+            if inner_trace is not None:
+                await inner_trace(event_name, info)
+
+        return trace
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+class HTTPClientPool:
+    """上流名 → 共有 httpx.AsyncClient のレジストリ。"""
+
+    def __init__(self, upstreams: dict[str, Upstream] | None = None):
+        self.upstreams = UPSTREAMS if upstreams is None else upstreams
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._loops: dict[str, asyncio.AbstractEventLoop] = {}
+        self._stats: dict[str, UpstreamStats] = {name: UpstreamStats() for name in self.upstreams}
+        self.breakers: dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(name) for name, upstream in self.upstreams.items() if upstream.circuit
+        }
+        # CA バンドルの読み込みは重いので、全上流で1つの SSL コンテキストを共有する
+        self._ssl_context: ssl.SSLContext | None = None
+
+    async def open(self) -> None:
+        """全上流のクライアントを作る（lifespan 開始時）。"""
+        for name in self.upstreams:
+            self.client(name)
+
+    async def close(self) -> None:
+        """全クライアントを閉じる（lifespan 終了時）。"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._loops.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug("HTTP client close failed: %s", e)
+
+    def client(self, name: str) -> httpx.AsyncClient:
+        """上流の共有クライアントを返す。なければ作る。"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(name)
+        if client is not None and not client.is_closed and self._loops.get(name) is loop:
+            return client
+        # 別のイベントループで作られた接続は使えないので作り直す（スクリプト・テスト）
+        client = self._create(name)
+        self._clients[name] = client
+        self._loops[name] = loop
+        return client
+
+    def stats(self) -> dict[str, dict]:
+        result = {}
+        for name, upstream in self.upstreams.items():
+            s = self._stats[name]
+            result[name] = {
+                "open": name in self._clients,
+                "http2": HTTP2_AVAILABLE,
+                "max_connections": upstream.max_connections,
+                "requests": s.requests,
+                "errors": s.errors,
+                "new_connections": s.new_connections,
+                "reused": max(s.requests - s.errors - s.new_connections, 0),
+                "reuse_rate": (
+                    round(1 - s.new_connections / s.requests, 4) if s.requests else 0.0
+                ),
+                "tls_handshakes": s.tls_handshakes,
+                "in_flight": s.in_flight,
+                "peak_in_flight": s.peak_in_flight,
+                "saturated": s.saturated,
+            }
+        return result
+
+    def circuit_stats(self) -> dict[str, dict]:
+        return {name: breaker.stats() for name, breaker in self.breakers.items()}
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        upstream = self.upstreams.get(name)
+        if upstream is None:
+            raise KeyError(f"Unknown upstream: {name}")
+        limits = httpx.Limits(
+            max_connections=upstream.max_connections,
+            max_keepalive_connections=upstream.max_keepalive,
+            keepalive_expiry=upstream.keepalive_expiry,
+        )
+        if self._ssl_context is None:
+            self._ssl_context = httpx.create_ssl_context()
+        transport = httpx.AsyncHTTPTransport(
+            verify=self._ssl_context, limits=limits, http2=HTTP2_AVAILABLE,
+        )
+        return httpx.AsyncClient(
+            timeout=upstream.timeout,
+            follow_redirects=upstream.follow_redirects,
+            transport=_InstrumentedTransport(
+                transport, self._stats[name], upstream.max_connections, self.breakers.get(name),
+            ),
+        )
+
+
+# グローバルインスタンス
+http_pool = HTTPClientPool()
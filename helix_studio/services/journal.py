@@ -0,0 +1,209 @@
+"""メッセージジャーナル — messages への書き込みをまとめてコミットする write-behind キュー
+
+WebSocket チャットでは1ターンごとに INSERT + UPDATE + COMMIT が発生し、
+同時接続ユーザーが SQLite の書き込みロックで直列化されてしまう。
+単一のバックグラウンドタスクがキューを読み出し、数ミリ秒 or N件ごとに
+1トランザクションへまとめて書き込む。
+
+書き込みの完了を待ちたい呼び出し側（直後に同じ会話を読む等）は、
+append() が返す Future を await すればよい。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+from dataclasses import dataclass, field
+
+from helix_studio.db import db_pool
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SEC = 0.005
+MAX_BATCH = 64
+
+_INSERT_SQL = (
+    "INSERT INTO messages (id, conversation_id, role, content, provider, model, "
+    "tokens_in, tokens_out, duration_ms) VALUES "
+)
+_ROW_PLACEHOLDERS = "(?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_TOUCH_SQL = "UPDATE conversations SET updated_at = datetime('now') WHERE id = ?"
+
+
+@dataclass
+class JournalEntry:
+    """書き込み待ちのメッセージ1件。"""
+    row: tuple
+    conversation_id: str
+    future: asyncio.Future = field(repr=False)
+
+
+def _mark_retrieved(fut: asyncio.Future) -> None:
+    # 誰も await しない Future の例外で "never retrieved" 警告を出さない
+    if not fut.cancelled():
+        fut.exception()
+
+
+class MessageJournal:
+    """messages テーブルへの write-behind ライター。"""
+
+    def __init__(
+        self,
+        flush_interval: float = FLUSH_INTERVAL_SEC,
+        max_batch: int = MAX_BATCH,
+    ):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue[JournalEntry | None] | None = None
+        self._task: asyncio.Task | None = None
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """バックグラウンドライターを起動。"""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="message-journal")
+
+    async def stop(self) -> None:
+        """キューに残っている書き込みを全てフラッシュしてから停止。"""
+        if not self.is_running or self._queue is None or self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def append(
+        self,
+        msg_id: str,
+        conversation_id: str,
+        role: str,
+        content: str,
+        provider: str | None = None,
+        model: str | None = None,
+        tokens_in: int | None = None,
+        tokens_out: int | None = None,
+        duration_ms: int | None = None,
+    ) -> asyncio.Future:
+        """メッセージを書き込みキューに積み、永続化完了で解決される Future を返す。
+
+        Future の結果は挿入された行の rowid。
+
+        ライター未起動時（テスト・スクリプト）はその場で書き込む。
+        """
+        row = (msg_id, conversation_id, role, content, provider, model,
+               tokens_in, tokens_out, duration_ms)
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        fut.add_done_callback(_mark_retrieved)
+        entry = JournalEntry(row=row, conversation_id=conversation_id, future=fut)
+        if self._queue is None or not self.is_running:
+            await self._flush([entry])
+        else:
+            self._queue.put_nowait(entry)
+        return fut
+
+    def stats(self) -> dict[str, int | bool]:
+        return {
+            "running": self.is_running,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        stopping = False
+        while not stopping:
+            first = await queue.get()
+            if first is None:
+                break
+            batch = [first]
+            # 少し待って同時に来た書き込みをまとめる
+            if queue.qsize() < self.max_batch:
+                await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.max_batch and not queue.empty():
+                entry = queue.get_nowait()
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            await self._flush(batch)
+        # 停止要求後に残っているものも書き切る
+        rest = [e for e in self._drain(queue) if e is not None]
+        for i in range(0, len(rest), self.max_batch):
+            await self._flush(rest[i:i + self.max_batch])
+
+    @staticmethod
+    def _drain(queue: asyncio.Queue) -> list[JournalEntry | None]:
+        items = []
+        while not queue.empty():
+            items.append(queue.get_nowait())
+        return items
+
+    async def _flush(self, batch: list[JournalEntry], retried: bool = False) -> None:
+        """バッチを1トランザクションで書き込む。
+
+        - 制約違反（存在しない会話・ID 重複など）は行ごとの原因なので、1件ずつ書き直して
+          悪い行だけを失敗させる
+        - ロック待ちの超過・ディスク I/O などは行と関係がなく、1件ずつ書き直すと
+          busy_timeout を件数ぶん待つことになるので、バッチ全体を1回だけ送り直し、
+          それでも失敗したら全件を失敗させる
+        """
+        conv_ids = list(dict.fromkeys(e.conversation_id for e in batch))
+        try:
+            async with db_pool.write() as db:
+                # 複数行 VALUES の1文で挿入し、RETURNING で各行の rowid を受け取る
+                cursor = await db.execute(
+                    _INSERT_SQL + ",".join([_ROW_PLACEHOLDERS] * len(batch))
+                    + " RETURNING id, rowid",
+                    [value for e in batch for value in e.row],
+                )
+                rowids = {row[0]: row[1] for row in await cursor.fetchall()}
+                await db.executemany(_TOUCH_SQL, [(cid,) for cid in conv_ids])
+        except sqlite3.IntegrityError as e:
+            if len(batch) > 1:
+                for entry in batch:
+                    await self._flush([entry])
+                return
+            self._fail(batch, e)
+            return
+        except sqlite3.OperationalError as e:
+            if not retried:
+                logger.info("Retrying message batch of %d: %s", len(batch), e)
+                await self._flush(batch, retried=True)
+                return
+            self._fail(batch, e)
+            return
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        self.batches += 1
+        self.written += len(batch)
+        for entry in batch:
+            if not entry.future.done():
+                entry.future.set_result(rowids.get(entry.row[0]))
+
+    def _fail(self, batch: list[JournalEntry], error: Exception) -> None:
+        self.failed += len(batch)
+        logger.warning(
+            "Failed to persist %s: %s",
+            batch[0].row[0] if len(batch) == 1 else f"{len(batch)} messages", error,
+        )
+        for entry in batch:
+            if not entry.future.done():
+                entry.future.set_exception(error)
+
+
+# グローバルインスタンス（app.py の lifespan で start/stop）
+message_journal = MessageJournal()
@@ -2,13 +2,18 @@
 
 from __future__ import annotations
 
-import json
 import logging
-from collections.abc import AsyncIterator
+from collections.abc import AsyncIterable, AsyncIterator
 from typing import Any
 
 import httpx
 
+from helix_studio.services import fastjson
+from helix_studio.services.backend_pool import backend_pool
+from helix_studio.services.http_pool import http_pool
+from helix_studio.services.residency import residency
+from helix_studio.services.turn_metrics import mark_connected
+
 logger = logging.getLogger(__name__)
 
 # タイムアウト設定
@@ -18,24 +23,26 @@ _TIMEOUT = httpx.Timeout(connect=10.0, read=120.0, write=10.0, pool=10.0)
 # ── Ollama ────────────────────────────────────────────
 
 
-async def list_ollama_models(url: str) -> list[dict[str, Any]]:
-    """Ollama GET /api/tags でモデル一覧を取得。"""
+async def list_ollama_models(url: str, strict: bool = False) -> list[dict[str, Any]]:
+    """Ollama GET /api/tags でモデル一覧を取得。strict なら失敗時に例外を送出する。"""
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-            resp = await client.get(f"{url.rstrip('/')}/api/tags")
-            resp.raise_for_status()
-            data = resp.json()
-            models = data.get("models", [])
-            return [
-                {
-                    "provider": "ollama",
-                    "name": m.get("name", ""),
-                    "size": _format_size(m.get("size", 0)),
-                    "modified_at": m.get("modified_at", ""),
-                }
-                for m in models
-            ]
+        client = http_pool.client("ollama")
+        resp = await client.get(f"{url.rstrip('/')}/api/tags", timeout=_TIMEOUT)
+        resp.raise_for_status()
+        data = resp.json()
+        models = data.get("models", [])
+        return [
+            {
+                "provider": "ollama",
+                "name": m.get("name", ""),
+                "size": _format_size(m.get("size", 0)),
+                "modified_at": m.get("modified_at", ""),
+            }
+            for m in models
+        ]
     except Exception as e:
+        if strict:
+            raise
         logger.warning("Failed to list Ollama models: %s", e)
         return []
 
@@ -44,58 +51,90 @@ async def stream_ollama_chat(
     url: str,
     model: str,
     messages: list[dict[str, str]],
+    usage: dict[str, Any] | None = None,
 ) -> AsyncIterator[str]:
-    """Ollama POST /api/chat でストリーミングチャット。"""
+    """Ollama POST /api/chat でストリーミングチャット。
+
+    usage を渡すと、応答ヘッダ受信時刻とトークン数
+    （最終チャンクの prompt_eval_count / eval_count）を書き込む。
+    """
     payload = {
         "model": model,
         "messages": messages,
         "stream": True,
     }
-    async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-        async with client.stream(
-            "POST",
-            f"{url.rstrip('/')}/api/chat",
-            json=payload,
-        ) as resp:
-            resp.raise_for_status()
-            async for line in resp.aiter_lines():
-                if not line:
-                    continue
-                try:
-                    chunk = json.loads(line)
-                    content = chunk.get("message", {}).get("content", "")
-                    if content:
-                        yield content
-                except json.JSONDecodeError:
-                    continue
+    keep_alive = await residency.keep_alive_for(model)
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    client = http_pool.client("ollama")
+    async with client.stream(
+        "POST",
+        f"{url.rstrip('/')}/api/chat",
+        json=payload,
+        timeout=_TIMEOUT,
+    ) as resp:
+        resp.raise_for_status()
+        mark_connected(usage)
+        async for content in _parse_ollama_ndjson(resp.aiter_bytes(), usage):
+            yield content
+
+
+# 思考中などの本文が空の途中チャンク（Ollama は空白なしの JSON を返す）
+_OLLAMA_EMPTY_CONTENT = b'"content":""'
+_OLLAMA_NOT_DONE = b'"done":false'
+
+
+async def _parse_ollama_ndjson(
+    chunks: AsyncIterable[bytes],
+    usage: dict[str, Any] | None = None,
+) -> AsyncIterator[str]:
+    """Ollama の NDJSON ストリームから本文を取り出す。最終チャンクのトークン数を usage に書く。"""
+    async for lines in fastjson.iter_line_batches(chunks):
+        for line in lines:
+            if _OLLAMA_EMPTY_CONTENT in line and _OLLAMA_NOT_DONE in line:
+                continue
+            try:
+                chunk = fastjson.loads(line)
+            except fastjson.JSONDecodeError:
+                continue
+            content = chunk.get("message", {}).get("content", "")
+            if content:
+                yield content
+            if chunk.get("done") and usage is not None:
+                usage["tokens_in"] = chunk.get("prompt_eval_count")
+                usage["tokens_out"] = chunk.get("eval_count")
 
 
 # ── OpenAI互換API ────────────────────────────────────
 
 
-async def list_openai_compat_models(url: str, api_key: str = "") -> list[dict[str, Any]]:
-    """OpenAI互換 GET /v1/models でモデル一覧を取得。"""
+async def list_openai_compat_models(
+    url: str, api_key: str = "", strict: bool = False,
+) -> list[dict[str, Any]]:
+    """OpenAI互換 GET /v1/models でモデル一覧を取得。strict なら失敗時に例外を送出する。"""
     headers: dict[str, str] = {}
     if api_key:
         headers["Authorization"] = f"Bearer {api_key}"
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-            resp = await client.get(
-                f"{url.rstrip('/')}/v1/models", headers=headers
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            models = data.get("data", [])
-            return [
-                {
-                    "provider": "openai_compat",
-                    "name": m.get("id", ""),
-                    "size": None,
-                    "modified_at": None,
-                }
-                for m in models
-            ]
+        client = http_pool.client("openai_compat")
+        resp = await client.get(
+            f"{url.rstrip('/')}/v1/models", headers=headers, timeout=_TIMEOUT,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        models = data.get("data", [])
+        return [
+            {
+                "provider": "openai_compat",
+                "name": m.get("id", ""),
+                "size": None,
+                "modified_at": None,
+            }
+            for m in models
+        ]
     except Exception as e:
+        if strict:
+            raise
         logger.warning("Failed to list OpenAI-compatible models: %s", e)
         return []
 
@@ -105,38 +144,60 @@ async def stream_openai_compat_chat(
     model: str,
     messages: list[dict[str, str]],
     api_key: str = "",
+    usage: dict[str, Any] | None = None,
 ) -> AsyncIterator[str]:
     """OpenAI互換 POST /v1/chat/completions でストリーミングチャット。"""
     headers: dict[str, str] = {"Content-Type": "application/json"}
     if api_key:
         headers["Authorization"] = f"Bearer {api_key}"
-    payload = {
+    payload: dict[str, Any] = {
         "model": model,
         "messages": messages,
         "stream": True,
     }
-    async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-        async with client.stream(
-            "POST",
-            f"{url.rstrip('/')}/v1/chat/completions",
-            json=payload,
-            headers=headers,
-        ) as resp:
-            resp.raise_for_status()
-            async for line in resp.aiter_lines():
-                if not line or not line.startswith("data: "):
-                    continue
-                data_str = line[6:]
-                if data_str.strip() == "[DONE]":
-                    break
-                try:
-                    chunk = json.loads(data_str)
-                    delta = chunk.get("choices", [{}])[0].get("delta", {})
-                    content = delta.get("content", "")
-                    if content:
-                        yield content
-                except (json.JSONDecodeError, IndexError):
-                    continue
+    if usage is not None:
+        # 最終チャンクに usage を含めてもらう（choices は空で届く）
+        payload["stream_options"] = {"include_usage": True}
+    client = http_pool.client("openai_compat")
+    async with client.stream(
+        "POST",
+        f"{url.rstrip('/')}/v1/chat/completions",
+        json=payload,
+        headers=headers,
+        timeout=_TIMEOUT,
+    ) as resp:
+        resp.raise_for_status()
+        mark_connected(usage)
+        async for content in _parse_openai_sse(resp.aiter_bytes(), usage):
+            yield content
+
+
+async def _parse_openai_sse(
+    chunks: AsyncIterable[bytes],
+    usage: dict[str, Any] | None = None,
+) -> AsyncIterator[str]:
+    """OpenAI 互換の SSE ストリームから本文を取り出す。usage チャンクのトークン数を usage に書く。"""
+    async for lines in fastjson.iter_line_batches(chunks):
+        for line in lines:
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                return
+            # 本文も usage も含まないチャンク（role のみ等）はデコードしない
+            if b'"content"' not in data and (usage is None or b'"usage"' not in data):
+                continue
+            try:
+                chunk = fastjson.loads(data)
+                if chunk.get("usage") and usage is not None:
+                    usage["tokens_in"] = chunk["usage"].get("prompt_tokens")
+                    usage["tokens_out"] = chunk["usage"].get("completion_tokens")
+                delta = chunk.get("choices", [{}])[0].get("delta", {})
+            except (fastjson.JSONDecodeError, IndexError):
+                continue
+            content = delta.get("content", "")
+            if content:
+                yield content
 
 
 # ── 統合インターフェース ──────────────────────────────
@@ -161,16 +222,23 @@ async def stream_chat(
     model: str,
     messages: list[dict[str, str]],
     api_key: str = "",
+    usage: dict[str, Any] | None = None,
 ) -> AsyncIterator[str]:
-    """プロバイダに応じたストリーミングチャットを返す。"""
+    """プロバイダに応じたストリーミングチャットを返す。
+
+    url は主ノードで、追加ノード（ollama_urls / openai_compat_urls）があれば
+    backend_pool が負荷とモデルの常駐状態から振り分ける。
+    """
     if provider == "ollama":
-        async for chunk in stream_ollama_chat(url, model, messages):
-            yield chunk
+        def open_stream(node_url: str) -> AsyncIterator[str]:
+            return stream_ollama_chat(node_url, model, messages, usage=usage)
     elif provider == "openai_compat":
-        async for chunk in stream_openai_compat_chat(url, model, messages, api_key):
-            yield chunk
+        def open_stream(node_url: str) -> AsyncIterator[str]:
+            return stream_openai_compat_chat(node_url, model, messages, api_key, usage=usage)
     else:
         raise ValueError(f"Unsupported local provider: {provider}")
+    async for chunk in backend_pool.stream(provider, model, open_stream, primary=url):
+        yield chunk
 
 
 # ── ユーティリティ ────────────────────────────────────
@@ -8,6 +8,9 @@ from typing import Any
 
 import httpx
 
+from helix_studio.services.embeddings import embedder
+from helix_studio.services.http_pool import http_pool
+
 logger = logging.getLogger(__name__)
 
 _TIMEOUT = httpx.Timeout(connect=5.0, read=30.0, write=10.0, pool=5.0)
@@ -20,20 +23,8 @@ EMBEDDING_MODEL = "qwen3-embedding:8b"
 
 
 async def _embed(text: str) -> list[float] | None:
-    """Ollama埋め込みモデルでテキストをベクトル化"""
-    try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-            resp = await client.post(
-                f"{OLLAMA_URL}/api/embed",
-                json={"model": EMBEDDING_MODEL, "input": text},
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            embeddings = data.get("embeddings", [[]])
-            return embeddings[0] if embeddings and embeddings[0] else None
-    except Exception as e:
-        logger.debug("Embedding generation failed: %s", e)
-        return None
+    """Ollama埋め込みモデルでテキストをベクトル化（キャッシュ済みなら呼ばない）"""
+    return await embedder.embed(OLLAMA_URL, EMBEDDING_MODEL, text)
 
 
 async def _qdrant_search(query: str, limit: int = 5) -> list[dict[str, Any]]:
@@ -43,23 +34,24 @@ async def _qdrant_search(query: str, limit: int = 5) -> list[dict[str, Any]]:
         return []
 
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-            resp = await client.post(
-                f"{QDRANT_URL}/collections/{QDRANT_COLLECTION}/points/search",
-                json={"vector": vector, "limit": limit, "with_payload": True},
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            results = []
-            for point in data.get("result", []):
-                payload = point.get("payload", {})
-                memory_text = payload.get("data", payload.get("memory", ""))
-                if memory_text and point.get("score", 0) > 0.3:
-                    results.append({
-                        "memory": memory_text,
-                        "score": point.get("score", 0),
-                    })
-            return results
+        client = http_pool.client("qdrant")
+        resp = await client.post(
+            f"{QDRANT_URL}/collections/{QDRANT_COLLECTION}/points/search",
+            json={"vector": vector, "limit": limit, "with_payload": True},
+            timeout=_TIMEOUT,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        results = []
+        for point in data.get("result", []):
+            payload = point.get("payload", {})
+            memory_text = payload.get("data", payload.get("memory", ""))
+            if memory_text and point.get("score", 0) > 0.3:
+                results.append({
+                    "memory": memory_text,
+                    "score": point.get("score", 0),
+                })
+        return results
     except Exception as e:
         logger.debug("Qdrant direct search failed: %s", e)
         return []
@@ -80,15 +72,16 @@ async def search(
     # 2. フォールバック: HTTP API
     logger.info("Qdrant direct search returned empty -> falling back to HTTP API")
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-            resp = await client.post(
-                f"{url.rstrip('/')}/search",
-                json={"query": query, "limit": limit},
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            memories = data.get("memories", [])
-            return [{"memory": m.get("text", ""), "score": m.get("score", 0)} for m in memories]
+        client = http_pool.client("mem0")
+        resp = await client.post(
+            f"{url.rstrip('/')}/search",
+            json={"query": query, "limit": limit},
+            timeout=_TIMEOUT,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        memories = data.get("memories", [])
+        return [{"memory": m.get("text", ""), "score": m.get("score", 0)} for m in memories]
     except Exception as e:
         logger.debug("HTTP API search failed: %s", e)
         return []
@@ -97,13 +90,14 @@ async def search(
 async def add(url: str, user_id: str, text: str) -> dict[str, Any] | None:
     """POST /add で記憶を追加。"""
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-            resp = await client.post(
-                f"{url.rstrip('/')}/add",
-                json={"text": text},
-            )
-            resp.raise_for_status()
-            return resp.json()
+        client = http_pool.client("mem0")
+        resp = await client.post(
+            f"{url.rstrip('/')}/add",
+            json={"text": text},
+            timeout=_TIMEOUT,
+        )
+        resp.raise_for_status()
+        return resp.json()
     except Exception as e:
         logger.warning("Failed to add memory: %s", e)
         return None
@@ -112,12 +106,12 @@ async def add(url: str, user_id: str, text: str) -> dict[str, Any] | None:
 async def get_all(url: str, user_id: str) -> list[dict[str, Any]]:
     """GET /list で全記憶を取得。"""
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
-            resp = await client.get(f"{url.rstrip('/')}/list")
-            resp.raise_for_status()
-            data = resp.json()
-            memories = data.get("memories", [])
-            return [{"memory": m.get("text", ""), "id": m.get("id", "")} for m in memories]
+        client = http_pool.client("mem0")
+        resp = await client.get(f"{url.rstrip('/')}/list", timeout=_TIMEOUT)
+        resp.raise_for_status()
+        data = resp.json()
+        memories = data.get("memories", [])
+        return [{"memory": m.get("text", ""), "id": m.get("id", "")} for m in memories]
     except Exception as e:
         logger.warning("Failed to retrieve all memories: %s", e)
         return []
@@ -126,9 +120,9 @@ async def get_all(url: str, user_id: str) -> list[dict[str, Any]]:
 async def health(url: str) -> bool:
     """GET /health で稼働状態を確認。"""
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(5.0)) as client:
-            resp = await client.get(f"{url.rstrip('/')}/health")
-            return resp.status_code == 200
+        client = http_pool.client("mem0")
+        resp = await client.get(f"{url.rstrip('/')}/health", timeout=httpx.Timeout(5.0))
+        return resp.status_code == 200
     except Exception:
         return False
 
@@ -0,0 +1,169 @@
+"""モデル一覧キャッシュ — プロバイダごとのモデル一覧を TTL 付きで保持する
+
+チャット・パイプライン画面は読み込みのたびに GET /api/models を呼ぶ。プロバイダを
+順番に問い合わせていたため、停止中の Ollama や応答しないクラウド API が1つあるだけで
+画面全体が接続タイムアウトまで止まっていた。
+
+プロバイダごとに個別のタイムアウトで並行に取得し、結果を TTL 付きで保持する。
+TTL 切れでも max_stale 以内なら古い結果をすぐ返し、裏で取り直す
+（stale-while-revalidate）。取得に失敗したプロバイダはエラーを記録して空の一覧を返し、
+他のプロバイダの結果は妨げない。失敗結果は error_ttl の間だけ保持する。
+
+エントリは設定値（URL・APIキーのハッシュ）のシグネチャを持ち、設定が変わったら
+キャッシュミスとして取り直す。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60.0
+DEFAULT_MAX_STALE = 3600.0
+DEFAULT_ERROR_TTL = 10.0
+DEFAULT_TIMEOUT = 5.0
+
+Fetcher = Callable[[], Awaitable[list[dict]]]
+
+
+def signature(*values: str) -> str:
+    """設定値からシグネチャを作る（APIキーをそのまま保持しないためハッシュ化）。"""
+    return hashlib.sha256("\0".join(values).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    signature: str
+    models: list[dict] = field(default_factory=list)
+    error: str | None = None
+    fetched_at: float = 0.0
+
+
+class ModelCatalog:
+    """プロバイダ名 → モデル一覧の TTL キャッシュ。"""
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        max_stale: float = DEFAULT_MAX_STALE,
+        error_ttl: float = DEFAULT_ERROR_TTL,
+    ):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.error_ttl = error_ttl
+        self._entries: dict[str, _Entry] = {}
+        # 取得中のプロバイダ → タスク（同時リクエストで二重に取得しない）
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    async def get_all(
+        self, fetchers: dict[str, tuple[str, Fetcher, float]],
+    ) -> tuple[dict[str, list[dict]], dict[str, str]]:
+        """全プロバイダを並行に取得し、(モデル一覧, エラー) を返す。
+
+        fetchers はプロバイダ名 → (シグネチャ, 取得関数, タイムアウト秒)。
+        """
+        names = list(fetchers)
+        entries = await asyncio.gather(*(self.get(name, *fetchers[name]) for name in names))
+        models = {name: entry.models for name, entry in zip(names, entries)}
+        errors = {name: entry.error for name, entry in zip(names, entries) if entry.error}
+        return models, errors
+
+    async def get(
+        self, provider: str, sig: str, fetch: Fetcher, timeout: float = DEFAULT_TIMEOUT,
+    ) -> _Entry:
+        """1プロバイダのエントリを返す。期限切れなら取り直す。"""
+        entry = self._entries.get(provider)
+        if entry is not None and entry.signature == sig:
+            age = time.monotonic() - entry.fetched_at
+            if age < (self.error_ttl if entry.error else self.ttl):
+                self.hits += 1
+                return entry
+            if age < self.max_stale:
+                # 古い結果をすぐ返し、裏で取り直す
+                self.stale_hits += 1
+                self._refresh(provider, sig, fetch, timeout)
+                return entry
+        self.misses += 1
+        # 取得中にクライアントが切断しても、取得自体は最後まで走らせて結果を残す
+        return await asyncio.shield(self._refresh(provider, sig, fetch, timeout))
+
+    def invalidate(self, provider: str | None = None) -> None:
+        """プロバイダ（省略時は全て）のエントリを捨てる。"""
+        if provider is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(provider, None)
+
+    async def stop(self) -> None:
+        """取得中のタスクをキャンセルし、キャッシュを空にする（シャットダウン用）。"""
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._inflight.clear()
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "refreshing": sorted(self._inflight),
+            "providers": {
+                name: {
+                    "models": len(entry.models),
+                    "error": entry.error,
+                    "age": round(now - entry.fetched_at, 1),
+                }
+                for name, entry in self._entries.items()
+            },
+        }
+
+    def _refresh(self, provider: str, sig: str, fetch: Fetcher, timeout: float) -> asyncio.Task:
+        task = self._inflight.get(provider)
+        if task is not None and not task.done() and task.get_name() == sig:
+            return task
+        task = asyncio.create_task(self._fetch(provider, sig, fetch, timeout), name=sig)
+        self._inflight[provider] = task
+        task.add_done_callback(lambda t: self._forget(provider, t))
+        return task
+
+    def _forget(self, provider: str, task: asyncio.Task) -> None:
+        if self._inflight.get(provider) is task:
+            del self._inflight[provider]
+
+    async def _fetch(self, provider: str, sig: str, fetch: Fetcher, timeout: float) -> _Entry:
+        self.refreshes += 1
+        try:
+            async with asyncio.timeout(timeout):
+                entry = _Entry(sig, await fetch())
+        except asyncio.CancelledError:
+            raise
+        except TimeoutError:
+            entry = _Entry(sig, error=f"timed out after {timeout:g}s")
+        except Exception as e:
+            entry = _Entry(sig, error=str(e) or type(e).__name__)
+        if entry.error:
+            self.errors += 1
+            logger.warning("Model list failed (%s): %s", provider, entry.error)
+        entry.fetched_at = time.monotonic()
+        self._entries[provider] = entry
+        return entry
+
+
+# グローバルインスタンス
+model_catalog = ModelCatalog()
@@ -16,8 +16,10 @@ from datetime import datetime, timezone
 from typing import Any
 
 from helix_studio.config import get_setting
-from helix_studio.db import get_connection
+from helix_studio.db import db_pool
 from helix_studio.services import cloud_ai, local_ai, cli_ai, mem0
+from helix_studio.services.backend_pool import backend_pool
+from helix_studio.services.context_window import estimate_tokens, fit_texts, prompt_budget
 
 logger = logging.getLogger(__name__)
 
@@ -127,18 +129,20 @@ async def run_pipeline(
     if not step3_model:
         step3_model = await get_setting("pipeline_step3_model") or "claude-sonnet-4-20250514"
 
+    # Step1 がクラウドなら、計画を作っている間に Step2 のローカルモデルをロードしておく
+    if _detect_provider(step1_model) != "ollama":
+        await _prefetch_local_model(step2_model, use_crew, crew_team)
+
     # Mem0から関連記憶を取得
     memory_context = await _get_memory_context(input_text)
 
-    db = await get_connection()
     try:
-        await db.execute(
+        await _update_run(
             """UPDATE pipeline_runs SET status='running', current_step=1,
                step1_model=?, step2_model=?, step3_model=?
                WHERE id=?""",
             (step1_model, step2_model if not use_crew else f"crew:{crew_team}", step3_model, run_id),
         )
-        await db.commit()
 
         # ── Step 1: Cloud AI で計画 ──
         if progress_callback:
@@ -148,11 +152,10 @@ async def run_pipeline(
             step1_model,
             STEP1_PROMPT.format(input_text=input_text, memory_context=memory_context),
         )
-        await db.execute(
+        await _update_run(
             "UPDATE pipeline_runs SET step1_result=?, current_step=2 WHERE id=?",
             (step1_result, run_id),
         )
-        await db.commit()
 
         # ── Step 2: Local LLM で実行 ──
         if use_crew:
@@ -181,18 +184,17 @@ async def run_pipeline(
 
             step2_result = await _run_local_step(
                 step2_model,
-                STEP2_PROMPT.format(
-                    input_text=input_text,
-                    step1_result=step1_result,
-                    memory_context=memory_context,
+                _build_prompt(
+                    STEP2_PROMPT, step2_model,
+                    fixed={"input_text": input_text, "memory_context": memory_context},
+                    flexible={"step1_result": step1_result},
                 ),
             )
 
-        await db.execute(
+        await _update_run(
             "UPDATE pipeline_runs SET step2_result=?, current_step=3 WHERE id=?",
             (step2_result, run_id),
         )
-        await db.commit()
 
         # ── Step 3: Final Answer (Cloud/CLI/Ollama) ──
         if progress_callback:
@@ -200,21 +202,19 @@ async def run_pipeline(
 
         step3_result = await _run_cloud_step(
             step3_model,
-            STEP3_PROMPT.format(
-                input_text=input_text,
-                step1_result=step1_result,
-                step2_result=step2_result,
-                memory_context=memory_context,
+            _build_prompt(
+                STEP3_PROMPT, step3_model,
+                fixed={"input_text": input_text, "memory_context": memory_context},
+                flexible={"step1_result": step1_result, "step2_result": step2_result},
             ),
         )
 
         now = datetime.now(timezone.utc).isoformat()
-        await db.execute(
+        await _update_run(
             """UPDATE pipeline_runs SET step3_result=?, current_step=3,
                status='completed', completed_at=? WHERE id=?""",
             (step3_result, now, run_id),
         )
-        await db.commit()
 
         if progress_callback:
             await progress_callback(3, "completed", "Pipeline completed")
@@ -229,16 +229,19 @@ async def run_pipeline(
 
     except Exception as e:
         logger.exception("Pipeline execution error: %s", e)
-        await db.execute(
+        await _update_run(
             "UPDATE pipeline_runs SET status='failed', error_msg=? WHERE id=?",
             (str(e), run_id),
         )
-        await db.commit()
         if progress_callback:
             await progress_callback(0, "failed", f"Error: {e}")
         return {"id": run_id, "status": "failed", "error_msg": str(e)}
-    finally:
-        await db.close()
+
+
+async def _update_run(sql: str, params: tuple) -> None:
+    """pipeline_runs を更新する。LLM呼び出し中に書き込み接続を保持しないよう都度借りる。"""
+    async with db_pool.write() as db:
+        await db.execute(sql, params)
 
 
 async def _get_memory_context(query: str) -> str:
@@ -271,6 +274,23 @@ _CLI_MODEL_MAP = {
 }
 
 
+def _build_prompt(
+    template: str,
+    model: str,
+    fixed: dict[str, str],
+    flexible: dict[str, str],
+) -> str:
+    """前段の結果 (flexible) をモデルのプロンプト予算に収めてテンプレートに埋め込む。
+
+    Ollama は num_ctx を超えると先頭（＝指示部分）から黙って切り捨てるため、
+    送る前にこちらで前段の結果の中ほどを削る。
+    """
+    provider = _detect_provider(model)
+    base = estimate_tokens(template.format(**fixed, **dict.fromkeys(flexible, "")))
+    fitted = fit_texts(list(flexible.values()), prompt_budget(provider, model) - base)
+    return template.format(**fixed, **dict(zip(flexible, fitted)))
+
+
 def _detect_provider(model: str) -> str:
     """モデル名からプロバイダを自動判定。"""
     m = model.lower()
@@ -309,6 +329,19 @@ async def _run_cloud_step(model: str, prompt: str) -> str:
     return await _run_local_step(model, prompt)
 
 
+async def _prefetch_local_model(step2_model: str, use_crew: bool, crew_team: str) -> None:
+    """Step2 で最初に使う Ollama モデルを先読みする。"""
+    if use_crew:
+        from helix_studio.services import crew_ai
+        agents = crew_ai.PRESET_TEAMS.get(crew_team, crew_ai.PRESET_TEAMS["dev_team"])
+        model = agents[0].model
+    elif _detect_provider(step2_model) == "ollama":
+        model = step2_model.split("/", 1)[1] if "/" in step2_model else step2_model
+    else:
+        return
+    await backend_pool.prefetch(model)
+
+
 async def _run_local_step(model: str, prompt: str) -> str:
     """ローカルLLMにプロンプトを送信して応答を取得。"""
     ollama_url = await get_setting("ollama_url") or "http://localhost:11434"
@@ -317,7 +350,7 @@ async def _run_local_step(model: str, prompt: str) -> str:
         model = model.split("/", 1)[1]
     messages = [{"role": "user", "content": prompt}]
     chunks: list[str] = []
-    async for chunk in local_ai.stream_ollama_chat(ollama_url, model, messages):
+    async for chunk in local_ai.stream_chat("ollama", ollama_url, model, messages):
         chunks.append(chunk)
     return "".join(chunks)
 
@@ -325,13 +358,9 @@ async def _run_local_step(model: str, prompt: str) -> str:
 async def create_pipeline_run(title: str, input_text: str) -> str:
     """パイプライン実行レコードをDBに作成し、IDを返す。"""
     run_id = str(uuid.uuid4())
-    db = await get_connection()
-    try:
+    async with db_pool.write() as db:
         await db.execute(
             "INSERT INTO pipeline_runs (id, title, input_text) VALUES (?, ?, ?)",
             (run_id, title, input_text),
         )
-        await db.commit()
-        return run_id
-    finally:
-        await db.close()
+    return run_id
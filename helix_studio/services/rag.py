@@ -8,6 +8,7 @@
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import logging
 import re
@@ -17,6 +18,11 @@ from typing import Any
 
 import httpx
 
+from helix_studio.services import bm25
+from helix_studio.services.bm25 import bm25_index
+from helix_studio.services.embeddings import embedder
+from helix_studio.services.http_pool import http_pool
+
 logger = logging.getLogger(__name__)
 
 QDRANT_URL = "http://localhost:6333"
@@ -26,6 +32,12 @@ EMBEDDING_MODEL = "qwen3-embedding:8b"
 EMBEDDING_DIM = 4096
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+# 1回の upsert で送るポイント数（4096次元のベクトルは JSON で1件 80KB 前後）
+UPSERT_BATCH_SIZE = 64
+# 段落のおよそ 1/CHUNK_ANCHOR_EVERY をチャンクの区切りに固定する（_chunk_text 参照）
+CHUNK_ANCHOR_EVERY = 8
+# ポイント ID（uuid5）の名前空間
+POINT_NAMESPACE = uuid.UUID("5b0c7f2e-3d8a-4e51-9a56-1f4c2b7d9e03")
 
 _TIMEOUT = httpx.Timeout(connect=5.0, read=60.0, write=10.0, pool=5.0)
 
@@ -53,28 +65,28 @@ async def _parse_with_docling(file_content: bytes, filename: str) -> str | None:
     """Docling Serve API でドキュメントをMarkdownに変換。"""
     import base64
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(connect=5.0, read=120.0, write=30.0, pool=5.0)) as c:
-            payload = {
-                "options": {"to_format": "markdown"},
-                "http_sources": [],
-                "file_sources": [
-                    {
-                        "base64": base64.b64encode(file_content).decode("ascii"),
-                        "filename": filename,
-                    }
-                ],
-            }
-            r = await c.post(f"{DOCLING_URL}/v1/convert/source", json=payload)
-            r.raise_for_status()
-            data = r.json()
-            # Docling Serve v1 returns {"document": {"md_content": "..."}}
-            doc = data.get("document", {})
-            md = doc.get("md_content", "")
-            if not md:
-                # 代替パス: results 配列
-                for result in data.get("results", []):
-                    md += result.get("md_content", result.get("text", "")) + "\n"
-            return md if md.strip() else None
+        c = http_pool.client("docling")
+        payload = {
+            "options": {"to_format": "markdown"},
+            "http_sources": [],
+            "file_sources": [
+                {
+                    "base64": base64.b64encode(file_content).decode("ascii"),
+                    "filename": filename,
+                }
+            ],
+        }
+        r = await c.post(f"{DOCLING_URL}/v1/convert/source", json=payload)
+        r.raise_for_status()
+        data = r.json()
+        # Docling Serve v1 returns {"document": {"md_content": "..."}}
+        doc = data.get("document", {})
+        md = doc.get("md_content", "")
+        if not md:
+            # 代替パス: results 配列
+            for result in data.get("results", []):
+                md += result.get("md_content", result.get("text", "")) + "\n"
+        return md if md.strip() else None
     except Exception as e:
         logger.warning("Docling parse failed (%s): %s", filename, e)
         return None
@@ -86,23 +98,24 @@ async def _parse_with_docling(file_content: bytes, filename: str) -> str | None:
 async def ensure_collection() -> bool:
     """Qdrant コレクションが存在しなければ作成する（hybrid検索対応）。"""
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as c:
-            r = await c.get(f"{QDRANT_URL}/collections/{COLLECTION}")
-            if r.status_code == 200:
-                return True
-            # dense + sparse vectors で作成
-            r = await c.put(
-                f"{QDRANT_URL}/collections/{COLLECTION}",
-                json={
-                    "vectors": {"size": EMBEDDING_DIM, "distance": "Cosine"},
-                    "sparse_vectors": {
-                        "text_bm25": {},
-                    },
-                },
-            )
-            r.raise_for_status()
-            logger.info("Created Qdrant hybrid collection '%s'", COLLECTION)
+        c = http_pool.client("qdrant")
+        r = await c.get(f"{QDRANT_URL}/collections/{COLLECTION}", timeout=_TIMEOUT)
+        if r.status_code == 200:
             return True
+        # dense + sparse vectors で作成
+        r = await c.put(
+            f"{QDRANT_URL}/collections/{COLLECTION}",
+            json={
+                "vectors": {"size": EMBEDDING_DIM, "distance": "Cosine"},
+                "sparse_vectors": {
+                    "text_bm25": {},
+                },
+            },
+            timeout=_TIMEOUT,
+        )
+        r.raise_for_status()
+        logger.info("Created Qdrant hybrid collection '%s'", COLLECTION)
+        return True
     except Exception as e:
         logger.warning("Failed to verify Qdrant collection: %s", e)
         return False
@@ -112,43 +125,8 @@ async def ensure_collection() -> bool:
 
 
 async def _embed(text: str, ollama_url: str | None = None) -> list[float] | None:
-    """Ollama でテキストを埋め込みベクトルに変換。"""
-    url = ollama_url or OLLAMA_URL
-    try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as c:
-            r = await c.post(
-                f"{url}/api/embed",
-                json={"model": EMBEDDING_MODEL, "input": text},
-            )
-            r.raise_for_status()
-            embeddings = r.json().get("embeddings", [[]])
-            return embeddings[0] if embeddings and embeddings[0] else None
-    except Exception as e:
-        logger.debug("Embedding generation failed: %s", e)
-        return None
-
-
-# ── BM25 スパースベクトル ─────────────────────────────────
-
-
-def _tokenize_for_bm25(text: str) -> dict[str, list]:
-    """簡易BM25トークナイザ。単語頻度ベースのスパースベクトルを生成。"""
-    import math
-    tokens = re.findall(r"\w+", text.lower())
-    if not tokens:
-        return {"indices": [], "values": []}
-
-    # 単語→インデックスマッピング (ハッシュで固定)
-    freq: dict[int, float] = {}
-    for tok in tokens:
-        idx = hash(tok) % 2_000_000  # 2M次元のスパース空間
-        freq[idx] = freq.get(idx, 0) + 1.0
-
-    # TF正規化 (sublinear TF)
-    indices = sorted(freq.keys())
-    values = [1.0 + math.log(freq[i]) for i in indices]
-
-    return {"indices": indices, "values": values}
+    """Ollama でテキストを埋め込みベクトルに変換（キャッシュ済みなら呼ばない）。"""
+    return await embedder.embed(ollama_url or OLLAMA_URL, EMBEDDING_MODEL, text)
 
 
 # ── チャンク分割 ──────────────────────────────────────────
@@ -159,7 +137,12 @@ def _chunk_text(
     chunk_size: int = CHUNK_SIZE,
     overlap: int = CHUNK_OVERLAP,
 ) -> list[str]:
-    """テキストを固定サイズチャンクに分割 (段落境界を優先)。"""
+    """テキストを固定サイズチャンクに分割 (段落境界を優先)。
+
+    内容のハッシュで選んだ「アンカー」段落の前では必ずチャンクを区切る。
+    詰め込みだけだと途中に段落を1つ足すと以降の区切りが全てずれるが、
+    アンカーがあれば編集箇所の次のアンカーで区切りが元に戻る（再登録の差分が小さくなる）。
+    """
     if len(text) <= chunk_size:
         return [text] if text.strip() else []
 
@@ -172,7 +155,7 @@ def _chunk_text(
         para = para.strip()
         if not para:
             continue
-        if len(current) + len(para) + 2 <= chunk_size:
+        if len(current) + len(para) + 2 <= chunk_size and not (current and _is_anchor(para)):
             current = f"{current}\n\n{para}" if current else para
         else:
             if current:
@@ -205,6 +188,31 @@ def _chunk_text(
     return chunks
 
 
+def _is_anchor(paragraph: str) -> bool:
+    h = hashlib.blake2b(paragraph.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(h, "big") % CHUNK_ANCHOR_EVERY == 0
+
+
+def _document_id(source: str) -> str:
+    """source（ファイルのパスなど、呼び出し側が決めた文書の出どころ）から決まる文書の識別子。"""
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+def _point_ids(doc_id: str, chunks: list[str]) -> list[str]:
+    """チャンクごとのポイント ID。文書と内容（同じ内容が複数あれば出現順）で決まる。
+
+    スパースベクトルの形式（bm25.VERSION）も含めるので、形式を変えると次の再登録で作り直す
+    （埋め込みはキャッシュから取れる）。
+    """
+    seen: dict[str, int] = {}
+    ids = []
+    for chunk in chunks:
+        content_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+        n = seen[content_hash] = seen.get(content_hash, -1) + 1
+        ids.append(str(uuid.uuid5(POINT_NAMESPACE, f"{doc_id}:{content_hash}:{n}:bm25v{bm25.VERSION}")))
+    return ids
+
+
 # ── ドキュメント登録 ──────────────────────────────────────
 
 
@@ -213,8 +221,23 @@ async def ingest_text(
     filename: str,
     metadata: dict[str, Any] | None = None,
     ollama_url: str | None = None,
+    doc_id: str | None = None,
 ) -> dict[str, Any]:
-    """テキストをチャンク分割 → 埋め込み → Qdrant に保存。"""
+    """テキストをチャンク分割 → 埋め込み → Qdrant に保存。
+
+    doc_id を渡すと、その文書を新しい内容で置き換える。ポイント ID は文書とチャンクの
+    内容から決まるので、既存のポイントと突き合わせて差分だけを反映する。
+
+    doc_id を渡さなければファイル名と内容から決める。同じファイル名でも内容が違えば
+    別の文書として登録し、既存の文書のチャンクは消さない（同じ内容の再登録は何もしない）。
+
+    - 新しい・変わったチャンクだけを埋め込んで upsert する
+    - 位置（chunk_index・total_chunks）だけが変わったチャンクはペイロードだけ更新する
+    - なくなったチャンクは削除する
+
+    埋め込みはバッチ・並行で行い（services/embeddings.py）、できたチャンクから
+    UPSERT_BATCH_SIZE 件ずつ Qdrant に保存する。
+    """
     if not await ensure_collection():
         return {"ok": False, "error": "Cannot connect to Qdrant"}
 
@@ -222,52 +245,190 @@ async def ingest_text(
     if not chunks:
         return {"ok": False, "error": "Text is empty"}
 
-    doc_id = hashlib.sha256(f"{filename}:{text[:200]}".encode()).hexdigest()[:16]
-    points = []
-
-    for i, chunk in enumerate(chunks):
-        vector = await _embed(chunk, ollama_url)
-        if not vector:
-            continue
-        sparse = _tokenize_for_bm25(chunk)
-        point_id = str(uuid.uuid4())
-        point: dict[str, Any] = {
-            "id": point_id,
-            "vector": vector,
-            "payload": {
-                "doc_id": doc_id,
-                "filename": filename,
-                "chunk_index": i,
-                "total_chunks": len(chunks),
-                "content": chunk,
-                **(metadata or {}),
-            },
-        }
-        if sparse["indices"]:
-            point["sparse_vectors"] = {"text_bm25": sparse}
-        points.append(point)
-
-    if not points:
-        return {"ok": False, "error": "Failed to generate embeddings"}
-
-    # Qdrant にバッチ upsert
+    if doc_id is None:
+        doc_id = _document_id(f"{filename}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}")
+    ids = _point_ids(doc_id, chunks)
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as c:
-            r = await c.put(
-                f"{QDRANT_URL}/collections/{COLLECTION}/points",
-                json={"points": points},
-            )
-            r.raise_for_status()
+        existing = await _existing_points(doc_id)
     except Exception as e:
-        return {"ok": False, "error": f"Failed to save to Qdrant: {e}"}
+        return {"ok": False, "error": f"Failed to read from Qdrant: {e}", "doc_id": doc_id}
+
+    new = [i for i, point_id in enumerate(ids) if point_id not in existing]
+    moved = [
+        i for i, point_id in enumerate(ids)
+        if point_id in existing
+        and (existing[point_id].get("chunk_index"), existing[point_id].get("total_chunks")) != (i, len(chunks))
+    ]
+    removed = list(existing.keys() - set(ids))
+    avgdl = await bm25_index.average_length(chunks)
+    pending: list[dict[str, Any]] = []
+    added = 0
+    failed = 0
+
+    async for indices, vectors in embedder.iter_embeddings(
+        [chunks[i] for i in new], ollama_url or OLLAMA_URL, EMBEDDING_MODEL,
+    ):
+        for j, vector in zip(indices, vectors):
+            if not vector:
+                failed += 1
+                continue
+            pending.append(_make_point(
+                doc_id, filename, new[j], chunks, vector, metadata, ids[new[j]], avgdl,
+            ))
+        # 埋め込みの残りは裏で進めながら、溜まったぶんを保存する
+        while len(pending) >= UPSERT_BATCH_SIZE:
+            batch, pending = pending[:UPSERT_BATCH_SIZE], pending[UPSERT_BATCH_SIZE:]
+            error = await _upsert_points(batch)
+            if error:
+                return {"ok": False, "error": error, "doc_id": doc_id, "chunks": added}
+            await bm25_index.add([p["payload"]["content"] for p in batch])
+            added += len(batch)
+
+    if pending:
+        error = await _upsert_points(pending)
+        if error:
+            return {"ok": False, "error": error, "doc_id": doc_id, "chunks": added}
+        await bm25_index.add([p["payload"]["content"] for p in pending])
+        added += len(pending)
+
+    if new and not added:
+        return {"ok": False, "error": "Failed to generate embeddings"}
 
-    logger.info("RAG ingested: %s (%d chunks)", filename, len(points))
+    # 新しいチャンクが揃ってから古いチャンクを外す（検索結果が途中で空にならない）
+    error = await _update_positions(
+        [(ids[i], i, len(chunks)) for i in moved], metadata,
+    ) or await _delete_points(removed)
+    if error:
+        return {"ok": False, "error": error, "doc_id": doc_id, "chunks": added}
+    await bm25_index.remove([existing[point_id].get("content", "") for point_id in removed])
+
+    stored = len(chunks) - len(new) + added
+    logger.info(
+        "RAG ingested: %s (%d chunks: %d added, %d moved, %d removed, %d failed)",
+        filename, stored, added, len(moved), len(removed), failed,
+    )
     return {
         "ok": True,
         "doc_id": doc_id,
         "filename": filename,
-        "chunks": len(points),
+        "chunks": stored,
+        "added_chunks": added,
+        "updated_chunks": len(moved),
+        "removed_chunks": len(removed),
+        "failed_chunks": failed,
+    }
+
+
+def _make_point(
+    doc_id: str,
+    filename: str,
+    index: int,
+    chunks: list[str],
+    vector: list[float],
+    metadata: dict[str, Any] | None,
+    point_id: str | None = None,
+    avgdl: float | None = None,
+) -> dict[str, Any]:
+    chunk = chunks[index]
+    point: dict[str, Any] = {
+        "id": point_id or str(uuid.uuid4()),
+        "vector": vector,
+        "payload": {
+            "doc_id": doc_id,
+            "filename": filename,
+            "chunk_index": index,
+            "total_chunks": len(chunks),
+            "content": chunk,
+            **(metadata or {}),
+        },
     }
+    sparse = bm25.encode_document(chunk, avgdl)
+    if sparse["indices"]:
+        point["sparse_vectors"] = {"text_bm25": sparse}
+    return point
+
+
+async def _upsert_points(points: list[dict[str, Any]]) -> str | None:
+    """Qdrant に upsert する。失敗したらエラーメッセージを返す。"""
+    try:
+        c = http_pool.client("qdrant")
+        r = await c.put(
+            f"{QDRANT_URL}/collections/{COLLECTION}/points",
+            json={"points": points},
+            timeout=_TIMEOUT,
+        )
+        r.raise_for_status()
+    except Exception as e:
+        return f"Failed to save to Qdrant: {e}"
+    return None
+
+
+async def _existing_points(doc_id: str) -> dict[str, dict[str, Any]]:
+    """doc_id の登録済みポイント ID → ペイロード（chunk_index・total_chunks・content）。"""
+    c = http_pool.client("qdrant")
+    points: dict[str, dict[str, Any]] = {}
+    offset = None
+    while True:
+        body: dict[str, Any] = {
+            "filter": {"must": [{"key": "doc_id", "match": {"value": doc_id}}]},
+            "limit": 1000,
+            "with_payload": ["chunk_index", "total_chunks", "content"],
+            "with_vector": False,
+        }
+        if offset is not None:
+            body["offset"] = offset
+        r = await c.post(
+            f"{QDRANT_URL}/collections/{COLLECTION}/points/scroll", json=body, timeout=_TIMEOUT,
+        )
+        r.raise_for_status()
+        result = r.json().get("result", {})
+        for p in result.get("points", []):
+            points[str(p["id"])] = p.get("payload", {})
+        offset = result.get("next_page_offset")
+        if offset is None:
+            return points
+
+
+async def _update_positions(
+    positions: list[tuple[str, int, int]],
+    metadata: dict[str, Any] | None,
+) -> str | None:
+    """(ポイント ID, chunk_index, total_chunks) のペイロードをまとめて更新する。"""
+    c = http_pool.client("qdrant")
+    for start in range(0, len(positions), UPSERT_BATCH_SIZE):
+        operations = [
+            {"set_payload": {
+                "payload": {"chunk_index": index, "total_chunks": total, **(metadata or {})},
+                "points": [point_id],
+            }}
+            for point_id, index, total in positions[start:start + UPSERT_BATCH_SIZE]
+        ]
+        try:
+            r = await c.post(
+                f"{QDRANT_URL}/collections/{COLLECTION}/points/batch",
+                json={"operations": operations},
+                timeout=_TIMEOUT,
+            )
+            r.raise_for_status()
+        except Exception as e:
+            return f"Failed to update Qdrant payloads: {e}"
+    return None
+
+
+async def _delete_points(point_ids: list[str]) -> str | None:
+    if not point_ids:
+        return None
+    try:
+        c = http_pool.client("qdrant")
+        r = await c.post(
+            f"{QDRANT_URL}/collections/{COLLECTION}/points/delete",
+            json={"points": point_ids},
+            timeout=_TIMEOUT,
+        )
+        r.raise_for_status()
+    except Exception as e:
+        return f"Failed to delete from Qdrant: {e}"
+    return None
 
 
 async def ingest_file(
@@ -286,7 +447,8 @@ async def ingest_file(
     except Exception as e:
         return {"ok": False, "error": f"Failed to read file: {e}"}
 
-    return await ingest_text(text, p.name, {"path": str(p)}, ollama_url)
+    # 同じパスのファイルは同じ文書として置き換える
+    return await ingest_text(text, p.name, {"path": str(p)}, ollama_url, doc_id=_document_id(str(p.resolve())))
 
 
 # ── 検索 ──────────────────────────────────────────────────
@@ -299,76 +461,76 @@ async def search(
     ollama_url: str | None = None,
 ) -> list[dict[str, Any]]:
     """Hybrid検索 (dense + BM25 sparse + RRF融合) でチャンクを取得。"""
-    vector = await _embed(query, ollama_url)
+    vector, sparse = await asyncio.gather(_embed(query, ollama_url), bm25_index.encode_query(query))
     if not vector:
         return []
 
-    sparse = _tokenize_for_bm25(query)
-
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as c:
-            # Qdrant Query API でhybrid検索 (prefetch + RRF)
-            query_payload: dict[str, Any] = {
-                "prefetch": [
-                    {
-                        "query": vector,
-                        "using": "__default__",
-                        "limit": limit * 3,
-                    },
-                ],
-                "query": {"fusion": "rrf"},
-                "limit": limit,
-                "with_payload": True,
-            }
-            # スパースベクトルがあればhybrid、なければdenseのみ
-            if sparse["indices"]:
-                query_payload["prefetch"].append({
-                    "query": {
-                        "indices": sparse["indices"],
-                        "values": sparse["values"],
-                    },
-                    "using": "text_bm25",
+        c = http_pool.client("qdrant")
+        # Qdrant Query API でhybrid検索 (prefetch + RRF)
+        query_payload: dict[str, Any] = {
+            "prefetch": [
+                {
+                    "query": vector,
+                    "using": "__default__",
                     "limit": limit * 3,
-                })
-
+                },
+            ],
+            "query": {"fusion": "rrf"},
+            "limit": limit,
+            "with_payload": True,
+        }
+        # スパースベクトルがあればhybrid、なければdenseのみ
+        if sparse["indices"]:
+            query_payload["prefetch"].append({
+                "query": {
+                    "indices": sparse["indices"],
+                    "values": sparse["values"],
+                },
+                "using": "text_bm25",
+                "limit": limit * 3,
+            })
+
+        r = await c.post(
+            f"{QDRANT_URL}/collections/{COLLECTION}/points/query",
+            json=query_payload,
+            timeout=_TIMEOUT,
+        )
+
+        # Query APIが使えない場合、従来のsearch APIにフォールバック
+        if r.status_code >= 400:
+            logger.debug("Query API unavailable, falling back to search API")
             r = await c.post(
-                f"{QDRANT_URL}/collections/{COLLECTION}/points/query",
-                json=query_payload,
+                f"{QDRANT_URL}/collections/{COLLECTION}/points/search",
+                json={
+                    "vector": vector,
+                    "limit": limit,
+                    "with_payload": True,
+                    "score_threshold": score_threshold,
+                },
+                timeout=_TIMEOUT,
             )
-
-            # Query APIが使えない場合、従来のsearch APIにフォールバック
-            if r.status_code >= 400:
-                logger.debug("Query API unavailable, falling back to search API")
-                r = await c.post(
-                    f"{QDRANT_URL}/collections/{COLLECTION}/points/search",
-                    json={
-                        "vector": vector,
-                        "limit": limit,
-                        "with_payload": True,
-                        "score_threshold": score_threshold,
-                    },
-                )
-                r.raise_for_status()
-                points_key = "result"
-            else:
-                r.raise_for_status()
-                points_key = "points"
-
-            results = []
-            for point in r.json().get(points_key, []):
-                payload = point.get("payload", {})
-                results.append({
-                    "content": payload.get("content", ""),
-                    "filename": payload.get("filename", ""),
-                    "chunk_index": payload.get("chunk_index", 0),
-                    "score": round(point.get("score", 0), 4),
-                })
-
-            # Reranker で再スコアリング（TEI 起動時のみ）
-            if results:
-                results = await _rerank(query, results, top_n=limit)
-
-            return results
+            r.raise_for_status()
+            points_key = "result"
+        else:
+            r.raise_for_status()
+            points_key = "points"
+
+        results = []
+        for point in r.json().get(points_key, []):
+            payload = point.get("payload", {})
+            results.append({
+                "content": payload.get("content", ""),
+                "filename": payload.get("filename", ""),
+                "chunk_index": payload.get("chunk_index", 0),
+                "score": round(point.get("score", 0), 4),
+            })
+
+        # Reranker で再スコアリング（TEI 起動時のみ）
+        if results:
+            results = await _rerank(query, results, top_n=limit)
+
+        return results
     except Exception as e:
         logger.debug("RAG search failed: %s", e)
         return []
@@ -382,24 +544,25 @@ async def _rerank(
         return results[:top_n]
 
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as c:
-            r = await c.post(
-                f"{RERANKER_URL}/rerank",
-                json={
-                    "query": query,
-                    "texts": [r["content"] for r in results],
-                },
-            )
-            r.raise_for_status()
-            ranked = r.json()
-            # TEI returns [{"index": 0, "score": 0.95}, ...]
-            reranked = []
-            for item in sorted(ranked, key=lambda x: x["score"], reverse=True)[:top_n]:
-                idx = item["index"]
-                entry = results[idx].copy()
-                entry["score"] = round(item["score"], 4)
-                reranked.append(entry)
-            return reranked
+        c = http_pool.client("reranker")
+        r = await c.post(
+            f"{RERANKER_URL}/rerank",
+            json={
+                "query": query,
+                "texts": [r["content"] for r in results],
+            },
+            timeout=httpx.Timeout(10.0),
+        )
+        r.raise_for_status()
+        ranked = r.json()
+        # TEI returns [{"index": 0, "score": 0.95}, ...]
+        reranked = []
+        for item in sorted(ranked, key=lambda x: x["score"], reverse=True)[:top_n]:
+            idx = item["index"]
+            entry = results[idx].copy()
+            entry["score"] = round(item["score"], 4)
+            reranked.append(entry)
+        return reranked
     except Exception as e:
         logger.debug("Reranker unavailable, using original scores: %s", e)
         return results[:top_n]
@@ -425,51 +588,60 @@ def format_rag_context(results: list[dict[str, Any]]) -> str:
 async def list_documents() -> list[dict[str, Any]]:
     """登録済みドキュメントの一覧を取得。"""
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as c:
-            r = await c.post(
-                f"{QDRANT_URL}/collections/{COLLECTION}/points/scroll",
-                json={"limit": 1000, "with_payload": True, "with_vector": False},
-            )
-            r.raise_for_status()
-            points = r.json().get("result", {}).get("points", [])
-
-            # doc_id でグループ化
-            docs: dict[str, dict] = {}
-            for p in points:
-                payload = p.get("payload", {})
-                doc_id = payload.get("doc_id", "unknown")
-                if doc_id not in docs:
-                    docs[doc_id] = {
-                        "doc_id": doc_id,
-                        "filename": payload.get("filename", ""),
-                        "chunks": 0,
-                        "total_chunks": payload.get("total_chunks", 0),
-                    }
-                docs[doc_id]["chunks"] += 1
-
-            return list(docs.values())
+        c = http_pool.client("qdrant")
+        r = await c.post(
+            f"{QDRANT_URL}/collections/{COLLECTION}/points/scroll",
+            json={"limit": 1000, "with_payload": True, "with_vector": False},
+            timeout=_TIMEOUT,
+        )
+        r.raise_for_status()
+        points = r.json().get("result", {}).get("points", [])
+
+        # doc_id でグループ化
+        docs: dict[str, dict] = {}
+        for p in points:
+            payload = p.get("payload", {})
+            doc_id = payload.get("doc_id", "unknown")
+            if doc_id not in docs:
+                docs[doc_id] = {
+                    "doc_id": doc_id,
+                    "filename": payload.get("filename", ""),
+                    "chunks": 0,
+                    "total_chunks": payload.get("total_chunks", 0),
+                }
+            docs[doc_id]["chunks"] += 1
+
+        return list(docs.values())
     except Exception as e:
         logger.debug("Failed to list documents: %s", e)
         return []
 
 
 async def delete_document(doc_id: str) -> bool:
-    """doc_id に一致する全チャンクを削除。"""
+    """doc_id に一致する全チャンクを削除し、BM25 の統計からも除く。"""
     try:
-        async with httpx.AsyncClient(timeout=_TIMEOUT) as c:
-            r = await c.post(
-                f"{QDRANT_URL}/collections/{COLLECTION}/points/delete",
-                json={
-                    "filter": {
-                        "must": [
-                            {"key": "doc_id", "match": {"value": doc_id}},
-                        ],
-                    },
+        existing = await _existing_points(doc_id)
+    except Exception as e:
+        # 統計は少しずれるが、削除自体は続ける
+        logger.debug("Failed to read chunks before delete: %s", e)
+        existing = {}
+    try:
+        c = http_pool.client("qdrant")
+        r = await c.post(
+            f"{QDRANT_URL}/collections/{COLLECTION}/points/delete",
+            json={
+                "filter": {
+                    "must": [
+                        {"key": "doc_id", "match": {"value": doc_id}},
+                    ],
                 },
-            )
-            r.raise_for_status()
-            logger.info("RAG document deleted: %s", doc_id)
-            return True
+            },
+            timeout=_TIMEOUT,
+        )
+        r.raise_for_status()
+        await bm25_index.remove([p.get("content", "") for p in existing.values()])
+        logger.info("RAG document deleted: %s", doc_id)
+        return True
     except Exception as e:
         logger.warning("Failed to delete RAG document: %s", e)
         return False
@@ -478,12 +650,12 @@ async def delete_document(doc_id: str) -> bool:
 async def get_status() -> dict[str, Any]:
     """RAG サービスのステータスを返す。"""
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(5.0)) as c:
-            r = await c.get(f"{QDRANT_URL}/collections/{COLLECTION}")
-            if r.status_code == 200:
-                info = r.json().get("result", {})
-                count = info.get("points_count", 0)
-                return {"available": True, "points_count": count}
-            return {"available": False, "error": "Collection not created"}
+        c = http_pool.client("qdrant")
+        r = await c.get(f"{QDRANT_URL}/collections/{COLLECTION}", timeout=httpx.Timeout(5.0))
+        if r.status_code == 200:
+            info = r.json().get("result", {})
+            count = info.get("points_count", 0)
+            return {"available": True, "points_count": count}
+        return {"available": False, "error": "Collection not created"}
     except Exception:
         return {"available": False, "error": "Cannot connect to Qdrant"}
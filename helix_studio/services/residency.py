@@ -0,0 +1,225 @@
+"""Ollama モデル常駐管理 — 起動時のウォームアップ・keep_alive 固定・先読み
+
+初回ターンの待ち時間の大半はモデルのロードだった。Ollama は keep_alive を指定しないと
+5分でモデルをアンロードし、どのリクエストも keep_alive を送っていなかった。
+
+- 起動時に default_local_model（チャット）と rag_embedding_model（埋め込み）をロードする
+- この2モデルへのリクエストには ollama_keep_alive（既定 1h）を付けて常駐させる
+- /api/ps を読み、ロード済みのモデルを追跡する（定期取得は backend_pool が全ノードぶん行う）
+- パイプライン・CrewAI で次に使うモデルが分かっていれば、前のステップの間に先読みする
+
+ロードは Ollama の仕様どおり、プロンプトなしの /api/generate（埋め込みモデルは
+入力なしの /api/embed）で行う。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from helix_studio.config import get_setting
+from helix_studio.services.http_pool import http_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+DEFAULT_KEEP_ALIVE = "1h"
+# /api/ps の結果をこの秒数以内なら読み直さない
+PS_MAX_AGE = 5.0
+# ロードは大きなモデルだと数十秒かかる
+_WARM_TIMEOUT = httpx.Timeout(connect=10.0, read=300.0, write=10.0, pool=10.0)
+_PS_TIMEOUT = httpx.Timeout(5.0)
+
+CHAT = "chat"
+EMBED = "embed"
+
+
+def normalize(model: str) -> str:
+    """タグなしのモデル名は Ollama と同じく :latest とみなす。"""
+    return model if ":" in model else f"{model}:latest"
+
+
+@dataclass
+class Resident:
+    size_vram: int = 0
+    expires_at: str = ""
+
+
+class ResidencyManager:
+    """Ollama 上のモデルの常駐状態を管理する。"""
+
+    def __init__(self):
+        self._resident: dict[str, dict[str, Resident]] = {}
+        self._polled_at: dict[str, float] = {}
+        # (url, モデル) → 実行中のロード（同時に同じモデルを二重にロードしない）
+        self._warming: dict[tuple[str, str], asyncio.Task] = {}
+        self._prefetches: set[asyncio.Task] = set()
+        self._task: asyncio.Task | None = None
+        self.warmups = 0
+        self.warm_failures = 0
+        self.prefetches = 0
+        self.prefetch_skipped = 0
+        self.last_warm_sec: dict[str, float] = {}
+
+    # ── 設定 ──
+
+    async def pinned_models(self) -> dict[str, str]:
+        """keep_alive で常駐させるモデル → 種別（chat / embed）。"""
+        pinned: dict[str, str] = {}
+        chat_model = await get_setting("default_local_model") or ""
+        embed_model = await get_setting("rag_embedding_model") or ""
+        if chat_model:
+            pinned[normalize(chat_model)] = CHAT
+        if embed_model:
+            pinned[normalize(embed_model)] = EMBED
+        return pinned
+
+    async def keep_alive_for(self, model: str) -> str | None:
+        """リクエストに付ける keep_alive。常駐対象外のモデルは None（Ollama の既定）。"""
+        if normalize(model) not in await self.pinned_models():
+            return None
+        return await get_setting("ollama_keep_alive") or DEFAULT_KEEP_ALIVE
+
+    # ── ライフサイクル ──
+
+    def start(self) -> None:
+        """常駐対象のモデルを裏でロードする（lifespan 開始時）。"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._warm_on_start(), name="ollama-residency")
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._task, *self._warming.values(), *self._prefetches) if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._warming.clear()
+        self._prefetches.clear()
+
+    async def warm_pinned(self, url: str) -> None:
+        """常駐対象のモデルを順にロードする。"""
+        for model, kind in (await self.pinned_models()).items():
+            await self.warm(url, model, kind)
+
+    # ── ロード ──
+
+    async def warm(self, url: str, model: str, kind: str = CHAT) -> bool:
+        """モデルをロードする。既に同じモデルをロード中ならその完了を待つ。"""
+        key = (url.rstrip("/"), normalize(model))
+        task = self._warming.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(self._load(key[0], key[1], kind))
+            self._warming[key] = task
+            task.add_done_callback(lambda t: self._forget_warm(key, t))
+        return await asyncio.shield(task)
+
+    def prefetch(self, url: str, model: str, kind: str = CHAT) -> None:
+        """次に使うモデルを裏でロードしておく。ロード済みなら何もしない。"""
+        task = asyncio.create_task(self._prefetch(url, model, kind))
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetches.discard)
+
+    async def is_resident(self, url: str, model: str) -> bool:
+        """モデルがロード済みか（/api/ps を必要なら読み直す）。"""
+        url = url.rstrip("/")
+        if time.monotonic() - self._polled_at.get(url, 0.0) > PS_MAX_AGE:
+            await self.refresh(url)
+        return normalize(model) in self._resident.get(url, {})
+
+    def has_model(self, url: str, model: str) -> bool:
+        """直近の /api/ps 時点でロード済みか、ロード中か（問い合わせはしない）。"""
+        url, model = url.rstrip("/"), normalize(model)
+        return model in self._resident.get(url, {}) or (url, model) in self._warming
+
+    def reachable(self, url: str) -> bool:
+        """直近の /api/ps（またはロード）が成功したか。"""
+        return url.rstrip("/") in self._resident
+
+    async def refresh(self, url: str) -> dict[str, Resident]:
+        """/api/ps を読んでロード済みのモデルを更新する。"""
+        url = url.rstrip("/")
+        try:
+            resp = await http_pool.client("ollama").get(f"{url}/api/ps", timeout=_PS_TIMEOUT)
+            resp.raise_for_status()
+            models = resp.json().get("models", [])
+        except Exception as e:
+            logger.debug("Ollama /api/ps failed: %s", e)
+            self._resident.pop(url, None)
+            return {}
+        resident = {
+            normalize(m.get("name", "")): Resident(m.get("size_vram", 0), m.get("expires_at", ""))
+            for m in models
+        }
+        self._resident[url] = resident
+        self._polled_at[url] = time.monotonic()
+        return resident
+
+    def stats(self) -> dict:
+        return {
+            "resident": {
+                url: {
+                    name: {"size_vram_gb": round(r.size_vram / 1024**3, 1), "expires_at": r.expires_at}
+                    for name, r in models.items()
+                }
+                for url, models in self._resident.items()
+            },
+            "warming": sorted(model for _, model in self._warming),
+            "warmups": self.warmups,
+            "warm_failures": self.warm_failures,
+            "prefetches": self.prefetches,
+            "prefetch_skipped": self.prefetch_skipped,
+            "last_warm_sec": dict(self.last_warm_sec),
+        }
+
+    # ── 内部 ──
+
+    def _forget_warm(self, key: tuple[str, str], task: asyncio.Task) -> None:
+        if self._warming.get(key) is task:
+            del self._warming[key]
+
+    async def _load(self, url: str, model: str, kind: str) -> bool:
+        keep_alive = await self.keep_alive_for(model)
+        payload: dict = {"model": model}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        if kind == EMBED:
+            endpoint, payload["input"] = "/api/embed", []
+        else:
+            endpoint = "/api/generate"
+        start = time.monotonic()
+        try:
+            resp = await http_pool.client("ollama").post(
+                f"{url}{endpoint}", json=payload, timeout=_WARM_TIMEOUT,
+            )
+            resp.raise_for_status()
+        except Exception as e:
+            self.warm_failures += 1
+            logger.debug("Ollama warmup failed (%s): %s", model, e)
+            return False
+        self.warmups += 1
+        self.last_warm_sec[model] = round(time.monotonic() - start, 2)
+        logger.info("Ollama model loaded: %s (%.1fs)", model, self.last_warm_sec[model])
+        self._resident.setdefault(url, {}).setdefault(model, Resident())
+        return True
+
+    async def _prefetch(self, url: str, model: str, kind: str) -> None:
+        if await self.is_resident(url, model):
+            self.prefetch_skipped += 1
+            return
+        self.prefetches += 1
+        await self.warm(url, model, kind)
+
+    async def _warm_on_start(self) -> None:
+        url = await get_setting("ollama_url") or DEFAULT_OLLAMA_URL
+        try:
+            await self.warm_pinned(url)
+        except Exception as e:
+            logger.debug("Ollama warmup failed: %s", e)
+
+
+# グローバルインスタンス
+residency = ResidencyManager()
@@ -0,0 +1,199 @@
+"""履歴全文検索 — SQLite FTS5 (trigram) で会話・メッセージ・パイプライン実行を検索
+
+trigram トークナイザは3文字以上の語しか索引を引けないため、
+2文字以下の語（「東京」など）は LIKE による絞り込みに回す。
+
+bm25 による並べ替えはヒット件数に比例して重くなるため、ヒットが多い語では
+新しい方から RANK_WINDOW 件だけをスコアリング対象にする（履歴が増えても
+検索時間がほぼ一定になる）。
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any
+
+from helix_studio.db import db_pool
+
+MIN_TRIGRAM_LEN = 3
+SNIPPET_TOKENS = 16
+RANK_WINDOW = 2000
+# スニペット内のハイライト位置（フロント側でエスケープ後に <mark> へ置換する）
+MARK_OPEN = "\x02"
+MARK_CLOSE = "\x03"
+ELLIPSIS = "…"
+
+KINDS = ("message", "conversation", "pipeline")
+
+
+def _split_terms(query: str) -> tuple[list[str], list[str]]:
+    """クエリを空白で分割し、(FTS MATCH 用の語, LIKE 用の短い語) を返す。"""
+    terms = [t for t in re.split(r"\s+", query.strip()) if t]
+    long_terms = [t for t in terms if len(t) >= MIN_TRIGRAM_LEN]
+    short_terms = [t for t in terms if len(t) < MIN_TRIGRAM_LEN]
+    return long_terms, short_terms
+
+
+def _match_expr(terms: list[str]) -> str:
+    """各語をフレーズとしてクォートし AND で結合（FTS 構文エラーを防ぐ）。"""
+    return " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _make_snippet(text: str, terms: list[str], width: int = 60) -> str:
+    """LIKE 検索用に、最初にヒットした語の前後を切り出してマークする。"""
+    lower = text.lower()
+    pos, hit = -1, ""
+    for t in terms:
+        pos = lower.find(t.lower())
+        if pos >= 0:
+            hit = text[pos:pos + len(t)]
+            break
+    if pos < 0:
+        return text[:width * 2] + (ELLIPSIS if len(text) > width * 2 else "")
+    start = max(0, pos - width)
+    end = min(len(text), pos + len(hit) + width)
+    return (
+        (ELLIPSIS if start > 0 else "")
+        + text[start:pos] + MARK_OPEN + hit + MARK_CLOSE + text[pos + len(hit):end]
+        + (ELLIPSIS if end < len(text) else "")
+    )
+
+
+async def _rank_floor(db, fts_table: str, match: str) -> int:
+    """新しい方から RANK_WINDOW 件目の rowid を返す（ヒットがそれ未満なら0）。"""
+    cursor = await db.execute(
+        f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ? "
+        "ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+        (match, RANK_WINDOW),
+    )
+    row = await cursor.fetchone()
+    return row[0] if row else 0
+
+
+async def _where(db, fts_table: str, like_column: str, long_terms: list[str], short_terms: list[str]) -> tuple[str, list]:
+    clauses: list[str] = []
+    params: list = []
+    if long_terms:
+        match = _match_expr(long_terms)
+        clauses.append(f"{fts_table} MATCH ? AND {fts_table}.rowid >= ?")
+        params.extend([match, await _rank_floor(db, fts_table, match)])
+    for t in short_terms:
+        clauses.append(f"{like_column} LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(t))
+    return " AND ".join(clauses), params
+
+
+async def _search_messages(db, long_terms, short_terms, limit) -> list[dict[str, Any]]:
+    where, params = await _where(db, "messages_fts", "m.content", long_terms, short_terms)
+    if long_terms:
+        sql = (
+            "SELECT m.id AS message_id, m.conversation_id, m.role, m.created_at, c.title, "
+            "snippet(messages_fts, 0, ?, ?, ?, ?) AS snippet, bm25(messages_fts) AS rank "
+            "FROM messages_fts "
+            "JOIN messages m ON m.rowid = messages_fts.rowid "
+            "JOIN conversations c ON c.id = m.conversation_id "
+            f"WHERE {where} ORDER BY rank LIMIT ?"
+        )
+        params = [MARK_OPEN, MARK_CLOSE, ELLIPSIS, SNIPPET_TOKENS, *params, limit]
+    else:
+        sql = (
+            "SELECT m.id AS message_id, m.conversation_id, m.role, m.created_at, c.title, "
+            "m.content AS snippet, 0.0 AS rank "
+            "FROM messages m JOIN conversations c ON c.id = m.conversation_id "
+            f"WHERE {where} ORDER BY m.rowid DESC LIMIT ?"
+        )
+        params = [*params, limit]
+    cursor = await db.execute(sql, params)
+    rows = [dict(r) for r in await cursor.fetchall()]
+    for r in rows:
+        r["kind"] = "message"
+        if not long_terms:
+            r["snippet"] = _make_snippet(r["snippet"], short_terms)
+    return rows
+
+
+async def _search_conversations(db, long_terms, short_terms, limit) -> list[dict[str, Any]]:
+    where, params = await _where(db, "conversations_fts", "c.title", long_terms, short_terms)
+    if long_terms:
+        select = "highlight(conversations_fts, 0, ?, ?) AS snippet, bm25(conversations_fts) AS rank"
+        source = "conversations_fts JOIN conversations c ON c.rowid = conversations_fts.rowid"
+        order = "rank"
+        params = [MARK_OPEN, MARK_CLOSE, *params, limit]
+    else:
+        select = "c.title AS snippet, 0.0 AS rank"
+        source = "conversations c"
+        order = "c.updated_at DESC"
+        params = [*params, limit]
+    cursor = await db.execute(
+        f"SELECT c.id AS conversation_id, c.title, c.updated_at AS created_at, {select} "
+        f"FROM {source} WHERE {where} ORDER BY {order} LIMIT ?",
+        params,
+    )
+    rows = [dict(r) for r in await cursor.fetchall()]
+    for r in rows:
+        r["kind"] = "conversation"
+        if not long_terms:
+            r["snippet"] = _make_snippet(r["snippet"], short_terms)
+    return rows
+
+
+async def _search_pipelines(db, long_terms, short_terms, limit) -> list[dict[str, Any]]:
+    like_col = (
+        "(p.title || ' ' || p.input_text || ' ' || IFNULL(p.step2_result, '') || ' ' "
+        "|| IFNULL(p.step3_result, ''))"
+    )
+    where, params = await _where(db, "pipeline_runs_fts", like_col, long_terms, short_terms)
+    if long_terms:
+        select = "snippet(pipeline_runs_fts, -1, ?, ?, ?, ?) AS snippet, bm25(pipeline_runs_fts) AS rank"
+        source = "pipeline_runs_fts JOIN pipeline_runs p ON p.rowid = pipeline_runs_fts.rowid"
+        order = "rank"
+        params = [MARK_OPEN, MARK_CLOSE, ELLIPSIS, SNIPPET_TOKENS, *params, limit]
+    else:
+        select = f"{like_col} AS snippet, 0.0 AS rank"
+        source = "pipeline_runs p"
+        order = "p.created_at DESC"
+        params = [*params, limit]
+    cursor = await db.execute(
+        f"SELECT p.id AS pipeline_id, p.title, p.status, p.created_at, {select} "
+        f"FROM {source} WHERE {where} ORDER BY {order} LIMIT ?",
+        params,
+    )
+    rows = [dict(r) for r in await cursor.fetchall()]
+    for r in rows:
+        r["kind"] = "pipeline"
+        if not long_terms:
+            r["snippet"] = _make_snippet(r["snippet"], short_terms)
+    return rows
+
+
+_SEARCHERS = {
+    "message": _search_messages,
+    "conversation": _search_conversations,
+    "pipeline": _search_pipelines,
+}
+
+
+async def search(
+    query: str,
+    limit: int = 20,
+    kinds: tuple[str, ...] | list[str] = KINDS,
+) -> list[dict[str, Any]]:
+    """全文検索してスコア順（bm25、小さいほど関連度が高い）に返す。"""
+    long_terms, short_terms = _split_terms(query)
+    if not long_terms and not short_terms:
+        return []
+
+    results: list[dict[str, Any]] = []
+    async with db_pool.read() as db:
+        for kind in kinds:
+            searcher = _SEARCHERS.get(kind)
+            if searcher:
+                results.extend(await searcher(db, long_terms, short_terms, limit))
+
+    results.sort(key=lambda r: r["rank"])
+    return results[:limit]
@@ -8,7 +8,7 @@ import os
 from pathlib import Path
 from typing import Any
 
-import httpx
+from helix_studio.services.http_pool import http_pool
 
 logger = logging.getLogger(__name__)
 
@@ -30,61 +30,63 @@ async def web_search(query: str, max_results: int = 5) -> list[dict[str, str]]:
 
     # DuckDuckGo Instant Answer API（フォールバック）
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(
-                "https://api.duckduckgo.com/",
-                params={"q": query, "format": "json", "no_html": "1"},
-            )
-            data = resp.json()
-
-            # Abstract（概要）
-            if data.get("AbstractText"):
+        client = http_pool.client("web")
+        resp = await client.get(
+            "https://api.duckduckgo.com/",
+            params={"q": query, "format": "json", "no_html": "1"},
+            timeout=10.0,
+        )
+        data = resp.json()
+
+        # Abstract（概要）
+        if data.get("AbstractText"):
+            results.append({
+                "title": data.get("Heading", query),
+                "snippet": data["AbstractText"][:300],
+                "url": data.get("AbstractURL", ""),
+                "source": "DuckDuckGo",
+            })
+
+        # RelatedTopics
+        for topic in data.get("RelatedTopics", [])[:max_results]:
+            if isinstance(topic, dict) and topic.get("Text"):
                 results.append({
-                    "title": data.get("Heading", query),
-                    "snippet": data["AbstractText"][:300],
-                    "url": data.get("AbstractURL", ""),
+                    "title": topic.get("Text", "")[:100],
+                    "snippet": topic.get("Text", "")[:300],
+                    "url": topic.get("FirstURL", ""),
                     "source": "DuckDuckGo",
                 })
-
-            # RelatedTopics
-            for topic in data.get("RelatedTopics", [])[:max_results]:
-                if isinstance(topic, dict) and topic.get("Text"):
-                    results.append({
-                        "title": topic.get("Text", "")[:100],
-                        "snippet": topic.get("Text", "")[:300],
-                        "url": topic.get("FirstURL", ""),
-                        "source": "DuckDuckGo",
-                    })
     except Exception as e:
         logger.debug("DuckDuckGo API search failed: %s", e)
 
     # DuckDuckGo HTML検索（フォールバック）
     if len(results) < max_results:
         try:
-            async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-                resp = await client.get(
-                    "https://html.duckduckgo.com/html/",
-                    params={"q": query},
-                    headers={"User-Agent": "Mozilla/5.0"},
-                )
-                text = resp.text
-                # シンプルなHTMLパース（BeautifulSoup不要）
-                import re
-                links = re.findall(
-                    r'class="result__a"[^>]*href="([^"]+)"[^>]*>(.*?)</a>.*?'
-                    r'class="result__snippet"[^>]*>(.*?)</span>',
-                    text, re.DOTALL,
-                )
-                for url, title, snippet in links[:max_results - len(results)]:
-                    clean_title = re.sub(r'<[^>]+>', '', title).strip()
-                    clean_snippet = re.sub(r'<[^>]+>', '', snippet).strip()
-                    if clean_title:
-                        results.append({
-                            "title": clean_title,
-                            "snippet": clean_snippet[:300],
-                            "url": url,
-                            "source": "DuckDuckGo",
-                        })
+            client = http_pool.client("web")
+            resp = await client.get(
+                "https://html.duckduckgo.com/html/",
+                params={"q": query},
+                headers={"User-Agent": "Mozilla/5.0"},
+                timeout=10.0,
+            )
+            text = resp.text
+            # シンプルなHTMLパース（BeautifulSoup不要）
+            import re
+            links = re.findall(
+                r'class="result__a"[^>]*href="([^"]+)"[^>]*>(.*?)</a>.*?'
+                r'class="result__snippet"[^>]*>(.*?)</span>',
+                text, re.DOTALL,
+            )
+            for url, title, snippet in links[:max_results - len(results)]:
+                clean_title = re.sub(r'<[^>]+>', '', title).strip()
+                clean_snippet = re.sub(r'<[^>]+>', '', snippet).strip()
+                if clean_title:
+                    results.append({
+                        "title": clean_title,
+                        "snippet": clean_snippet[:300],
+                        "url": url,
+                        "source": "DuckDuckGo",
+                    })
         except Exception as e:
             logger.debug("DuckDuckGo HTML search failed: %s", e)
 
@@ -94,28 +96,29 @@ async def web_search(query: str, max_results: int = 5) -> list[dict[str, str]]:
 async def _searxng_search(query: str, max_results: int = 5) -> list[dict[str, str]]:
     """SearXNG API で横断検索（Google/Bing/DuckDuckGo等）"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(
-                f"{SEARXNG_URL}/search",
-                params={
-                    "q": query,
-                    "format": "json",
-                    "categories": "general",
-                    "language": "auto",
-                    "pageno": 1,
-                },
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            results = []
-            for r in data.get("results", [])[:max_results]:
-                results.append({
-                    "title": r.get("title", ""),
-                    "snippet": r.get("content", "")[:300],
-                    "url": r.get("url", ""),
-                    "source": f"SearXNG ({r.get('engine', '')})",
-                })
-            return results
+        client = http_pool.client("searxng")
+        resp = await client.get(
+            f"{SEARXNG_URL}/search",
+            params={
+                "q": query,
+                "format": "json",
+                "categories": "general",
+                "language": "auto",
+                "pageno": 1,
+            },
+            timeout=10.0,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        results = []
+        for r in data.get("results", [])[:max_results]:
+            results.append({
+                "title": r.get("title", ""),
+                "snippet": r.get("content", "")[:300],
+                "url": r.get("url", ""),
+                "source": f"SearXNG ({r.get('engine', '')})",
+            })
+        return results
     except Exception as e:
         logger.debug("SearXNG unavailable, falling back to DuckDuckGo: %s", e)
         return []
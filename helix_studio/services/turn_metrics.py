@@ -0,0 +1,180 @@
+"""チャット1ターンごとのレイテンシ計測 — TTFT・各段階の所要時間・トークン速度
+
+ターン中の各段階（DB保存、履歴構築、コンテキスト取得、上流接続、最初のトークン、
+チャンク間隔）を TurnTrace に記録し、turn_metrics テーブルに保存する。
+トークン数は各プロバイダのストリームが usage dict に書き込んだ値を使う
+（Ollama の prompt_eval_count / eval_count、Anthropic / OpenAI の usage）。
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from helix_studio.db import db_pool
+
+# パーセンタイル集計に使う直近ターン数の既定値
+DEFAULT_WINDOW = 5_000
+
+# 集計対象の列
+LATENCY_FIELDS = (
+    "ttft_ms", "total_ms", "connect_ms", "context_ms",
+    "gap_max_ms", "tokens_per_sec",
+)
+
+_INSERT_SQL = """INSERT INTO turn_metrics
+    (message_id, conversation_id, provider, model, db_ms, history_ms, context_ms,
+     stages, skipped, connect_ms, ttft_ms, stream_ms, total_ms, chunks,
+     gap_mean_ms, gap_max_ms, tokens_in, tokens_out, tokens_per_sec)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+def mark_connected(usage: dict[str, Any] | None) -> None:
+    """上流の応答ヘッダを受け取った時刻を usage に記録する（接続時間の計測用）。"""
+    if usage is not None:
+        usage["connected_at"] = time.perf_counter()
+
+
+def _ms(seconds: float | None) -> int | None:
+    return None if seconds is None else int(seconds * 1000)
+
+
+class TurnTrace:
+    """1ターン分の計測値を集める。時刻は全て time.perf_counter()。"""
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.started = time.perf_counter()
+        self.stages: dict[str, int] = {}
+        self.skipped: list[str] = []
+        self.usage: dict[str, Any] = {}
+        self._stream_started: float | None = None
+        self._first_chunk: float | None = None
+        self._last_chunk: float | None = None
+        self._stream_ended: float | None = None
+        self.chunks = 0
+        self._gap_total = 0.0
+        self._gap_max = 0.0
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """with ブロックの所要時間を stage として記録する。"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage] = _ms(time.perf_counter() - start) or 0
+
+    def stream_started(self) -> None:
+        self._stream_started = time.perf_counter()
+
+    def chunk(self) -> None:
+        """チャンク受信ごとに呼ぶ。最初のチャンクとチャンク間隔を記録する。"""
+        now = time.perf_counter()
+        if self._first_chunk is None:
+            self._first_chunk = now
+        else:
+            gap = now - self._last_chunk
+            self._gap_total += gap
+            if gap > self._gap_max:
+                self._gap_max = gap
+        self._last_chunk = now
+        self.chunks += 1
+
+    def stream_ended(self) -> None:
+        self._stream_ended = time.perf_counter()
+
+    @property
+    def ttft_ms(self) -> int | None:
+        if self._stream_started is None or self._first_chunk is None:
+            return None
+        return _ms(self._first_chunk - self._stream_started)
+
+    def row(self) -> dict[str, Any]:
+        """turn_metrics の1行分の値。"""
+        start = self._stream_started
+        end = self._stream_ended or time.perf_counter()
+        connected = self.usage.get("connected_at")
+        tokens_out = self.usage.get("tokens_out")
+        tokens_per_sec = None
+        if tokens_out and self._first_chunk is not None and end > self._first_chunk:
+            tokens_per_sec = round(tokens_out / (end - self._first_chunk), 2)
+        stage_ms = {k: v for k, v in self.stages.items() if k not in ("db", "history", "context")}
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "db_ms": self.stages.get("db"),
+            "history_ms": self.stages.get("history"),
+            "context_ms": self.stages.get("context"),
+            "stages": stage_ms,
+            "skipped": self.skipped,
+            "connect_ms": _ms(connected - start) if connected and start else None,
+            "ttft_ms": self.ttft_ms,
+            "stream_ms": _ms(end - start) if start is not None else None,
+            "total_ms": _ms(end - self.started),
+            "chunks": self.chunks,
+            "gap_mean_ms": (
+                round(self._gap_total * 1000 / (self.chunks - 1), 2)
+                if self.chunks > 1 else None
+            ),
+            "gap_max_ms": _ms(self._gap_max) if self.chunks > 1 else None,
+            "tokens_in": self.usage.get("tokens_in"),
+            "tokens_out": tokens_out,
+            "tokens_per_sec": tokens_per_sec,
+        }
+
+
+async def record_turn(trace: TurnTrace, message_id: str, conversation_id: str) -> dict[str, Any]:
+    """計測値を turn_metrics に保存し、保存した行を返す。"""
+    row = trace.row()
+    async with db_pool.write() as db:
+        await db.execute(_INSERT_SQL, (
+            message_id, conversation_id, row["provider"], row["model"],
+            row["db_ms"], row["history_ms"], row["context_ms"],
+            json.dumps(row["stages"]), json.dumps(row["skipped"]),
+            row["connect_ms"], row["ttft_ms"], row["stream_ms"], row["total_ms"],
+            row["chunks"], row["gap_mean_ms"], row["gap_max_ms"],
+            row["tokens_in"], row["tokens_out"], row["tokens_per_sec"],
+        ))
+    return row
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """ソート済みの値から nearest-rank 法でパーセンタイルを返す。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+async def latency_stats(window: int = DEFAULT_WINDOW) -> dict[str, Any]:
+    """直近 window ターンの p50/p95/p99 をプロバイダ・モデル別に集計する。"""
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            f"SELECT provider, model, {', '.join(LATENCY_FIELDS)} FROM turn_metrics "
+            "ORDER BY id DESC LIMIT ?",
+            (window,),
+        )
+        rows = await cursor.fetchall()
+
+    groups: dict[tuple[str, str], list] = {}
+    for row in rows:
+        groups.setdefault((row["provider"], row["model"]), []).append(row)
+
+    models = []
+    for (provider, model), group in sorted(groups.items()):
+        entry: dict[str, Any] = {"provider": provider, "model": model, "turns": len(group)}
+        for field in LATENCY_FIELDS:
+            values = sorted(r[field] for r in group if r[field] is not None)
+            entry[field] = {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "count": len(values),
+            }
+        models.append(entry)
+    return {"window": window, "turns": len(rows), "models": models}
@@ -48,6 +48,14 @@ document.addEventListener('alpine:init', () => {
             messages: 'メッセージ',
             deleteConvConfirm: 'この会話を削除しますか？',
             historyLoadError: '履歴読み込みエラー:',
+            historySearchPlaceholder: '会話・パイプラインを全文検索...',
+            searchHits: '件ヒット',
+            searchKind_message: 'メッセージ',
+            searchKind_conversation: '会話',
+            searchKind_pipeline: 'パイプライン',
+            loadMore: 'さらに読み込む',
+            loadOlderMessages: '以前のメッセージを読み込む',
+            contextSkipped: '時間切れで省略:',
             // knowledge
             qdrantConnected: 'Qdrant 接続中',
             qdrantDisconnected: 'Qdrant 未接続',
@@ -115,6 +123,11 @@ document.addEventListener('alpine:init', () => {
             openaiConnTest: 'OpenAI 接続テスト',
             localAiSettings: 'ローカル AI 設定',
             ollamaUrl: 'Ollama URL',
+            ollamaExtraUrls: '追加の Ollama URL',
+            openaiCompatExtraUrls: '追加の OpenAI 互換 API URL',
+            extraUrlsDesc: 'カンマ区切りで複数指定できます。リクエストは実行中の件数とモデルのロード状態を見て振り分け、接続できないノードは自動で避けます。',
+            ollamaKeepAlive: 'Ollama モデル常駐時間 (keep_alive)',
+            ollamaKeepAliveDesc: 'デフォルトのローカルモデルと埋め込みモデルを起動時にロードし、最後の利用からこの時間メモリに保持します（例: 30m, 1h, -1 = 無期限）。',
             openaiCompatUrl: 'OpenAI 互換 API URL',
             openaiCompatKey: 'OpenAI 互換 API キー（任意）',
             ollamaConnTest: 'Ollama 接続テスト',
@@ -129,6 +142,12 @@ document.addEventListener('alpine:init', () => {
             embeddingModel: '埋め込みモデル (Ollama)',
             autoInjectKnowledge: '会話にナレッジを自動注入',
             ragAutoInjectDesc: 'アップロードしたドキュメントのチャンクをベクトル検索し、関連コンテキストをチャットに自動注入します。',
+            backendStatus: 'バックエンド状態',
+            backendStatusDesc: '停止中と判定されたバックエンドは、復旧を確認するまで呼び出しをスキップします。',
+            circuitClosed: '正常',
+            circuitOpen: '停止中（スキップ）',
+            circuitHalfOpen: '復旧確認中',
+            refresh: '更新',
             gpuVramSettings: 'GPU / VRAM 設定',
             gpuVramTotal: 'GPU VRAM 合計 (GB)',
             gpuVramAutoDetect: '0 = 自動検出 (nvidia-smi)',
@@ -192,6 +211,14 @@ document.addEventListener('alpine:init', () => {
             messages: 'messages',
             deleteConvConfirm: 'Delete this conversation?',
             historyLoadError: 'History load error:',
+            historySearchPlaceholder: 'Search conversations and pipelines...',
+            searchHits: 'results',
+            searchKind_message: 'Message',
+            searchKind_conversation: 'Conversation',
+            searchKind_pipeline: 'Pipeline',
+            loadMore: 'Load more',
+            loadOlderMessages: 'Load older messages',
+            contextSkipped: 'Skipped (timeout):',
             // knowledge
             qdrantConnected: 'Qdrant Connected',
             qdrantDisconnected: 'Qdrant Disconnected',
@@ -259,6 +286,11 @@ document.addEventListener('alpine:init', () => {
             openaiConnTest: 'OpenAI Connection Test',
             localAiSettings: 'Local AI Settings',
             ollamaUrl: 'Ollama URL',
+            ollamaExtraUrls: 'Additional Ollama URLs',
+            openaiCompatExtraUrls: 'Additional OpenAI Compatible API URLs',
+            extraUrlsDesc: 'Comma-separated. Requests are routed by in-flight load and which node already has the model loaded; unreachable nodes are skipped automatically.',
+            ollamaKeepAlive: 'Ollama Model Keep-Alive',
+            ollamaKeepAliveDesc: 'The default local model and the embedding model are loaded at startup and kept in memory this long after their last use (e.g. 30m, 1h, -1 = forever).',
             openaiCompatUrl: 'OpenAI Compatible API URL',
             openaiCompatKey: 'OpenAI Compatible API Key (optional)',
             ollamaConnTest: 'Ollama Connection Test',
@@ -273,6 +305,12 @@ document.addEventListener('alpine:init', () => {
             embeddingModel: 'Embedding Model (Ollama)',
             autoInjectKnowledge: 'Auto-inject knowledge into conversations',
             ragAutoInjectDesc: 'Vector-searches uploaded document chunks and auto-injects relevant context into chat.',
+            backendStatus: 'Backend Status',
+            backendStatusDesc: 'Backends detected as down are skipped until they are confirmed to have recovered.',
+            circuitClosed: 'Healthy',
+            circuitOpen: 'Down (skipped)',
+            circuitHalfOpen: 'Checking recovery',
+            refresh: 'Refresh',
             gpuVramSettings: 'GPU / VRAM Settings',
             gpuVramTotal: 'GPU VRAM Total (GB)',
             gpuVramAutoDetect: '0 = Auto-detect (nvidia-smi)',
@@ -306,14 +344,9 @@ document.addEventListener('alpine:init', () => {
     });
 
     // ── Markdown レンダラー ───────────────────────────────
+    // コードのハイライトは highlightCode() で行う（閉じたフェンスだけを一度だけ処理するため）
     if (typeof marked !== 'undefined') {
         marked.setOptions({
-            highlight(code, lang) {
-                if (typeof hljs !== 'undefined' && lang && hljs.getLanguage(lang)) {
-                    return hljs.highlight(code, { language: lang }).value;
-                }
-                return typeof hljs !== 'undefined' ? hljs.highlightAuto(code).value : code;
-            },
             breaks: true,
             gfm: true,
         });
@@ -332,15 +365,21 @@ document.addEventListener('alpine:init', () => {
         messages: [],
         isStreaming: false,
         currentStreamText: '',
+        // ストリーミング中の逐次レンダラーと requestAnimationFrame の予約
+        streamRenderer: null,
+        renderFrame: null,
 
         // モデル選択
         provider: 'ollama',
         model: '',
         availableModels: [],
 
-        // 会話
+        // 会話 (キーセットページングのカーソル)
         conversations: [],
+        conversationsCursor: null,
         currentConversationId: null,
+        messagesCursor: null,
+        loadingOlder: false,
 
         // Mem0 & RAG
         mem0Enabled: true,
@@ -396,10 +435,10 @@ document.addEventListener('alpine:init', () => {
             switch (data.type) {
                 case 'chunk':
                     this.currentStreamText += data.content || '';
-                    this.updateLastAssistantMessage();
+                    this.scheduleRender();
                     break;
                 case 'done':
-                    this.isStreaming = false;
+                    this.finishStream();
                     if (this.messages.length > 0) {
                         const lastIdx = this.messages.length - 1;
                         const last = this.messages[lastIdx];
@@ -409,6 +448,7 @@ document.addEventListener('alpine:init', () => {
                                 provider_label: data.provider_label || '',
                                 model: data.model || '',
                                 duration_ms: data.duration_ms || 0,
+                                context_skipped: data.skipped || [],
                             };
                         }
                     }
@@ -416,7 +456,7 @@ document.addEventListener('alpine:init', () => {
                     this.loadConversations();
                     break;
                 case 'error':
-                    this.isStreaming = false;
+                    this.finishStream();
                     this.messages.push({
                         role: 'error',
                         content: data.content || 'Unknown error',
@@ -432,9 +472,33 @@ document.addEventListener('alpine:init', () => {
             }
         },
 
+        // チャンクごとではなく1フレームに1回だけ描画する
+        scheduleRender() {
+            if (this.renderFrame !== null) return;
+            this.renderFrame = requestAnimationFrame(() => {
+                this.renderFrame = null;
+                this.updateLastAssistantMessage();
+            });
+        },
+
         updateLastAssistantMessage() {
             const last = this.messages[this.messages.length - 1];
-            if (last?.role === 'assistant') last.content = this.currentStreamText;
+            if (last?.role !== 'assistant') return;
+            last.content = this.currentStreamText;
+            if (this.streamRenderer) last.html = this.streamRenderer.render(this.currentStreamText);
+        },
+
+        // 未描画のチャンクを反映し、最終表示は全文の通常レンダリングに戻す
+        finishStream() {
+            if (this.renderFrame !== null) {
+                cancelAnimationFrame(this.renderFrame);
+                this.renderFrame = null;
+            }
+            if (this.isStreaming) this.updateLastAssistantMessage();
+            const last = this.messages[this.messages.length - 1];
+            if (last?.role === 'assistant') delete last.html;
+            this.streamRenderer = null;
+            this.isStreaming = false;
         },
 
         async sendMessage(content) {
@@ -452,6 +516,7 @@ document.addEventListener('alpine:init', () => {
             });
 
             this.currentStreamText = '';
+            this.streamRenderer = new IncrementalMarkdown();
             this.messages.push({
                 role: 'assistant',
                 content: '',
@@ -470,6 +535,9 @@ document.addEventListener('alpine:init', () => {
                 content: content.trim(),
                 mem0_enabled: this.mem0Enabled,
                 rag_enabled: this.ragEnabled,
+                // チャンクを約1フレーム分 (33ms) か 2KB ごとにまとめて受け取る
+                coalesce_ms: 33,
+                coalesce_bytes: 2048,
             }));
         },
 
@@ -478,6 +546,9 @@ document.addEventListener('alpine:init', () => {
                 const res = await fetch('/api/models');
                 if (!res.ok) return;
                 const data = await res.json();
+                if (data.errors && data.errors[this.provider]) {
+                    console.warn(`Model list for ${this.provider} failed:`, data.errors[this.provider]);
+                }
                 const providerModels = data[this.provider] || [];
 
                 this.availableModels = providerModels.map(m => {
@@ -507,6 +578,21 @@ document.addEventListener('alpine:init', () => {
                 if (!res.ok) return;
                 const data = await res.json();
                 this.conversations = Array.isArray(data) ? data : (data.conversations || []);
+                this.conversationsCursor = data.next_cursor || null;
+            } catch (e) {
+                console.error('Conversation load error:', e);
+            }
+        },
+
+        async loadMoreConversations() {
+            if (!this.conversationsCursor) return;
+            try {
+                const res = await fetch('/api/conversations?' + new URLSearchParams({ cursor: this.conversationsCursor }));
+                if (!res.ok) return;
+                const data = await res.json();
+                const known = new Set(this.conversations.map(c => c.id));
+                this.conversations.push(...data.conversations.filter(c => !known.has(c.id)));
+                this.conversationsCursor = data.next_cursor || null;
             } catch (e) {
                 console.error('Conversation load error:', e);
             }
@@ -514,9 +600,21 @@ document.addEventListener('alpine:init', () => {
 
         async newConversation() {
             this.currentConversationId = null;
+            this.messagesCursor = null;
+            this.finishStream();
             this.messages = [];
             this.currentStreamText = '';
-            this.isStreaming = false;
+        },
+
+        toViewMessage(m) {
+            return {
+                role: m.role,
+                content: m.content,
+                timestamp: m.timestamp || m.created_at || '',
+                provider_label: m.provider || '',
+                model: m.model || '',
+                duration_ms: m.duration_ms || 0,
+            };
         },
 
         async switchConversation(id) {
@@ -525,19 +623,37 @@ document.addEventListener('alpine:init', () => {
                 if (!res.ok) return;
                 const data = await res.json();
                 this.currentConversationId = id;
-                this.messages = (data.messages || []).map(m => ({
-                    role: m.role,
-                    content: m.content,
-                    timestamp: m.timestamp || m.created_at || '',
-                    provider_label: m.provider || '',
-                    model: m.model || '',
-                    duration_ms: m.duration_ms || 0,
-                }));
+                this.messagesCursor = data.next_cursor || null;
+                this.messages = (data.messages || []).map(m => this.toViewMessage(m));
             } catch (e) {
                 console.error('Conversation load error:', e);
             }
         },
 
+        async loadOlderMessages() {
+            if (!this.messagesCursor || this.loadingOlder) return;
+            const convId = this.currentConversationId;
+            this.loadingOlder = true;
+            try {
+                const params = new URLSearchParams({ before: this.messagesCursor });
+                const res = await fetch(`/api/conversations/${convId}/messages?` + params);
+                if (res.ok && convId === this.currentConversationId) {
+                    const data = await res.json();
+                    // 先頭に挿入してもスクロール位置が動かないよう高さの差分を補正
+                    const el = document.querySelector('#chat-messages');
+                    const prevHeight = el ? el.scrollHeight : 0;
+                    this.messages.unshift(...data.messages.map(m => this.toViewMessage(m)));
+                    this.messagesCursor = data.next_cursor || null;
+                    Alpine.nextTick(() => {
+                        if (el) el.scrollTop += el.scrollHeight - prevHeight;
+                    });
+                }
+            } catch (e) {
+                console.error('Conversation load error:', e);
+            }
+            this.loadingOlder = false;
+        },
+
         async deleteConversation(id) {
             if (!confirm(Alpine.store('i18n').t('deleteConfirm'))) return;
             try {
@@ -554,6 +670,9 @@ document.addEventListener('alpine:init', () => {
             this.connectWs();
             this.loadModels();
             this.loadConversations();
+            // 履歴・検索画面からのリンク (/?conversation=<id>)
+            const convId = new URLSearchParams(location.search).get('conversation');
+            if (convId) this.switchConversation(convId);
         },
     });
 });
@@ -563,7 +682,80 @@ document.addEventListener('alpine:init', () => {
 function renderMarkdown(text) {
     if (!text) return '';
     if (typeof marked === 'undefined') return escapeHtml(text);
-    return addCopyButtons(marked.parse(text));
+    return addCopyButtons(highlightCode(marked.parse(text)));
+}
+
+function highlightCode(html) {
+    if (typeof hljs === 'undefined' || !html.includes('<pre>')) return html;
+    const tpl = document.createElement('template');
+    tpl.innerHTML = html;
+    tpl.content.querySelectorAll('pre code').forEach(el => {
+        const lang = (el.className.match(/language-([\w+#-]+)/) || [])[1];
+        const code = el.textContent;
+        el.innerHTML = lang && hljs.getLanguage(lang)
+            ? hljs.highlight(code, { language: lang }).value
+            : hljs.highlightAuto(code).value;
+        el.classList.add('hljs');
+    });
+    return tpl.innerHTML;
+}
+
+// ストリーミング中の Markdown を逐次レンダリングする。
+// 閉じたブロック（フェンス外の空行で区切られた範囲）は一度だけ変換・ハイライトして固定し、
+// 毎回パースするのは末尾の開いたブロックだけにする。開いたコードフェンスはハイライトしない。
+// ブロック単位の変換は全文変換と細部が異なりうるため、完了後は renderMarkdown() で描き直す。
+class IncrementalMarkdown {
+    constructor() {
+        this.frozenHtml = '';
+        this.frozenUpTo = 0;   // 固定済みの文字数
+        this.scanPos = 0;      // 行走査済みの位置（常に行頭）
+        this.fence = null;     // 開いているフェンス ('```' / '~~~' と長さ)
+        this.fenceTop = false; // 開いているフェンスが字下げなしか
+        this.boundary = 0;     // 直近に見つけたブロック境界
+        this.blank = false;    // 直前の行が空行か
+    }
+
+    render(text) {
+        if (typeof marked === 'undefined') return escapeHtml(text);
+        this.scan(text);
+        if (this.boundary > this.frozenUpTo) {
+            const block = text.slice(this.frozenUpTo, this.boundary);
+            this.frozenHtml += addCopyButtons(highlightCode(marked.parse(block)));
+            this.frozenUpTo = this.boundary;
+        }
+        const tail = text.slice(this.frozenUpTo);
+        return this.frozenHtml + (tail ? addCopyButtons(marked.parse(tail)) : '');
+    }
+
+    // 改行で終わった行だけを走査し、フェンスの開閉と境界を更新する
+    scan(text) {
+        while (true) {
+            const end = text.indexOf('\n', this.scanPos);
+            if (end < 0) break;
+            const line = text.slice(this.scanPos, end);
+            const fence = line.match(/^ {0,3}(`{3,}|~{3,})/);
+            if (this.fence) {
+                if (fence && fence[1][0] === this.fence[0] && fence[1].length >= this.fence.length
+                    && !line.slice(fence.index + fence[0].length).trim()) {
+                    if (this.fenceTop) this.boundary = end + 1;
+                    this.fence = null;
+                    this.blank = false;
+                }
+            } else if (fence) {
+                // 字下げなしのフェンスは段落・リストを必ず閉じるので、その前後が境界
+                this.fence = fence[1];
+                this.fenceTop = !line.startsWith(' ');
+                if (this.fenceTop) this.boundary = this.scanPos;
+            } else if (!line.trim()) {
+                this.blank = true;
+            } else {
+                // 空行の後に字下げなしの行が来たら、空行の後ろがブロック境界
+                if (this.blank && !/^[ \t]/.test(line)) this.boundary = this.scanPos;
+                this.blank = false;
+            }
+            this.scanPos = end + 1;
+        }
+    }
 }
 
 function addCopyButtons(html) {
@@ -2,9 +2,20 @@
 
 from __future__ import annotations
 
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
 import pytest
 
-from helix_studio.config import get_all_settings, get_setting, set_setting
+from helix_studio.config import (
+    get_all_settings,
+    get_setting,
+    set_setting,
+    set_settings,
+    settings_cache,
+)
+from helix_studio.db import db_pool
 
 
 @pytest.mark.asyncio
@@ -40,3 +51,57 @@ async def test_get_all_settings_returns_dict(app):
     assert isinstance(settings, dict)
     assert "ollama_url" in settings
     assert "language" in settings
+
+
+@pytest.mark.asyncio
+async def test_snapshot_loaded_at_startup(app):
+    assert settings_cache.stats()["loaded"] is True
+
+
+@pytest.mark.asyncio
+async def test_reads_do_not_touch_db(app):
+    loads = settings_cache.loads
+    for _ in range(10):
+        await get_setting("ollama_url")
+    assert settings_cache.loads == loads
+
+
+@pytest.mark.asyncio
+async def test_set_setting_writes_through(app):
+    await set_setting("ollama_url", "http://gpu-box:11434")
+    assert await get_setting("ollama_url") == "http://gpu-box:11434"
+    # DB も更新されている
+    settings_cache.invalidate()
+    assert await get_setting("ollama_url") == "http://gpu-box:11434"
+
+
+@pytest.mark.asyncio
+async def test_set_settings_bulk(app):
+    await set_settings({"language": "en", "theme": "light"})
+    settings = await get_all_settings()
+    assert settings["language"] == "en"
+    assert settings["theme"] == "light"
+
+
+@pytest.mark.asyncio
+async def test_get_all_settings_returns_copy(app):
+    settings = await get_all_settings()
+    settings["language"] = "mutated"
+    assert await get_setting("language") != "mutated"
+
+
+@pytest.mark.asyncio
+async def test_load_does_not_overwrite_concurrent_write(app):
+    read = db_pool.read
+
+    @asynccontextmanager
+    async def slow_read():
+        async with read() as db:
+            yield db
+        # 読み取りが終わってからスナップショットを差し替えるまでの間に書き込みを挟む
+        await asyncio.sleep(0.05)
+
+    settings_cache.invalidate()
+    with patch.object(db_pool, "read", slow_read):
+        await asyncio.gather(get_setting("theme"), set_setting("theme", "light"))
+    assert await get_setting("theme") == "light"
@@ -11,6 +11,8 @@ from helix_studio.db import (
     DEFAULT_SETTINGS,
     ENV_OVERRIDE_MAP,
     SCHEMA,
+    ConnectionPool,
+    db_pool,
     get_connection,
     init_db,
 )
@@ -84,3 +86,178 @@ def test_default_settings_keys():
 def test_env_override_map_keys():
     assert "ANTHROPIC_API_KEY" in ENV_OVERRIDE_MAP
     assert "OLLAMA_URL" in ENV_OVERRIDE_MAP
+
+
+@pytest.mark.asyncio
+async def test_pool_is_open_during_lifespan(app):
+    assert db_pool.is_open
+
+
+@pytest.mark.asyncio
+async def test_pool_write_then_read(app):
+    async with db_pool.write() as db:
+        await db.execute(
+            "INSERT INTO settings (key, value) VALUES (?, ?)", ("pool_key", "v1")
+        )
+    async with db_pool.read() as db:
+        cursor = await db.execute("SELECT value FROM settings WHERE key = 'pool_key'")
+        row = await cursor.fetchone()
+        assert row["value"] == "v1"
+
+
+@pytest.mark.asyncio
+async def test_pool_write_rolls_back_on_error(app):
+    with pytest.raises(RuntimeError):
+        async with db_pool.write() as db:
+            await db.execute(
+                "INSERT INTO settings (key, value) VALUES (?, ?)", ("rollback_key", "x")
+            )
+            raise RuntimeError("boom")
+    async with db_pool.read() as db:
+        cursor = await db.execute("SELECT value FROM settings WHERE key = 'rollback_key'")
+        assert await cursor.fetchone() is None
+
+
+@pytest.mark.asyncio
+async def test_pool_readers_are_query_only(app):
+    async with db_pool.read() as db:
+        with pytest.raises(Exception):
+            await db.execute("DELETE FROM settings")
+
+
+@pytest.mark.asyncio
+async def test_pool_falls_back_when_closed(test_db_path):
+    pool = ConnectionPool(readers=1)
+    with patch("helix_studio.db.DB_PATH", test_db_path):
+        async with pool.write() as db:
+            await db.execute("CREATE TABLE t (x INTEGER)")
+            await db.execute("INSERT INTO t VALUES (1)")
+        async with pool.read() as db:
+            cursor = await db.execute("SELECT x FROM t")
+            row = await cursor.fetchone()
+            assert row["x"] == 1
+
+
+def test_pool_can_be_reopened_on_another_event_loop(test_db_path):
+    import asyncio
+
+    pool = ConnectionPool(readers=1)
+
+    async def contended_writes() -> None:
+        await pool.open()
+        try:
+            async def write(i: int) -> None:
+                async with pool.write() as db:
+                    await db.execute("INSERT OR REPLACE INTO t VALUES (?)", (i,))
+                    await asyncio.sleep(0)
+
+            await asyncio.gather(*(write(i) for i in range(3)))
+        finally:
+            await pool.close()
+
+    with patch("helix_studio.db.DB_PATH", test_db_path):
+        asyncio.run(_create_table(pool))
+        asyncio.run(asyncio.wait_for(contended_writes(), timeout=5))
+        asyncio.run(asyncio.wait_for(contended_writes(), timeout=5))
+
+
+async def _create_table(pool: ConnectionPool) -> None:
+    async with pool.write() as db:
+        await db.execute("CREATE TABLE t (x INTEGER PRIMARY KEY)")
+
+
+@pytest.mark.asyncio
+async def test_init_db_backfills_fts_for_existing_rows(tmp_path):
+    import aiosqlite
+
+    path = tmp_path / "legacy.db"
+    async with aiosqlite.connect(str(path)) as db:
+        await db.executescript(SCHEMA)
+        await db.execute(
+            "INSERT INTO conversations (id, provider, model) VALUES ('c', 'ollama', 'm')"
+        )
+        await db.execute(
+            "INSERT INTO messages (id, conversation_id, role, content) "
+            "VALUES ('m', 'c', 'user', 'legacy message body')"
+        )
+        await db.commit()
+    with patch("helix_studio.db.DB_PATH", path):
+        await init_db()
+        db = await get_connection()
+        try:
+            cursor = await db.execute(
+                "SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'legacy'"
+            )
+            assert len(await cursor.fetchall()) == 1
+        finally:
+            await db.close()
+
+
+# seq 列を足す前のスキーマ
+_LEGACY_SCHEMA = """
+CREATE TABLE conversations (
+    id TEXT PRIMARY KEY, title TEXT NOT NULL DEFAULT 'New Chat', provider TEXT NOT NULL,
+    model TEXT NOT NULL, system_prompt TEXT DEFAULT '',
+    created_at TEXT DEFAULT (datetime('now')), updated_at TEXT DEFAULT (datetime('now'))
+);
+CREATE TABLE messages (
+    id TEXT PRIMARY KEY,
+    conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    role TEXT NOT NULL, content TEXT NOT NULL, provider TEXT, model TEXT,
+    tokens_in INTEGER, tokens_out INTEGER, duration_ms INTEGER,
+    created_at TEXT DEFAULT (datetime('now'))
+);
+CREATE INDEX idx_messages_conv ON messages(conversation_id, created_at);
+CREATE TABLE pipeline_runs (
+    id TEXT PRIMARY KEY, title TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending',
+    input_text TEXT NOT NULL, step1_result TEXT, step2_result TEXT, step3_result TEXT,
+    step4_result TEXT, step1_model TEXT, step2_model TEXT, step3_model TEXT,
+    current_step INTEGER DEFAULT 0, error_msg TEXT,
+    created_at TEXT DEFAULT (datetime('now')), completed_at TEXT
+);
+CREATE VIRTUAL TABLE messages_fts USING fts5(
+    content, content='messages', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content);
+END;
+"""
+
+
+@pytest.mark.asyncio
+async def test_init_db_adds_seq_keeping_rowids(tmp_path):
+    import aiosqlite
+
+    path = tmp_path / "legacy.db"
+    async with aiosqlite.connect(str(path)) as db:
+        await db.executescript(_LEGACY_SCHEMA)
+        await db.execute("INSERT INTO conversations (id, provider, model) VALUES ('c', 'ollama', 'm')")
+        await db.executemany(
+            "INSERT INTO messages (id, conversation_id, role, content) VALUES (?, 'c', 'user', ?)",
+            [("m1", "first legacy body"), ("m2", "second legacy body"), ("m3", "third legacy body")],
+        )
+        await db.execute("DELETE FROM messages WHERE id = 'm2'")
+        await db.commit()
+        cursor = await db.execute("SELECT id, rowid FROM messages ORDER BY rowid")
+        rowids = [tuple(r) for r in await cursor.fetchall()]
+    with patch("helix_studio.db.DB_PATH", path):
+        await init_db()
+        await init_db()  # 2回目は何もしない
+        db = await get_connection()
+        try:
+            cursor = await db.execute("SELECT id, seq FROM messages ORDER BY seq")
+            assert [tuple(r) for r in await cursor.fetchall()] == rowids == [("m1", 1), ("m3", 3)]
+            await db.execute("VACUUM")
+            cursor = await db.execute(
+                "SELECT m.id FROM messages_fts JOIN messages m ON m.seq = messages_fts.rowid "
+                "WHERE messages_fts MATCH 'third'"
+            )
+            assert [r["id"] for r in await cursor.fetchall()] == ["m3"]
+            # 外部キーと ON DELETE CASCADE は作り直したテーブルでも効く
+            await db.execute("DELETE FROM conversations WHERE id = 'c'")
+            cursor = await db.execute("SELECT COUNT(*) FROM messages")
+            assert (await cursor.fetchone())[0] == 0
+            cursor = await db.execute("PRAGMA index_list(messages)")
+            assert "idx_messages_conv" in {r["name"] for r in await cursor.fetchall()}
+        finally:
+            await db.close()
@@ -4,6 +4,8 @@ from __future__ import annotations
 
 import pytest
 
+from helix_studio.db import db_pool
+
 
 @pytest.mark.asyncio
 async def test_create_conversation(client):
@@ -27,8 +29,9 @@ async def test_list_conversations(client):
     resp = await client.get("/api/conversations")
     assert resp.status_code == 200
     data = resp.json()
-    assert isinstance(data, list)
-    assert len(data) >= 1
+    assert isinstance(data["conversations"], list)
+    assert len(data["conversations"]) >= 1
+    assert data["next_cursor"] is None
 
 
 @pytest.mark.asyncio
@@ -66,3 +69,71 @@ async def test_delete_conversation(client):
     # Verify deleted
     get_resp = await client.get(f"/api/conversations/{conv_id}")
     assert get_resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_list_conversations_keyset_pagination(client):
+    async with db_pool.write() as db:
+        # 同一 updated_at を含めて id で順序が決まることを確認
+        await db.executemany(
+            "INSERT INTO conversations (id, provider, model, updated_at) "
+            "VALUES (?, 'ollama', 'm', ?)",
+            [(f"c{i}", f"2025-01-0{1 + i // 2} 00:00:00") for i in range(5)],
+        )
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        data = (await client.get("/api/conversations", params=params)).json()
+        seen += [c["id"] for c in data["conversations"]]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["c4", "c3", "c2", "c1", "c0"]
+
+
+@pytest.mark.asyncio
+async def test_list_conversations_invalid_cursor(client):
+    resp = await client.get("/api/conversations", params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_conversation_messages_load_older(client):
+    async with db_pool.write() as db:
+        await db.execute(
+            "INSERT INTO conversations (id, provider, model) VALUES ('c', 'ollama', 'm')"
+        )
+        # created_at は秒精度なので全件同一時刻でも挿入順を保つ
+        await db.executemany(
+            "INSERT INTO messages (id, conversation_id, role, content, created_at) "
+            "VALUES (?, 'c', 'user', ?, '2025-01-01 00:00:00')",
+            [(f"m-{9 - i}", str(i)) for i in range(7)],
+        )
+
+    data = (await client.get("/api/conversations/c", params={"limit": 3})).json()
+    assert [m["content"] for m in data["messages"]] == ["4", "5", "6"]
+    assert data["has_more"] is True
+
+    older = (await client.get(
+        "/api/conversations/c/messages",
+        params={"before": data["next_cursor"], "limit": 3},
+    )).json()
+    assert [m["content"] for m in older["messages"]] == ["1", "2", "3"]
+
+    oldest = (await client.get(
+        "/api/conversations/c/messages",
+        params={"before": older["next_cursor"], "limit": 3},
+    )).json()
+    assert [m["content"] for m in oldest["messages"]] == ["0"]
+    assert oldest["has_more"] is False
+    assert oldest["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_conversation_messages_not_found(client):
+    resp = await client.get("/api/conversations/missing/messages")
+    assert resp.status_code == 404
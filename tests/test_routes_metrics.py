@@ -0,0 +1,108 @@
+"""Tests for metrics API routes."""
+
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_settings_cache_stats(client):
+    await client.get("/api/settings")
+    resp = await client.get("/api/metrics/settings")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["loaded"] is True
+    assert data["hits"] >= 1
+    assert "misses" in data
+
+
+@pytest.mark.asyncio
+async def test_journal_stats(client):
+    resp = await client.get("/api/metrics/journal")
+    assert resp.status_code == 200
+    assert resp.json()["running"] is True
+
+
+@pytest.mark.asyncio
+async def test_history_cache_stats(client):
+    resp = await client.get("/api/metrics/history")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert {"entries", "bytes", "hit_rate", "evictions"} <= data.keys()
+
+
+@pytest.mark.asyncio
+async def test_context_stats(client):
+    resp = await client.get("/api/metrics/context")
+    assert resp.status_code == 200
+    assert resp.json()["pending_summaries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cli_session_stats(client):
+    resp = await client.get("/api/metrics/cli")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["workers"] == 0
+    assert {"max_workers", "spawned", "reused", "reaped"} <= data.keys()
+
+
+@pytest.mark.asyncio
+async def test_http_pool_stats(client):
+    resp = await client.get("/api/metrics/http")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert {"ollama", "qdrant", "reranker", "searxng"} <= data.keys()
+    assert data["ollama"]["open"] is True
+
+
+@pytest.mark.asyncio
+async def test_cloud_client_stats(client):
+    resp = await client.get("/api/metrics/cloud")
+    assert resp.status_code == 200
+    assert {"clients", "in_use", "hits", "misses", "retired"} <= resp.json().keys()
+
+
+@pytest.mark.asyncio
+async def test_model_catalog_stats(client):
+    resp = await client.get("/api/metrics/models")
+    assert resp.status_code == 200
+    assert {"hits", "stale_hits", "misses", "providers"} <= resp.json().keys()
+
+
+@pytest.mark.asyncio
+async def test_circuit_stats(client):
+    resp = await client.get("/api/metrics/circuits")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert {"qdrant", "reranker", "docling", "searxng", "mem0"} == data.keys()
+    assert data["qdrant"]["state"] in {"closed", "open", "half_open"}
+
+
+@pytest.mark.asyncio
+async def test_residency_stats(client):
+    resp = await client.get("/api/metrics/residency")
+    assert resp.status_code == 200
+    assert {"resident", "warming", "warmups", "prefetches"} <= resp.json().keys()
+
+
+@pytest.mark.asyncio
+async def test_backend_pool_stats(client):
+    resp = await client.get("/api/metrics/backends")
+    assert resp.status_code == 200
+    assert {"failovers", "nodes"} <= resp.json().keys()
+
+
+@pytest.mark.asyncio
+async def test_embedding_stats(client):
+    resp = await client.get("/api/metrics/embeddings")
+    assert resp.status_code == 200
+    assert {"requests", "texts", "avg_batch", "retries", "failures"} <= resp.json().keys()
+
+
+@pytest.mark.asyncio
+async def test_bm25_stats(client):
+    resp = await client.get("/api/metrics/bm25")
+    assert resp.status_code == 200
+    assert resp.json()["docs"] == 0
+    assert {"queries", "avg_query_ms", "added", "removed"} <= resp.json().keys()
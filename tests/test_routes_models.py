@@ -30,6 +30,24 @@ async def test_list_models(client):
         assert "ollama" in data
         assert len(data["ollama"]) == 1
         assert data["ollama"][0]["name"] == "gemma4:31b"
+        assert data["errors"] == {}
+
+
+@pytest.mark.asyncio
+async def test_list_models_reports_provider_errors_and_caches(client):
+    with (
+        patch("helix_studio.services.local_ai.list_ollama_models", new_callable=AsyncMock) as mock_ollama,
+        patch("helix_studio.services.cli_ai.list_cli_models", return_value={}),
+    ):
+        mock_ollama.side_effect = ConnectionError("connection refused")
+        resp = await client.get("/api/models")
+        data = resp.json()
+        assert data["ollama"] == []
+        assert data["errors"]["ollama"] == "connection refused"
+
+        # 失敗結果もしばらくキャッシュされ、再度は問い合わせない
+        await client.get("/api/models")
+        assert mock_ollama.await_count == 1
 
 
 @pytest.mark.asyncio
@@ -38,3 +38,21 @@ async def test_rag_search(client):
         data = resp.json()
         assert len(data) == 1
         assert data[0]["content"] == "test chunk"
+
+
+@pytest.mark.asyncio
+async def test_rag_upload_passes_doc_id_for_replacement(client):
+    with patch("helix_studio.services.rag.ingest_text", new_callable=AsyncMock) as mock:
+        mock.return_value = {"ok": True, "doc_id": "abc", "chunks": 1}
+        resp = await client.post(
+            "/api/rag/upload",
+            files={"file": ("README.md", "本文".encode(), "text/markdown")},
+            data={"doc_id": "abc"},
+        )
+        assert resp.status_code == 200
+        assert mock.call_args.kwargs["doc_id"] == "abc"
+        resp = await client.post(
+            "/api/rag/upload", files={"file": ("README.md", "本文".encode(), "text/markdown")},
+        )
+        assert resp.status_code == 200
+        assert mock.call_args.kwargs["doc_id"] is None
@@ -0,0 +1,106 @@
+"""Tests for full-text search API routes."""
+
+from __future__ import annotations
+
+import pytest
+
+from helix_studio.db import db_pool
+from helix_studio.services.pipeline import create_pipeline_run
+
+
+async def _seed() -> None:
+    async with db_pool.write() as db:
+        await db.execute(
+            "INSERT INTO conversations (id, title, provider, model) "
+            "VALUES ('c1', 'Qdrant セットアップ', 'ollama', 'm')"
+        )
+        await db.executemany(
+            "INSERT INTO messages (id, conversation_id, role, content) VALUES (?, 'c1', ?, ?)",
+            [
+                ("m1", "user", "東京タワーの高さは？"),
+                ("m2", "assistant", "東京タワーの高さは333メートルです。"),
+                ("m3", "user", "How do I configure the reranker?"),
+            ],
+        )
+
+
+@pytest.mark.asyncio
+async def test_search_japanese_message(client):
+    await _seed()
+    resp = await client.get("/api/search", params={"q": "東京タワー"})
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    ids = {r["message_id"] for r in results if r["kind"] == "message"}
+    assert ids == {"m1", "m2"}
+    hit = next(r for r in results if r["kind"] == "message")
+    assert hit["conversation_id"] == "c1"
+    assert "\x02" in hit["snippet"]
+
+
+@pytest.mark.asyncio
+async def test_search_short_term_falls_back_to_like(client):
+    await _seed()
+    resp = await client.get("/api/search", params={"q": "東京", "kind": "message"})
+    assert resp.status_code == 200
+    assert resp.json()["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_search_conversation_title(client):
+    await _seed()
+    resp = await client.get("/api/search", params={"q": "qdrant", "kind": "conversation"})
+    results = resp.json()["results"]
+    assert [r["conversation_id"] for r in results] == ["c1"]
+
+
+@pytest.mark.asyncio
+async def test_search_pipeline_runs(client):
+    run_id = await create_pipeline_run("Refactor", "FastAPIのルーターを分割したい")
+    resp = await client.get("/api/search", params={"q": "ルーター", "kind": "pipeline"})
+    results = resp.json()["results"]
+    assert [r["pipeline_id"] for r in results] == [run_id]
+
+
+@pytest.mark.asyncio
+async def test_search_pipeline_short_term_matches_step2_result(client):
+    run_id = await create_pipeline_run("Refactor", "input")
+    async with db_pool.write() as db:
+        await db.execute("UPDATE pipeline_runs SET step2_result = '分割案' WHERE id = ?", (run_id,))
+    resp = await client.get("/api/search", params={"q": "分割", "kind": "pipeline"})
+    results = resp.json()["results"]
+    assert [r["pipeline_id"] for r in results] == [run_id]
+
+
+@pytest.mark.asyncio
+async def test_search_survives_vacuum(client):
+    await _seed()
+    async with db_pool.write() as db:
+        await db.execute("DELETE FROM messages WHERE id = 'm1'")
+    async with db_pool.write() as db:
+        await db.commit()
+        await db.execute("VACUUM")
+    resp = await client.get("/api/search", params={"q": "東京タワー", "kind": "message"})
+    assert [r["message_id"] for r in resp.json()["results"]] == ["m2"]
+    resp = await client.get("/api/search", params={"q": "reranker", "kind": "message"})
+    assert [r["message_id"] for r in resp.json()["results"]] == ["m3"]
+
+
+@pytest.mark.asyncio
+async def test_search_index_follows_deletes(client):
+    await _seed()
+    await client.delete("/api/conversations/c1")
+    resp = await client.get("/api/search", params={"q": "東京タワー"})
+    assert resp.json()["count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_search_quotes_fts_syntax(client):
+    await _seed()
+    resp = await client.get("/api/search", params={"q": 'reranker" OR NOT'})
+    assert resp.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_search_unknown_kind(client):
+    resp = await client.get("/api/search", params={"q": "abc", "kind": "bogus"})
+    assert resp.status_code == 400
@@ -65,3 +65,21 @@ async def test_bool_keys_returned_as_bool(client):
     # mem0_auto_inject and rag_auto_inject should be booleans
     assert isinstance(data.get("mem0_auto_inject"), bool)
     assert isinstance(data.get("rag_auto_inject"), bool)
+
+
+@pytest.mark.asyncio
+async def test_update_settings_visible_immediately(client):
+    await client.put("/api/settings", json={"settings": {"theme": "light"}})
+    resp = await client.get("/api/settings")
+    assert resp.json()["settings"]["theme"] == "light"
+
+
+@pytest.mark.asyncio
+async def test_api_key_change_retires_sdk_client(client):
+    from helix_studio.services.cloud_ai import client_cache
+
+    async with client_cache.lease("openai", "sk-old", "http://127.0.0.1:9") as old:
+        pass
+    await client.put("/api/settings", json={"settings": {"openai_api_key": "sk-new-key-1234"}})
+    assert old._client.is_closed
+    assert client_cache.stats()["clients"] == 0
@@ -0,0 +1,251 @@
+"""Tests for the local LLM backend pool (routing, affinity, failover)."""
+
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from helix_studio.services import local_ai
+from helix_studio.services.backend_pool import LOAD_PENALTY, BackendPool, parse_urls
+from helix_studio.services.residency import Resident, ResidencyManager
+
+DEAD = "http://127.0.0.1:9"
+
+
+class _FakeBackend(BaseHTTPRequestHandler):
+    """Ollama の /api/chat・/api/ps と OpenAI 互換の /v1/models を返す代役。"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        lines = [
+            {"message": {"content": "from "}, "done": False},
+            {"message": {"content": "live"}, "done": True, "prompt_eval_count": 1, "eval_count": 2},
+        ]
+        self._send(b"".join(json.dumps(x).encode() + b"\n" for x in lines), "application/x-ndjson")
+
+    def do_GET(self):
+        if self.path == "/v1/models":
+            self._send(json.dumps({"data": [{"id": "qwen3-32b"}]}).encode())
+        else:
+            self._send(json.dumps({"models": [{"name": "gemma3:27b", "size_vram": 1}]}).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def live_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeBackend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def residency():
+    manager = ResidencyManager()
+    with (
+        patch("helix_studio.services.backend_pool.residency", manager),
+        patch("helix_studio.services.local_ai.residency", manager),
+    ):
+        yield manager
+
+
+def _settings(values: dict[str, str]):
+    async def get_setting(key: str) -> str | None:
+        return values.get(key)
+
+    return patch("helix_studio.services.backend_pool.get_setting", side_effect=get_setting)
+
+
+async def _collect(agen) -> list:
+    return [item async for item in agen]
+
+
+def test_parse_urls():
+    assert parse_urls("http://a:11434/", "http://b:11434, http://a:11434\nhttp://c:11434 ") == [
+        "http://a:11434", "http://b:11434", "http://c:11434",
+    ]
+    assert parse_urls("", "") == []
+
+
+class TestRouting:
+    SETTINGS = {"ollama_url": "http://a", "ollama_urls": "http://b,http://c"}
+
+    @pytest.mark.asyncio
+    async def test_prefers_node_with_model_loaded(self, residency):
+        residency._resident["http://c"] = {"gemma3:27b": Resident()}
+        with _settings(self.SETTINGS):
+            assert await BackendPool().choose("ollama", "gemma3:27b") == "http://c"
+
+    @pytest.mark.asyncio
+    async def test_least_loaded_when_no_node_has_model(self, residency):
+        pool = BackendPool()
+        with _settings(self.SETTINGS):
+            a, b, c = await pool.nodes("ollama")
+            a.in_flight, b.in_flight, c.in_flight = 2, 0, 1
+            assert [n.url for n in await pool.candidates("ollama", "gemma3:27b")] == [
+                "http://b", "http://c", "http://a",
+            ]
+
+    @pytest.mark.asyncio
+    async def test_spills_over_when_resident_node_is_busy(self, residency):
+        residency._resident["http://a"] = {"gemma3:27b": Resident()}
+        pool = BackendPool()
+        with _settings(self.SETTINGS):
+            a, _, _ = await pool.nodes("ollama")
+            a.in_flight = LOAD_PENALTY - 1
+            assert await pool.choose("ollama", "gemma3:27b") == "http://a"
+            a.in_flight = LOAD_PENALTY + 1
+            assert await pool.choose("ollama", "gemma3:27b") == "http://b"
+
+    @pytest.mark.asyncio
+    async def test_routed_model_sticks_until_next_poll(self, residency):
+        pool = BackendPool()
+
+        async def request(url: str) -> str:
+            return url
+
+        with _settings(self.SETTINGS):
+            assert await pool.call("ollama", "gemma3:4b", request) == "http://a"
+            # b・c は空いているが、a は直前にロードさせたので a に寄せる
+            assert await pool.choose("ollama", "gemma3:4b") == "http://a"
+            assert await pool.choose("ollama", "ministral-3:8b") == "http://a"
+
+    @pytest.mark.asyncio
+    async def test_primary_argument_overrides_setting(self, residency):
+        with _settings({"ollama_url": "http://a"}):
+            nodes = await BackendPool().nodes("ollama", primary="http://z")
+        assert [n.url for n in nodes] == ["http://z"]
+
+
+@pytest.mark.asyncio
+async def test_no_configured_node_raises_value_error(residency):
+    pool = BackendPool()
+
+    async def request(url: str) -> str:
+        return url
+
+    async def open_stream(url: str):
+        yield url
+
+    with _settings({"ollama_urls": ""}):
+        with pytest.raises(ValueError, match="no ollama backend configured"):
+            await pool.choose("ollama", "m", primary=" ")
+        with pytest.raises(ValueError, match="no ollama backend configured"):
+            await pool.call("ollama", "m", request, primary="")
+        with pytest.raises(ValueError, match="no ollama backend configured"):
+            await _collect(pool.stream("ollama", "m", open_stream, primary=""))
+        with pytest.raises(ValueError, match="no ollama backend configured"):
+            await pool.prefetch("m", primary="")
+
+
+class TestFailover:
+    SETTINGS = {"ollama_url": "http://a", "ollama_urls": "http://b"}
+
+    @pytest.mark.asyncio
+    async def test_stream_fails_over_on_connect_error(self, residency):
+        pool = BackendPool()
+
+        async def open_stream(url: str):
+            if url == "http://a":
+                raise httpx.ConnectError("refused")
+            yield f"{url}:1"
+            yield f"{url}:2"
+
+        with _settings(self.SETTINGS):
+            assert await _collect(pool.stream("ollama", "m", open_stream)) == ["http://b:1", "http://b:2"]
+            a, b = await pool.nodes("ollama")
+            assert a.down and not b.down
+            assert (a.in_flight, b.in_flight) == (0, 0)
+            # 停止中のノードは候補の最後に回る
+            assert await pool.choose("ollama", "m") == "http://b"
+        assert pool.stats()["failovers"] == 1
+
+    @pytest.mark.asyncio
+    async def test_no_failover_after_first_chunk(self, residency):
+        pool = BackendPool()
+        calls = []
+
+        async def open_stream(url: str):
+            calls.append(url)
+            yield "partial"
+            raise httpx.RemoteProtocolError("peer closed connection")
+
+        with _settings(self.SETTINGS):
+            received = []
+            with pytest.raises(httpx.RemoteProtocolError):
+                async for chunk in pool.stream("ollama", "m", open_stream):
+                    received.append(chunk)
+        assert received == ["partial"] and calls == ["http://a"]
+
+    @pytest.mark.asyncio
+    async def test_busy_node_is_skipped_but_not_marked_down(self, residency):
+        pool = BackendPool()
+
+        async def request(url: str) -> str:
+            if url == "http://a":
+                resp = httpx.Response(503, request=httpx.Request("POST", url))
+                resp.raise_for_status()
+            return url
+
+        with _settings(self.SETTINGS):
+            assert await pool.call("ollama", "m", request) == "http://b"
+            a, _ = await pool.nodes("ollama")
+        assert not a.down
+
+    @pytest.mark.asyncio
+    async def test_all_nodes_down_raises_last_error(self, residency):
+        pool = BackendPool()
+
+        async def request(url: str) -> str:
+            raise httpx.ConnectError(f"refused {url}")
+
+        with _settings(self.SETTINGS):
+            with pytest.raises(httpx.ConnectError, match="http://b"):
+                await pool.call("ollama", "m", request)
+
+    @pytest.mark.asyncio
+    async def test_local_ai_stream_chat_uses_live_node(self, residency, live_url):
+        usage: dict = {}
+        with (
+            _settings({"ollama_urls": live_url}),
+            patch("helix_studio.services.residency.get_setting", return_value=None),
+        ):
+            chunks = await _collect(local_ai.stream_chat("ollama", DEAD, "gemma3:27b", [], usage=usage))
+        assert chunks == ["from ", "live"]
+        assert usage["tokens_out"] == 2
+
+
+@pytest.mark.asyncio
+async def test_poll_updates_node_state(residency, live_url):
+    pool = BackendPool()
+    settings = {"ollama_url": DEAD, "ollama_urls": live_url, "openai_compat_url": live_url}
+    with _settings(settings):
+        assert await pool.poll() == {
+            ("ollama", DEAD): False, ("ollama", live_url): True, ("openai_compat", live_url): True,
+        }
+        dead, live = await pool.nodes("ollama")
+        assert dead.down and not live.down
+        assert residency.has_model(live_url, "gemma3:27b")
+        (compat,) = await pool.nodes("openai_compat")
+        assert compat.models == {"qwen3-32b"}
+        assert await pool.choose("ollama", "gemma3:27b") == live_url
+    nodes = {(n["kind"], n["url"]): n for n in pool.stats()["nodes"]}
+    assert nodes[("ollama", live_url)]["models"] == ["gemma3:27b"]
+    assert nodes[("ollama", DEAD)]["state"] == "down"
@@ -0,0 +1,80 @@
+"""Tests for the BM25 sparse encoder and its SQLite statistics."""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from helix_studio.services.bm25 import BM25Index, encode_document, idf, term_id, tokenize
+
+
+class TestTokenize:
+    def test_japanese_bigrams(self):
+        assert tokenize("検索精度") == ["検索", "索精", "精度"]
+
+    def test_mixed_scripts_are_split(self):
+        assert tokenize("Qdrantでhybrid検索") == ["qdrant", "で", "hybrid", "検索"]
+
+    def test_nfkc_normalization(self):
+        # 半角カナ・全角英数は同じ語になる
+        assert tokenize("ﾍﾞｸﾄﾙ ＡＰＩ") == tokenize("ベクトル api")
+
+    def test_punctuation_splits_runs(self):
+        assert tokenize("猫。犬、") == ["猫", "犬"]
+
+
+def test_term_id_is_stable_across_processes():
+    code = "from helix_studio.services.bm25 import term_id; print(term_id('検索'))"
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONHASHSEED": seed},
+        ).stdout.strip()
+        for seed in ("1", "2")
+    }
+    assert outputs == {str(term_id("検索"))}
+    assert 0 <= term_id("検索") < 2**32
+
+
+def test_long_documents_get_lower_weights():
+    short = encode_document("ベクトル検索", avgdl=10)
+    long = encode_document("ベクトル検索" + "。本文" * 20, avgdl=10)
+    i = short["indices"].index(term_id("検索"))
+    j = long["indices"].index(term_id("検索"))
+    assert long["values"][j] < short["values"][i]
+
+
+class TestIndex:
+    DOCS = ["猫が好きです", "犬が好きです", "猫と犬を飼っています"]
+
+    @pytest.mark.asyncio
+    async def test_query_weights_rare_terms_higher(self, app):
+        index = BM25Index()
+        await index.add(self.DOCS)
+        assert await index.corpus() == (3, sum(len(tokenize(d)) for d in self.DOCS))
+        query = await index.encode_query("好きな猫")
+        weights = dict(zip(query["indices"], query["values"]))
+        # 「好き」は2件に出る。「猫」は文書側では bigram（猫が・猫と）になるので一致しない
+        assert term_id("好き") in weights and term_id("猫") not in weights
+        assert weights[term_id("好き")] == pytest.approx(idf(2, 3))
+        assert index.stats()["queries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_remove_restores_statistics(self, app):
+        index = BM25Index()
+        await index.add(self.DOCS)
+        await index.remove(self.DOCS[:2])
+        assert (await index.corpus())[0] == 1
+        query = await index.encode_query("好きです")
+        assert query == {"indices": [], "values": []}
+        query = await index.encode_query("飼っています")
+        assert query["indices"] and all(v == pytest.approx(idf(1, 1)) for v in query["values"])
+
+    @pytest.mark.asyncio
+    async def test_empty_corpus_gives_empty_query(self, app):
+        index = BM25Index()
+        assert await index.encode_query("検索") == {"indices": [], "values": []}
+        assert await index.average_length(["検索精度", "猫"]) == 2.0
@@ -0,0 +1,183 @@
+"""Tests for the circuit breakers on optional backends."""
+
+from __future__ import annotations
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from helix_studio.services.circuit import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    HealthPoller,
+)
+from helix_studio.services.http_pool import HTTPClientPool, Upstream
+
+# 何も待ち受けていないポート（接続は即座に拒否される）
+DEAD_URL = "http://127.0.0.1:9/"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    status = 200
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(type(self).status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def server_url():
+    _Handler.status = 200
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+def _pool() -> HTTPClientPool:
+    return HTTPClientPool({"backend": Upstream(httpx.Timeout(5.0), circuit=True)})
+
+
+def _expire(breaker: CircuitBreaker) -> None:
+    breaker._opened_at -= breaker.reset_timeout
+
+
+class TestBreaker:
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker("b", failure_threshold=3)
+        breaker.record_failure("e1")
+        breaker.record_failure("e2")
+        assert breaker.state == CLOSED and breaker.allow()
+        breaker.record_failure("e3")
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        stats = breaker.stats()
+        assert stats["trips"] == 1 and stats["short_circuited"] == 1 and stats["last_error"] == "e3"
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker("b", failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+
+    def test_half_open_allows_single_probe(self):
+        breaker = CircuitBreaker("b", failure_threshold=1)
+        breaker.record_failure()
+        _expire(breaker)
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CLOSED and breaker.allow()
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker("b", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        _expire(breaker)
+        assert breaker.allow()
+        breaker.record_failure("still down")
+        assert breaker.state == OPEN and breaker.stats()["retry_in"] > 29
+        assert breaker.trips == 1
+
+    def test_released_probe_can_be_retried(self):
+        breaker = CircuitBreaker("b", failure_threshold=1)
+        breaker.record_failure()
+        _expire(breaker)
+        assert breaker.allow()
+        breaker.release()
+        assert breaker.allow()
+
+
+class TestTransport:
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_backend(self):
+        pool = _pool()
+        try:
+            client = pool.client("backend")
+            for _ in range(3):
+                with pytest.raises(httpx.ConnectError):
+                    await client.get(DEAD_URL)
+            assert pool.circuit_stats()["backend"]["state"] == OPEN
+            start = time.perf_counter()
+            with pytest.raises(CircuitOpenError):
+                await client.get(DEAD_URL)
+            assert time.perf_counter() - start < 0.05
+            # 送らなかったリクエストはプールの統計に数えない
+            assert pool.stats()["backend"]["requests"] == 3
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_server_errors_count_as_failures(self, server_url):
+        pool = _pool()
+        try:
+            _Handler.status = 503
+            for _ in range(3):
+                await pool.client("backend").get(server_url)
+            assert pool.breakers["backend"].state == OPEN
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_client_errors_do_not_trip(self, server_url):
+        pool = _pool()
+        try:
+            _Handler.status = 404
+            for _ in range(5):
+                await pool.client("backend").get(server_url)
+            assert pool.breakers["backend"].state == CLOSED
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_upstream_without_circuit_is_untouched(self):
+        pool = HTTPClientPool({"plain": Upstream(httpx.Timeout(5.0))})
+        try:
+            for _ in range(5):
+                with pytest.raises(httpx.ConnectError):
+                    await pool.client("plain").get(DEAD_URL)
+            assert pool.circuit_stats() == {}
+        finally:
+            await pool.close()
+
+
+class TestHealthPoller:
+    @pytest.mark.asyncio
+    async def test_poll_recovers_open_circuit(self, server_url):
+        pool = _pool()
+        try:
+            breaker = pool.breakers["backend"]
+            for _ in range(3):
+                breaker.record_failure("down")
+            assert breaker.state == OPEN
+            assert await HealthPoller().poll(pool, {"backend": server_url}) == {"backend": True}
+            assert breaker.state == CLOSED
+        finally:
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_poll_bypasses_open_circuit_and_records_failure(self):
+        pool = _pool()
+        try:
+            breaker = pool.breakers["backend"]
+            for _ in range(3):
+                breaker.record_failure("down")
+            assert await HealthPoller().poll(pool, {"backend": DEAD_URL}) == {"backend": False}
+            assert breaker.state == OPEN and breaker.short_circuited == 0
+        finally:
+            await pool.close()
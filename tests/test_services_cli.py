@@ -2,6 +2,11 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
+import os
+import sys
+import time
 from unittest.mock import patch
 
 import pytest
@@ -10,8 +15,16 @@ from helix_studio.services.cli_ai import (
     CLAUDE_CODE_MODELS,
     CODEX_MODELS,
     GEMINI_CLI_MODELS,
+    CLIError,
+    CLITimeout,
+    _claude_event,
+    _codex_event,
+    _gemini_event,
+    _stream_cli,
+    _stream_lines,
     detect_installed_clis,
     list_cli_models,
+    reset_cli_detection,
 )
 
 
@@ -28,6 +41,17 @@ class TestDetectInstalledClis:
         for v in result.values():
             assert isinstance(v, bool)
 
+    def test_result_is_cached(self):
+        reset_cli_detection()
+        with patch("helix_studio.services.cli_ai.shutil.which", return_value=None) as which:
+            detect_installed_clis()
+            detect_installed_clis()
+            assert which.call_count == 3
+            reset_cli_detection()
+            detect_installed_clis()
+            assert which.call_count == 6
+        reset_cli_detection()
+
 
 class TestListCliModels:
     def test_with_no_cli_installed(self):
@@ -57,3 +81,124 @@ class TestModelDefinitions:
     def test_gemini_models_have_id(self):
         for m in GEMINI_CLI_MODELS:
             assert "id" in m
+
+
+def _py(script: str) -> list[str]:
+    return [sys.executable, "-c", script]
+
+
+class TestStreaming:
+    @pytest.mark.asyncio
+    async def test_lines_arrive_before_exit(self):
+        script = "import sys, time\nprint('first', flush=True)\ntime.sleep(0.5)\nprint('second')"
+        start = time.perf_counter()
+        lines = []
+        async for line in _stream_lines(_py(script)):
+            lines.append((line, time.perf_counter() - start))
+        assert [line for line, _ in lines] == ["first\n", "second\n"]
+        assert lines[0][1] < lines[1][1] - 0.3
+
+    @pytest.mark.asyncio
+    async def test_stdin_is_passed(self):
+        script = "import sys\nprint(sys.stdin.read().upper())"
+        lines = [line async for line in _stream_lines(_py(script), stdin_text="hello")]
+        assert lines == ["HELLO\n"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(sys.platform == "win32", reason="process groups are POSIX only")
+    async def test_timeout_kills_process_group(self, tmp_path):
+        pid_file = tmp_path / "child.pid"
+        script = (
+            "import subprocess, sys, time\n"
+            "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+            f"open({str(pid_file)!r}, 'w').write(str(child.pid))\n"
+            "time.sleep(60)"
+        )
+        with pytest.raises(CLITimeout):
+            async for _ in _stream_lines(_py(script), timeout=1.0):
+                pass
+        child_pid = int(pid_file.read_text())
+        for _ in range(50):
+            try:
+                os.kill(child_pid, 0)
+            except ProcessLookupError:
+                break
+            await asyncio.sleep(0.05)
+        else:
+            pytest.fail("child process survived the timeout")
+
+    @pytest.mark.asyncio
+    async def test_timeout_while_consumer_is_busy_raises_cli_timeout(self):
+        script = "import time\nfor i in range(100):\n    print(i, flush=True)\n    time.sleep(0.1)"
+        received = []
+        with pytest.raises(CLITimeout):
+            async for line in _stream_lines(_py(script), timeout=0.5):
+                received.append(line)
+                # 呼び出し側が止まっている間に期限が来ても、呼び出し側はキャンセルされない
+                await asyncio.sleep(1.0)
+        assert received == ["0\n"]
+
+    @pytest.mark.asyncio
+    async def test_nonzero_exit_raises(self):
+        script = "import sys\nsys.stderr.write('boom')\nsys.exit(2)"
+        with pytest.raises(CLIError, match="boom"):
+            async for _ in _stream_lines(_py(script)):
+                pass
+
+    @pytest.mark.asyncio
+    async def test_stream_cli_parses_claude_events(self):
+        events = [
+            {"type": "system", "subtype": "init"},
+            {"type": "stream_event", "event": {
+                "type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hel"}}},
+            {"type": "stream_event", "event": {
+                "type": "content_block_delta", "delta": {"type": "text_delta", "text": "lo"}}},
+            {"type": "assistant", "message": {"content": [{"type": "text", "text": "Hello"}]}},
+            {"type": "result", "result": "Hello", "usage": {"input_tokens": 7, "output_tokens": 2}},
+        ]
+        script = "".join(f"print({json.dumps(json.dumps(e))})\n" for e in events)
+        usage: dict = {}
+        chunks = [c async for c in _stream_cli(
+            "Claude Code", _py(script), _py(""), _claude_event, usage=usage,
+        )]
+        assert chunks == ["Hel", "lo"]
+        assert usage["tokens_in"] == 7 and usage["tokens_out"] == 2
+        assert "connected_at" in usage
+
+    @pytest.mark.asyncio
+    async def test_stream_cli_falls_back_on_unknown_option(self):
+        failing = "import sys\nsys.stderr.write('error: unknown option --output-format')\nsys.exit(1)"
+        chunks = [c async for c in _stream_cli(
+            "Gemini CLI", _py(failing), _py("print('plain answer')"), _gemini_event,
+        )]
+        assert chunks == ["plain answer\n"]
+
+    @pytest.mark.asyncio
+    async def test_stream_cli_reports_errors(self):
+        failing = "import sys\nsys.stderr.write('not logged in')\nsys.exit(1)"
+        chunks = [c async for c in _stream_cli("Codex", _py(failing), _py(""), _codex_event)]
+        assert chunks == ["[Codex エラー] not logged in"]
+
+
+class TestEventParsers:
+    def test_claude_result_without_partial_messages(self):
+        state: dict = {}
+        assert _claude_event({"type": "result", "result": "done"}, state) == "done"
+
+    def test_codex_item_completed(self):
+        state: dict = {}
+        event = {"type": "item.completed", "item": {"type": "agent_message", "text": "hi"}}
+        assert _codex_event(event, state) == "hi"
+        _codex_event({"type": "turn.completed", "usage": {"input_tokens": 3, "output_tokens": 1}}, state)
+        assert state["tokens_out"] == 1
+
+    def test_codex_legacy_deltas(self):
+        state: dict = {}
+        assert _codex_event({"msg": {"type": "agent_message_delta", "delta": "a"}}, state) == "a"
+        assert _codex_event({"msg": {"type": "agent_message", "message": "a"}}, state) == ""
+
+    def test_gemini_message_deltas(self):
+        state: dict = {}
+        event = {"type": "message", "role": "assistant", "content": "x", "delta": True}
+        assert _gemini_event(event, state) == "x"
+        assert _gemini_event({"type": "message", "role": "user", "content": "q"}, state) == ""
@@ -0,0 +1,194 @@
+"""Tests for the CLI session pool."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+from helix_studio.services.cli_ai import CLITimeout
+from helix_studio.services.cli_sessions import (
+    CLISessionPool,
+    _ClaudeWorker,
+    build_prompt,
+)
+
+# stdin の stream-json ユーザーメッセージごとに応答する claude の代役
+FAKE_CLAUDE = r"""
+import json, os, sys
+turn = 0
+for line in sys.stdin:
+    msg = json.loads(line)
+    text = msg["message"]["content"][0]["text"]
+    turn += 1
+    if text == "crash":
+        sys.exit(3)
+    for event in (
+        {"type": "system", "subtype": "init", "session_id": "s1"},
+        {"type": "stream_event", "event": {"type": "content_block_delta",
+            "delta": {"type": "text_delta", "text": f"{os.getpid()}:{turn}:"}}},
+        {"type": "stream_event", "event": {"type": "content_block_delta",
+            "delta": {"type": "text_delta", "text": text}}},
+        {"type": "result", "result": text, "usage": {"input_tokens": 5, "output_tokens": 2}},
+    ):
+        print(json.dumps(event), flush=True)
+"""
+
+
+def _fake_pool(**kwargs) -> CLISessionPool:
+    pool = CLISessionPool(**kwargs)
+    pool._new_worker = lambda key: _ClaudeWorker(key[1], cmd=[sys.executable, "-c", FAKE_CLAUDE])
+    return pool
+
+
+async def _turn(pool: CLISessionPool, conv: str, text: str, usage: dict | None = None) -> str:
+    messages = [{"role": "user", "content": text}]
+    return "".join([c async for c in pool.stream("claude_code", "sonnet", conv, messages, usage=usage)])
+
+
+class TestBuildPrompt:
+    def test_single_message(self):
+        assert build_prompt([{"role": "user", "content": "hi"}], "be brief") == "be brief\n\nhi"
+
+    def test_fresh_includes_history(self):
+        messages = [
+            {"role": "user", "content": "q1"},
+            {"role": "assistant", "content": "a1"},
+            {"role": "user", "content": "q2"},
+        ]
+        prompt = build_prompt(messages)
+        assert "User: q1" in prompt and "Assistant: a1" in prompt
+        assert prompt.endswith("User: q2")
+
+    def test_resumed_sends_only_current_turn(self):
+        messages = [
+            {"role": "system", "content": "[search results]"},
+            {"role": "user", "content": "q1"},
+            {"role": "assistant", "content": "a1"},
+            {"role": "user", "content": "q2"},
+        ]
+        assert build_prompt(messages, "sys", fresh=False) == "[search results]\n\nq2"
+
+
+class TestPool:
+    @pytest.mark.asyncio
+    async def test_repeat_turns_reuse_process(self):
+        pool = _fake_pool()
+        try:
+            usage: dict = {}
+            first = await _turn(pool, "c1", "hello", usage)
+            second = await _turn(pool, "c1", "again")
+            pid1, turn1, text1 = first.split(":")
+            pid2, turn2, text2 = second.split(":")
+            assert pid1 == pid2
+            assert (turn1, turn2) == ("1", "2")
+            assert (text1, text2) == ("hello", "again")
+            assert usage["tokens_in"] == 5 and usage["tokens_out"] == 2
+            stats = pool.stats()
+            assert stats["spawned"] == 1 and stats["reused"] == 1 and stats["processes"] == 1
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_conversations_get_separate_workers(self):
+        pool = _fake_pool()
+        try:
+            a = await _turn(pool, "c1", "x")
+            b = await _turn(pool, "c2", "y")
+            assert a.split(":")[0] != b.split(":")[0]
+            assert pool.stats()["workers"] == 2
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_max_workers_evicts_idle(self):
+        pool = _fake_pool(max_workers=1)
+        try:
+            await _turn(pool, "c1", "x")
+            await _turn(pool, "c2", "y")
+            stats = pool.stats()
+            assert stats["workers"] == 1 and stats["evicted"] == 1
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_dead_worker_is_replaced(self):
+        pool = _fake_pool()
+        try:
+            crashed = await _turn(pool, "c1", "crash")
+            assert crashed.startswith("[Claude Code エラー]")
+            assert pool.stats()["workers"] == 0
+            answer = await _turn(pool, "c1", "ok")
+            assert answer.endswith(":1:ok")
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_abandoned_turn_discards_worker(self):
+        pool = _fake_pool()
+        try:
+            stream = pool.stream("claude_code", "sonnet", "c1", [{"role": "user", "content": "x"}])
+            await anext(stream)
+            await stream.aclose()
+            assert pool.stats()["workers"] == 0
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_turns_on_full_pool_share_one_worker(self):
+        pool = _fake_pool(max_workers=1)
+        try:
+            await _turn(pool, "c1", "x")
+            # 両方のターンが c1 の追い出し（プロセス終了待ち）と重なる
+            a, b = await asyncio.gather(_turn(pool, "c2", "a"), _turn(pool, "c2", "b"))
+            assert a.split(":")[0] == b.split(":")[0]
+            assert sorted([a.split(":")[1], b.split(":")[1]]) == ["1", "2"]
+            stats = pool.stats()
+            assert stats["workers"] == 1 and stats["spawned"] == 2 and stats["processes"] == 1
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_worker_closed_before_first_turn_is_unhealthy(self):
+        pool = _fake_pool()
+        try:
+            worker = await pool._acquire(("claude_code", "sonnet", "c1"))
+            await worker.close()
+            assert not worker.healthy()
+            # 閉じたワーカーではプロセスを起動せず、新しいワーカーに替える
+            assert (await _turn(pool, "c1", "x")).endswith(":1:x")
+            assert worker.proc is None and pool.stats()["unhealthy"] == 1
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_reap_closes_idle_workers(self):
+        pool = _fake_pool(idle_timeout=60)
+        try:
+            await _turn(pool, "c1", "x")
+            assert await pool.reap() == 0
+            with patch("helix_studio.services.cli_sessions.time.monotonic", return_value=time.monotonic() + 120):
+                assert await pool.reap() == 1
+            assert pool.stats()["workers"] == 0
+        finally:
+            await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_turn_timeout_while_consumer_is_busy_raises_cli_timeout():
+    worker = _ClaudeWorker("sonnet", cmd=[sys.executable, "-c", FAKE_CLAUDE])
+    received = []
+    try:
+        with patch("helix_studio.services.cli_sessions.CLI_TIMEOUT", 0.5):
+            with pytest.raises(CLITimeout):
+                async for text in worker.turn("hello"):
+                    received.append(text)
+                    # 呼び出し側が止まっている間に期限が来ても、呼び出し側はキャンセルされない
+                    await asyncio.sleep(1.0)
+        assert len(received) == 1
+        assert not worker.healthy()
+    finally:
+        await worker.close()
@@ -0,0 +1,87 @@
+"""Tests for the cached cloud SDK clients."""
+
+from __future__ import annotations
+
+import pytest
+
+from helix_studio.services.cloud_ai import ClientCache
+
+BASE = "http://127.0.0.1:9"
+
+
+async def _get(cache: ClientCache, provider: str, key: str):
+    async with cache.lease(provider, key, BASE) as client:
+        return client
+
+
+@pytest.mark.asyncio
+async def test_same_key_reuses_client():
+    cache = ClientCache()
+    try:
+        first = await _get(cache, "claude", "k1")
+        assert await _get(cache, "claude", "k1") is first
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    finally:
+        await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_providers_are_cached_separately():
+    cache = ClientCache()
+    try:
+        claude = await _get(cache, "claude", "k1")
+        gpt = await _get(cache, "openai", "k1")
+        assert claude is not gpt
+        assert cache.stats()["clients"] == 2
+    finally:
+        await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_key_change_retires_and_closes_old_client():
+    cache = ClientCache()
+    try:
+        old = await _get(cache, "openai", "k1")
+        new = await _get(cache, "openai", "k2")
+        assert new is not old
+        assert old._client.is_closed
+        stats = cache.stats()
+        assert stats["clients"] == 1 and stats["retired"] == 1
+    finally:
+        await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_client_in_use_is_closed_after_release():
+    cache = ClientCache()
+    try:
+        async with cache.lease("claude", "k1", BASE) as old:
+            await cache.invalidate("claude")
+            assert not old._client.is_closed
+            assert cache.stats()["clients"] == 0
+        assert old._client.is_closed
+        assert await _get(cache, "claude", "k1") is not old
+    finally:
+        await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_invalidate_only_touches_provider():
+    cache = ClientCache()
+    try:
+        await _get(cache, "claude", "k1")
+        gpt = await _get(cache, "openai", "k1")
+        await cache.invalidate("claude")
+        assert await _get(cache, "openai", "k1") is gpt
+        assert cache.stats()["clients"] == 1
+    finally:
+        await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_close_closes_all_clients():
+    cache = ClientCache()
+    clients = [await _get(cache, "claude", "k1"), await _get(cache, "openai", "k1")]
+    await cache.close()
+    assert all(c._client.is_closed for c in clients)
+    assert cache.stats()["clients"] == 0
@@ -0,0 +1,73 @@
+"""Tests for helix_studio.services.context_assembly."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from helix_studio.routes.chat import _assemble_context
+from helix_studio.services.context_assembly import (
+    ContextAssembler,
+    SourceResult,
+    skipped,
+    timings,
+)
+
+
+async def _after(delay: float, text: str) -> str:
+    await asyncio.sleep(delay)
+    return text
+
+
+async def _boom() -> str:
+    raise RuntimeError("down")
+
+
+@pytest.mark.asyncio
+async def test_sources_run_concurrently():
+    assembler = ContextAssembler({"a": 1.0, "b": 1.0})
+    start = time.perf_counter()
+    assembler.start("a", _after(0.1, "A"))
+    assembler.start("b", _after(0.1, "B"))
+    results = await assembler.collect()
+    assert time.perf_counter() - start < 0.19
+    assert results["a"].text == "A" and results["b"].text == "B"
+    assert skipped(results) == []
+
+
+@pytest.mark.asyncio
+async def test_late_and_failing_sources_are_skipped():
+    assembler = ContextAssembler({"slow": 0.05, "bad": 1.0, "ok": 1.0})
+    assembler.start("slow", _after(1.0, "never"))
+    assembler.start("bad", _boom())
+    assembler.start("ok", _after(0, ""))
+    results = await assembler.collect()
+    assert results["slow"].status == "timeout"
+    assert results["bad"].status == "error"
+    assert results["ok"].status == "empty"
+    assert sorted(skipped(results)) == ["bad", "slow"]
+    assert timings(results)["slow"] < 500
+
+
+def _result(name: str, text: str) -> SourceResult:
+    return SourceResult(name=name, text=text, elapsed_ms=0, status="ok")
+
+
+def test_assemble_context_fixed_order():
+    messages = [
+        {"role": "user", "content": "old"},
+        {"role": "assistant", "content": "reply"},
+        {"role": "user", "content": "question"},
+    ]
+    # 完了順（dict の順序）によらず同じ並びになる
+    sources = {
+        "mem0": _result("mem0", "MEM"),
+        "rag": _result("rag", "RAG"),
+        "tools": _result("tools", "TOOLS"),
+    }
+    _assemble_context(messages, sources)
+    assert messages[0] == {"role": "system", "content": "TOOLS"}
+    assert messages[-1]["content"] == "RAG\n\n---\n\nMEM\n\n---\n\nquestion"
+    assert messages[1]["content"] == "old"
@@ -0,0 +1,134 @@
+"""Tests for helix_studio.services.context_window."""
+
+from __future__ import annotations
+
+import pytest
+
+from helix_studio.config import set_setting
+from helix_studio.db import db_pool
+from helix_studio.services.context_window import (
+    SUMMARY_HEADER,
+    ContextManager,
+    context_limit,
+    estimate_tokens,
+    fit_text,
+    fit_texts,
+    trim_messages,
+)
+
+
+class TestEstimateTokens:
+    def test_empty(self):
+        assert estimate_tokens("") == 0
+
+    def test_ascii(self):
+        assert estimate_tokens("a" * 400) == 100
+
+    def test_japanese_counts_per_char(self):
+        assert estimate_tokens("東京タワー") == 5
+
+    def test_mixed(self):
+        assert estimate_tokens("Qdrant の設定") == 2 + 3
+
+
+class TestContextLimit:
+    def test_model_prefix(self):
+        assert context_limit("claude", "claude-sonnet-4-20250514") == 200_000
+
+    def test_provider_prefix_stripped(self):
+        assert context_limit("ollama", "ollama/gemma3:4b") == 4_096
+
+    def test_unknown_provider(self):
+        assert context_limit("whatever", "mystery") == 4_096
+
+
+class TestFit:
+    def test_fit_text_keeps_head_and_tail(self):
+        text = "A" * 2000 + "B" * 2000
+        fitted = fit_text(text, 200)
+        assert estimate_tokens(fitted) <= 200
+        assert fitted.startswith("A") and fitted.endswith("B")
+        assert "truncated" in fitted
+
+    def test_fit_texts_keeps_short_sections_whole(self):
+        short, long = "x" * 40, "y" * 8000
+        out = fit_texts([short, long], 500)
+        assert out[0] == short
+        assert estimate_tokens(out[1]) <= 500 - estimate_tokens(short)
+
+    def test_trim_messages_keeps_latest_and_starts_with_user(self):
+        msgs = [
+            {"role": "user", "content": "あ" * 100},
+            {"role": "assistant", "content": "い" * 100},
+            {"role": "user", "content": "う" * 10},
+            {"role": "assistant", "content": "え" * 10},
+            {"role": "user", "content": "最新"},
+        ]
+        assert trim_messages(msgs, 40) == msgs[2:]
+        assert trim_messages(msgs, 0) == msgs[-1:]
+
+
+async def _seed(conv_id: str, turns: int, size: int) -> None:
+    async with db_pool.write() as db:
+        await db.execute(
+            "INSERT INTO conversations (id, provider, model) VALUES (?, 'ollama', 'm')",
+            (conv_id,),
+        )
+        await db.executemany(
+            "INSERT INTO messages (id, conversation_id, role, content) VALUES (?, ?, ?, ?)",
+            [
+                (f"{conv_id}-{i}", conv_id, "user" if i % 2 == 0 else "assistant",
+                 f"{i}:" + "会話" * size)
+                for i in range(turns)
+            ],
+        )
+
+
+@pytest.mark.asyncio
+async def test_build_within_budget_returns_everything(app):
+    await _seed("c1", 4, 10)
+    manager = ContextManager()
+    messages = await manager.build("c1", "ollama", "gemma3:4b")
+    assert [m["content"].split(":")[0] for m in messages] == ["0", "1", "2", "3"]
+    assert manager.trimmed == 0
+
+
+@pytest.mark.asyncio
+async def test_build_trims_and_summarizes_in_background(app):
+    await set_setting("context_budget_tokens", "1000")
+    await _seed("c2", 20, 150)  # 1ターン約300トークン
+    prompts: list[str] = []
+
+    async def summarize(prompt: str) -> str:
+        prompts.append(prompt)
+        return "- 要約済みの内容"
+
+    manager = ContextManager()
+    messages = await manager.build("c2", "ollama", "gemma3:4b", summarize=summarize)
+    assert messages[0]["role"] == "user"
+    assert messages[-1]["content"].startswith("19:")
+    assert len(messages) < 20
+    await manager.wait_idle()
+    assert manager.summaries == 1
+    assert "0:" in prompts[0]
+
+    # 次のターンは要約が先頭のユーザーメッセージに入り、要約済みの範囲は読まない
+    messages = await manager.build("c2", "ollama", "gemma3:4b")
+    assert messages[0]["content"].startswith(SUMMARY_HEADER)
+    assert "要約済みの内容" in messages[0]["content"]
+    assert messages[-1]["content"].startswith("19:")
+
+
+@pytest.mark.asyncio
+async def test_summary_failure_is_counted(app):
+    await set_setting("context_budget_tokens", "1000")
+    await _seed("c3", 20, 150)
+
+    async def summarize(prompt: str) -> str:
+        raise RuntimeError("model down")
+
+    manager = ContextManager()
+    await manager.build("c3", "ollama", "gemma3:4b", summarize=summarize)
+    await manager.wait_idle()
+    assert manager.summary_failures == 1
+    assert manager.stats()["pending_summaries"] == 0
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+from unittest.mock import AsyncMock, patch
+
 import pytest
 
 from helix_studio.services.crew_ai import (
@@ -9,6 +11,7 @@ from helix_studio.services.crew_ai import (
     VRAMBudget,
     estimate_model_size,
     list_preset_teams,
+    run_crew,
 )
 
 
@@ -75,3 +78,28 @@ class TestPresetTeams:
             assert "name" in agent
             assert "role" in agent
             assert "model" in agent
+
+
+class TestPrefetch:
+    async def _run(self, vram_gb: float) -> AsyncMock:
+        prefetch = AsyncMock()
+        with (
+            patch("helix_studio.services.crew_ai._ollama_chat", new_callable=AsyncMock, return_value="ok"),
+            patch("helix_studio.services.crew_ai.get_vram_status", new_callable=AsyncMock, return_value={}),
+            patch("helix_studio.services.crew_ai.get_effective_vram_total", new_callable=AsyncMock,
+                  return_value=vram_gb),
+            patch("helix_studio.services.crew_ai.backend_pool.prefetch", prefetch),
+        ):
+            result = await run_crew("http://ollama", "task", team_name="dev_team")
+        assert result["ok"]
+        return prefetch
+
+    @pytest.mark.asyncio
+    async def test_next_model_prefetched_when_both_fit(self):
+        prefetch = await self._run(96.0)
+        prefetch.assert_called_once_with("ministral-3:8b", primary="http://ollama")
+
+    @pytest.mark.asyncio
+    async def test_no_prefetch_when_vram_is_tight(self):
+        prefetch = await self._run(20.0)
+        prefetch.assert_not_called()
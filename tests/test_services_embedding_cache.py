@@ -0,0 +1,143 @@
+"""Tests for the persistent embedding cache."""
+
+from __future__ import annotations
+
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from helix_studio.services.embedding_cache import EmbeddingCache
+
+MODEL = "qwen3-embedding:8b"
+
+
+@pytest.fixture()
+async def cache(tmp_path):
+    cache = EmbeddingCache(tmp_path, hot_entries=2)
+    yield cache
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_round_trip_in_float16(cache):
+    vector = [0.1, -0.25, 0.333, 1.0]
+    await cache.put(MODEL, "hello", vector)
+    cache._hot.clear()
+    stored = await cache.get(MODEL, "hello")
+    assert stored == pytest.approx(vector, abs=1e-3)
+    assert await cache.get(MODEL, "other") is None
+    assert await cache.get("another-model", "hello") is None
+
+
+@pytest.mark.asyncio
+async def test_persists_across_reopen(tmp_path):
+    first = EmbeddingCache(tmp_path)
+    await first.put_many(MODEL, ["a", "b"], [[0.5, 0.5], [0.25, -0.5, 1.0]])
+    await first.close()
+    second = EmbeddingCache(tmp_path)
+    assert await second.get_many(MODEL, ["b", "a", "c"]) == [[0.25, -0.5, 1.0], [0.5, 0.5], None]
+    stats = second.stats()
+    assert stats["disk_hits"] == 2 and stats["misses"] == 1
+    assert stats["entries"] == 2 and stats["bytes"] == (2 + 3) * 2
+    await second.close()
+
+
+@pytest.mark.asyncio
+async def test_hot_tier_serves_recent_entries(cache):
+    await cache.put(MODEL, "a", [1.0])
+    await cache.get(MODEL, "a")
+    assert cache.stats()["hot_hits"] == 1 and cache.stats()["disk_hits"] == 0
+    await cache.put(MODEL, "b", [1.0])
+    await cache.put(MODEL, "c", [1.0])
+    # hot_entries=2 なので a はディスクから読む
+    await cache.get(MODEL, "a")
+    assert cache.stats()["disk_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_size_based_eviction_reuses_slots(tmp_path):
+    cache = EmbeddingCache(tmp_path, max_bytes=3 * 4 * 2, hot_entries=0)
+    for text in ("a", "b", "c"):
+        await cache.put(MODEL, text, [0.5] * 4)
+    await cache.get(MODEL, "a")  # a を最近使ったことにする
+    await cache.put(MODEL, "d", [0.5] * 4)
+    assert [v is not None for v in await cache.get_many(MODEL, ["a", "b", "c", "d"])] == [True, False, True, True]
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 3 and stats["bytes"] == 24
+    # 追い出した b のスロットを d が使う
+    slots = cache._conn.execute("SELECT slot FROM entries ORDER BY slot").fetchall()
+    assert [s for (s,) in slots] == [0, 1, 2]
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_overwrite_keeps_single_entry(cache):
+    await cache.put(MODEL, "a", [0.5, 0.5])
+    await cache.put(MODEL, "a", [0.25, 0.25])
+    await cache.put(MODEL, "a", [0.125, 0.125, 0.125])
+    cache._hot.clear()
+    assert await cache.get(MODEL, "a") == [0.125, 0.125, 0.125]
+    assert cache.stats()["entries"] == 1 and cache.stats()["bytes"] == 6
+
+
+@pytest.mark.asyncio
+async def test_values_outside_float16_are_skipped(cache):
+    await cache.put(MODEL, "huge", [1e6, 0.0])
+    assert await cache.get(MODEL, "huge") is None
+    assert cache.stats()["skipped"] == 1 and cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_missing_vector_file_is_a_miss(tmp_path):
+    cache = EmbeddingCache(tmp_path, hot_entries=0)
+    await cache.put(MODEL, "a", [0.5, 0.5])
+    await cache.close()
+    (tmp_path / "vectors-2.f16").unlink()
+    cache = EmbeddingCache(tmp_path, hot_entries=0)
+    assert await cache.get(MODEL, "a") is None
+    assert cache.stats()["entries"] == 0
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_last_used_is_written_in_batches(tmp_path):
+    cache = EmbeddingCache(tmp_path, hot_entries=0)
+    await cache.put(MODEL, "a", [0.5, 0.5])
+    cache._conn.execute("UPDATE entries SET last_used = 0")
+    cache._conn.commit()
+    assert await cache.get(MODEL, "a") == [0.5, 0.5]
+    # 読むたびには書かない
+    assert cache._conn.execute("SELECT last_used FROM entries").fetchone()[0] == 0
+    assert cache.stats()["pending_touches"] == 1
+    await cache.close()
+    cache = EmbeddingCache(tmp_path)
+    await cache.get(MODEL, "other")
+    assert cache._conn.execute("SELECT last_used FROM entries").fetchone()[0] > 0
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_index_work_runs_off_the_event_loop(cache):
+    loop_thread = threading.get_ident()
+    threads = []
+    read, write, close = cache._read, cache._write, cache._close
+
+    def record(fn):
+        def wrapper(*args):
+            threads.append(threading.get_ident())
+            return fn(*args)
+        return wrapper
+
+    with (
+        patch.object(cache, "_read", record(read)),
+        patch.object(cache, "_write", record(write)),
+        patch.object(cache, "_close", record(close)),
+    ):
+        await cache.put(MODEL, "a", [0.5])
+        cache._hot.clear()
+        assert await cache.get(MODEL, "a") == [0.5]
+        # hot tier のヒットはスレッドに回さない
+        assert await cache.get(MODEL, "a") == [0.5]
+        await cache.close()
+    assert len(threads) == 3 and loop_thread not in threads
@@ -0,0 +1,352 @@
+"""Tests for batched embedding and streaming RAG ingestion."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from helix_studio.services import rag
+from helix_studio.services.bm25 import bm25_index
+from helix_studio.services.embedding_cache import EmbeddingCache
+from helix_studio.services.embeddings import Embedder, plan_batches
+from helix_studio.services.http_pool import HTTPClientPool
+
+MODEL = "qwen3-embedding:8b"
+
+
+class _FakeBackend(BaseHTTPRequestHandler):
+    """Ollama の /api/embed と Qdrant のコレクション・ポイント操作を返す代役。
+
+    POISON を含むテキストがあるバッチは 400、DOWN を含むバッチは 503 を返す。
+    """
+
+    protocol_version = "HTTP/1.1"
+    batches: list[list[str]] = []
+    upserts: list[list[dict]] = []
+    updates: list[list[dict]] = []
+    deletes: list[list[str]] = []
+    points: dict[str, dict] = {}
+
+    def _send(self, data: dict, status: int = 200) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> dict:
+        return json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def do_POST(self):
+        cls = type(self)
+        body = self._body()
+        if self.path.endswith("/points/scroll"):
+            doc_id = body["filter"]["must"][0]["match"]["value"]
+            found = [
+                {"id": point_id, "payload": {k: payload[k] for k in body["with_payload"]}}
+                for point_id, payload in cls.points.items() if payload["doc_id"] == doc_id
+            ]
+            self._send({"result": {"points": found, "next_page_offset": None}})
+        elif self.path.endswith("/points/batch"):
+            cls.updates.append(body["operations"])
+            for op in body["operations"]:
+                for point_id in op["set_payload"]["points"]:
+                    cls.points[point_id].update(op["set_payload"]["payload"])
+            self._send({"result": []})
+        elif self.path.endswith("/points/delete"):
+            cls.deletes.append(body["points"])
+            for point_id in body["points"]:
+                del cls.points[point_id]
+            self._send({"result": {"status": "acknowledged"}})
+        else:
+            texts = body["input"]
+            cls.batches.append(texts)
+            if any("POISON" in t for t in texts):
+                self._send({"error": "boom"}, 400)
+                return
+            if any("DOWN" in t for t in texts):
+                self._send({"error": "unavailable"}, 503)
+                return
+            self._send({"embeddings": [[float(len(t)), 1.0] for t in texts]})
+
+    def do_PUT(self):
+        points = self._body()["points"]
+        type(self).upserts.append(points)
+        type(self).points.update({p["id"]: p["payload"] for p in points})
+        self._send({"result": {"status": "acknowledged"}})
+
+    def do_GET(self):
+        self._send({"result": {}})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+async def backend_url():
+    _FakeBackend.batches = []
+    _FakeBackend.upserts = []
+    _FakeBackend.updates = []
+    _FakeBackend.deletes = []
+    _FakeBackend.points = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeBackend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # 他のテストで開いた Qdrant のブレーカーに影響されないよう、専用のプールを使う
+    pool = HTTPClientPool()
+    with (
+        patch("helix_studio.services.residency.get_setting", new_callable=AsyncMock, return_value=None),
+        patch("helix_studio.services.embeddings.http_pool", pool),
+        patch("helix_studio.services.rag.http_pool", pool),
+    ):
+        yield f"http://127.0.0.1:{server.server_port}"
+    await pool.close()
+    server.shutdown()
+    server.server_close()
+
+
+class TestPlanBatches:
+    def test_count_limit(self):
+        assert plan_batches(["a"] * 5, batch_size=2) == [[0, 1], [2, 3], [4]]
+
+    def test_byte_limit_counts_utf8(self):
+        # 日本語は1文字3バイト
+        texts = ["あ" * 10, "あ" * 10, "b" * 10]
+        assert plan_batches(texts, batch_size=10, max_bytes=40) == [[0], [1, 2]]
+
+    def test_oversized_text_gets_its_own_batch(self):
+        assert plan_batches(["x" * 100, "y"], max_bytes=10) == [[0], [1]]
+
+    def test_empty(self):
+        assert plan_batches([]) == []
+
+
+@pytest.mark.asyncio
+async def test_embed_many_batches_and_keeps_order(backend_url):
+    embedder = Embedder()
+    texts = [f"text {i}" * (i + 1) for i in range(10)]
+    vectors = await embedder.embed_many(texts, backend_url, MODEL, batch_size=4, concurrency=2)
+    assert vectors == [[float(len(t)), 1.0] for t in texts]
+    assert sorted(len(b) for b in _FakeBackend.batches) == [2, 4, 4]
+    assert embedder.stats()["requests"] == 3
+
+
+@pytest.mark.asyncio
+async def test_only_failed_sub_batches_are_retried(backend_url):
+    embedder = Embedder()
+    texts = ["a", "b", "c", "POISON", "e", "f", "g", "h"]
+    vectors = await embedder.embed_many(texts, backend_url, MODEL, batch_size=8)
+    assert [v is None for v in vectors] == [False, False, False, True, False, False, False, False]
+    # 8 → 4+4 → 2+2 → 1+1: 成功した半分は送り直さない
+    assert [len(b) for b in _FakeBackend.batches] == [8, 4, 4, 2, 2, 1, 1]
+    stats = embedder.stats()
+    assert stats["retries"] == 3 and stats["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_server_errors_fail_the_batch_without_splitting(backend_url):
+    embedder = Embedder()
+    texts = ["a", "b", "c", "DOWN", "e", "f", "g", "h"]
+    vectors = await embedder.embed_many(texts, backend_url, MODEL, batch_size=4)
+    assert vectors == [None] * 4 + [[1.0, 1.0]] * 4
+    assert [len(b) for b in _FakeBackend.batches] == [4, 4]
+    stats = embedder.stats()
+    assert stats["retries"] == 0 and stats["failures"] == 4
+
+
+@pytest.mark.asyncio
+async def test_unreachable_backend_sends_one_request_per_batch():
+    embedder = Embedder()
+    pool = HTTPClientPool()
+    with (
+        patch("helix_studio.services.residency.get_setting", new_callable=AsyncMock, return_value=None),
+        patch("helix_studio.services.embeddings.http_pool", pool),
+    ):
+        vectors = await embedder.embed_many(
+            [f"text {i}" for i in range(100)], "http://127.0.0.1:9", MODEL, batch_size=32,
+        )
+    await pool.close()
+    assert vectors == [None] * 100
+    stats = embedder.stats()
+    assert stats["requests"] == 4 and stats["retries"] == 0 and stats["failures"] == 100
+
+
+@pytest.mark.asyncio
+async def test_ingest_text_streams_upserts(app, backend_url):
+    paragraphs = [f"段落{i} " + "本文" * 400 for i in range(10)]
+    paragraphs[6] = "POISON " + paragraphs[6]
+    with (
+        patch.object(rag, "QDRANT_URL", backend_url),
+        patch.object(rag, "UPSERT_BATCH_SIZE", 4),
+        patch.object(rag, "embedder", Embedder()),
+    ):
+        result = await rag.ingest_text("\n\n".join(paragraphs), "manual.md", ollama_url=backend_url)
+    assert result["ok"] is True, result
+    assert result["chunks"] == 9 and result["failed_chunks"] == 1
+    assert [len(u) for u in _FakeBackend.upserts] == [4, 4, 1]
+    indices = sorted(p["payload"]["chunk_index"] for u in _FakeBackend.upserts for p in u)
+    assert indices == [0, 1, 2, 3, 4, 5, 7, 8, 9]
+    assert all(p["payload"]["total_chunks"] == 10 for u in _FakeBackend.upserts for p in u)
+
+
+@pytest.mark.usefixtures("app")  # BM25 の統計はテスト用の DB に書く
+class TestIncrementalIngest:
+    # 1段落 = 1チャンク（オーバーラップで前のチャンクの末尾も入る）
+    PARAGRAPHS = [f"第{i}節 " + "本文" * 300 + f" 第{i}節おわり" for i in range(8)]
+
+    async def _ingest(self, backend_url, paragraphs, filename="manual.md", doc_id=None):
+        _FakeBackend.batches, _FakeBackend.upserts = [], []
+        _FakeBackend.updates, _FakeBackend.deletes = [], []
+        with (
+            patch.object(rag, "QDRANT_URL", backend_url),
+            patch.object(rag, "embedder", Embedder()),
+        ):
+            result = await rag.ingest_text(
+                "\n\n".join(paragraphs), filename, ollama_url=backend_url, doc_id=doc_id,
+            )
+        assert result["ok"] is True, result
+        return result
+
+    def _stored(self):
+        return sorted((p["chunk_index"], p["total_chunks"]) for p in _FakeBackend.points.values())
+
+    @pytest.mark.asyncio
+    async def test_reingesting_unchanged_document_is_a_no_op(self, backend_url):
+        first = await self._ingest(backend_url, self.PARAGRAPHS)
+        second = await self._ingest(backend_url, self.PARAGRAPHS)
+        assert second["doc_id"] == first["doc_id"]
+        assert second["chunks"] == 8 and second["added_chunks"] == 0
+        assert _FakeBackend.batches == [] and _FakeBackend.upserts == []
+        assert _FakeBackend.updates == [] and _FakeBackend.deletes == []
+
+    @pytest.mark.asyncio
+    async def test_edit_embeds_only_changed_chunks(self, backend_url):
+        await self._ingest(backend_url, self.PARAGRAPHS, doc_id="manual")
+        edited = list(self.PARAGRAPHS)
+        edited[3] += " 追記"
+        result = await self._ingest(backend_url, edited, doc_id="manual")
+        # 編集した段落と、その末尾をオーバーラップに含む次の段落だけ
+        assert sum(len(b) for b in _FakeBackend.batches) == 2
+        assert (result["added_chunks"], result["removed_chunks"], result["updated_chunks"]) == (2, 2, 0)
+        assert self._stored() == [(i, 8) for i in range(8)]
+        assert (await bm25_index.corpus())[0] == 8
+
+    @pytest.mark.asyncio
+    async def test_removed_paragraph_shifts_positions_without_reembedding(self, backend_url):
+        await self._ingest(backend_url, self.PARAGRAPHS, doc_id="manual")
+        result = await self._ingest(backend_url, self.PARAGRAPHS[:2] + self.PARAGRAPHS[3:], doc_id="manual")
+        # 段落2の次のチャンクはオーバーラップが変わるので作り直す
+        assert sum(len(b) for b in _FakeBackend.batches) == 1
+        assert (result["added_chunks"], result["removed_chunks"]) == (1, 2)
+        # total_chunks が変わるので残りは全てペイロードだけ更新する
+        assert result["updated_chunks"] == 6 and len(_FakeBackend.updates) == 1
+        assert self._stored() == [(i, 7) for i in range(7)]
+        by_index = {p["chunk_index"]: p["content"] for p in _FakeBackend.points.values()}
+        assert by_index[6].endswith(self.PARAGRAPHS[7])
+        assert (await bm25_index.corpus())[0] == 7
+
+    @pytest.mark.asyncio
+    async def test_same_name_without_doc_id_never_replaces(self, backend_url):
+        a = await self._ingest(backend_url, self.PARAGRAPHS, "README.md")
+        b = await self._ingest(backend_url, [p + " 別の文書" for p in self.PARAGRAPHS], "README.md")
+        assert a["doc_id"] != b["doc_id"] and b["added_chunks"] == 8
+        assert b["removed_chunks"] == 0 and _FakeBackend.deletes == []
+        assert len(_FakeBackend.points) == 16
+
+
+@pytest.mark.asyncio
+async def test_cached_texts_are_not_sent_again(backend_url, tmp_path):
+    embedder = Embedder(cache=EmbeddingCache(tmp_path))
+    texts = ["alpha", "beta", "gamma"]
+    first = await embedder.embed_many(texts, backend_url, MODEL)
+    second = await embedder.embed_many(texts + ["delta"], backend_url, MODEL)
+    assert second[:3] == first
+    assert _FakeBackend.batches == [texts, ["delta"]]
+    assert await embedder.embed(backend_url, MODEL, "beta") == first[1]
+    assert len(_FakeBackend.batches) == 2
+    await embedder.cache.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_embeds_share_one_request(backend_url, tmp_path):
+    embedder = Embedder(cache=EmbeddingCache(tmp_path))
+    first, second = await asyncio.gather(
+        embedder.embed(backend_url, MODEL, "same message"),
+        embedder.embed(backend_url, MODEL, "same message"),
+    )
+    assert first == second == [12.0, 1.0]
+    assert _FakeBackend.batches == [["same message"]]
+    assert embedder.stats()["shared"] == 1
+    await embedder.cache.close()
+
+
+@pytest.mark.asyncio
+async def test_embed_failure_returns_none_and_is_not_cached(backend_url, tmp_path):
+    embedder = Embedder(cache=EmbeddingCache(tmp_path))
+    assert await embedder.embed(backend_url, MODEL, "POISON") is None
+    assert await embedder.embed(backend_url, MODEL, "POISON") is None
+    assert len(_FakeBackend.batches) == 2
+    await embedder.cache.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_embeds_are_coalesced_into_one_batch(backend_url):
+    embedder = Embedder()
+    texts = ["q1", "q2", "q1", "q3", "q2"]
+    vectors = await asyncio.gather(*(embedder.embed(backend_url, MODEL, t) for t in texts))
+    assert vectors == [[2.0, 1.0]] * 5
+    assert _FakeBackend.batches == [["q1", "q2", "q3"]]
+    stats = embedder.stats()
+    assert stats["coalesced_batches"] == 1 and stats["shared"] == 2 and stats["queued"] == 0
+    assert stats["batch_sizes"]["<=4"] == 1
+    assert [stats["queue_depth"][k] for k in ("<=1", "<=2", "<=4")] == [1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_sent_without_waiting_for_window(backend_url):
+    embedder = Embedder(window=30.0, batch_size=2)
+    vectors = await asyncio.wait_for(
+        asyncio.gather(*(embedder.embed(backend_url, MODEL, f"q{i}") for i in range(4))), timeout=5,
+    )
+    assert all(vectors)
+    assert _FakeBackend.batches == [["q0", "q1"], ["q2", "q3"]]
+
+
+@pytest.mark.asyncio
+async def test_failing_text_does_not_fail_other_callers(backend_url):
+    embedder = Embedder()
+    vectors = await asyncio.gather(
+        embedder.embed(backend_url, MODEL, "fine"),
+        embedder.embed(backend_url, MODEL, "POISON"),
+    )
+    assert vectors == [[4.0, 1.0], None]
+    assert [len(b) for b in _FakeBackend.batches] == [2, 1, 1]
+    assert embedder.stats()["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_coalesced_batch_is_not_split_when_backend_is_down(backend_url):
+    embedder = Embedder()
+    vectors = await asyncio.gather(*(embedder.embed(backend_url, MODEL, t) for t in ("q1", "DOWN", "q3")))
+    assert vectors == [None, None, None]
+    assert [len(b) for b in _FakeBackend.batches] == [3]
+
+
+@pytest.mark.asyncio
+async def test_stop_resolves_callers_waiting_for_the_window(backend_url):
+    embedder = Embedder(window=30.0)
+    pending = asyncio.gather(*(embedder.embed(backend_url, MODEL, t) for t in ("q1", "q2")))
+    await asyncio.sleep(0)
+    assert embedder.stats()["queued"] == 2
+    await embedder.stop()
+    assert await asyncio.wait_for(pending, timeout=5) == [None, None]
+    assert _FakeBackend.batches == []
+    assert embedder.stats()["queued"] == 0 and not embedder._inflight and not embedder._tasks
+    # 止めた後の呼び出しは古い Future を待たずに新しく送る
+    embedder.window = 0.0
+    assert await asyncio.wait_for(embedder.embed(backend_url, MODEL, "q1"), timeout=5) == [2.0, 1.0]
@@ -0,0 +1,128 @@
+"""Tests for the JSON fast path and the upstream stream parsers."""
+
+from __future__ import annotations
+
+import importlib
+import json
+import sys
+
+import pytest
+
+from helix_studio.services import fastjson
+from helix_studio.services.local_ai import _parse_ollama_ndjson, _parse_openai_sse
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+async def _collect(agen) -> list:
+    return [item async for item in agen]
+
+
+@pytest.fixture(params=["default", "stdlib"])
+def backend(request, monkeypatch):
+    """orjson の有無の両方で同じ結果になることを確かめる。"""
+    if request.param == "stdlib":
+        monkeypatch.setitem(sys.modules, "orjson", None)
+        module = importlib.reload(fastjson)
+        assert module.BACKEND == "json"
+    yield fastjson
+    monkeypatch.undo()
+    importlib.reload(fastjson)
+
+
+class TestSerialization:
+    def test_round_trip(self, backend):
+        obj = {"type": "chunk", "content": "日本語 \"quoted\"\n", "n": [1, 2.5, None, True]}
+        text = backend.dumps(obj)
+        assert isinstance(text, str)
+        assert json.loads(text) == obj
+        assert backend.loads(text) == obj
+        assert backend.loads(text.encode()) == obj
+        assert backend.dumps_bytes(obj) == text.encode()
+
+    def test_compact_and_non_ascii(self, backend):
+        assert backend.dumps({"a": "é", "b": 1}) == '{"a":"é","b":1}'
+
+    def test_decode_error_is_value_error(self, backend):
+        with pytest.raises(backend.JSONDecodeError):
+            backend.loads(b"{not json")
+        assert issubclass(backend.JSONDecodeError, ValueError)
+
+
+class TestLineBatches:
+    @pytest.mark.asyncio
+    async def test_lines_split_across_chunks(self):
+        batches = await _collect(fastjson.iter_line_batches(_chunks(b"ab", b"c\nde", b"f\n\ngh\r\n")))
+        assert [line for batch in batches for line in batch] == [b"abc", b"def", b"gh"]
+
+    @pytest.mark.asyncio
+    async def test_trailing_line_without_newline(self):
+        batches = await _collect(fastjson.iter_line_batches(_chunks(b"a\nb")))
+        assert batches == [[b"a"], [b"b"]]
+
+    @pytest.mark.asyncio
+    async def test_one_batch_per_network_chunk(self):
+        batches = await _collect(fastjson.iter_line_batches(_chunks(b"1\n2\n3\n", b"4\n")))
+        assert batches == [[b"1", b"2", b"3"], [b"4"]]
+
+
+def _ollama_stream() -> bytes:
+    lines = [
+        {"message": {"role": "assistant", "content": ""}, "done": False},
+        {"message": {"role": "assistant", "content": "こん"}, "done": False},
+        {"message": {"role": "assistant", "content": "にちは"}, "done": False},
+        {"message": {"role": "assistant", "content": ""}, "done": True,
+         "prompt_eval_count": 7, "eval_count": 2},
+    ]
+    return b"\n".join(json.dumps(x, ensure_ascii=False, separators=(",", ":")).encode() for x in lines)
+
+
+class TestOllamaParser:
+    @pytest.mark.asyncio
+    async def test_content_and_usage(self, backend):
+        usage: dict = {}
+        raw = _ollama_stream()
+        # 行の途中・マルチバイト文字の途中で区切って届く
+        parts = [raw[i:i + 7] for i in range(0, len(raw), 7)]
+        assert await _collect(_parse_ollama_ndjson(_chunks(*parts), usage)) == ["こん", "にちは"]
+        assert usage == {"tokens_in": 7, "tokens_out": 2}
+
+    @pytest.mark.asyncio
+    async def test_malformed_lines_are_skipped(self):
+        stream = _chunks(b'{"message":{"content":"a"},"done":false}\nnot json\n{"message":{"content":"b"}}\n')
+        assert await _collect(_parse_ollama_ndjson(stream)) == ["a", "b"]
+
+
+def _sse(chunk: dict) -> bytes:
+    return b"data: " + json.dumps(chunk, separators=(",", ":")).encode() + b"\n\n"
+
+
+class TestOpenAIParser:
+    @pytest.mark.asyncio
+    async def test_content_usage_and_done(self, backend):
+        raw = b"".join([
+            b": keep-alive\n\n",
+            _sse({"choices": [{"delta": {"role": "assistant"}}]}),
+            _sse({"choices": [{"delta": {"content": "Hel"}}], "usage": None}),
+            _sse({"choices": [{"delta": {"content": "lo"}}]}),
+            _sse({"choices": [], "usage": {"prompt_tokens": 3, "completion_tokens": 2}}),
+            b"data: [DONE]\n\n",
+            _sse({"choices": [{"delta": {"content": "after done"}}]}),
+        ])
+        usage: dict = {}
+        parts = [raw[i:i + 11] for i in range(0, len(raw), 11)]
+        assert await _collect(_parse_openai_sse(_chunks(*parts), usage)) == ["Hel", "lo"]
+        assert usage == {"tokens_in": 3, "tokens_out": 2}
+
+    @pytest.mark.asyncio
+    async def test_data_prefix_without_space(self):
+        stream = _chunks(b'data:{"choices":[{"delta":{"content":"x"}}]}\n\ndata:[DONE]\n\n')
+        assert await _collect(_parse_openai_sse(stream)) == ["x"]
+
+    @pytest.mark.asyncio
+    async def test_empty_choices_without_usage_request(self):
+        stream = _chunks(_sse({"choices": [], "usage": {"prompt_tokens": 1}}), b"data: [DONE]\n")
+        assert await _collect(_parse_openai_sse(stream)) == []
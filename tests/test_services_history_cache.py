@@ -0,0 +1,106 @@
+"""Tests for helix_studio.services.history_cache."""
+
+from __future__ import annotations
+
+import pytest
+
+from helix_studio.routes.chat import _save_message
+from helix_studio.services.context_window import ContextManager
+from helix_studio.services.history_cache import HistoryCache, history_cache
+
+
+def _msg(seq: int, content: str = "x", role: str = "user") -> dict:
+    return {"seq": seq, "role": role, "content": content}
+
+
+class TestHistoryCache:
+    def test_miss_then_hit(self):
+        cache = HistoryCache()
+        assert cache.get("c") is None
+        cache.begin_load("c")
+        cache.put("c", 0, [_msg(1), _msg(2)])
+        messages, complete = cache.get("c")
+        assert [m["seq"] for m in messages] == [1, 2]
+        assert complete is True
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_append_only_to_cached_conversation(self):
+        cache = HistoryCache()
+        cache.append("c", _msg(1))
+        assert cache.get("c") is None
+        cache.begin_load("c")
+        cache.put("c", 0, [_msg(1)])
+        cache.append("c", _msg(2))
+        assert [m["seq"] for m in cache.get("c")[0]] == [1, 2]
+
+    def test_append_during_load_discards_stale_snapshot(self):
+        cache = HistoryCache()
+        cache.begin_load("c")
+        cache.append("c", _msg(2))
+        cache.put("c", 0, [_msg(1)])
+        assert cache.get("c") is None
+
+    def test_out_of_order_append_evicts(self):
+        cache = HistoryCache()
+        cache.begin_load("c")
+        cache.put("c", 0, [_msg(5)])
+        cache.append("c", _msg(3))
+        assert cache.get("c") is None
+
+    def test_lru_eviction_by_bytes(self):
+        cache = HistoryCache(max_bytes=3000)
+        for conv in ("a", "b", "c"):
+            cache.begin_load(conv)
+            cache.put(conv, 0, [_msg(1, "y" * 1000)])
+        assert cache.get("a") is None
+        assert cache.get("c") is not None
+        assert cache.stats()["evictions"] >= 1
+        assert cache.stats()["bytes"] <= 3000
+
+    def test_entry_limit_keeps_newest(self):
+        cache = HistoryCache(max_entry_bytes=2500)
+        cache.begin_load("c")
+        cache.put("c", 0, [_msg(i, "z" * 1000) for i in range(1, 5)])
+        messages, complete = cache.get("c")
+        assert messages[-1]["seq"] == 4
+        assert len(messages) < 4
+        assert complete is False
+
+    def test_get_after_seq_drops_summarized(self):
+        cache = HistoryCache()
+        cache.begin_load("c")
+        cache.put("c", 0, [_msg(1), _msg(2), _msg(3)])
+        messages, complete = cache.get("c", after_seq=2)
+        assert [m["seq"] for m in messages] == [3]
+        assert complete is True
+
+    def test_evict(self):
+        cache = HistoryCache()
+        cache.begin_load("c")
+        cache.put("c", 0, [_msg(1)])
+        cache.evict("c")
+        assert cache.get("c") is None
+        assert cache.stats()["bytes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_saved_messages_are_served_from_cache(client):
+    conv_id = (await client.post("/api/conversations", json={"title": "t"})).json()["id"]
+    manager = ContextManager()
+
+    await (await _save_message("m1", conv_id, "user", "こんにちは", "ollama", "m"))
+    assert await manager.build(conv_id, "ollama", "m") == [
+        {"role": "user", "content": "こんにちは"},
+    ]
+
+    # 2ターン目は DB を読まずにキャッシュへ追記された内容が返る
+    misses = history_cache.misses
+    await (await _save_message("m2", conv_id, "assistant", "やあ", "ollama", "m"))
+    await (await _save_message("m3", conv_id, "user", "元気？", "ollama", "m"))
+    messages = await manager.build(conv_id, "ollama", "m")
+    assert [m["content"] for m in messages] == ["こんにちは", "やあ", "元気？"]
+    assert history_cache.misses == misses
+
+    await client.delete(f"/api/conversations/{conv_id}")
+    assert history_cache.get(conv_id) is None
@@ -0,0 +1,112 @@
+"""Tests for the shared HTTP client pool."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from helix_studio.services.http_pool import HTTPClientPool, Upstream
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+def _pool(max_connections: int = 4) -> HTTPClientPool:
+    return HTTPClientPool({"local": Upstream(httpx.Timeout(5.0), max_connections, max_connections)})
+
+
+@pytest.mark.asyncio
+async def test_sequential_requests_reuse_connection(server_url):
+    pool = _pool()
+    try:
+        for _ in range(5):
+            resp = await pool.client("local").get(server_url)
+            assert resp.text == "ok"
+        stats = pool.stats()["local"]
+        assert stats["requests"] == 5
+        assert stats["new_connections"] == 1
+        assert stats["reused"] == 4
+        assert stats["in_flight"] == 0
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_counts_in_flight_until_closed(server_url):
+    pool = _pool()
+    try:
+        async with pool.client("local").stream("GET", server_url) as resp:
+            assert pool.stats()["local"]["in_flight"] == 1
+            await resp.aread()
+        assert pool.stats()["local"]["in_flight"] == 0
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_saturation_is_counted(server_url):
+    pool = _pool(max_connections=2)
+    try:
+        client = pool.client("local")
+        await asyncio.gather(*(client.get(server_url) for _ in range(6)))
+        stats = pool.stats()["local"]
+        assert stats["peak_in_flight"] > 2
+        assert stats["saturated"] > 0
+        assert stats["new_connections"] <= 2
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_errors_release_in_flight():
+    pool = _pool()
+    try:
+        with pytest.raises(httpx.ConnectError):
+            await pool.client("local").get("http://127.0.0.1:9/")
+        stats = pool.stats()["local"]
+        assert stats["errors"] == 1 and stats["in_flight"] == 0
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_client_is_shared_and_recreated_after_close():
+    pool = _pool()
+    first = pool.client("local")
+    assert pool.client("local") is first
+    await pool.close()
+    assert first.is_closed
+    second = pool.client("local")
+    assert second is not first and not second.is_closed
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_unknown_upstream():
+    with pytest.raises(KeyError):
+        _pool().client("nope")
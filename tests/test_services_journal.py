@@ -0,0 +1,106 @@
+"""Tests for helix_studio.services.journal."""
+
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+import pytest
+
+from helix_studio.db import db_pool
+from helix_studio.services.journal import JournalEntry, MessageJournal
+
+
+async def _create_conversation(conv_id: str) -> None:
+    async with db_pool.write() as db:
+        await db.execute(
+            "INSERT INTO conversations (id, provider, model) VALUES (?, 'ollama', 'm')",
+            (conv_id,),
+        )
+
+
+async def _count_messages(conv_id: str) -> int:
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            "SELECT COUNT(*) AS cnt FROM messages WHERE conversation_id = ?", (conv_id,)
+        )
+        return (await cursor.fetchone())["cnt"]
+
+
+@pytest.mark.asyncio
+async def test_batches_concurrent_writes(app):
+    await _create_conversation("c1")
+    journal = MessageJournal(flush_interval=0.01)
+    await journal.start()
+    try:
+        futures = [
+            await journal.append(f"m{i}", "c1", "user", f"hello {i}")
+            for i in range(10)
+        ]
+        await asyncio.gather(*futures)
+    finally:
+        await journal.stop()
+    assert await _count_messages("c1") == 10
+    assert journal.batches < 10
+    assert journal.written == 10
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_pending(app):
+    await _create_conversation("c2")
+    journal = MessageJournal(flush_interval=1.0)
+    await journal.start()
+    await journal.append("m1", "c2", "user", "hi")
+    await journal.stop()
+    assert await _count_messages("c2") == 1
+
+
+@pytest.mark.asyncio
+async def test_bad_row_does_not_sink_batch(app):
+    await _create_conversation("c3")
+    journal = MessageJournal(flush_interval=0.01)
+    await journal.start()
+    try:
+        ok = await journal.append("m1", "c3", "user", "fine")
+        bad = await journal.append("m2", "missing-conv", "user", "orphan")
+        await ok
+        with pytest.raises(Exception):
+            await bad
+    finally:
+        await journal.stop()
+    assert await _count_messages("c3") == 1
+    assert journal.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_locked_database_retries_whole_batch_once(app):
+    attempts = 0
+
+    @asynccontextmanager
+    async def locked_write():
+        nonlocal attempts
+        attempts += 1
+        raise sqlite3.OperationalError("database is locked")
+        yield
+
+    journal = MessageJournal()
+    loop = asyncio.get_running_loop()
+    batch = [JournalEntry((f"m{i}", "c5", "user", "x", None, None, None, None, None), "c5", loop.create_future())
+             for i in range(5)]
+    with patch.object(db_pool, "write", locked_write):
+        await journal._flush(batch)
+    # 1件ずつには分けない
+    assert attempts == 2
+    assert all(isinstance(e.future.exception(), sqlite3.OperationalError) for e in batch)
+    assert journal.failed == 5
+
+
+@pytest.mark.asyncio
+async def test_writes_inline_when_not_running(app):
+    await _create_conversation("c4")
+    journal = MessageJournal()
+    fut = await journal.append("m1", "c4", "user", "inline")
+    assert fut.done()
+    assert await _count_messages("c4") == 1
@@ -0,0 +1,131 @@
+"""Tests for the model list cache."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import pytest
+
+from helix_studio.services.model_catalog import ModelCatalog
+
+
+def _fetcher(models: list[dict], calls: list, delay: float = 0.0):
+    async def fetch() -> list[dict]:
+        calls.append(1)
+        if delay:
+            await asyncio.sleep(delay)
+        return models
+
+    return fetch
+
+
+def _age(catalog: ModelCatalog, provider: str, seconds: float) -> None:
+    # time.monotonic を差し替えるとイベントループの時計も止まるので、エントリ側を古くする
+    catalog._entries[provider].fetched_at -= seconds
+
+
+@pytest.mark.asyncio
+async def test_fresh_entry_is_served_from_cache():
+    catalog = ModelCatalog(ttl=60)
+    calls: list = []
+    fetch = _fetcher([{"name": "a"}], calls)
+    first = await catalog.get("ollama", "sig", fetch)
+    second = await catalog.get("ollama", "sig", fetch)
+    assert first.models == second.models == [{"name": "a"}]
+    assert len(calls) == 1
+    assert catalog.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_returned_while_revalidating():
+    catalog = ModelCatalog(ttl=60, max_stale=600)
+    calls: list = []
+    await catalog.get("ollama", "sig", _fetcher([{"name": "old"}], calls))
+    _age(catalog, "ollama", 120)
+    stale = await catalog.get("ollama", "sig", _fetcher([{"name": "new"}], calls, delay=0.01))
+    assert stale.models == [{"name": "old"}]
+    assert catalog.stats()["refreshing"] == ["ollama"]
+    await asyncio.sleep(0.05)
+    fresh = await catalog.get("ollama", "sig", _fetcher([], calls))
+    assert fresh.models == [{"name": "new"}]
+    assert len(calls) == 2 and catalog.stats()["stale_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_past_max_stale_fetches_in_foreground():
+    catalog = ModelCatalog(ttl=60, max_stale=600)
+    calls: list = []
+    await catalog.get("ollama", "sig", _fetcher([{"name": "old"}], calls))
+    _age(catalog, "ollama", 3600)
+    entry = await catalog.get("ollama", "sig", _fetcher([{"name": "new"}], calls))
+    assert entry.models == [{"name": "new"}]
+
+
+@pytest.mark.asyncio
+async def test_signature_change_is_a_miss():
+    catalog = ModelCatalog()
+    calls: list = []
+    await catalog.get("openai", "key1", _fetcher([{"name": "a"}], calls))
+    entry = await catalog.get("openai", "key2", _fetcher([{"name": "b"}], calls))
+    assert entry.models == [{"name": "b"}]
+    assert catalog.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch():
+    catalog = ModelCatalog()
+    calls: list = []
+    fetch = _fetcher([{"name": "a"}], calls, delay=0.01)
+    await asyncio.gather(*(catalog.get("ollama", "sig", fetch) for _ in range(5)))
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_and_failing_providers_do_not_block_others():
+    catalog = ModelCatalog()
+
+    async def hang() -> list[dict]:
+        await asyncio.sleep(10)
+        return []
+
+    async def fail() -> list[dict]:
+        raise ConnectionError("refused")
+
+    start = time.perf_counter()
+    models, errors = await catalog.get_all({
+        "ollama": ("s", _fetcher([{"name": "a"}], []), 1.0),
+        "claude": ("s", hang, 0.05),
+        "openai": ("s", fail, 1.0),
+    })
+    assert time.perf_counter() - start < 1.0
+    assert models == {"ollama": [{"name": "a"}], "claude": [], "openai": []}
+    assert errors == {"claude": "timed out after 0.05s", "openai": "refused"}
+
+
+@pytest.mark.asyncio
+async def test_errors_are_cached_for_error_ttl():
+    catalog = ModelCatalog(ttl=60, error_ttl=10)
+    calls: list = []
+
+    async def fail() -> list[dict]:
+        calls.append(1)
+        raise ConnectionError("refused")
+
+    await catalog.get("ollama", "sig", fail)
+    await catalog.get("ollama", "sig", fail)
+    assert len(calls) == 1
+    _age(catalog, "ollama", 30)
+    await catalog.get("ollama", "sig", fail)
+    await asyncio.sleep(0)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_refresh_and_clears():
+    catalog = ModelCatalog(ttl=0)
+    await catalog.get("ollama", "sig", _fetcher([], []))
+    await catalog.get("ollama", "sig", _fetcher([], [], delay=10))
+    assert catalog.stats()["refreshing"] == ["ollama"]
+    await catalog.stop()
+    stats = catalog.stats()
+    assert stats["refreshing"] == [] and stats["providers"] == {}
@@ -2,9 +2,11 @@
 
 from __future__ import annotations
 
+from unittest.mock import AsyncMock, patch
+
 import pytest
 
-from helix_studio.services.pipeline import _detect_provider
+from helix_studio.services.pipeline import _detect_provider, _prefetch_local_model
 
 
 class TestDetectProvider:
@@ -35,3 +37,23 @@ class TestDetectProvider:
 
     def test_cli_gemini(self):
         assert _detect_provider("gemini") == "gemini_cli"
+
+
+class TestPrefetchLocalModel:
+    async def _prefetched(self, step2_model: str, use_crew: bool = False) -> list:
+        prefetch = AsyncMock()
+        with patch("helix_studio.services.pipeline.backend_pool.prefetch", prefetch):
+            await _prefetch_local_model(step2_model, use_crew, "research_team")
+        return [c.args for c in prefetch.call_args_list]
+
+    @pytest.mark.asyncio
+    async def test_local_step2_model(self):
+        assert await self._prefetched("ollama/gemma3:27b") == [("gemma3:27b",)]
+
+    @pytest.mark.asyncio
+    async def test_crew_first_agent_model(self):
+        assert await self._prefetched("", use_crew=True) == [("gemma3:27b",)]
+
+    @pytest.mark.asyncio
+    async def test_cloud_step2_is_not_prefetched(self):
+        assert await self._prefetched("claude-sonnet-4-20250514") == []
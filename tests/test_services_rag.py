@@ -4,9 +4,9 @@ from __future__ import annotations
 
 import pytest
 
+from helix_studio.services.bm25 import encode_document
 from helix_studio.services.rag import (
     _chunk_text,
-    _tokenize_for_bm25,
     format_rag_context,
     SUPPORTED_EXTENSIONS,
     DOCLING_EXTENSIONS,
@@ -48,25 +48,42 @@ class TestChunkText:
             assert len(chunks[1]) > 0
 
 
+    def test_inserted_paragraph_only_changes_nearby_chunks(self):
+        paragraphs = [f"段落{i}: " + "文" * 200 for i in range(60)]
+        before = _chunk_text("\n\n".join(paragraphs), chunk_size=1000, overlap=0)
+        after = _chunk_text("\n\n".join(paragraphs[:5] + ["追加の段落"] + paragraphs[5:]), chunk_size=1000, overlap=0)
+        # アンカー段落で区切りが揃うので、挿入位置の後ろもほとんど同じチャンクになる
+        assert len(set(after) - set(before)) <= 3
+
+
 class TestBM25Tokenizer:
     def test_basic_tokenization(self):
-        result = _tokenize_for_bm25("hello world hello")
+        result = encode_document("hello world hello")
         assert len(result["indices"]) > 0
         assert len(result["indices"]) == len(result["values"])
 
     def test_empty_text(self):
-        result = _tokenize_for_bm25("")
+        result = encode_document("")
         assert result["indices"] == []
         assert result["values"] == []
 
     def test_single_token(self):
-        result = _tokenize_for_bm25("word")
+        result = encode_document("word")
         assert len(result["indices"]) == 1
 
     def test_indices_are_sorted(self):
-        result = _tokenize_for_bm25("the quick brown fox jumps over the lazy dog")
+        result = encode_document("the quick brown fox jumps over the lazy dog")
         assert result["indices"] == sorted(result["indices"])
 
+    def test_japanese_is_split_into_bigrams(self):
+        # 東京・京都・都の → 3語
+        assert len(encode_document("東京都の")["indices"]) == 3
+
+    def test_repeated_terms_saturate(self):
+        once = encode_document("cat dog")["values"]
+        many = encode_document("cat " * 50 + "dog", avgdl=51)["values"]
+        assert max(many) < 2.2 and max(once) < max(many)
+
 
 class TestFormatRagContext:
     def test_empty_results(self):
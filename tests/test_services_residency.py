@@ -0,0 +1,150 @@
+"""Tests for the Ollama model residency manager."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+from helix_studio.services.residency import EMBED, ResidencyManager, normalize
+
+SETTINGS = {
+    "default_local_model": "gemma3:27b",
+    "rag_embedding_model": "qwen3-embedding:8b",
+    "ollama_keep_alive": "2h",
+}
+
+
+class _FakeOllama(BaseHTTPRequestHandler):
+    """/api/generate・/api/embed でモデルを「ロード」し、/api/ps で返す Ollama の代役。"""
+
+    protocol_version = "HTTP/1.1"
+    requests: list[tuple[str, dict]] = []
+    loaded: list[str] = []
+    delay = 0.0
+
+    def _send(self, data: dict) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests.append((self.path, payload))
+        if type(self).delay:
+            import time
+            time.sleep(type(self).delay)
+        type(self).loaded.append(payload["model"])
+        self._send({"model": payload["model"], "done": True})
+
+    def do_GET(self):
+        self._send({"models": [
+            {"name": name, "size_vram": 2 * 1024**3, "expires_at": "2026-01-01T00:00:00Z"}
+            for name in dict.fromkeys(type(self).loaded)
+        ]})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def ollama_url():
+    _FakeOllama.requests = []
+    _FakeOllama.loaded = []
+    _FakeOllama.delay = 0.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def settings():
+    async def get_setting(key: str) -> str | None:
+        return SETTINGS.get(key)
+
+    with patch("helix_studio.services.residency.get_setting", side_effect=get_setting):
+        yield
+
+
+def test_normalize():
+    assert normalize("gemma3") == "gemma3:latest"
+    assert normalize("gemma3:27b") == "gemma3:27b"
+
+
+@pytest.mark.asyncio
+async def test_keep_alive_only_for_pinned_models():
+    manager = ResidencyManager()
+    assert await manager.keep_alive_for("gemma3:27b") == "2h"
+    assert await manager.keep_alive_for("qwen3-embedding:8b") == "2h"
+    assert await manager.keep_alive_for("ministral-3:8b") is None
+
+
+@pytest.mark.asyncio
+async def test_warm_pinned_loads_chat_and_embedding_models(ollama_url):
+    manager = ResidencyManager()
+    await manager.warm_pinned(ollama_url)
+    assert _FakeOllama.requests == [
+        ("/api/generate", {"model": "gemma3:27b", "keep_alive": "2h"}),
+        ("/api/embed", {"model": "qwen3-embedding:8b", "keep_alive": "2h", "input": []}),
+    ]
+    assert manager.stats()["warmups"] == 2
+    assert await manager.is_resident(ollama_url, "gemma3:27b")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_warms_share_one_load(ollama_url):
+    _FakeOllama.delay = 0.05
+    manager = ResidencyManager()
+    results = await asyncio.gather(*(manager.warm(ollama_url, "gemma3:27b") for _ in range(4)))
+    assert results == [True] * 4
+    assert len(_FakeOllama.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_prefetch_skips_resident_model(ollama_url):
+    manager = ResidencyManager()
+    await manager.warm(ollama_url, "ministral-3:8b")
+    manager.prefetch(ollama_url, "ministral-3:8b")
+    manager.prefetch(ollama_url, "gemma3:4b")
+    await asyncio.gather(*manager._prefetches)
+    assert [p["model"] for _, p in _FakeOllama.requests] == ["ministral-3:8b", "gemma3:4b"]
+    # 常駐対象外のモデルには keep_alive を付けない
+    assert "keep_alive" not in _FakeOllama.requests[1][1]
+    stats = manager.stats()
+    assert stats["prefetches"] == 1 and stats["prefetch_skipped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_tracks_api_ps(ollama_url):
+    manager = ResidencyManager()
+    _FakeOllama.loaded = ["gemma3:27b", "qwen3-embedding:8b"]
+    resident = await manager.refresh(ollama_url)
+    assert set(resident) == {"gemma3:27b", "qwen3-embedding:8b"}
+    assert manager.stats()["resident"][ollama_url]["gemma3:27b"]["size_vram_gb"] == 2.0
+
+
+@pytest.mark.asyncio
+async def test_unreachable_ollama_is_not_fatal():
+    manager = ResidencyManager()
+    assert await manager.warm("http://127.0.0.1:9", "gemma3:27b", EMBED) is False
+    assert await manager.refresh("http://127.0.0.1:9") == {}
+    assert manager.stats()["warm_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_background_work(ollama_url):
+    _FakeOllama.delay = 0.2
+    manager = ResidencyManager()
+    manager.prefetch(ollama_url, "gemma3:4b")
+    await asyncio.sleep(0.02)
+    await manager.stop()
+    assert manager.stats()["warming"] == []
@@ -0,0 +1,109 @@
+"""Tests for the WebSocket chunk coalescer."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from helix_studio.services.stream_coalescer import (
+    MAX_FLUSH_BYTES,
+    MAX_FLUSH_MS,
+    ChunkCoalescer,
+    negotiate,
+)
+
+
+def _collector():
+    frames: list[str] = []
+
+    async def send(text: str) -> None:
+        frames.append(text)
+
+    return frames, send
+
+
+@pytest.mark.asyncio
+async def test_disabled_sends_every_chunk():
+    frames, send = _collector()
+    c = ChunkCoalescer(send)
+    for t in ("a", "b", "c"):
+        await c.push(t)
+    await c.close()
+    assert frames == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_first_chunk_is_immediate():
+    frames, send = _collector()
+    c = ChunkCoalescer(send, flush_ms=1000)
+    await c.push("first")
+    assert frames == ["first"]
+    await c.push("second")
+    assert frames == ["first"]
+    await c.close()
+    assert frames == ["first", "second"]
+
+
+@pytest.mark.asyncio
+async def test_byte_threshold_flushes():
+    frames, send = _collector()
+    c = ChunkCoalescer(send, flush_ms=1000, max_bytes=4)
+    await c.push("x")
+    await c.push("ab")
+    assert frames == ["x"]
+    await c.push("cd")
+    assert frames == ["x", "abcd"]
+    await c.close()
+
+
+@pytest.mark.asyncio
+async def test_timer_flushes_buffer():
+    frames, send = _collector()
+    c = ChunkCoalescer(send, flush_ms=20)
+    await c.push("a")
+    await c.push("b")
+    await c.push("c")
+    await asyncio.sleep(0.06)
+    assert frames == ["a", "bc"]
+    assert c.frames == 2 and c.chunks == 3
+    await c.close()
+    assert frames == ["a", "bc"]
+
+
+@pytest.mark.asyncio
+async def test_slow_stream_is_not_delayed():
+    frames, send = _collector()
+    c = ChunkCoalescer(send, flush_ms=10)
+    await c.push("a")
+    await asyncio.sleep(0.02)
+    await c.push("b")
+    assert frames == ["a", "b"]
+    await c.close()
+
+
+@pytest.mark.asyncio
+async def test_timer_send_error_surfaces_on_close():
+    sent = []
+
+    async def send(text: str) -> None:
+        if sent:
+            raise RuntimeError("disconnected")
+        sent.append(text)
+
+    c = ChunkCoalescer(send, flush_ms=10)
+    await c.push("a")
+    await c.push("b")
+    await asyncio.sleep(0.03)
+    with pytest.raises(RuntimeError):
+        await c.close()
+
+
+def test_negotiate_clamps_values():
+    assert negotiate({}) == (0.0, 0)
+    assert negotiate({"coalesce_ms": 33, "coalesce_bytes": 2048}) == (33.0, 2048)
+    assert negotiate({"coalesce_ms": 10_000, "coalesce_bytes": 10**9}) == (
+        MAX_FLUSH_MS, MAX_FLUSH_BYTES,
+    )
+    assert negotiate({"coalesce_ms": -5}) == (0.0, 0)
+    assert negotiate({"coalesce_ms": "fast"}) == (0.0, 0)
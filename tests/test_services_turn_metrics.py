@@ -0,0 +1,78 @@
+"""Tests for helix_studio.services.turn_metrics."""
+
+from __future__ import annotations
+
+import time
+from unittest.mock import patch
+
+import pytest
+
+from helix_studio.db import db_pool
+from helix_studio.services.turn_metrics import TurnTrace, mark_connected, percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0.0
+    assert percentile([7], 99) == 7
+
+
+def test_trace_row():
+    trace = TurnTrace("ollama", "gemma3:4b")
+    with trace.measure("db"):
+        pass
+    trace.stream_started()
+    mark_connected(trace.usage)
+    time.sleep(0.01)
+    for _ in range(3):
+        trace.chunk()
+        time.sleep(0.005)
+    trace.stream_ended()
+    trace.usage.update(tokens_in=12, tokens_out=30)
+
+    row = trace.row()
+    assert row["db_ms"] == 0
+    assert row["ttft_ms"] >= 10
+    assert row["connect_ms"] is not None and row["connect_ms"] <= row["ttft_ms"]
+    assert row["chunks"] == 3
+    assert row["gap_max_ms"] >= 5
+    assert row["tokens_out"] == 30
+    assert row["tokens_per_sec"] > 0
+
+
+@pytest.mark.asyncio
+async def test_post_chat_records_usage_and_latency(client):
+    async def fake_stream(*args, usage=None, **kwargs):
+        mark_connected(usage)
+        yield "Hello "
+        yield "world!"
+        usage.update(tokens_in=5, tokens_out=2)
+
+    with patch("helix_studio.routes.chat.local_ai.stream_chat", side_effect=fake_stream):
+        resp = await client.post(
+            "/api/chat",
+            json={
+                "provider": "ollama",
+                "model": "gemma3:27b",
+                "messages": [{"role": "user", "content": "hi"}],
+            },
+        )
+    data = resp.json()
+    assert data["tokens_in"] == 5 and data["tokens_out"] == 2
+
+    async with db_pool.read() as db:
+        cursor = await db.execute(
+            "SELECT tokens_in, tokens_out FROM messages WHERE id = ?", (data["message_id"],)
+        )
+        msg = await cursor.fetchone()
+    assert (msg["tokens_in"], msg["tokens_out"]) == (5, 2)
+
+    stats = (await client.get("/api/metrics/chat")).json()
+    assert stats["turns"] == 1
+    entry = stats["models"][0]
+    assert (entry["provider"], entry["model"]) == ("ollama", "gemma3:27b")
+    assert entry["ttft_ms"]["count"] == 1
+    assert {"p50", "p95", "p99"} <= entry["total_ms"].keys()